@@ -0,0 +1,138 @@
+"""
+Кэш виджетов дашборда без «стада» пересчётов.
+
+Раньше каждый виджет делал cache.get / cache.set с фиксированным TTL: когда
+популярный ключ истекал, все одновременные запросы дашборда пересчитывали один
+и тот же тяжёлый агрегат.
+
+@stampede_safe(key_func, soft_ttl, hard_ttl, beta) кладёт в кэш конверт
+{value, soft_until, delta} на hard_ttl секунд:
+
+    - до soft_until значение свежее и отдаётся как есть;
+    - после soft_until пересчитывает один вызов — занявший замок
+      dashboard:lock:<ключ> (cache.add — SET NX в Redis), остальные сразу
+      получают устаревшее значение;
+    - ключа нет совсем — считает владелец замка, остальные ждут его результат
+      (не дольше LOCK_TTL);
+    - beta > 0 — вероятностное раннее истечение (XFetch): чем ближе soft_until
+      и чем дольше считался агрегат (delta), тем вероятнее, что один из запросов
+      пересчитает значение заранее, до того как оно устареет у всех.
+
+У обёрнутой функции есть .refresh(...) — пересчитать и положить в кэш, если
+никто не считает этот ключ прямо сейчас (прогрев warm_dashboard_cache_task),
+и .cache_key(...).
+"""
+
+from __future__ import annotations
+
+import functools
+import logging
+import math
+import random
+import time
+import uuid
+from typing import Callable, Optional
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Потолок одного пересчёта: упавший воркер не держит замок дольше
+LOCK_TTL = 60
+WAIT_STEP = 0.05
+
+_MISSING = object()
+
+
+def _lock_key(key: str) -> str:
+    return f"dashboard:lock:{key}"
+
+
+def _envelope(key: str):
+    envelope = cache.get(key)
+    # Значения, положенные до обёртки в конверт, считаем промахом
+    if isinstance(envelope, dict) and "soft_until" in envelope:
+        return envelope
+    return None
+
+
+def _is_due(envelope, beta: float) -> bool:
+    remaining = envelope["soft_until"] - time.time()
+    if remaining <= 0:
+        return True
+    # 1 - random() ∈ (0, 1]: без log(0)
+    return beta > 0 and envelope["delta"] * beta * -math.log(1.0 - random.random()) >= remaining
+
+
+def stampede_safe(key_func: Callable[..., str], soft_ttl: int, hard_ttl: int, beta: float = 1.0):
+    """
+    Args:
+        key_func: ключ кэша по аргументам функции.
+        soft_ttl: сколько секунд значение свежее.
+        hard_ttl: сколько секунд значение хранится (отдаётся устаревшим, пока его пересчитывают).
+        beta: сила раннего истечения; 0 — выключено.
+    """
+
+    def decorator(fn):
+        def compute(key, args, kwargs):
+            started = time.monotonic()
+            value = fn(*args, **kwargs)
+            envelope = {"value": value, "soft_until": time.time() + soft_ttl, "delta": time.monotonic() - started}
+            cache.set(key, envelope, hard_ttl)
+            return value
+
+        def locked(key, args, kwargs):
+            """Пересчёт под замком; _MISSING — замок занят другим вызовом."""
+            lock_key, token = _lock_key(key), uuid.uuid4().hex
+            try:
+                owner = cache.add(lock_key, token, LOCK_TTL)
+            except Exception as e:
+                logger.warning(f"Замок кэша дашборда недоступен, считаю {key} без него: {e}")
+                return compute(key, args, kwargs)
+            if not owner:
+                return _MISSING
+            try:
+                return compute(key, args, kwargs)
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            envelope = _envelope(key)
+            if envelope is not None and not _is_due(envelope, beta):
+                return envelope["value"]
+
+            deadline = time.monotonic() + LOCK_TTL
+            while True:
+                value = locked(key, args, kwargs)
+                if value is not _MISSING:
+                    return value
+                if envelope is not None:
+                    # Пересчитывает другой вызов — отдаём, что есть
+                    return envelope["value"]
+                # Холодный ключ: ждём результат владельца замка
+                while cache.get(_lock_key(key)) is not None and time.monotonic() < deadline:
+                    time.sleep(WAIT_STEP)
+                    envelope = _envelope(key)
+                    if envelope is not None:
+                        return envelope["value"]
+                envelope = _envelope(key)
+                if envelope is not None:
+                    return envelope["value"]
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Не дождались пересчёта {key}, считаю сам")
+                    return compute(key, args, kwargs)
+                # Владелец закончил без результата (исключение) — пробуем занять замок сами
+
+        def refresh(*args, **kwargs) -> Optional[object]:
+            """Пересчитать и положить в кэш. None — ключ уже пересчитывает другой вызов."""
+            value = locked(key_func(*args, **kwargs), args, kwargs)
+            return None if value is _MISSING else value
+
+        wrapper.refresh = refresh
+        wrapper.cache_key = key_func
+        return wrapper
+
+    return decorator
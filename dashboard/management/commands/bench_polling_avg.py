@@ -0,0 +1,140 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from dashboard.models import PrinterMonthCounters
+from dashboard.services_counters import printer_first_last, refresh_counter_snapshots
+from inventory.models import InventoryTask, PageCounter, Printer
+
+# Вставка пачками сырым executemany: bulk_create перезаписал бы task_timestamp (auto_now_add)
+INSERT_CHUNK = 20000
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _legacy_first_last(printer_ids):
+    """Прежняя выборка: все успешные счётчики принтеров в Python, первый и последний — по принтеру."""
+    result = {}
+    for row in (
+        PageCounter.objects.filter(task__printer_id__in=printer_ids, task__status="SUCCESS")
+        .order_by("task__printer_id", "recorded_at")
+        .values("task__printer_id", "recorded_at", "bw_a4", "color_a4", "bw_a3", "color_a3")
+        .iterator(chunk_size=INSERT_CHUNK)
+    ):
+        printer_id = row["task__printer_id"]
+        result[printer_id] = (result[printer_id][0] if printer_id in result else row, row)
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк первого/последнего счётчика принтеров за всю историю (средняя нагрузка по сетевому "
+        "опросу, лист «По принтерам (сеть)»): прежняя выгрузка всех счётчиков в Python против месячных "
+        "снимков. Синтетическая история опросов создаётся в транзакции и откатывается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000, help="Опросов в истории (default: 10000000)")
+        parser.add_argument("--printers", type=int, default=2000, help="Принтеров (default: 2000)")
+        parser.add_argument("--months", type=int, default=36, help="Глубина истории в месяцах (default: 36)")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                printer_ids = self._build(options)
+                self.stdout.write(
+                    f"\nОпросов: {options['rows']}, принтеров: {options['printers']}, "
+                    f"история создана за {time.perf_counter() - started:.0f} c"
+                )
+
+                PrinterMonthCounters.objects.all().delete()
+                started = time.perf_counter()
+                months = refresh_counter_snapshots()
+                self.stdout.write(
+                    f"  снимки за {months} мес. свёрнуты за {time.perf_counter() - started:.1f} c (один раз)"
+                )
+
+                new = self._run("месячные снимки", lambda: printer_first_last(printer_ids))
+                old = self._run("прежняя, все счётчики в Python", lambda: _legacy_first_last(printer_ids))
+                mismatched = [
+                    pid
+                    for pid, (first, last) in old.items()
+                    if pid not in new or (new[pid][0]["bw_a4"], new[pid][1]["bw_a4"]) != (first["bw_a4"], last["bw_a4"])
+                ]
+                self.stdout.write(f"  расхождений: {len(mismatched) + abs(len(new) - len(old))}")
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _build(self, options):
+        rnd = random.Random(options["seed"])
+        printers = Printer.objects.bulk_create(
+            [
+                Printer(
+                    ip_address=f"10.{200 + i // 65536}.{i // 256 % 256}.{i % 256}", serial_number=f"BENCH-PA-{i:06d}"
+                )
+                for i in range(options["printers"])
+            ]
+        )
+        printer_ids = [p.pk for p in printers]
+
+        history_end = timezone.make_aware(datetime(1990, 1, 1)) + timedelta(days=30 * options["months"])
+        span = 30 * 24 * 3600 * options["months"]
+        task_table = InventoryTask._meta.db_table
+        counter_table = PageCounter._meta.db_table
+        task_id = (InventoryTask.objects.order_by("-pk").values_list("pk", flat=True).first() or 0) + 1
+        counter_id = (PageCounter.objects.order_by("-pk").values_list("pk", flat=True).first() or 0) + 1
+
+        with connection.cursor() as cursor:
+            for chunk_start in range(0, options["rows"], INSERT_CHUNK):
+                tasks, counters = [], []
+                for _ in range(min(INSERT_CHUNK, options["rows"] - chunk_start)):
+                    ts = connection.ops.adapt_datetimefield_value(history_end - timedelta(seconds=rnd.randrange(span)))
+                    status = "SUCCESS" if rnd.random() < 0.9 else "FAILED"
+                    tasks.append((task_id, rnd.choice(printer_ids), ts, status, "SNMP_LOCAL", ""))
+                    counters.append((counter_id, task_id, rnd.randint(0, 10**6), 0, "", ts))
+                    task_id += 1
+                    counter_id += 1
+                cursor.executemany(
+                    f"INSERT INTO {task_table} (id, printer_id, task_timestamp, status, data_source, agent_id) "
+                    f"VALUES (%s, %s, %s, %s, %s, %s)",
+                    tasks,
+                )
+                cursor.executemany(
+                    f"INSERT INTO {counter_table} (id, task_id, bw_a4, color_a4, "
+                    f"drum_black, drum_cyan, drum_magenta, drum_yellow, toner_black, toner_cyan, toner_magenta, "
+                    f"toner_yellow, fuser_kit, transfer_kit, waste_toner, recorded_at) "
+                    f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    [(cid, tid, bw, color) + (blank,) * 11 + (ts,) for cid, tid, bw, color, blank, ts in counters],
+                )
+            if connection.vendor == "postgresql":
+                cursor.execute(f"ANALYZE {task_table}")
+                cursor.execute(f"ANALYZE {counter_table}")
+
+        return printer_ids
+
+    def _run(self, label, func):
+        queries = []
+
+        def count(execute, sql, sql_params, many, context):
+            queries.append(sql)
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  {label}: {elapsed:.2f} c, запросов {len(queries)}, принтеров с данными {len(result)}"
+            )
+        )
+        return result
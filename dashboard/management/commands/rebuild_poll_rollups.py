@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dashboard.models import PrinterMonthCounters, PrinterPollDaily, PrinterPollHourly
+from dashboard.services_counters import refresh_counter_snapshots
+from dashboard.services_rollups import rebuild_poll_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Полностью пересобрать сводки опросов дашборда (по принтерам и организациям, по часам и дням) "
+        "и месячные снимки счётчиков принтеров"
+    )
+
+    def handle(self, *args, **options):
+        processed = rebuild_poll_rollups()
+        with transaction.atomic():
+            PrinterMonthCounters.objects.all().delete()
+            months = refresh_counter_snapshots()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Учтено задач опроса: {processed}; строк по часам: {PrinterPollHourly.objects.count()}, "
+                f"по дням: {PrinterPollDaily.objects.count()}; свёрнуто месяцев счётчиков: {months}"
+            )
+        )
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('inventory', '0027_inventorytask_covering_printer_status_ts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Сводка')),
+                ('last_task_id', models.BigIntegerField(default=0, verbose_name='Последняя учтённая задача')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Отметка сводок опросов',
+                'verbose_name_plural': 'Отметки сводок опросов',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrganizationPollDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('polls_ok', models.PositiveIntegerField(default=0, verbose_name='Успешных опросов')),
+                ('polls_failed', models.PositiveIntegerField(default=0, verbose_name='Неуспешных опросов')),
+                ('pages', models.BigIntegerField(default=0, verbose_name='Напечатано страниц')),
+                ('last_success', models.DateTimeField(blank=True, null=True, verbose_name='Последний успешный опрос')),
+                ('day', models.DateField(verbose_name='День')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.organization')),
+            ],
+            options={
+                'verbose_name': 'Опросы организации за сутки',
+                'verbose_name_plural': 'Опросы организаций по дням',
+                'indexes': [models.Index(fields=['day'], name='dash_org_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('organization', 'day'), name='dash_org_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrganizationPollHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('polls_ok', models.PositiveIntegerField(default=0, verbose_name='Успешных опросов')),
+                ('polls_failed', models.PositiveIntegerField(default=0, verbose_name='Неуспешных опросов')),
+                ('pages', models.BigIntegerField(default=0, verbose_name='Напечатано страниц')),
+                ('last_success', models.DateTimeField(blank=True, null=True, verbose_name='Последний успешный опрос')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.organization')),
+            ],
+            options={
+                'verbose_name': 'Опросы организации за час',
+                'verbose_name_plural': 'Опросы организаций по часам',
+                'indexes': [models.Index(fields=['hour'], name='dash_org_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('organization', 'hour'), name='dash_org_hour_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PrinterPollDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('polls_ok', models.PositiveIntegerField(default=0, verbose_name='Успешных опросов')),
+                ('polls_failed', models.PositiveIntegerField(default=0, verbose_name='Неуспешных опросов')),
+                ('pages', models.BigIntegerField(default=0, verbose_name='Напечатано страниц')),
+                ('last_success', models.DateTimeField(blank=True, null=True, verbose_name='Последний успешный опрос')),
+                ('day', models.DateField(verbose_name='День')),
+                ('last_total', models.BigIntegerField(blank=True, null=True, verbose_name='Счётчик на последнем успешном опросе')),
+                ('printer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.printer')),
+            ],
+            options={
+                'verbose_name': 'Опросы принтера за сутки',
+                'verbose_name_plural': 'Опросы принтеров по дням',
+                'indexes': [models.Index(fields=['day'], name='dash_printer_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('printer', 'day'), name='dash_printer_day_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PrinterPollHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('polls_ok', models.PositiveIntegerField(default=0, verbose_name='Успешных опросов')),
+                ('polls_failed', models.PositiveIntegerField(default=0, verbose_name='Неуспешных опросов')),
+                ('pages', models.BigIntegerField(default=0, verbose_name='Напечатано страниц')),
+                ('last_success', models.DateTimeField(blank=True, null=True, verbose_name='Последний успешный опрос')),
+                ('hour', models.DateTimeField(verbose_name='Час')),
+                ('printer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.printer')),
+            ],
+            options={
+                'verbose_name': 'Опросы принтера за час',
+                'verbose_name_plural': 'Опросы принтеров по часам',
+                'indexes': [models.Index(fields=['hour'], name='dash_printer_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('printer', 'hour'), name='dash_printer_hour_uniq')],
+            },
+        ),
+    ]
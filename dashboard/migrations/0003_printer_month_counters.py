@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_poll_rollups'),
+        ('inventory', '0027_inventorytask_covering_printer_status_ts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrinterMonthCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('first_at', models.DateTimeField(verbose_name='Первый опрос')),
+                ('first_bw_a4', models.IntegerField(blank=True, null=True)),
+                ('first_color_a4', models.IntegerField(blank=True, null=True)),
+                ('first_bw_a3', models.IntegerField(blank=True, null=True)),
+                ('first_color_a3', models.IntegerField(blank=True, null=True)),
+                ('last_at', models.DateTimeField(verbose_name='Последний опрос')),
+                ('last_bw_a4', models.IntegerField(blank=True, null=True)),
+                ('last_color_a4', models.IntegerField(blank=True, null=True)),
+                ('last_bw_a3', models.IntegerField(blank=True, null=True)),
+                ('last_color_a3', models.IntegerField(blank=True, null=True)),
+                ('printer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.printer')),
+            ],
+            options={
+                'verbose_name': 'Счётчики принтера за месяц',
+                'verbose_name_plural': 'Счётчики принтеров по месяцам',
+                'indexes': [models.Index(fields=['month'], name='dash_printer_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('printer', 'month'), name='dash_printer_month_uniq')],
+            },
+        ),
+    ]
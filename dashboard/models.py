@@ -13,3 +13,118 @@ class DashboardAccess(models.Model):
         app_label = "dashboard"
         verbose_name = "Дашборд"
         verbose_name_plural = "Дашборд"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Сводки опросов (ведёт dashboard/services_rollups.py)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+class PollRollup(models.Model):
+    """Общие поля сводок: опросы за интервал, напечатано страниц, последний успешный опрос."""
+
+    polls_ok = models.PositiveIntegerField("Успешных опросов", default=0)
+    polls_failed = models.PositiveIntegerField("Неуспешных опросов", default=0)
+    pages = models.BigIntegerField("Напечатано страниц", default=0)
+    last_success = models.DateTimeField("Последний успешный опрос", null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class PrinterPollHourly(PollRollup):
+    """Опросы принтера за час (UTC-час начала). Хранятся DASHBOARD_ROLLUP_HOURLY_DAYS дней."""
+
+    printer = models.ForeignKey("inventory.Printer", on_delete=models.CASCADE, related_name="+")
+    hour = models.DateTimeField("Час")
+
+    class Meta:
+        verbose_name = "Опросы принтера за час"
+        verbose_name_plural = "Опросы принтеров по часам"
+        constraints = [models.UniqueConstraint(fields=["printer", "hour"], name="dash_printer_hour_uniq")]
+        indexes = [models.Index(fields=["hour"], name="dash_printer_hour_idx")]
+
+
+class PrinterPollDaily(PollRollup):
+    """
+    Опросы принтера за сутки (локальная дата). last_total — показание счётчика
+    на момент last_success: от него считается прирост страниц следующих опросов.
+    """
+
+    printer = models.ForeignKey("inventory.Printer", on_delete=models.CASCADE, related_name="+")
+    day = models.DateField("День")
+    last_total = models.BigIntegerField("Счётчик на последнем успешном опросе", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Опросы принтера за сутки"
+        verbose_name_plural = "Опросы принтеров по дням"
+        constraints = [models.UniqueConstraint(fields=["printer", "day"], name="dash_printer_day_uniq")]
+        indexes = [models.Index(fields=["day"], name="dash_printer_day_idx")]
+
+
+class OrganizationPollHourly(PollRollup):
+    """Опросы принтеров организации за час — по организации принтера на момент опроса."""
+
+    organization = models.ForeignKey("inventory.Organization", on_delete=models.CASCADE, related_name="+")
+    hour = models.DateTimeField("Час")
+
+    class Meta:
+        verbose_name = "Опросы организации за час"
+        verbose_name_plural = "Опросы организаций по часам"
+        constraints = [models.UniqueConstraint(fields=["organization", "hour"], name="dash_org_hour_uniq")]
+        indexes = [models.Index(fields=["hour"], name="dash_org_hour_idx")]
+
+
+class OrganizationPollDaily(PollRollup):
+    organization = models.ForeignKey("inventory.Organization", on_delete=models.CASCADE, related_name="+")
+    day = models.DateField("День")
+
+    class Meta:
+        verbose_name = "Опросы организации за сутки"
+        verbose_name_plural = "Опросы организаций по дням"
+        constraints = [models.UniqueConstraint(fields=["organization", "day"], name="dash_org_day_uniq")]
+        indexes = [models.Index(fields=["day"], name="dash_org_day_idx")]
+
+
+class RollupWatermark(models.Model):
+    """До какой задачи опроса (InventoryTask.id) сводки уже посчитаны."""
+
+    name = models.CharField("Сводка", max_length=50, primary_key=True)
+    last_task_id = models.BigIntegerField("Последняя учтённая задача", default=0)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "Отметка сводок опросов"
+        verbose_name_plural = "Отметки сводок опросов"
+
+    def __str__(self):
+        return f"{self.name}: до задачи {self.last_task_id}"
+
+
+class PrinterMonthCounters(models.Model):
+    """
+    Первый и последний успешный опрос принтера за закрытый месяц (локальный) со
+    счётчиками — снимок для средних по сетевому опросу. Ведёт services_rollups.py.
+    """
+
+    printer = models.ForeignKey("inventory.Printer", on_delete=models.CASCADE, related_name="+")
+    month = models.DateField("Месяц")
+    first_at = models.DateTimeField("Первый опрос")
+    first_bw_a4 = models.IntegerField(null=True, blank=True)
+    first_color_a4 = models.IntegerField(null=True, blank=True)
+    first_bw_a3 = models.IntegerField(null=True, blank=True)
+    first_color_a3 = models.IntegerField(null=True, blank=True)
+    last_at = models.DateTimeField("Последний опрос")
+    last_bw_a4 = models.IntegerField(null=True, blank=True)
+    last_color_a4 = models.IntegerField(null=True, blank=True)
+    last_bw_a3 = models.IntegerField(null=True, blank=True)
+    last_color_a3 = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Счётчики принтера за месяц"
+        verbose_name_plural = "Счётчики принтеров по месяцам"
+        constraints = [models.UniqueConstraint(fields=["printer", "month"], name="dash_printer_month_uniq")]
+        indexes = [models.Index(fields=["month"], name="dash_printer_month_idx")]
+
+    def __str__(self):
+        return f"{self.printer_id} за {self.month:%m.%Y}"
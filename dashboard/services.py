@@ -1,19 +1,24 @@
 """
 Dashboard services — агрегация данных из inventory, contracts, monthly_report.
-Все функции кэшируются через Redis с TTL 5 минут.
+Виджеты кэшируются через Redis (dashboard/caching.py): свежими 5 минут, потом
+устаревшее значение отдаётся, пока его пересчитывает один запрос; прогрев —
+warm_widgets из warm_dashboard_cache_task.
+Виджеты по опросам читают сводки dashboard/services_rollups.py, а не InventoryTask.
 """
 
 import logging
 import re
 from datetime import date, timedelta
 
-from django.core.cache import cache
 from django.db.models import Count, Max, Sum
 from django.utils import timezone
 
+from dashboard.caching import stampede_safe
+
 logger = logging.getLogger(__name__)
 
-CACHE_TTL = 60 * 5  # 5 минут
+CACHE_TTL = 60 * 5  # 5 минут — значение свежее
+CACHE_STALE_TTL = 60 * 30  # столько ещё отдаётся устаревшим, пока идёт пересчёт
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -36,23 +41,31 @@ def _cache_key(name: str, org_id, period_days=None) -> str:
     return ":".join(parts)
 
 
+def _widget_cache(key_func):
+    return stampede_safe(key_func, soft_ttl=CACHE_TTL, hard_ttl=CACHE_STALE_TTL)
+
+
+def _manufacturer_distribution_key(source="polling", org_id=None, month_from=None, month_to=None):
+    mf = month_from.isoformat() if month_from else "_"
+    mt = month_to.isoformat() if month_to else "_"
+    return _cache_key(f"manufacturer_distribution_{source}_{mf}_{mt}", org_id)
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 1. Статус принтеров (online / offline)
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda org_id=None: _cache_key("printer_status", org_id))
 def get_printer_status(org_id=None):
     """
     Возвращает counts online/offline активных принтеров.
-    «Online» = есть SUCCESS InventoryTask за последние 24 часа.
+    «Online» = есть SUCCESS InventoryTask за последние 24 часа (по сводкам опросов).
     """
-    key = _cache_key("printer_status", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
-    from inventory.models import InventoryTask, Printer
+    from dashboard.services_rollups import ensure_fresh, printers_polled_since
+    from inventory.models import Printer
 
+    ensure_fresh()
     since = timezone.now() - timedelta(hours=24)
 
     qs = Printer.objects.filter(is_active=True)
@@ -60,23 +73,7 @@ def get_printer_status(org_id=None):
         qs = qs.filter(organization_id=org_id)
 
     total = qs.count()
-
-    # online: принтер, у которого есть SUCCESS за последние 24ч
-    online_ids = (
-        InventoryTask.objects.filter(status="SUCCESS", task_timestamp__gte=since, printer__is_active=True)
-        .values_list("printer_id", flat=True)
-        .distinct()
-    )
-    if org_id:
-        online_ids = (
-            InventoryTask.objects.filter(
-                status="SUCCESS", task_timestamp__gte=since, printer__is_active=True, printer__organization_id=org_id
-            )
-            .values_list("printer_id", flat=True)
-            .distinct()
-        )
-
-    online = qs.filter(id__in=online_ids).count()
+    online = qs.filter(id__in=printers_polled_since(since, org_id)).count()
     offline = total - online
     percentage = round(online / total * 100) if total else 0
 
@@ -86,7 +83,6 @@ def get_printer_status(org_id=None):
         "offline": offline,
         "percentage": percentage,
     }
-    cache.set(key, result, CACHE_TTL)
     return result
 
 
@@ -95,12 +91,8 @@ def get_printer_status(org_id=None):
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda org_id=None, period_days=7: _cache_key("poll_stats", org_id, period_days))
 def get_poll_stats(org_id=None, period_days=7):
-    key = _cache_key("poll_stats", org_id, period_days)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from inventory.models import InventoryTask
 
     cutoff = timezone.now() - timedelta(days=period_days)
@@ -111,7 +103,6 @@ def get_poll_stats(org_id=None, period_days=7):
     rows = qs.values("status").annotate(count=Count("id")).order_by("status")
     result = [{"status": r["status"], "count": r["count"]} for r in rows]
 
-    cache.set(key, result, CACHE_TTL)
     return result
 
 
@@ -120,78 +111,42 @@ def get_poll_stats(org_id=None, period_days=7):
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda org_id=None, threshold=20: _cache_key(f"low_consumables_{threshold}", org_id))
 def get_low_consumables(org_id=None, threshold=20):
-    key = _cache_key(f"low_consumables_{threshold}", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
-    from inventory.models import InventoryTask, PageCounter, Printer
+    from inventory.consumables import LEVEL_FIELDS
+    from inventory.models import PrinterLatestState
 
-    qs = Printer.objects.filter(is_active=True)
+    # Последние счётчики активных принтеров с расходником ниже порога — отбор в SQL по min_level_pct
+    states = PrinterLatestState.objects.filter(printer__is_active=True, counter__min_level_pct__lt=threshold)
     if org_id:
-        qs = qs.filter(organization_id=org_id)
-
-    printer_ids = list(qs.values_list("id", flat=True))
-
-    # Последние PageCounter для этих принтеров
-    latest_task_ids = (
-        InventoryTask.objects.filter(printer_id__in=printer_ids, status="SUCCESS")
-        .values("printer_id")
-        .annotate(last_id=Max("id"))
-        .values_list("last_id", flat=True)
-    )
-
-    counters = (
-        PageCounter.objects.filter(task_id__in=latest_task_ids)
-        .select_related("task__printer", "task__printer__organization", "task__printer__device_model")
-        .only(
-            "task__printer__ip_address",
-            "task__printer__model",
-            "task__printer__organization__name",
-            "task__printer__device_model",
-            "toner_black",
-            "toner_cyan",
-            "toner_magenta",
-            "toner_yellow",
-            "drum_black",
-            "drum_cyan",
-            "drum_magenta",
-            "drum_yellow",
-            "task__task_timestamp",
-        )
+        states = states.filter(printer__organization_id=org_id)
+
+    states = states.select_related("counter", "printer", "printer__organization", "printer__device_model").only(
+        "success_at",
+        "printer__ip_address",
+        "printer__model",
+        "printer__organization__name",
+        "printer__device_model__name",
+        *(f"counter__{field}_pct" for field in LEVEL_FIELDS),
     )
 
     result = []
-    for c in counters:
-        consumable_fields = {
-            "toner_black": c.toner_black,
-            "toner_cyan": c.toner_cyan,
-            "toner_magenta": c.toner_magenta,
-            "toner_yellow": c.toner_yellow,
-            "drum_black": c.drum_black,
-            "drum_cyan": c.drum_cyan,
-            "drum_magenta": c.drum_magenta,
-            "drum_yellow": c.drum_yellow,
-        }
-
+    for state in states:
+        c = state.counter
         low = {}
-        for field, val in consumable_fields.items():
-            pct = _parse_percent(val)
+        for field in LEVEL_FIELDS:
+            pct = getattr(c, f"{field}_pct")
             if pct is not None and pct < threshold:
                 low[field] = pct
 
-        if not low:
-            continue
-
-        printer = c.task.printer
+        printer = state.printer
         result.append(
             {
                 "printer_id": printer.id,
                 "ip_address": printer.ip_address,
                 "model": printer.device_model.name if printer.device_model else printer.model,
                 "organization": printer.organization.name if printer.organization else "—",
-                "last_poll": c.task.task_timestamp.isoformat(),
+                "last_poll": state.success_at.isoformat(),
                 "low_consumables": low,
                 "min_level": min(low.values()),
             }
@@ -199,7 +154,6 @@ def get_low_consumables(org_id=None, threshold=20):
 
     result.sort(key=lambda x: x["min_level"])
 
-    cache.set(key, result, CACHE_TTL)
     return result
 
 
@@ -208,29 +162,26 @@ def get_low_consumables(org_id=None, threshold=20):
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(
+    lambda org_id=None, period_days=7, limit=10: _cache_key(f"problem_printers_{limit}", org_id, period_days)
+)
 def get_problem_printers(org_id=None, period_days=7, limit=10):
-    key = _cache_key(f"problem_printers_{limit}", org_id, period_days)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
-    from inventory.models import InventoryTask
+    """Принтеры с наибольшим числом неуспешных опросов за период (по сводкам опросов)."""
+    from dashboard.services_rollups import ensure_fresh, printer_rollups
 
+    ensure_fresh()
     cutoff = timezone.now() - timedelta(days=period_days)
-    failure_statuses = ["FAILED", "VALIDATION_ERROR", "HISTORICAL_INCONSISTENCY"]
-
-    qs = InventoryTask.objects.filter(status__in=failure_statuses, task_timestamp__gte=cutoff, printer__is_active=True)
-    if org_id:
-        qs = qs.filter(printer__organization_id=org_id)
 
     rows = (
-        qs.values(
+        printer_rollups(cutoff, org_id)
+        .values(
             "printer_id",
             "printer__ip_address",
             "printer__model",
             "printer__organization__name",
         )
-        .annotate(failure_count=Count("id"))
+        .annotate(failure_count=Sum("polls_failed"))
+        .filter(failure_count__gt=0)
         .order_by("-failure_count")[:limit]
     )
 
@@ -245,7 +196,6 @@ def get_problem_printers(org_id=None, period_days=7, limit=10):
         for r in rows
     ]
 
-    cache.set(key, result, CACHE_TTL)
     return result
 
 
@@ -254,16 +204,12 @@ def get_problem_printers(org_id=None, period_days=7, limit=10):
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda org_id=None, months=0: _cache_key(f"print_trend_{months}", org_id))
 def get_print_trend(org_id=None, months=0):
     """
     months=0  → все доступные данные
     months=N  → последние N месяцев
     """
-    key = _cache_key(f"print_trend_{months}", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from monthly_report.models import MonthlyReport
 
     qs = MonthlyReport.objects.all()
@@ -297,7 +243,6 @@ def get_print_trend(org_id=None, months=0):
         for r in rows
     ]
 
-    cache.set(key, result, CACHE_TTL)
     return result
 
 
@@ -368,48 +313,58 @@ def get_org_devices(org_id, status_filter=None):
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda: _cache_key("org_summary", None))
 def get_org_summary():
-    key = _cache_key("org_summary", None)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
-    from inventory.models import InventoryTask, Organization, Printer
+    """
+    Online/offline по организациям и активность опроса за 24 часа
+    (polls_ok, polls_failed, pages, last_success) — по сводкам опросов.
+    """
+    from dashboard.services_rollups import ensure_fresh, organization_rollups, printers_polled_since
+    from inventory.models import Organization, Printer
 
+    ensure_fresh()
     since = timezone.now() - timedelta(hours=24)
 
-    orgs = Organization.objects.filter(active=True)
-    result = []
-
-    for org in orgs:
-        printers = Printer.objects.filter(is_active=True, organization=org)
-        total = printers.count()
-        if total == 0:
-            continue
-
-        online_ids = (
-            InventoryTask.objects.filter(
-                status="SUCCESS", task_timestamp__gte=since, printer__is_active=True, printer__organization=org
-            )
-            .values_list("printer_id", flat=True)
-            .distinct()
+    printers = Printer.objects.filter(is_active=True, organization__active=True)
+    totals = dict(printers.values("organization_id").annotate(n=Count("id")).values_list("organization_id", "n"))
+    online = dict(
+        printers.filter(id__in=printers_polled_since(since))
+        .values("organization_id")
+        .annotate(n=Count("id"))
+        .values_list("organization_id", "n")
+    )
+    activity = {
+        row["organization_id"]: row
+        for row in organization_rollups(since)
+        .filter(organization_id__in=list(totals))
+        .values("organization_id")
+        .annotate(
+            polls_ok=Sum("polls_ok"), polls_failed=Sum("polls_failed"), pages=Sum("pages"), last=Max("last_success")
         )
-        online = printers.filter(id__in=online_ids).count()
-        online_pct = round(online / total * 100) if total else 0
+    }
 
+    result = []
+    for org in Organization.objects.filter(id__in=list(totals)).only("id", "name"):
+        total = totals[org.id]
+        org_online = online.get(org.id, 0)
+        act = activity.get(org.id, {})
+        last = act.get("last")
         result.append(
             {
                 "org_id": org.id,
                 "org_name": org.name,
                 "total_printers": total,
-                "online": online,
-                "offline": total - online,
-                "online_pct": online_pct,
+                "online": org_online,
+                "offline": total - org_online,
+                "online_pct": round(org_online / total * 100) if total else 0,
+                "polls_ok": act.get("polls_ok") or 0,
+                "polls_failed": act.get("polls_failed") or 0,
+                "pages": act.get("pages") or 0,
+                "last_success": last.isoformat() if last else None,
             }
         )
 
     result.sort(key=lambda x: x["org_name"])
-    cache.set(key, result, CACHE_TTL)
     return result
 
 
@@ -418,12 +373,8 @@ def get_org_summary():
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda org_id=None, limit=20: _cache_key(f"recent_activity_{limit}", org_id))
 def get_recent_activity(org_id=None, limit=20):
-    key = _cache_key(f"recent_activity_{limit}", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from inventory.models import InventoryTask
 
     qs = InventoryTask.objects.select_related("printer", "printer__organization", "printer__device_model").filter(
@@ -448,7 +399,6 @@ def get_recent_activity(org_id=None, limit=20):
         for t in rows
     ]
 
-    cache.set(key, result, CACHE_TTL)
     return result
 
 
@@ -457,18 +407,12 @@ def get_recent_activity(org_id=None, limit=20):
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda: "dashboard:organizations")
 def get_organizations():
-    key = "dashboard:organizations"
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from inventory.models import Organization
 
     orgs = Organization.objects.filter(active=True).values("id", "name").order_by("name")
-    result = list(orgs)
-    cache.set(key, result, CACHE_TTL)
-    return result
+    return list(orgs)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -476,21 +420,15 @@ def get_organizations():
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda org_id=None: _cache_key("glpi_cross_check", org_id))
 def get_glpi_cross_check(org_id=None):
     """
     Возвращает результаты последней кросс-проверки с GLPI.
     Только устройства со статусом GLPI_ACTIVE (свежие данные в GLPI).
     """
-    key = _cache_key("glpi_cross_check", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from integrations.glpi.services import get_cross_check_results
 
-    result = get_cross_check_results(org_id=org_id)
-    cache.set(key, result, CACHE_TTL)
-    return result
+    return get_cross_check_results(org_id=org_id)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -498,57 +436,76 @@ def get_glpi_cross_check(org_id=None):
 # ─────────────────────────────────────────────────────────────────────────────
 
 
+@_widget_cache(lambda org_id=None, days=7, limit=50: _cache_key(f"silent_printers_{days}_{limit}", org_id))
 def get_silent_printers(org_id=None, days=7, limit=50):
-    key = _cache_key(f"silent_printers_{days}_{limit}", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from dashboard import services_stats
 
-    result = services_stats.compute_silent_printers(org_id=org_id, days=days, limit=limit)
-    cache.set(key, result, CACHE_TTL)
-    return result
+    return services_stats.compute_silent_printers(org_id=org_id, days=days, limit=limit)
 
 
+@_widget_cache(lambda org_id=None, months=0, limit=10: _cache_key(f"top_volume_{months}_{limit}", org_id))
 def get_top_by_volume(org_id=None, months=0, limit=10):
-    key = _cache_key(f"top_volume_{months}_{limit}", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from dashboard import services_stats
 
-    result = services_stats.compute_top_by_volume(org_id=org_id, months=months, limit=limit)
-    cache.set(key, result, CACHE_TTL)
-    return result
+    return services_stats.compute_top_by_volume(org_id=org_id, months=months, limit=limit)
 
 
+@_widget_cache(_manufacturer_distribution_key)
 def get_manufacturer_distribution(source="polling", org_id=None, month_from=None, month_to=None):
-    mf = month_from.isoformat() if month_from else "_"
-    mt = month_to.isoformat() if month_to else "_"
-    key = _cache_key(f"manufacturer_distribution_{source}_{mf}_{mt}", org_id)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from dashboard import services_stats
 
-    result = services_stats.compute_manufacturer_distribution(
+    return services_stats.compute_manufacturer_distribution(
         source=source, org_id=org_id, month_from=month_from, month_to=month_to
     )
-    cache.set(key, result, CACHE_TTL)
-    return result
 
 
+@_widget_cache(lambda: _cache_key("report_months", None))
 def get_report_months():
-    key = _cache_key("report_months", None)
-    cached = cache.get(key)
-    if cached is not None:
-        return cached
-
     from dashboard import services_stats
 
-    result = services_stats.get_report_months()
-    cache.set(key, result, CACHE_TTL)
-    return result
+    return services_stats.get_report_months()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 11. Прогрев кэша виджетов
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Виджеты с фильтром по организации — прогреваются с параметрами по умолчанию
+ORG_WIDGETS = (
+    get_printer_status,
+    get_poll_stats,
+    get_low_consumables,
+    get_problem_printers,
+    get_print_trend,
+    get_recent_activity,
+    get_glpi_cross_check,
+    get_silent_printers,
+    get_top_by_volume,
+    get_manufacturer_distribution,
+)
+GLOBAL_WIDGETS = (get_org_summary, get_organizations, get_report_months)
+
+
+def warm_widgets() -> int:
+    """
+    Пересчитывает виджеты для фильтра «Все» и каждой активной организации.
+    Ключи, которые в этот момент пересчитывает запрос пользователя, пропускаются.
+
+    Returns:
+        Сколько значений положено в кэш.
+    """
+    from inventory.models import Organization
+
+    calls = [(widget, {}) for widget in GLOBAL_WIDGETS]
+    for org_id in [None, *Organization.objects.filter(active=True).order_by("id").values_list("id", flat=True)]:
+        calls.extend((widget, {"org_id": org_id}) for widget in ORG_WIDGETS)
+
+    warmed = 0
+    for widget, kwargs in calls:
+        try:
+            if widget.refresh(**kwargs) is not None:
+                warmed += 1
+        except Exception as e:
+            logger.warning(f"Прогрев {widget.__name__}({kwargs}) не удался: {e}")
+    logger.info(f"warm_widgets: прогрето {warmed} из {len(calls)}")
+    return warmed
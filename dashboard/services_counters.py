@@ -0,0 +1,147 @@
+"""
+Снимки счётчиков принтеров по месяцам (PrinterMonthCounters).
+
+compute_printer_polling_avg брал первый и последний успешный PageCounter каждого
+принтера, выгружая ради них в Python все счётчики за всю историю опросов.
+Теперь для каждого закрытого месяца хранятся первый и последний успешный опрос
+принтера со счётчиками. Считаются они на стороне БД (iter_first_last_counters —
+по индексу inv_task_printer_ok_ts_idx) один раз, когда месяц закрылся:
+refresh_counter_snapshots из ежедневной задачи refresh_counter_snapshots_task.
+
+printer_first_last — самый ранний и самый поздний снимок принтера плюс живой
+хвост после последнего свёрнутого месяца (текущий месяц и ещё не свёрнутые):
+объём работы зависит от числа принтеров, а не от глубины истории.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.utils import timezone
+
+from monthly_report.integrations.inventory_batch import COUNTER_FIELDS, PRINTER_CHUNK, iter_first_last_counters
+
+from .models import PrinterMonthCounters
+
+logger = logging.getLogger(__name__)
+
+# Начало живого хвоста, пока не свёрнуто ни одного месяца
+HISTORY_START = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def month_start(month: date) -> datetime:
+    """Начало месяца в локальной TZ."""
+    return datetime(month.year, month.month, 1, tzinfo=timezone.get_current_timezone())
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Сворачивание
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def refresh_counter_snapshots(from_month: Optional[date] = None) -> int:
+    """
+    Сворачивает закрытые месяцы после последнего свёрнутого (from_month — пересобрать
+    начиная с него). Текущий месяц не сворачивается — его читают вживую.
+
+    Returns:
+        Количество свёрнутых месяцев.
+    """
+    from inventory.models import InventoryTask, Printer
+
+    if from_month is not None:
+        PrinterMonthCounters.objects.filter(month__gte=from_month.replace(day=1)).delete()
+
+    last = PrinterMonthCounters.objects.aggregate(last=Max("month"))["last"]
+    if last:
+        month = _next_month(last)
+    else:
+        first_ts = InventoryTask.objects.filter(status="SUCCESS").aggregate(first=Min("task_timestamp"))["first"]
+        if first_ts is None:
+            return 0
+        month = timezone.localdate(first_ts).replace(day=1)
+
+    current = timezone.localdate().replace(day=1)
+    printer_ids = list(Printer.objects.order_by("id").values_list("id", flat=True))
+    months = 0
+    while month < current:
+        following = _next_month(month)
+        rows = [
+            PrinterMonthCounters(
+                printer_id=printer_id,
+                month=month,
+                first_at=first["timestamp"],
+                last_at=last["timestamp"],
+                **{f"first_{field}": first[field] for field in COUNTER_FIELDS},
+                **{f"last_{field}": last[field] for field in COUNTER_FIELDS},
+            )
+            for printer_id, first, last in iter_first_last_counters(
+                printer_ids, month_start(month), month_start(following) - timedelta(microseconds=1)
+            )
+        ]
+        with transaction.atomic():
+            PrinterMonthCounters.objects.bulk_create(rows, batch_size=1000)
+        logger.debug(f"refresh_counter_snapshots: {month:%m.%Y} — принтеров {len(rows)}")
+        month = following
+        months += 1
+
+    if months:
+        logger.info(f"refresh_counter_snapshots: свёрнуто месяцев {months}")
+    return months
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Чтение
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def printer_first_last(printer_ids: Iterable[int]) -> Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    {printer_id: (первый, последний)} успешный опрос со счётчиками за всю историю;
+    словари с timestamp и COUNTER_FIELDS. Принтеры без опросов не попадают.
+    """
+    printer_ids = list(printer_ids)
+    result = {}
+    for start in range(0, len(printer_ids), PRINTER_CHUNK):
+        result.update(_snapshot_edges(printer_ids[start : start + PRINTER_CHUNK]))
+
+    rolled = PrinterMonthCounters.objects.aggregate(last=Max("month"))["last"]
+    tail_start = month_start(_next_month(rolled)) if rolled else HISTORY_START
+    for printer_id, first, last in iter_first_last_counters(printer_ids, tail_start, timezone.now()):
+        result[printer_id] = (result[printer_id][0] if printer_id in result else first, last)
+    return result
+
+
+def _snapshot_edges(printer_ids):
+    from inventory.models import Printer
+
+    snapshots = PrinterMonthCounters.objects.filter(printer_id=OuterRef("pk"))
+    edges = list(
+        Printer.objects.filter(id__in=printer_ids)
+        .annotate(
+            first_id=Subquery(snapshots.order_by("month").values("id")[:1]),
+            last_id=Subquery(snapshots.order_by("-month").values("id")[:1]),
+        )
+        .filter(first_id__isnull=False)
+        .values_list("id", "first_id", "last_id")
+    )
+    rows = PrinterMonthCounters.objects.in_bulk(
+        {row_id for _, first_id, last_id in edges for row_id in (first_id, last_id)}
+    )
+    return {
+        printer_id: (_edge(rows[first_id], "first"), _edge(rows[last_id], "last"))
+        for printer_id, first_id, last_id in edges
+    }
+
+
+def _edge(row: PrinterMonthCounters, side: str) -> Dict[str, Any]:
+    return {"timestamp": getattr(row, f"{side}_at"), **{f: getattr(row, f"{side}_{f}") for f in COUNTER_FIELDS}}
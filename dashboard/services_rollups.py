@@ -0,0 +1,287 @@
+"""
+Сводки опросов для виджетов дашборда.
+
+Виджеты (online/offline, проблемные и молчащие принтеры, сводка по организациям)
+раньше при каждом истечении кэша заново агрегировали InventoryTask за 24 часа –
+7 дней — миллионы строк на большом парке. Теперь они читают сводки:
+
+    PrinterPollHourly / PrinterPollDaily             — по принтеру за час / сутки;
+    OrganizationPollHourly / OrganizationPollDaily   — по организации за час / сутки;
+
+в каждой — успешные и неуспешные опросы, напечатано страниц (прирост счётчика
+между соседними успешными опросами; сброс счётчика — 0) и время последнего
+успешного опроса.
+
+Сводки дополняются инкрементально: refresh_poll_rollups берёт только задачи
+с id больше отметки RollupWatermark, пачками по ROLLUP_BATCH. Самые свежие
+задачи (моложе DASHBOARD_ROLLUP_LAG секунд) ждут следующего запуска — чтобы
+не перескочить id транзакции, которая ещё не закоммичена. Запускается задачей
+refresh_poll_rollups_task (раз в DASHBOARD_ROLLUP_INTERVAL) и на промахе кэша
+виджета — одна пачка, если отметку никто не держит.
+
+Часовые строки хранятся DASHBOARD_ROLLUP_HOURLY_DAYS дней, суточные — бессрочно.
+Окна до срока хранения считаются по часам (с начала часа), длиннее — по суткам
+(с начала локального дня). «Был ли успешный опрос после T» точен при любом
+окне: last_success строки сравнивается с T.
+
+Полная пересборка — manage.py rebuild_poll_rollups.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import (
+    OrganizationPollDaily,
+    OrganizationPollHourly,
+    PrinterPollDaily,
+    PrinterPollHourly,
+    RollupWatermark,
+)
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = "poll_rollups"
+
+# Задач опроса на одну транзакцию пересчёта
+ROLLUP_BATCH = 20000
+
+COUNTER_FIELDS = ("bw_a4", "color_a4", "bw_a3", "color_a3")
+
+
+def _hourly_days() -> int:
+    return getattr(settings, "DASHBOARD_ROLLUP_HOURLY_DAYS", 8)
+
+
+def _lag() -> int:
+    return getattr(settings, "DASHBOARD_ROLLUP_LAG", 60)
+
+
+def hour_start(ts: datetime) -> datetime:
+    return ts.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _reading_total(total_pages, *parts) -> Optional[int]:
+    """Показание счётчика: total_pages, иначе сумма форматов; пустое — None."""
+    total = total_pages or sum(p or 0 for p in parts)
+    return total or None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Чтение
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def printer_rollups(since: datetime, org_id=None):
+    """
+    Строки сводки по принтерам, покрывающие окно [since, now]: часовые, пока окно
+    в пределах срока их хранения, иначе суточные. Только активные принтеры.
+    """
+    if since >= timezone.now() - timedelta(days=_hourly_days()):
+        qs = PrinterPollHourly.objects.filter(hour__gte=hour_start(since))
+    else:
+        qs = PrinterPollDaily.objects.filter(day__gte=timezone.localdate(since))
+    qs = qs.filter(printer__is_active=True)
+    if org_id:
+        qs = qs.filter(printer__organization_id=org_id)
+    return qs
+
+
+def organization_rollups(since: datetime):
+    if since >= timezone.now() - timedelta(days=_hourly_days()):
+        return OrganizationPollHourly.objects.filter(hour__gte=hour_start(since))
+    return OrganizationPollDaily.objects.filter(day__gte=timezone.localdate(since))
+
+
+def printers_polled_since(since: datetime, org_id=None):
+    """Id активных принтеров с успешным опросом после since (values_list для id__in)."""
+    return (
+        printer_rollups(since, org_id).filter(last_success__gte=since).values_list("printer_id", flat=True).distinct()
+    )
+
+
+def last_success_map(printers) -> Dict[int, datetime]:
+    """{printer_id: последний успешный опрос за всё время} по суточной сводке."""
+    return dict(
+        PrinterPollDaily.objects.filter(printer__in=printers, last_success__isnull=False)
+        .values("printer_id")
+        .annotate(ts=Max("last_success"))
+        .values_list("printer_id", "ts")
+    )
+
+
+def ensure_fresh() -> None:
+    """Догоняет сводки перед чтением (одна пачка); если пересчёт уже идёт — не ждёт его."""
+    try:
+        refresh_poll_rollups(max_batches=1, wait=False)
+    except Exception as e:
+        logger.warning(f"Сводки опросов не обновлены перед чтением: {e}")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Пересчёт
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def refresh_poll_rollups(max_batches: Optional[int] = None, wait: bool = True) -> int:
+    """
+    Дополняет сводки задачами опроса новее отметки.
+
+    Args:
+        max_batches: не больше стольких пачек по ROLLUP_BATCH (None — до конца).
+        wait: ждать, пока отметку держит другой пересчёт; False — сразу выйти.
+
+    Returns:
+        Количество учтённых задач.
+    """
+    from inventory.models import InventoryTask
+
+    RollupWatermark.objects.get_or_create(name=WATERMARK)
+    processed = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            watermark = RollupWatermark.objects.select_for_update(skip_locked=not wait).filter(name=WATERMARK).first()
+            if watermark is None:
+                break
+            settled = timezone.now() - timedelta(seconds=_lag())
+            upper = InventoryTask.objects.filter(id__gt=watermark.last_task_id, task_timestamp__lte=settled).aggregate(
+                upper=Max("id")
+            )["upper"]
+            if upper is None:
+                break
+            tasks = list(
+                InventoryTask.objects.filter(id__gt=watermark.last_task_id, id__lte=upper)
+                .order_by("id")
+                .values_list("id", "printer_id", "printer__organization_id", "status", "task_timestamp")[:ROLLUP_BATCH]
+            )
+            _apply(tasks)
+            watermark.last_task_id = tasks[-1][0]
+            watermark.save(update_fields=["last_task_id", "updated_at"])
+        processed += len(tasks)
+        batches += 1
+
+    if processed:
+        logger.info(f"refresh_poll_rollups: учтено задач {processed}")
+    return processed
+
+
+def purge_hourly_rollups() -> int:
+    """Удаляет часовые строки старше срока хранения. Returns: сколько строк удалено."""
+    cutoff = hour_start(timezone.now() - timedelta(days=_hourly_days()))
+    deleted = PrinterPollHourly.objects.filter(hour__lt=cutoff).delete()[0]
+    deleted += OrganizationPollHourly.objects.filter(hour__lt=cutoff).delete()[0]
+    return deleted
+
+
+def rebuild_poll_rollups() -> int:
+    """Пересобирает сводки с нуля по всей истории опросов. Returns: учтено задач."""
+    with transaction.atomic():
+        for model in (PrinterPollHourly, PrinterPollDaily, OrganizationPollHourly, OrganizationPollDaily):
+            model.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK).delete()
+        return refresh_poll_rollups()
+
+
+def _apply(tasks) -> None:
+    """Раскладывает пачку задач (id, printer_id, organization_id, status, timestamp) по сводкам."""
+    from inventory.models import PageCounter
+
+    totals = {
+        row[0]: _reading_total(*row[1:])
+        for row in PageCounter.objects.filter(task_id__in=[t[0] for t in tasks if t[3] == "SUCCESS"])
+        .order_by("id")
+        .values_list("task_id", "total_pages", *COUNTER_FIELDS)
+    }
+    baselines = _baselines({t[1] for t in tasks})
+    hourly_since = hour_start(timezone.now() - timedelta(days=_hourly_days()))
+
+    printer_hours, printer_days, org_hours, org_days = {}, {}, {}, {}
+    # Прирост страниц — по порядку опросов принтера во времени
+    for task_id, printer_id, org_id, status, ts in sorted(tasks, key=lambda t: (t[1], t[4], t[0])):
+        ok = status == "SUCCESS"
+        pages = 0
+        total = totals.get(task_id) if ok else None
+        if total is not None:
+            last_ts, last_total = baselines.get(printer_id, (None, None))
+            if last_ts is None or ts >= last_ts:
+                if last_total is not None:
+                    pages = max(0, total - last_total)
+                baselines[printer_id] = (ts, total)
+
+        hour, day = hour_start(ts), timezone.localdate(ts)
+        buckets = [(printer_days, (printer_id, day))]
+        if hour >= hourly_since:
+            buckets.append((printer_hours, (printer_id, hour)))
+        if org_id:
+            buckets.append((org_days, (org_id, day)))
+            if hour >= hourly_since:
+                buckets.append((org_hours, (org_id, hour)))
+        for acc, key in buckets:
+            row = acc.setdefault(key, {"polls_ok": 0, "polls_failed": 0, "pages": 0, "last_success": None})
+            row["polls_ok" if ok else "polls_failed"] += 1
+            row["pages"] += pages
+            if ok and (row["last_success"] is None or ts >= row["last_success"]):
+                row["last_success"] = ts
+                if acc is printer_days and total is not None:
+                    row["last_total"] = total
+
+    _merge(PrinterPollHourly, "printer_id", "hour", printer_hours)
+    _merge(PrinterPollDaily, "printer_id", "day", printer_days)
+    _merge(OrganizationPollHourly, "organization_id", "hour", org_hours)
+    _merge(OrganizationPollDaily, "organization_id", "day", org_days)
+
+
+def _baselines(printer_ids) -> Dict[int, Tuple[datetime, int]]:
+    """{printer_id: (время, показание)} последнего учтённого успешного опроса со счётчиком."""
+    latest = (
+        PrinterPollDaily.objects.filter(printer_id=OuterRef("printer_id"), last_total__isnull=False)
+        .order_by("-day")
+        .values("id")[:1]
+    )
+    return {
+        printer_id: (ts, total)
+        for printer_id, ts, total in PrinterPollDaily.objects.filter(
+            printer_id__in=printer_ids, id=Subquery(latest)
+        ).values_list("printer_id", "last_success", "last_total")
+    }
+
+
+def _merge(model, owner_field: str, bucket_field: str, acc: Dict) -> None:
+    """Прибавляет накопленное к существующим строкам сводки, недостающие создаёт."""
+    if not acc:
+        return
+    existing = {
+        (getattr(row, owner_field), getattr(row, bucket_field)): row
+        for row in model.objects.filter(
+            **{f"{owner_field}__in": {key[0] for key in acc}, f"{bucket_field}__in": {key[1] for key in acc}}
+        )
+    }
+    fields = ["polls_ok", "polls_failed", "pages", "last_success"]
+    if model is PrinterPollDaily:
+        fields.append("last_total")
+
+    to_create, to_update = [], []
+    for (owner, bucket), values in acc.items():
+        row = existing.get((owner, bucket))
+        if row is None:
+            to_create.append(model(**{owner_field: owner, bucket_field: bucket}, **values))
+            continue
+        row.polls_ok += values["polls_ok"]
+        row.polls_failed += values["polls_failed"]
+        row.pages += values["pages"]
+        if values["last_success"] and (row.last_success is None or values["last_success"] >= row.last_success):
+            row.last_success = values["last_success"]
+            if "last_total" in values:
+                row.last_total = values["last_total"]
+        to_update.append(row)
+
+    model.objects.bulk_create(to_create, batch_size=1000)
+    model.objects.bulk_update(to_update, fields, batch_size=1000)
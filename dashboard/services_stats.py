@@ -6,7 +6,7 @@
   - Celery-задачей build_statistics_export_task (полная XLSX-выгрузка).
 
 Все функции принимают org_id (id Organization) и не делают побочных эффектов,
-кроме чтения из БД.
+кроме чтения из БД (и догона сводок опросов перед чтением — services_rollups).
 """
 
 import logging
@@ -66,8 +66,10 @@ def compute_silent_printers(org_id=None, days=7, limit=None):
                  last_success}],
       }
     """
-    from inventory.models import InventoryTask, Printer
+    from dashboard.services_rollups import ensure_fresh, last_success_map, printers_polled_since
+    from inventory.models import Printer
 
+    ensure_fresh()
     cutoff = timezone.now() - timedelta(days=days)
 
     printers = Printer.objects.filter(is_active=True)
@@ -75,14 +77,7 @@ def compute_silent_printers(org_id=None, days=7, limit=None):
         printers = printers.filter(organization_id=org_id)
     total = printers.count()
 
-    recent_ok_ids = (
-        InventoryTask.objects.filter(status="SUCCESS", task_timestamp__gte=cutoff, printer__is_active=True)
-        .values_list("printer_id", flat=True)
-        .distinct()
-    )
-    if org_id:
-        recent_ok_ids = recent_ok_ids.filter(printer__organization_id=org_id)
-    recent_ok_ids = set(recent_ok_ids)
+    recent_ok_ids = set(printers_polled_since(cutoff, org_id))
 
     silent_qs = (
         printers.exclude(id__in=recent_ok_ids)
@@ -91,12 +86,7 @@ def compute_silent_printers(org_id=None, days=7, limit=None):
     )
 
     # Последний успешный опрос (за всё время) для молчащих принтеров.
-    last_ok_map = dict(
-        InventoryTask.objects.filter(status="SUCCESS", printer__in=silent_qs)
-        .values("printer_id")
-        .annotate(ts=Max("task_timestamp"))
-        .values_list("printer_id", "ts")
-    )
+    last_ok_map = last_success_map(silent_qs)
 
     items = []
     rows = silent_qs[:limit] if limit else silent_qs
@@ -458,17 +448,17 @@ def compute_printer_polling_avg(org_id=None, include_inactive=False):
     """
     Средняя месячная нагрузка по принтерам на основе данных СЕТЕВОГО ОПРОСА.
 
-    Берём первый и последний SUCCESS-снапшот PageCounter каждого принтера,
-    вычитаем дельты (A4/A3 ЧБ/цвет, отрицательные = сброс → 0), делим на число
+    Берём первый и последний SUCCESS-снапшот PageCounter каждого принтера
+    (по месячным снимкам services_counters, без выгрузки истории), вычитаем
+    дельты (A4/A3 ЧБ/цвет, отрицательные = сброс → 0), делим на число
     месяцев между опросами (включая граничные).
 
     Возвращает [{organization, ip_address, serial_number, model, first_date,
                  last_date, months_count, avg_a4_bw, avg_a4_color, avg_a3_bw,
                  avg_a3_color, avg}].
     """
-    from itertools import groupby
-
-    from inventory.models import PageCounter, Printer
+    from dashboard.services_counters import printer_first_last
+    from inventory.models import Printer
 
     printers = Printer.objects.select_related("organization", "device_model", "device_model__manufacturer")
     if not include_inactive:
@@ -480,19 +470,12 @@ def compute_printer_polling_avg(org_id=None, include_inactive=False):
     if not printers:
         return []
 
-    printer_ids = [p.id for p in printers]
-    counters = (
-        PageCounter.objects.filter(task__printer_id__in=printer_ids, task__status="SUCCESS")
-        .order_by("task__printer_id", "recorded_at")
-        .values("task__printer_id", "recorded_at", "bw_a4", "color_a4", "bw_a3", "color_a3")
-    )
-    counters_by_printer = {pid: list(grp) for pid, grp in groupby(counters, key=lambda c: c["task__printer_id"])}
+    edges = printer_first_last(p.id for p in printers)
 
     result = []
     for p in printers:
         org = p.organization.name if p.organization_id else "—"
-        rows = counters_by_printer.get(p.id, [])
-        if not rows:
+        if p.id not in edges:
             result.append(
                 {
                     "organization": org,
@@ -511,8 +494,8 @@ def compute_printer_polling_avg(org_id=None, include_inactive=False):
             )
             continue
 
-        first, last = rows[0], rows[-1]
-        f_dt, l_dt = first["recorded_at"], last["recorded_at"]
+        first, last = edges[p.id]
+        f_dt, l_dt = first["timestamp"], last["timestamp"]
         f_date = f_dt.date() if hasattr(f_dt, "date") else f_dt
         l_date = l_dt.date() if hasattr(l_dt, "date") else l_dt
         n = (l_date.year - f_date.year) * 12 + (l_date.month - f_date.month) + 1
@@ -556,18 +539,6 @@ def _noop_progress(percent, message):  # pragma: no cover
     pass
 
 
-def _style_header(ws, cols):
-    from openpyxl.styles import Alignment, Font, PatternFill
-
-    fill = PatternFill(fill_type="solid", fgColor="1F7A4A")
-    font = Font(bold=True, color="FFFFFF")
-    for col in range(1, cols + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.fill = fill
-        cell.font = font
-        cell.alignment = Alignment(horizontal="center")
-
-
 def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, month_to=None, progress=None):
     """
     Собирает многолистовой XLSX-отчёт по статистике устройств.
@@ -578,40 +549,40 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
     progress(percent:int, message:str) — колбэк для отображения прогресса.
     Возвращает (content: bytes, filename: str).
     """
-    import io
     from datetime import datetime
 
-    import openpyxl
+    from printer_inventory.xlsx import StreamingWorkbook
 
     progress = progress or _noop_progress
 
-    wb = openpyxl.Workbook()
+    wb = StreamingWorkbook(header_color="1F7A4A")
 
     # ── Лист 1: Молчащие принтеры ────────────────────────────────────────────
     progress(5, "Считаю молчащие принтеры…")
     silent = compute_silent_printers(org_id=org_id, days=days)
-    ws = wb.active
-    ws.title = "Молчащие"
-    ws.append(["Организация", "IP-адрес", "Модель", "Серийный номер", "Последний успешный опрос"])
-    _style_header(ws, 5)
+    ws = wb.sheet(
+        "Молчащие",
+        ["Организация", "IP-адрес", "Модель", "Серийный номер", "Последний успешный опрос"],
+        widths=(28, 16, 32, 20, 22),
+        freeze=None,
+    )
     for it in silent["items"]:
         last_ok = ""
         if it["last_success"]:
             last_ok = datetime.fromisoformat(it["last_success"]).strftime("%d.%m.%Y %H:%M")
         ws.append([it["organization"], it["ip_address"], it["model"], it["serial_number"], last_ok])
-    for col, w in zip("ABCDE", (28, 16, 32, 20, 22)):
-        ws.column_dimensions[col].width = w
 
     # ── Лист 2: Топ по объёму ────────────────────────────────────────────────
     progress(30, "Считаю топ по объёму печати…")
     top = compute_top_by_volume(org_id=org_id, months=months, limit=50)
-    ws = wb.create_sheet("Топ по объёму")
-    ws.append(["#", "Организация", "Модель", "Серийный номер", "Отпечатков", "Месяцев"])
-    _style_header(ws, 6)
+    ws = wb.sheet(
+        "Топ по объёму",
+        ["#", "Организация", "Модель", "Серийный номер", "Отпечатков", "Месяцев"],
+        widths=(5, 28, 32, 20, 14, 10),
+        freeze=None,
+    )
     for idx, r in enumerate(top, start=1):
         ws.append([idx, r["organization"], r["model"], r["serial_number"], r["total"], r["months_count"]])
-    for col, w in zip("ABCDEF", (5, 28, 32, 20, 14, 10)):
-        ws.column_dimensions[col].width = w
 
     # ── Листы 3a-3c: По вендорам (3 источника) ───────────────────────────────
     progress(45, "Считаю распределение по вендорам…")
@@ -622,19 +593,15 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
     ]
     for title, source, count_label, extra in vendor_sheets:
         dist = compute_manufacturer_distribution(source=source, org_id=org_id, **extra)
-        ws = wb.create_sheet(title)
-        ws.append(["Производитель", count_label])
-        _style_header(ws, 2)
+        ws = wb.sheet(title, ["Производитель", count_label], widths=(28, 14), freeze=None)
         for r in dist:
             ws.append([r["manufacturer"], r["count"]])
-        ws.column_dimensions["A"].width = 28
-        ws.column_dimensions["B"].width = 14
 
     # ── Лист 4: Средняя нагрузка по организациям ─────────────────────────────
     progress(60, "Считаю среднюю нагрузку по организациям…")
     org_rows = compute_org_monthly_avg(org_id=org_id, months=months)
-    ws = wb.create_sheet("По организациям")
-    ws.append(
+    ws = wb.sheet(
+        "По организациям",
         [
             "Организация",
             "Принтеров",
@@ -645,9 +612,10 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
             "Цвет A3 (всего)",
             "Итого за период",
             "Среднее / мес",
-        ]
+        ],
+        widths=(28, 11, 9, 14, 15, 14, 15, 16, 14),
+        freeze=None,
     )
-    _style_header(ws, 9)
     for r in org_rows:
         ws.append(
             [
@@ -662,14 +630,12 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
                 r["avg"],
             ]
         )
-    for col, w in zip("ABCDEFGHI", (28, 11, 9, 14, 15, 14, 15, 16, 14)):
-        ws.column_dimensions[col].width = w
 
     # ── Лист 5: Средняя нагрузка по принтерам (по отчётам) ────────────────────
     progress(60, "Считаю среднюю нагрузку по принтерам (отчёты)…")
     avg_rows = compute_device_monthly_avg(org_id=org_id, months=months)
-    ws = wb.create_sheet("По принтерам (отчёты)")
-    ws.append(
+    ws = wb.sheet(
+        "По принтерам (отчёты)",
         [
             "Организация",
             "Серийный номер",
@@ -682,9 +648,10 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
             "Средн. ЧБ A3/мес",
             "Средн. Цвет A3/мес",
             "Итого средн./мес",
-        ]
+        ],
+        widths=(28, 20, 32, 13, 14, 9, 16, 17, 16, 17, 16),
+        freeze=None,
     )
-    _style_header(ws, 11)
     n = len(avg_rows) or 1
     for i, r in enumerate(avg_rows, start=1):
         ws.append(
@@ -704,14 +671,12 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
         )
         if i % 200 == 0:
             progress(60 + int(15 * i / n), f"Отчёты: {i}/{len(avg_rows)}…")
-    for col, w in zip("ABCDEFGHIJK", (28, 20, 32, 13, 14, 9, 16, 17, 16, 17, 16)):
-        ws.column_dimensions[col].width = w
 
     # ── Лист 6: Средняя нагрузка по принтерам (по сетевому опросу) ─────────────
     progress(78, "Считаю среднюю нагрузку по принтерам (сеть)…")
     poll_rows = compute_printer_polling_avg(org_id=org_id)
-    ws = wb.create_sheet("По принтерам (сеть)")
-    ws.append(
+    ws = wb.sheet(
+        "По принтерам (сеть)",
         [
             "Организация",
             "IP-адрес",
@@ -725,9 +690,10 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
             "Средн. ЧБ A3/мес",
             "Средн. Цвет A3/мес",
             "Итого средн./мес",
-        ]
+        ],
+        widths=(28, 16, 20, 32, 13, 14, 9, 16, 17, 16, 17, 16),
+        freeze=None,
     )
-    _style_header(ws, 12)
     n2 = len(poll_rows) or 1
     for i, r in enumerate(poll_rows, start=1):
         ws.append(
@@ -748,15 +714,11 @@ def build_statistics_workbook(org_id=None, days=7, months=0, month_from=None, mo
         )
         if i % 200 == 0:
             progress(78 + int(18 * i / n2), f"Сеть: {i}/{len(poll_rows)}…")
-    for col, w in zip("ABCDEFGHIJKL", (28, 16, 20, 32, 13, 14, 9, 16, 17, 16, 17, 16)):
-        ws.column_dimensions[col].width = w
 
     progress(98, "Формирую файл…")
-    buf = io.BytesIO()
-    wb.save(buf)
-    buf.seek(0)
+    content = wb.to_bytes()
 
     suffix = "all" if not org_id else f"org{org_id}"
     filename = f'device_stats_{suffix}_{datetime.now().strftime("%Y%m%d_%H%M")}.xlsx'
     progress(100, "Готово")
-    return buf.getvalue(), filename
+    return content, filename
@@ -102,3 +102,29 @@ def build_statistics_export_task(self, org_id=None, days=7, months=0, month_from
             PROGRESS_TTL,
         )
         raise
+
+
+@shared_task(queue="high_priority", ignore_result=True)
+def refresh_poll_rollups_task() -> int:
+    """Дополняет сводки опросов дашборда задачами новее отметки и чистит устаревшие часовые строки."""
+    from dashboard.services_rollups import purge_hourly_rollups, refresh_poll_rollups
+
+    processed = refresh_poll_rollups()
+    purge_hourly_rollups()
+    return processed
+
+
+@shared_task(queue="low_priority", ignore_result=True)
+def refresh_counter_snapshots_task() -> int:
+    """Сворачивает в месячные снимки счётчиков месяцы, закрывшиеся с прошлого запуска."""
+    from dashboard.services_counters import refresh_counter_snapshots
+
+    return refresh_counter_snapshots()
+
+
+@shared_task(queue="high_priority", ignore_result=True)
+def warm_dashboard_cache_task() -> int:
+    """Заранее пересчитывает виджеты дашборда для «Все» и каждой организации, пока кэш не устарел."""
+    from dashboard.services import warm_widgets
+
+    return warm_widgets()
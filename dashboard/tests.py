@@ -1,11 +1,28 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+from unittest import mock
 
 from django.core.cache import cache
 from django.test import SimpleTestCase, TestCase
 from django.utils import timezone
 
-from dashboard.services import _cache_key, _parse_percent, get_poll_stats, get_printer_status
-from inventory.models import InventoryTask, Organization, Printer
+from dashboard.caching import stampede_safe
+from dashboard.models import PrinterPollDaily, RollupWatermark
+from dashboard.services import (
+    _cache_key,
+    _parse_percent,
+    get_org_summary,
+    get_poll_stats,
+    get_printer_status,
+    get_problem_printers,
+    get_silent_printers,
+)
+from dashboard.services_counters import refresh_counter_snapshots
+from dashboard.services_rollups import rebuild_poll_rollups, refresh_poll_rollups
+from dashboard.services_stats import compute_printer_polling_avg
+from inventory.models import InventoryTask, Organization, PageCounter, Printer
 
 
 class ParsePercentTests(SimpleTestCase):
@@ -72,3 +89,235 @@ class DashboardAggregationTests(TestCase):
         stats = {row["status"]: row["count"] for row in get_poll_stats(period_days=7)}
         self.assertEqual(stats["SUCCESS"], 2)
         self.assertEqual(stats["FAILED"], 1)
+
+
+class PollRollupTests(TestCase):
+    """Ответы виджетов по сводкам совпадают с прямыми запросами к InventoryTask/PageCounter."""
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.orgs = [Organization.objects.create(name=f"Org R{i}") for i in range(2)]
+        self.printers = [
+            Printer.objects.create(
+                ip_address=f"10.1.0.{i}", serial_number=f"R{i}", snmp_community="public", organization=self.orgs[i % 2]
+            )
+            for i in range(6)
+        ]
+        self.printers[5].is_active = False
+        self.printers[5].save()
+        self.totals = {p.id: 1000 * (i + 1) for i, p in enumerate(self.printers)}
+
+    def _seed(self, ages_hours):
+        """Опросы в хронологическом порядке: (принтер, возраст в часах, статус); успех — со счётчиком."""
+        for index, age, status in sorted(ages_hours, key=lambda x: -x[1]):
+            printer = self.printers[index]
+            task = InventoryTask.objects.create(printer=printer, status=status)
+            InventoryTask.objects.filter(pk=task.pk).update(task_timestamp=self.now - timedelta(hours=age))
+            if status == "SUCCESS":
+                self.totals[printer.id] += 37 * (index + 1)
+                if index == 3 and age < 30:
+                    self.totals[printer.id] = 10  # замена счётчика — прирост 0
+                PageCounter.objects.create(task=task, bw_a4=self.totals[printer.id])
+
+    def _raw_success_deltas(self):
+        """[(printer_id, organization_id, время, прирост)] по успешным опросам со счётчиком."""
+        result, previous = [], {}
+        for counter in (
+            PageCounter.objects.filter(task__status="SUCCESS")
+            .select_related("task__printer")
+            .order_by("task__task_timestamp", "id")
+        ):
+            printer = counter.task.printer
+            last = previous.get(printer.id)
+            result.append(
+                (
+                    printer.id,
+                    printer.organization_id,
+                    counter.task.task_timestamp,
+                    max(0, counter.bw_a4 - last) if last is not None else 0,
+                )
+            )
+            previous[printer.id] = counter.bw_a4
+        return result
+
+    def _assert_matches_raw(self):
+        cache.clear()
+        active = Printer.objects.filter(is_active=True)
+        since_24h = self.now - timedelta(hours=24)
+        online = set(
+            InventoryTask.objects.filter(status="SUCCESS", task_timestamp__gte=since_24h, printer__is_active=True)
+            .values_list("printer_id", flat=True)
+            .distinct()
+        )
+        status = get_printer_status()
+        self.assertEqual(status["online"], len(online))
+        self.assertEqual(status["total"], active.count())
+        org_status = get_printer_status(org_id=self.orgs[0].id)
+        self.assertEqual(org_status["online"], active.filter(organization=self.orgs[0], id__in=online).count())
+
+        failures = {}
+        for printer_id in (
+            InventoryTask.objects.filter(task_timestamp__gte=self.now - timedelta(days=7), printer__is_active=True)
+            .exclude(status="SUCCESS")
+            .values_list("printer_id", flat=True)
+        ):
+            failures[printer_id] = failures.get(printer_id, 0) + 1
+        self.assertEqual(
+            {r["printer_id"]: r["failure_count"] for r in get_problem_printers(period_days=7, limit=100)}, failures
+        )
+
+        silent = get_silent_printers(days=7)
+        recent = set(
+            InventoryTask.objects.filter(status="SUCCESS", task_timestamp__gte=self.now - timedelta(days=7))
+            .values_list("printer_id", flat=True)
+            .distinct()
+        )
+        last_ok = {}
+        for printer_id, _, ts, _ in self._raw_success_deltas():
+            last_ok[printer_id] = ts.isoformat()
+        expected = {p.id: last_ok.get(p.id) for p in active if p.id not in recent}
+        self.assertEqual({item["printer_id"]: item["last_success"] for item in silent["items"]}, expected)
+
+        pages = {}
+        for _, org_id, ts, delta in self._raw_success_deltas():
+            if ts >= since_24h:
+                pages[org_id] = pages.get(org_id, 0) + delta
+        for row in get_org_summary():
+            self.assertEqual(row["online"], active.filter(organization_id=row["org_id"], id__in=online).count())
+            self.assertEqual(row["pages"], pages.get(row["org_id"], 0))
+
+    def test_rollups_match_raw_queries_incrementally(self):
+        # Возрасты в стороне от границ окон (24 ч, 7 дней), опросы старше 8 дней — только в суточной сводке
+        self._seed(
+            [(i, age, "SUCCESS") for i in range(6) for age in (400, 250, 120)]
+            + [(0, 110, "FAILED"), (1, 100, "VALIDATION_ERROR"), (2, 300, "FAILED")]
+        )
+        refresh_poll_rollups()
+        self._assert_matches_raw()
+
+        # Следующие опросы учитываются поверх отметки, прирост — от последнего учтённого счётчика
+        self._seed(
+            [(i, age, "SUCCESS") for i in (0, 1, 3, 5) for age in (50, 20, 2)]
+            + [(0, 3, "FAILED"), (0, 4, "FAILED"), (2, 5, "HISTORICAL_INCONSISTENCY"), (4, 60, "FAILED")]
+        )
+        self._assert_matches_raw()  # виджет сам догоняет сводки перед чтением
+        self.assertEqual(
+            RollupWatermark.objects.get().last_task_id, InventoryTask.objects.order_by("-id").values_list("id")[0][0]
+        )
+
+        daily = list(PrinterPollDaily.objects.order_by("id").values_list("polls_ok", "polls_failed", "pages"))
+        rebuild_poll_rollups()
+        self.assertEqual(
+            sorted(daily), sorted(PrinterPollDaily.objects.values_list("polls_ok", "polls_failed", "pages"))
+        )
+
+    def test_refresh_skips_unsettled_tasks(self):
+        printer = self.printers[0]
+        settled = InventoryTask.objects.create(printer=printer, status="SUCCESS")
+        InventoryTask.objects.filter(pk=settled.pk).update(task_timestamp=self.now - timedelta(hours=1))
+        InventoryTask.objects.create(printer=printer, status="FAILED")  # только что — ещё в окне задержки
+
+        self.assertEqual(refresh_poll_rollups(), 1)
+        self.assertEqual(RollupWatermark.objects.get().last_task_id, settled.pk)
+        self.assertEqual(refresh_poll_rollups(), 0)
+
+
+class CounterSnapshotTests(TestCase):
+    def setUp(self):
+        org = Organization.objects.create(name="Org S")
+        self.polled = Printer.objects.create(
+            ip_address="10.2.0.1", serial_number="S-POLLED", snmp_community="public", organization=org
+        )
+        self.silent = Printer.objects.create(
+            ip_address="10.2.0.2", serial_number="S-SILENT", snmp_community="public", organization=org
+        )
+        self.now = timezone.now()
+        for age_days, status, bw_a4 in [(100, "SUCCESS", 1000), (70, "SUCCESS", 1500), (69, "FAILED", None)] + [
+            (40, "SUCCESS", 2300),
+            (2, "SUCCESS", 4000),
+        ]:
+            task = InventoryTask.objects.create(printer=self.polled, status=status)
+            InventoryTask.objects.filter(pk=task.pk).update(task_timestamp=self.now - timedelta(days=age_days))
+            if bw_a4 is not None:
+                PageCounter.objects.create(task=task, bw_a4=bw_a4, color_a4=10)
+
+    def test_polling_avg_same_from_snapshots_and_live_history(self):
+        live = compute_printer_polling_avg()
+        self.assertGreaterEqual(refresh_counter_snapshots(), 3)
+        self.assertEqual(compute_printer_polling_avg(), live)
+
+        rows = {r["serial_number"]: r for r in live}
+        first = (self.now - timedelta(days=100)).date()
+        last = (self.now - timedelta(days=2)).date()
+        months = (last.year - first.year) * 12 + last.month - first.month + 1
+        polled = rows["S-POLLED"]
+        self.assertEqual((polled["first_date"], polled["last_date"]), (first.isoformat(), last.isoformat()))
+        self.assertEqual(polled["months_count"], months)
+        self.assertEqual(polled["avg_a4_bw"], round(3000 / months, 1))
+        self.assertEqual(polled["avg_a4_color"], 0)
+        self.assertEqual(rows["S-SILENT"]["months_count"], 0)
+
+        # Повторный запуск: новых закрытых месяцев нет
+        self.assertEqual(refresh_counter_snapshots(), 0)
+
+
+class StampedeSafeCacheTests(SimpleTestCase):
+    PARALLEL = 50
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+        self.value = "v1"
+
+        @stampede_safe(lambda org_id=None: f"dashboard:test:{org_id}", soft_ttl=60, hard_ttl=600, beta=0)
+        def widget(org_id=None):
+            with self.calls_lock:
+                self.calls += 1
+            time.sleep(0.2)
+            return self.value
+
+        self.widget = widget
+
+    def _parallel(self):
+        barrier = threading.Barrier(self.PARALLEL)
+
+        def request():
+            barrier.wait()
+            return self.widget(org_id=1)
+
+        with ThreadPoolExecutor(self.PARALLEL) as pool:
+            return [f.result() for f in [pool.submit(request) for _ in range(self.PARALLEL)]]
+
+    def test_cold_key_recomputed_once_under_parallel_requests(self):
+        results = self._parallel()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ["v1"] * self.PARALLEL)
+
+    def test_stale_value_served_while_one_request_refreshes(self):
+        self.widget(org_id=1)
+        key = self.widget.cache_key(org_id=1)
+        cache.set(key, {**cache.get(key), "soft_until": time.time() - 1}, 600)
+        self.value, self.calls = "v2", 0
+
+        results = self._parallel()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(results), ["v1"] * (self.PARALLEL - 1) + ["v2"])
+        self.assertEqual(self.widget(org_id=1), "v2")
+        self.assertEqual(self.calls, 1)
+
+    def test_probabilistic_early_expiration(self):
+        @stampede_safe(lambda: "dashboard:test:early", soft_ttl=60, hard_ttl=600, beta=1.0)
+        def widget():
+            with self.calls_lock:
+                self.calls += 1
+            return self.calls
+
+        widget()
+        # До истечения 60 с, пересчёт занял «30 с»: -log(1 - 0.99) * 30 ≈ 138 ≥ 60 — пересчитываем заранее
+        cache.set("dashboard:test:early", {**cache.get("dashboard:test:early"), "delta": 30}, 600)
+        with mock.patch("dashboard.caching.random.random", return_value=0.0):
+            self.assertEqual(widget(), 1)
+        with mock.patch("dashboard.caching.random.random", return_value=0.99):
+            self.assertEqual(widget(), 2)
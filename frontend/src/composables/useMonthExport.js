@@ -0,0 +1,62 @@
+// Excel-выгрузка месяца ежемесячных отчётов:
+// 1) GET export-excel/?async=1 → файл текущей версии данных уже собран
+//    (ready) или backend ставит сборку в очередь exports и возвращает task_id;
+// 2) поллим status_url, пока задача не завершится;
+// 3) кликаем по download_url — файл отдаётся из кэша на диске.
+//
+// Раньше ссылка вела прямо на export-excel/, и книга собиралась в потоке
+// запроса на каждое скачивание.
+
+import { ref } from 'vue'
+import { useToast } from './useToast'
+
+const POLL_INTERVAL_MS = 1500
+const POLL_TIMEOUT_MS = 10 * 60 * 1000
+
+function download(url) {
+  const link = document.createElement('a')
+  link.href = url
+  document.body.appendChild(link)
+  link.click()
+  link.remove()
+}
+
+export function useMonthExport() {
+  const exporting = ref(null) // ключ месяца, выгрузка которого идёт
+  const { showToast } = useToast()
+
+  async function exportMonth(year, month) {
+    if (exporting.value) return
+    exporting.value = `${year}-${month}`
+    try {
+      const resp = await fetch(`/monthly-report/${year}/${month}/export-excel/?async=1`)
+      const data = await resp.json()
+      if (!resp.ok && resp.status !== 202) {
+        throw new Error(data.error || `HTTP ${resp.status}`)
+      }
+      if (data.ready) {
+        download(data.download_url)
+        return
+      }
+
+      showToast('Формируется файл', 'Подождите несколько секунд...', 'info')
+      const started = Date.now()
+      while (Date.now() - started < POLL_TIMEOUT_MS) {
+        await new Promise((r) => setTimeout(r, POLL_INTERVAL_MS))
+        const sresp = await fetch(data.status_url)
+        const sdata = await sresp.json()
+        if (!sdata.done) continue
+        if (sdata.error) throw new Error(sdata.error)
+        download(data.download_url)
+        return
+      }
+      throw new Error('Таймаут формирования файла')
+    } catch (e) {
+      showToast('Ошибка экспорта', e.message, 'error')
+    } finally {
+      exporting.value = null
+    }
+  }
+
+  return { exportMonth, exporting }
+}
@@ -2,7 +2,11 @@ import { ref, onMounted, onUnmounted } from 'vue'
 import { usePrinterStore } from '@/stores/printerStore'
 import { useToast } from './useToast'
 
-export function useWebSocket() {
+/**
+ * @param {Object} [options]
+ * @param {number[]} [options.organizationIds] — получать события только этих организаций
+ */
+export function useWebSocket(options = {}) {
   const ws = ref(null)
   const connected = ref(false)
   const printerStore = usePrinterStore()
@@ -10,7 +14,8 @@ export function useWebSocket() {
 
   function connect() {
     const protocol = location.protocol === 'https:' ? 'wss' : 'ws'
-    const wsUrl = `${protocol}://${location.host}/ws/inventory/`
+    const orgQuery = (options.organizationIds || []).map((id) => `org=${encodeURIComponent(id)}`).join('&')
+    const wsUrl = `${protocol}://${location.host}/ws/inventory/${orgQuery ? `?${orgQuery}` : ''}`
 
     try {
       ws.value = new WebSocket(wsUrl)
@@ -56,6 +61,14 @@ export function useWebSocket() {
   }
 
   function handleMessage(data) {
+    if (data.type === 'inventory_batch') {
+      // Сервер присылает последние состояния принтеров пачкой
+      for (const event of data.events || []) {
+        handleMessage(event)
+      }
+      return
+    }
+
     const { type, printer_id, status, message, triggered_by } = data
 
     if (type === 'inventory_start') {
@@ -4,13 +4,11 @@
 """
 
 from datetime import date, datetime, timedelta
-from io import BytesIO
 
 from django.db.models import Count, Max, Q
 from django.utils import timezone
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, PatternFill
-from openpyxl.utils import get_column_letter
+
+from printer_inventory.xlsx import StreamingWorkbook
 
 from .models import OkdeskComment, OkdeskIssue
 
@@ -463,43 +461,31 @@ def _serialize_issue(issue):
 # Excel-экспорт
 # ──────────────────────────────────────────────────────────────────────────────
 
-_HEADER_FONT = Font(bold=True, color="FFFFFF")
-_HEADER_FILL = PatternFill(start_color="495057", end_color="495057", fill_type="solid")
-_HEADER_ALIGN = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-
-def _style_header_row(ws, row=1):
-    for cell in ws[row]:
-        cell.font = _HEADER_FONT
-        cell.fill = _HEADER_FILL
-        cell.alignment = _HEADER_ALIGN
-
-
-def _autosize(ws, max_width=60):
-    for column_cells in ws.columns:
-        col_letter = get_column_letter(column_cells[0].column)
-        length = max((len(str(c.value)) for c in column_cells if c.value is not None), default=10)
-        ws.column_dimensions[col_letter].width = min(length + 2, max_width)
-
-
-def _write_issues_sheet(ws, issues_iter, title):
-    ws.title = title[:31]
-    headers = [
-        "ID заявки",
-        "Заголовок",
-        "Статус",
-        "Приоритет",
-        "Автор",
-        "Исполнитель",
-        "Компания",
-        "Серийный номер",
-        "Создана",
-        "Дедлайн",
-        "Завершена",
-        "Просрочена",
-    ]
-    ws.append(headers)
-    _style_header_row(ws)
+_ISSUE_COLUMNS = (
+    # (заголовок, ширина)
+    ("ID заявки", 12),
+    ("Заголовок", 60),
+    ("Статус", 24),
+    ("Приоритет", 14),
+    ("Автор", 28),
+    ("Исполнитель", 28),
+    ("Компания", 40),
+    ("Серийный номер", 20),
+    ("Создана", 18),
+    ("Дедлайн", 18),
+    ("Завершена", 18),
+    ("Просрочена", 12),
+)
+
+
+def _write_issues_sheet(wb, issues_iter, title):
+    """Лист заявок в потоковой книге: строки пишутся по мере чтения iterator()."""
+    ws = wb.sheet(
+        title,
+        [header for header, _ in _ISSUE_COLUMNS],
+        widths=[width for _, width in _ISSUE_COLUMNS],
+        freeze=None,
+    )
     for issue in issues_iter:
         ws.append(
             [
@@ -517,7 +503,6 @@ def _write_issues_sheet(ws, issues_iter, title):
                 "Да" if issue.is_overdue else "",
             ]
         )
-    _autosize(ws)
 
 
 def _fmt_dt(dt):
@@ -540,8 +525,8 @@ def export_created_excel(target_date):
     day_start = timezone.make_aware(datetime.combine(target_date, datetime.min.time()))
     day_end = day_start + timedelta(days=1)
     base = OkdeskIssue.objects.filter(created_at__gte=day_start, created_at__lt=day_end)
-    wb = Workbook()
-    _write_issues_sheet(wb.active, _distinct_by_issue_id(base).iterator(chunk_size=500), f"Создано {target_date}")
+    wb = _workbook()
+    _write_issues_sheet(wb, _distinct_by_issue_id(base).iterator(chunk_size=500), f"Создано {target_date}")
     return _wb_bytes(wb), f"okdesk_created_{target_date}.xlsx"
 
 
@@ -554,24 +539,23 @@ def export_closed_excel(target_date):
         completed_at__gte=day_start,
         completed_at__lt=day_end,
     )
-    wb = Workbook()
-    _write_issues_sheet(wb.active, _distinct_by_issue_id(base).iterator(chunk_size=500), f"Закрыто {target_date}")
+    wb = _workbook()
+    _write_issues_sheet(wb, _distinct_by_issue_id(base).iterator(chunk_size=500), f"Закрыто {target_date}")
     return _wb_bytes(wb), f"okdesk_closed_{target_date}.xlsx"
 
 
 def export_by_status_excel(status_name):
     base = OkdeskIssue.objects.filter(status_name=status_name)
-    wb = Workbook()
+    wb = _workbook()
     safe = status_name.replace("/", "-").replace("\\", "-")
-    _write_issues_sheet(wb.active, _distinct_by_issue_id(base).iterator(chunk_size=500), safe)
+    _write_issues_sheet(wb, _distinct_by_issue_id(base).iterator(chunk_size=500), safe)
     return _wb_bytes(wb), f"okdesk_status_{safe}.xlsx"
 
 
 def export_all_active_excel():
     """Все активные заявки, по листу на статус. Для отчёта подрядчику —
     видно сразу сколько заявок висит и в каком состоянии."""
-    wb = Workbook()
-    wb.remove(wb.active)
+    wb = _workbook()
     statuses = (
         active_issues_qs()
         .values("status_name")
@@ -579,15 +563,16 @@ def export_all_active_excel():
         .order_by("-n")
         .values_list("status_name", flat=True)
     )
+    written = 0
     for status in statuses:
         base = OkdeskIssue.objects.filter(status_name=status)
         qs = _distinct_by_issue_id(base)
         if not qs.exists():
             continue
-        ws = wb.create_sheet(status[:31])
-        _write_issues_sheet(ws, qs.iterator(chunk_size=500), status[:31])
-    if not wb.sheetnames:
-        wb.create_sheet("Нет активных заявок")
+        _write_issues_sheet(wb, qs.iterator(chunk_size=500), status[:31])
+        written += 1
+    if not written:
+        wb.sheet("Нет активных заявок", [], freeze=None)
     today = timezone.localdate().isoformat()
     return _wb_bytes(wb), f"okdesk_active_{today}.xlsx"
 
@@ -601,8 +586,8 @@ def export_active_filtered_excel(user=None, mine=False, search="", author="", da
     base = _apply_author(base, author)
     base = _apply_date_range(base, date_from, date_to, field="created_at")
 
-    wb = Workbook()
-    _write_issues_sheet(wb.active, _distinct_by_issue_id(base).iterator(chunk_size=500), "Активные (фильтр)")
+    wb = _workbook()
+    _write_issues_sheet(wb, _distinct_by_issue_id(base).iterator(chunk_size=500), "Активные (фильтр)")
     today = timezone.localdate().isoformat()
     return _wb_bytes(wb), f"okdesk_active_filtered_{today}.xlsx"
 
@@ -616,13 +601,15 @@ def export_closed_filtered_excel(user=None, mine=False, search="", author="", da
     base = _apply_author(base, author)
     base = _apply_date_range(base, date_from, date_to, field="completed_at")
 
-    wb = Workbook()
-    _write_issues_sheet(wb.active, _distinct_by_issue_id(base).iterator(chunk_size=500), "Закрытые (фильтр)")
+    wb = _workbook()
+    _write_issues_sheet(wb, _distinct_by_issue_id(base).iterator(chunk_size=500), "Закрытые (фильтр)")
     today = timezone.localdate().isoformat()
     return _wb_bytes(wb), f"okdesk_closed_filtered_{today}.xlsx"
 
 
+def _workbook():
+    return StreamingWorkbook(header_color="495057")
+
+
 def _wb_bytes(wb):
-    bio = BytesIO()
-    wb.save(bio)
-    return bio.getvalue()
+    return wb.to_bytes()
@@ -45,6 +45,7 @@ class PrinterAdmin(admin.ModelAdmin):
         "organization",
         "last_match_rule",
         "polling_method",
+        "snmp_backend",
         "device_model",
         "device_model__manufacturer",
     )
@@ -76,11 +77,12 @@ class PrinterAdmin(admin.ModelAdmin):
         (
             "Метод опроса",
             {
-                "fields": ("polling_method", "snmp_community", "web_username", "web_password"),
+                "fields": ("polling_method", "snmp_backend", "snmp_community", "web_username", "web_password"),
                 "description": "Выберите метод опроса: SNMP или веб-парсинг",
             },
         ),
         ("Организация и настройки", {"fields": ("organization", "last_match_rule")}),
+        ("Расписание опроса", {"fields": ("next_poll_at", "poll_failure_streak"), "classes": ("collapse",)}),
         (
             "Статус и замена",
             {
@@ -92,7 +94,7 @@ class PrinterAdmin(admin.ModelAdmin):
         ("Служебная информация", {"fields": ("last_updated",), "classes": ("collapse",)}),
     )
 
-    readonly_fields = ("last_updated", "replaced_at")
+    readonly_fields = ("last_updated", "replaced_at", "next_poll_at", "poll_failure_streak")
 
     def device_model_display(self, obj):
         """Отображение модели из справочника с цветовым кодированием"""
@@ -14,3 +14,6 @@ class InventoryConfig(AppConfig):
             from . import tasks  # noqa
         except ImportError:
             pass
+
+        # Сигналы PrinterLatestState и окна счётчиков для валидации
+        from . import counter_window, latest_state  # noqa
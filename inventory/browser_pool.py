@@ -0,0 +1,270 @@
+# inventory/browser_pool.py
+"""
+Пул «тёплых» headless-браузеров для WEB/HYBRID опроса и интерактивного редактора правил.
+
+Запуск Edge занимает секунды и съедает сотни мегабайт — раньше это происходило на
+каждый опрос принтера. Теперь каждый процесс (Celery-воркер prefork, процесс
+веб-сервера) держит свой небольшой пул драйверов:
+
+- между арендами браузер сбрасывается (cookies, storage, лишние вкладки, about:blank);
+- драйвер пересоздаётся после WEB_BROWSER_MAX_USES аренд или если не прошёл health check;
+- если все браузеры заняты, acquire() ждёт не дольше WEB_BROWSER_CHECKOUT_TIMEOUT секунд;
+- WEB_BROWSER_POOL_SIZE = 0 отключает пул (браузер на каждую аренду, как раньше).
+
+Пример:
+    pool = get_browser_pool()
+    with pool.lease() as driver:
+        driver.get(url)
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPoolTimeout(Exception):
+    """Не удалось получить браузер из пула за отведённое время."""
+
+
+class _PooledDriver:
+    __slots__ = ("driver", "uses", "created_at")
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+
+
+def _quit_driver(driver) -> None:
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.debug(f"Browser quit failed: {e}")
+
+
+class BrowserPool:
+    """
+    Потокобезопасный пул WebDriver'ов одного процесса.
+
+    size — максимум одновременно существующих браузеров (занятых + свободных).
+    """
+
+    def __init__(
+        self,
+        factory: Optional[Callable] = None,
+        size: int = 2,
+        max_uses: int = 50,
+        checkout_timeout: float = 60.0,
+    ):
+        if factory is None:
+            from .web_parser import create_selenium_driver
+
+            factory = create_selenium_driver
+
+        self.factory = factory
+        self.size = max(0, size)
+        self.max_uses = max(1, max_uses)
+        self.checkout_timeout = checkout_timeout
+
+        self._idle: List[_PooledDriver] = []
+        self._leased = {}  # id(driver) -> _PooledDriver
+        self._total = 0  # занятые + свободные + создаваемые
+        self._cond = threading.Condition()
+        self._closed = False
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # АРЕНДА
+    # ──────────────────────────────────────────────────────────────────────────────
+
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Выдаёт готовый к работе драйвер.
+
+        Raises:
+            BrowserPoolTimeout: все браузеры заняты дольше timeout секунд
+            RuntimeError: не удалось запустить браузер
+        """
+        if self.size == 0:
+            return self.factory()
+
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._total < self.size:
+                        self._total += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise BrowserPoolTimeout(
+                            f"Нет свободного браузера за {timeout:.0f} c (размер пула {self.size})"
+                        )
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                entry = self._create()
+            elif not self._is_healthy(entry.driver):
+                logger.warning("Browser failed health check, recreating")
+                _quit_driver(entry.driver)
+                entry = self._create()
+
+            entry.uses += 1
+            with self._cond:
+                self._leased[id(entry.driver)] = entry
+            return entry.driver
+
+    def release(self, driver, discard: bool = False) -> None:
+        """Возвращает драйвер в пул (или закрывает, если он отработал своё / сломан)."""
+        if self.size == 0:
+            _quit_driver(driver)
+            return
+
+        with self._cond:
+            entry = self._leased.pop(id(driver), None)
+        if entry is None:
+            _quit_driver(driver)
+            return
+
+        if discard or self._closed:
+            discard = True
+        elif entry.uses >= self.max_uses:
+            discard = True
+            logger.info(f"Recycling browser after {entry.uses} uses")
+        else:
+            discard = not self._reset(driver)
+
+        if discard:
+            _quit_driver(driver)
+
+        with self._cond:
+            if discard:
+                self._total -= 1
+            else:
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Контекстный менеджер над acquire()/release()."""
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self) -> None:
+        """Закрывает свободные браузеры; занятые будут закрыты при release()."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            _quit_driver(entry.driver)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"size": self.size, "total": self._total, "idle": len(self._idle), "leased": len(self._leased)}
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # ВНУТРЕННЕЕ
+    # ──────────────────────────────────────────────────────────────────────────────
+
+    def _create(self) -> _PooledDriver:
+        try:
+            return _PooledDriver(self.factory())
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    @staticmethod
+    def _is_healthy(driver) -> bool:
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(driver) -> bool:
+        """Сбрасывает состояние между принтерами. False — драйвер лучше выбросить."""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+
+            try:
+                # Chromium: чистим cookies всех доменов, а не только текущего
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            except Exception:
+                driver.delete_all_cookies()
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except Exception:
+                pass  # about:blank и страницы без storage
+
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            logger.warning(f"Browser reset failed, discarding: {e}")
+            return False
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ПУЛ ПРОЦЕССА
+# ──────────────────────────────────────────────────────────────────────────────
+
+_pool: Optional[BrowserPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Пул текущего процесса (после fork дочерний процесс создаёт свой)."""
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = BrowserPool(
+                size=getattr(settings, "WEB_BROWSER_POOL_SIZE", 2),
+                max_uses=getattr(settings, "WEB_BROWSER_MAX_USES", 50),
+                checkout_timeout=getattr(settings, "WEB_BROWSER_CHECKOUT_TIMEOUT", 60),
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def shutdown_browser_pool() -> None:
+    """Закрывает браузеры пула текущего процесса."""
+    global _pool
+
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and _pool_pid == os.getpid():
+        pool.close()
+
+
+atexit.register(shutdown_browser_pool)
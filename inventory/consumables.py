@@ -0,0 +1,95 @@
+"""
+Уровни расходников в числовом виде.
+
+PageCounter хранит уровни тонера и драма строками, как их отдал принтер
+('75%', '75', 'OK', 'Near End', '-3', 'N/A'…). Разбирать их в Python на каждом
+чтении дашборда дорого, поэтому при записи счётчика (PageCounter.save)
+рядом с каждой строкой кладутся:
+
+    <поле>_pct   — процент 0..100 или NULL;
+    <поле>_state — статус без числа (OK / LOW / EMPTY) или пусто;
+
+и min_level_pct — наименьший процент по всем расходникам, с частичным
+индексом для запросов «ниже X%».
+
+Процент извлекается так же, как dashboard.services._parse_percent (первое
+целое в строке), но значения больше 100 считаются неизвестными: для любого
+порога до 100% «ниже порога» совпадает с прежним разбором строки.
+Модуль не импортирует модели — им пользуются миграции.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Optional, Tuple
+
+from django.db import models
+
+LEVEL_FIELDS = (
+    "toner_black",
+    "toner_cyan",
+    "toner_magenta",
+    "toner_yellow",
+    "drum_black",
+    "drum_cyan",
+    "drum_magenta",
+    "drum_yellow",
+)
+
+# Частичный индекс по min_level_pct покрывает пороги до этого значения
+LOW_LEVEL_INDEX_PCT = 30
+
+_NUMBER_RE = re.compile(r"\d+")
+
+
+class ConsumableState(models.TextChoices):
+    OK = "OK", "В норме"
+    LOW = "LOW", "Заканчивается"
+    EMPTY = "EMPTY", "Закончился"
+
+
+# Порядок важен: «Near End» — LOW, а не EMPTY
+_OK_WORDS = {"ok", "good", "normal", "норма"}
+_LOW_MARKERS = ("low", "warn", "near", "мало", "низк", "заканч")
+_EMPTY_MARKERS = ("empty", "end", "out", "replace", "exhaust", "пуст", "замен", "законч")
+
+
+def parse_level(raw: Optional[str]) -> Tuple[Optional[int], str]:
+    """
+    Строка уровня -> (процент или None, статус или '').
+    Статус определяется только для значений без числа.
+    """
+    if not raw:
+        return None, ""
+    match = _NUMBER_RE.search(raw)
+    if match:
+        pct = int(match.group())
+        return (pct if pct <= 100 else None), ""
+
+    text = raw.strip().lower()
+    if text in _OK_WORDS:
+        return None, ConsumableState.OK
+    if any(marker in text for marker in _LOW_MARKERS):
+        return None, ConsumableState.LOW
+    if any(marker in text for marker in _EMPTY_MARKERS):
+        return None, ConsumableState.EMPTY
+    return None, ""
+
+
+def level_values(counter) -> Dict[str, object]:
+    """Числовые колонки уровней по строковым полям счётчика (объект с атрибутами LEVEL_FIELDS)."""
+    values = {}
+    levels = []
+    for field in LEVEL_FIELDS:
+        pct, state = parse_level(getattr(counter, field))
+        values[f"{field}_pct"] = pct
+        values[f"{field}_state"] = state
+        if pct is not None:
+            levels.append(pct)
+    values["min_level_pct"] = min(levels) if levels else None
+    return values
+
+
+def level_columns():
+    """Имена числовых колонок — для bulk_update и .only()."""
+    return [f"{field}_{suffix}" for field in LEVEL_FIELDS for suffix in ("pct", "state")] + ["min_level_pct"]
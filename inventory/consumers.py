@@ -1,5 +1,9 @@
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from .ws_broadcast import GROUP, org_group
+
 
 class InventoryConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
@@ -7,11 +11,17 @@ class InventoryConsumer(AsyncJsonWebsocketConsumer):
         if not user or user.is_anonymous:
             await self.close()
             return
-        await self.channel_layer.group_add("inventory_updates", self.channel_name)
+        # /ws/inventory/?org=3&org=7 — только события принтеров этих организаций
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        org_ids = {int(v) for v in query.get("org", []) if v.isdigit()}
+        self.subscribed_groups = [org_group(org_id) for org_id in sorted(org_ids)] or [GROUP]
+        for group in self.subscribed_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
         await self.accept()
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("inventory_updates", self.channel_name)
+        for group in getattr(self, "subscribed_groups", []):
+            await self.channel_layer.group_discard(group, self.channel_name)
 
     async def inventory_start(self, event):
         # показываем старт опроса
@@ -20,3 +30,7 @@ class InventoryConsumer(AsyncJsonWebsocketConsumer):
     async def inventory_update(self, event):
         # показываем завершение опроса
         await self.send_json(event)
+
+    async def inventory_batch(self, event):
+        # пачка последних состояний принтеров (см. ws_broadcast)
+        await self.send_json(event)
@@ -0,0 +1,150 @@
+# inventory/counter_window.py
+"""
+Скользящее окно последних успешных счётчиков принтера для validate_against_history.
+
+Окно — список из COUNTER_WINDOW_SIZE снимков (новые первыми) под одним ключом
+в кэше COUNTER_WINDOW_CACHE_ALIAS (Redis): валидация очередного опроса — один
+GET и ни одного SQL-запроса. При промахе окно читается из БД и кладётся в кэш.
+
+Каждый успешный PageCounter дописывается в окно после коммита транзакции.
+Если окна в кэше нет, запись пропускается — следующее чтение соберёт его из БД.
+Правка существующего PageCounter или задачи (например, смена статуса) и
+удаление счётчика или задачи сбрасывают окно — иначе удалённый из админки
+плохой снимок проверял бы новые опросы до истечения COUNTER_WINDOW_TTL.
+"""
+
+import logging
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from typing import List
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import InventoryTask, PageCounter
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = ("bw_a3", "bw_a4", "color_a3", "color_a4", "total_pages")
+
+
+def _cache():
+    return caches[getattr(settings, "COUNTER_WINDOW_CACHE_ALIAS", "default")]
+
+
+def _key(printer_id: int) -> str:
+    return f"counter_window:{printer_id}"
+
+
+def _size() -> int:
+    return getattr(settings, "COUNTER_WINDOW_SIZE", 5)
+
+
+def _ttl() -> int:
+    return getattr(settings, "COUNTER_WINDOW_TTL", 7 * 24 * 3600)
+
+
+def make_snapshot(counter: PageCounter, task: InventoryTask) -> dict:
+    snapshot = {field: getattr(counter, field) for field in SNAPSHOT_FIELDS}
+    snapshot["task_id"] = task.id
+    snapshot["ts"] = task.task_timestamp.timestamp()
+    return snapshot
+
+
+def snapshot_time(snapshot: dict) -> datetime:
+    return datetime.fromtimestamp(snapshot["ts"], tz=dt_timezone.utc)
+
+
+def _load_from_db(printer_id: int) -> List[dict]:
+    """Как раньше в validate_against_history: счётчики последних N успешных задач."""
+    recent_tasks = InventoryTask.objects.filter(printer_id=printer_id, status="SUCCESS").order_by("-task_timestamp")[
+        : _size()
+    ]
+    counters = (
+        PageCounter.objects.filter(task__in=recent_tasks)
+        .select_related("task")
+        .order_by("-task__task_timestamp", "-id")
+        .only("task__id", "task__task_timestamp", *SNAPSHOT_FIELDS)
+    )
+    return [make_snapshot(c, c.task) for c in counters]
+
+
+def get_counter_window(printer_id: int) -> List[dict]:
+    """Последние успешные снимки счётчиков принтера, новые первыми."""
+    try:
+        window = _cache().get(_key(printer_id))
+    except Exception as e:
+        logger.warning(f"Counter window cache read failed for printer {printer_id}: {e}")
+        window = None
+    if window is not None:
+        return window
+
+    window = _load_from_db(printer_id)
+    try:
+        _cache().set(_key(printer_id), window, _ttl())
+    except Exception as e:
+        logger.warning(f"Counter window cache write failed for printer {printer_id}: {e}")
+    return window
+
+
+def push_snapshot(printer_id: int, snapshot: dict) -> None:
+    """Дописывает снимок в окно, если окно уже в кэше."""
+    cache = _cache()
+    key = _key(printer_id)
+    try:
+        window = cache.get(key)
+        if window is None:
+            return
+        window = [s for s in window if s["task_id"] != snapshot["task_id"]] + [snapshot]
+        window.sort(key=lambda s: (s["ts"], s["task_id"]), reverse=True)
+        cache.set(key, window[: _size()], _ttl())
+    except Exception as e:
+        logger.warning(f"Counter window update failed for printer {printer_id}: {e}")
+
+
+def invalidate_counter_window(printer_id: int) -> None:
+    try:
+        _cache().delete(_key(printer_id))
+    except Exception as e:
+        logger.warning(f"Counter window invalidation failed for printer {printer_id}: {e}")
+
+
+@receiver(post_save, sender=PageCounter, dispatch_uid="inventory_counter_window")
+def _counter_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    task = instance.task
+    if not created:
+        transaction.on_commit(lambda: invalidate_counter_window(task.printer_id))
+    elif task.status == "SUCCESS":
+        snapshot = make_snapshot(instance, task)
+        transaction.on_commit(lambda: push_snapshot(task.printer_id, snapshot))
+
+
+@receiver(post_delete, sender=PageCounter, dispatch_uid="inventory_counter_window_counter_deleted")
+def _counter_deleted(sender, instance, **kwargs):
+    # Задача могла уйти в том же каскаде — тогда окно сбросит её собственный сигнал
+    printer_id = InventoryTask.objects.filter(pk=instance.task_id).values_list("printer_id", flat=True).first()
+    if printer_id is not None:
+        transaction.on_commit(lambda: invalidate_counter_window(printer_id))
+
+
+@receiver(post_save, sender=InventoryTask, dispatch_uid="inventory_counter_window_task_saved")
+def _task_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Новая задача попадает в окно вместе со своим PageCounter; правка существующей
+    # (статус, время) может поменять состав окна
+    if raw or created:
+        return
+    if update_fields is not None and not {"status", "task_timestamp"} & set(update_fields):
+        return
+    printer_id = instance.printer_id
+    transaction.on_commit(lambda: invalidate_counter_window(printer_id))
+
+
+@receiver(post_delete, sender=InventoryTask, dispatch_uid="inventory_counter_window_task_deleted")
+def _task_deleted(sender, instance, **kwargs):
+    printer_id = instance.printer_id
+    transaction.on_commit(lambda: invalidate_counter_window(printer_id))
@@ -0,0 +1,204 @@
+# inventory/inflight.py
+"""
+Реестр опросов «в полёте» (single-flight) по принтерам.
+
+Один принтер могли одновременно опрашивать демон, ручной запуск
+(run_inventory_task_priority), повторы run_inventory_task и poll_printer —
+каждый со своим запуском GLPI-агента/браузера и своей InventoryTask.
+
+Теперь первый вызов single_flight() занимает ключ inflight:<kind>:running:<id>
+(cache.add — SET NX в Redis) и выполняет опрос; остальные вызовы за это время
+не запускают новый опрос, а ждут результат первого (он кладётся под токеном
+владельца на INFLIGHT_RESULT_TTL секунд) — или сразу уходят, если wait=False.
+
+Демон перед постановкой в очередь помечает принтеры inflight:<kind>:queued:<id>
+(claim_queued) и пропускает уже стоящие в очереди или опрашиваемые.
+
+Ключи живут в кэше INVENTORY_INFLIGHT_CACHE_ALIAS с TTL, поэтому упавший
+воркер не блокирует принтер дольше INVENTORY_INFLIGHT_TTL.
+"""
+
+import logging
+import time
+import uuid
+from typing import Callable, Iterable, List
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+INVENTORY = "inventory"
+INFLIGHT_RESULT_TTL = 120
+WAIT_STEP = 0.2
+
+_MISSING = object()
+
+
+class SingleFlightError(Exception):
+    """Опрос, к которому присоединился вызов, завершился исключением."""
+
+
+def _cache():
+    return caches[getattr(settings, "INVENTORY_INFLIGHT_CACHE_ALIAS", "default")]
+
+
+def _running_ttl() -> int:
+    return getattr(settings, "INVENTORY_INFLIGHT_TTL", 15 * 60)
+
+
+def _queued_ttl() -> int:
+    return getattr(settings, "INVENTORY_INFLIGHT_QUEUED_TTL", 30 * 60)
+
+
+def running_key(printer_id: int, kind: str = INVENTORY) -> str:
+    return f"inflight:{kind}:running:{printer_id}"
+
+
+def queued_key(printer_id: int, kind: str = INVENTORY) -> str:
+    return f"inflight:{kind}:queued:{printer_id}"
+
+
+def _result_key(token: str) -> str:
+    return f"inflight:result:{token}"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Выполнение
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def single_flight(printer_id: int, fn: Callable, kind: str = INVENTORY, wait: bool = True, timeout=None):
+    """
+    Выполняет fn(), если для принтера не идёт такой же опрос, иначе ждёт его результат.
+
+    Args:
+        wait: False — не ждать чужой опрос, сразу вернуть None.
+        timeout: сколько ждать чужой опрос, сек (default: INVENTORY_INFLIGHT_TTL).
+
+    Returns:
+        Результат fn() (своего или чужого запуска); None — опрос уже идёт и wait=False
+        или не дождались.
+    """
+    cache = _cache()
+    key = running_key(printer_id, kind)
+    deadline = time.monotonic() + (timeout if timeout is not None else _running_ttl())
+
+    vanished = 0
+    while True:
+        token = uuid.uuid4().hex
+        try:
+            owner = cache.add(key, token, _running_ttl())
+            other = None if owner else cache.get(key)
+        except Exception as e:
+            logger.warning(f"In-flight registry unavailable, polling printer {printer_id} without it: {e}")
+            return fn()
+
+        if owner:
+            return _run_as_owner(cache, key, token, fn)
+
+        if other is None:
+            # Ключа нет, но и занять не смогли: владелец только что закончил — или Redis
+            # недоступен (IGNORE_EXCEPTIONS глушит ошибки). Второй раз подряд — опрашиваем без реестра.
+            vanished += 1
+            if vanished > 1:
+                logger.warning(f"In-flight registry unavailable, polling printer {printer_id} without it")
+                return fn()
+            time.sleep(WAIT_STEP)
+            continue
+        vanished = 0
+
+        if not wait:
+            logger.info(f"Printer {printer_id}: {kind} poll already in progress, skipped")
+            return None
+
+        logger.info(f"Printer {printer_id}: {kind} poll already in progress, waiting for its result")
+        result = _wait_for(cache, key, other, deadline)
+        if result is not _MISSING:
+            return result
+        if time.monotonic() >= deadline:
+            logger.warning(f"Printer {printer_id}: gave up waiting for running {kind} poll")
+            return None
+        # Владелец пропал без результата (воркер убит) — пробуем сами
+
+
+def _run_as_owner(cache, key: str, token: str, fn: Callable):
+    envelope = None
+    try:
+        value = fn()
+        envelope = {"ok": True, "value": value}
+        return value
+    except Exception as e:
+        envelope = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        raise
+    finally:
+        try:
+            cache.set(_result_key(token), envelope, INFLIGHT_RESULT_TTL)
+            if cache.get(key) == token:
+                cache.delete(key)
+        except Exception as e:
+            logger.warning(f"In-flight registry cleanup failed for {key}: {e}")
+
+
+def _wait_for(cache, key: str, token: str, deadline: float):
+    """Ждёт результат владельца token; _MISSING — владелец сменился/пропал или вышло время."""
+    while time.monotonic() < deadline:
+        envelope = cache.get(_result_key(token))
+        if envelope is not None:
+            if not envelope["ok"]:
+                raise SingleFlightError(envelope["error"])
+            return envelope["value"]
+        if cache.get(key) != token:
+            # Между проверками владелец мог успеть записать результат и снять ключ
+            envelope = cache.get(_result_key(token))
+            if envelope is not None and envelope["ok"]:
+                return envelope["value"]
+            return _MISSING
+        time.sleep(WAIT_STEP)
+    return _MISSING
+
+
+def is_running(printer_id: int, kind: str = INVENTORY) -> bool:
+    try:
+        return _cache().get(running_key(printer_id, kind)) is not None
+    except Exception:
+        return False
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Очередь демона
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def claim_queued(printer_ids: Iterable[int], kind: str = INVENTORY) -> List[int]:
+    """
+    Помечает принтеры как поставленные в очередь.
+
+    Returns:
+        Принтеры, которые можно ставить: не стоят в очереди и не опрашиваются сейчас.
+        При недоступном кэше — все.
+    """
+    printer_ids = list(printer_ids)
+    cache = _cache()
+    try:
+        # Два пакетных запроса вместо add на каждый принтер; демон один, гонки между
+        # постановками нет, а двойной опрос всё равно отсечёт single_flight
+        busy = cache.get_many(
+            [running_key(pid, kind) for pid in printer_ids] + [queued_key(pid, kind) for pid in printer_ids]
+        )
+        claimed = [
+            pid for pid in printer_ids if running_key(pid, kind) not in busy and queued_key(pid, kind) not in busy
+        ]
+        cache.set_many({queued_key(pid, kind): 1 for pid in claimed}, _queued_ttl())
+        return claimed
+    except Exception as e:
+        logger.warning(f"In-flight registry unavailable, queueing all {len(printer_ids)} printers: {e}")
+        return printer_ids
+
+
+def release_queued(printer_ids: Iterable[int], kind: str = INVENTORY) -> None:
+    """Снимает отметку очереди (задача взята воркером или не поставилась)."""
+    try:
+        _cache().delete_many([queued_key(pid, kind) for pid in printer_ids])
+    except Exception as e:
+        logger.warning(f"In-flight registry cleanup failed: {e}")
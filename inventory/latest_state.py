@@ -0,0 +1,204 @@
+# inventory/latest_state.py
+"""
+Денормализованное «последнее состояние» принтера (PrinterLatestState).
+
+Раньше «последняя успешная задача + её счётчики» искалась отдельным запросом
+на каждый принтер. Теперь строка PrinterLatestState обновляется в той же
+транзакции, что и запись InventoryTask/PageCounter (сигналы ниже), а читатели
+делают один JOIN: Printer.objects.select_related("latest_state__counter", ...).
+
+Обновление условное: более старая задача (например, USB-показание, пришедшее
+с опозданием) не перетирает более свежее состояние.
+
+Если данные писались в обход сигналов (bulk_create, raw SQL, очистка старых
+задач), состояние восстанавливается командой backfill_latest_state, а
+расхождения ищет check_latest_state.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import InventoryTask, PageCounter, Printer, PrinterLatestState
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые сравнивает check_latest_state и пишет backfill
+STATE_FIELDS = ("last_task_id", "last_task_at", "success_task_id", "success_at", "counter_id")
+UPDATE_FIELDS = ("last_task", "last_task_at", "success_task", "success_at", "counter")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Обновление при записи опроса
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _upsert(printer_id: int, ts_field: str, ts: datetime, values: dict) -> bool:
+    """
+    Записывает values, если ts не старше уже сохранённого ts_field.
+
+    Returns:
+        True — состояние обновлено/создано, False — сохранено более свежее.
+    """
+    fresh = Q(**{f"{ts_field}__isnull": True}) | Q(**{f"{ts_field}__lte": ts})
+    values = {ts_field: ts, **values}
+
+    with transaction.atomic():
+        if PrinterLatestState.objects.filter(fresh, printer_id=printer_id).update(**values):
+            return True
+        if PrinterLatestState.objects.filter(printer_id=printer_id).exists():
+            return False
+        try:
+            with transaction.atomic():
+                PrinterLatestState.objects.create(printer_id=printer_id, **values)
+            return True
+        except IntegrityError:
+            # Параллельный опрос того же принтера успел создать строку
+            return bool(PrinterLatestState.objects.filter(fresh, printer_id=printer_id).update(**values))
+
+
+def record_task(task: InventoryTask) -> None:
+    """Учитывает новую задачу в PrinterLatestState."""
+    _upsert(task.printer_id, "last_task_at", task.task_timestamp, {"last_task_id": task.id})
+    if task.status == "SUCCESS":
+        _upsert(task.printer_id, "success_at", task.task_timestamp, {"success_task_id": task.id, "counter_id": None})
+
+
+def record_counter(counter: PageCounter) -> None:
+    """Привязывает счётчики к успешной задаче в PrinterLatestState."""
+    task = counter.task
+    if task.status == "SUCCESS":
+        _upsert(
+            task.printer_id, "success_at", task.task_timestamp, {"success_task_id": task.id, "counter_id": counter.id}
+        )
+
+
+@receiver(post_save, sender=InventoryTask, dispatch_uid="inventory_latest_state_task")
+def _task_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_task(instance)
+
+
+@receiver(post_save, sender=PageCounter, dispatch_uid="inventory_latest_state_counter")
+def _counter_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_counter(instance)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Пересчёт из истории: backfill и проверка согласованности
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _latest_task_subquery(**filters) -> Subquery:
+    return Subquery(
+        InventoryTask.objects.filter(printer_id=OuterRef("pk"), **filters)
+        .order_by("-task_timestamp", "-id")
+        .values("id")[:1]
+    )
+
+
+def compute_expected_states(printer_ids: Iterable[int]) -> Dict[int, dict]:
+    """
+    Состояние, которое должно быть у принтеров по истории задач.
+    Принтеры без задач в результат не попадают.
+    """
+    rows = (
+        Printer.objects.filter(pk__in=list(printer_ids))
+        .annotate(last_task_id=_latest_task_subquery(), success_task_id=_latest_task_subquery(status="SUCCESS"))
+        .filter(last_task_id__isnull=False)
+        .values_list("pk", "last_task_id", "success_task_id")
+    )
+    rows = list(rows)
+
+    task_ids = {tid for _, last_id, success_id in rows for tid in (last_id, success_id) if tid}
+    timestamps = dict(InventoryTask.objects.filter(pk__in=task_ids).values_list("pk", "task_timestamp"))
+    counters = {}
+    for task_id, counter_id in (
+        PageCounter.objects.filter(task_id__in=[s for _, _, s in rows if s]).order_by("id").values_list("task_id", "id")
+    ):
+        counters[task_id] = counter_id  # при нескольких счётчиках на задачу — последний, как и раньше
+
+    return {
+        printer_id: {
+            "last_task_id": last_id,
+            "last_task_at": timestamps.get(last_id),
+            "success_task_id": success_id,
+            "success_at": timestamps.get(success_id),
+            "counter_id": counters.get(success_id),
+        }
+        for printer_id, last_id, success_id in rows
+    }
+
+
+def _chunks(ids: List[int], size: int):
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
+
+
+def _all_printer_ids() -> List[int]:
+    return list(Printer.objects.order_by("pk").values_list("pk", flat=True))
+
+
+def rebuild_latest_state(printer_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> int:
+    """
+    Пересчитывает PrinterLatestState из истории задач.
+
+    Returns:
+        Количество записанных строк.
+    """
+    ids = sorted(set(printer_ids)) if printer_ids is not None else _all_printer_ids()
+    written = 0
+
+    for chunk in _chunks(ids, batch_size):
+        expected = compute_expected_states(chunk)
+        with transaction.atomic():
+            PrinterLatestState.objects.filter(printer_id__in=chunk).exclude(printer_id__in=expected).delete()
+            PrinterLatestState.objects.bulk_create(
+                [PrinterLatestState(printer_id=pid, **state) for pid, state in expected.items()],
+                update_conflicts=True,
+                unique_fields=["printer"],
+                update_fields=UPDATE_FIELDS,
+            )
+        written += len(expected)
+
+    return written
+
+
+def find_inconsistencies(printer_ids: Optional[Iterable[int]] = None, batch_size: int = 1000) -> List[dict]:
+    """
+    Сравнивает PrinterLatestState с историей задач.
+
+    Returns:
+        [{"printer_id", "field", "expected", "actual"}, ...]; field="row" —
+        строки нет (или есть лишняя).
+    """
+    ids = sorted(set(printer_ids)) if printer_ids is not None else _all_printer_ids()
+    problems = []
+
+    for chunk in _chunks(ids, batch_size):
+        expected = compute_expected_states(chunk)
+        actual = {
+            row["printer_id"]: row
+            for row in PrinterLatestState.objects.filter(printer_id__in=chunk).values("printer_id", *STATE_FIELDS)
+        }
+
+        for printer_id in chunk:
+            exp, act = expected.get(printer_id), actual.get(printer_id)
+            if exp is None and act is None:
+                continue
+            if exp is None or act is None:
+                problems.append({"printer_id": printer_id, "field": "row", "expected": exp, "actual": act})
+                continue
+            for field in STATE_FIELDS:
+                if exp[field] != act[field]:
+                    problems.append(
+                        {"printer_id": printer_id, "field": field, "expected": exp[field], "actual": act[field]}
+                    )
+
+    return problems
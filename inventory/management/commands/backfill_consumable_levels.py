@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.consumables import LEVEL_FIELDS, level_columns
+from inventory.models import PageCounter
+
+
+class Command(BaseCommand):
+    help = """
+    Заполняет числовые уровни расходников (<поле>_pct, <поле>_state, min_level_pct) в истории PageCounter.
+
+    Новые счётчики заполняются при записи; миграция 0028 заполнила только последние
+    счётчики принтеров. Команда идёт по id пачками, её можно прерывать и продолжать с --from-id.
+
+    Примеры использования:
+    python manage.py backfill_consumable_levels
+    python manage.py backfill_consumable_levels --from-id 5000000 --batch-size 5000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from-id", type=int, default=0, help="Начать с PageCounter.id больше указанного")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Счётчиков за одну транзакцию")
+
+    def handle(self, *args, **options):
+        last_id, batch_size = options["from_id"], options["batch_size"]
+        total = PageCounter.objects.filter(pk__gt=last_id).count()
+        self.stdout.write(f"Счётчиков к заполнению: {total}")
+
+        done = 0
+        while True:
+            counters = list(
+                PageCounter.objects.filter(pk__gt=last_id).order_by("pk").only("pk", *LEVEL_FIELDS)[:batch_size]
+            )
+            if not counters:
+                break
+            for counter in counters:
+                counter.fill_levels()
+            with transaction.atomic():
+                PageCounter.objects.bulk_update(counters, level_columns())
+            last_id = counters[-1].pk
+            done += len(counters)
+            self.stdout.write(f"  {done}/{total} (id <= {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Заполнено счётчиков: {done}"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from inventory.latest_state import rebuild_latest_state
+from inventory.models import Printer
+
+
+class Command(BaseCommand):
+    help = """
+    Пересчитывает PrinterLatestState (последняя задача и последний успешный опрос) из истории задач.
+
+    Нужна после массовой загрузки/удаления задач в обход ORM-сигналов.
+
+    Примеры использования:
+    python manage.py backfill_latest_state
+    python manage.py backfill_latest_state --printer-id 12 --printer-id 15
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--printer-id", type=int, action="append", help="Только указанные принтеры")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Принтеров за одну транзакцию")
+
+    def handle(self, *args, **options):
+        printer_ids = options["printer_id"]
+        total = len(printer_ids) if printer_ids else Printer.objects.count()
+        self.stdout.write(f"Принтеров к пересчёту: {total}")
+
+        written = rebuild_latest_state(printer_ids, batch_size=options["batch_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"✓ Записано состояний: {written}"))
@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from inventory import tasks
+from inventory.models import Printer
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк рассылки демона: число сообщений брокера и время полного обхода "
+        "для одиночных задач и пакетов (опрос эмулируется задержкой, сеть и брокер не нужны)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--printers", type=int, help="Размер парка (по умолчанию — принтеры из БД)")
+        parser.add_argument("--batch-size", type=int, help="Размер пачки (default: INVENTORY_BATCH_SIZE)")
+        parser.add_argument(
+            "--concurrency", type=int, help="Потоков внутри пачки (default: INVENTORY_BATCH_CONCURRENCY)"
+        )
+        parser.add_argument("--workers", type=int, default=4, help="Процессов воркера low_priority (default: 4)")
+        parser.add_argument("--latency", type=float, default=0.05, help="Длительность одного опроса, сек")
+        parser.add_argument(
+            "--message-overhead", type=float, default=0.005, help="Накладные расходы на сообщение брокера, сек"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"] or getattr(settings, "INVENTORY_BATCH_SIZE", 50)
+        concurrency = options["concurrency"] or getattr(settings, "INVENTORY_BATCH_CONCURRENCY", 8)
+        fleet = options["printers"] or Printer.objects.count()
+        printer_ids = list(range(1, fleet + 1))
+
+        self.stdout.write(
+            f"\nПарк: {fleet} принтеров, воркеров: {options['workers']}, "
+            f"опрос: {options['latency'] * 1000:.0f} мс, сообщение: {options['message_overhead'] * 1000:.0f} мс"
+        )
+
+        for label, size in (("одиночные задачи", 1), (f"пачки по {batch_size}", batch_size)):
+            messages = self._dispatch(printer_ids, size)
+            elapsed = self._sweep(messages, size, concurrency, options)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"  {label}: {len(messages)} сообщений брокера, обход за {elapsed:.2f} c "
+                    f"({fleet / elapsed:.1f} принтеров/сек)"
+                )
+            )
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # ЭМУЛЯЦИЯ
+    # ──────────────────────────────────────────────────────────────────────────────
+
+    def _dispatch(self, printer_ids, batch_size):
+        """Нарезка как в inventory_daemon_task: сообщения, которые ушли бы в брокер."""
+        messages = []
+        for offset in range(0, len(printer_ids), batch_size):
+            chunk = printer_ids[offset : offset + batch_size]
+            messages.append(chunk[0] if batch_size == 1 else chunk)
+        return messages
+
+    def _sweep(self, messages, batch_size, concurrency, options):
+        latency = options["latency"]
+        overhead = options["message_overhead"]
+
+        def fake_poll(printer_id):
+            time.sleep(latency)
+            return {"success": True, "printer_id": printer_id}
+
+        def consume(message):
+            time.sleep(overhead)  # получение/ack сообщения, старт задачи
+            if batch_size == 1:
+                fake_poll(message)
+            else:
+                tasks.run_inventory_batch_task(message)
+
+        start = time.monotonic()
+        with (
+            mock.patch.object(tasks, "_poll_printer_for_daemon", side_effect=fake_poll),
+            override_settings(INVENTORY_BATCH_CONCURRENCY=concurrency),
+            ThreadPoolExecutor(max_workers=options["workers"]) as workers,
+        ):
+            list(workers.map(consume, messages))
+        return time.monotonic() - start
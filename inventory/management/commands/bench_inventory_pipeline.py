@@ -0,0 +1,125 @@
+import os
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from inventory.utils import extract_page_counters, xml_to_json
+from inventory.web_parser import build_inventory_data, export_to_xml
+
+SNMP_FIXTURE = Path(__file__).resolve().parents[2] / "tests" / "fixtures" / "glpi" / "netinventory_kyocera.xml"
+
+WEB_RESULTS = {
+    "serial_number": "BENCH0001",
+    "mac_address": "00:11:22:33:44:55",
+    "counter": "152000",
+    "counter_a4_bw": "120000",
+    "counter_a4_color": "32000",
+    "toner_black": "40",
+    "toner_cyan": "55",
+    "toner_magenta": "60",
+    "toner_yellow": "35",
+    "drum_black": "80",
+}
+
+SNMP_RESULTS = {"serial_number": "BENCH0001", "counter": "152000", "toner_black": "40"}
+
+
+def _xml_to_json_tree(xml_path):
+    """Прежний xml_to_json: ET.parse всего дерева + рекурсия."""
+    root = ET.parse(xml_path).getroot()
+
+    def recurse(elem):
+        d = {}
+        for child in elem:
+            val = recurse(child) if list(child) else (child.text or "")
+            if child.tag in d:
+                d[child.tag] = d[child.tag] + [val] if isinstance(d[child.tag], list) else [d[child.tag], val]
+            else:
+                d[child.tag] = val
+        return d
+
+    return recurse(root)
+
+
+class Command(BaseCommand):
+    help = (
+        "Микробенчмарк обработки результата опроса до извлечения счётчиков: "
+        "SNMP (разбор XML), WEB и HYBRID (прежний XML round-trip через временный файл против прямой структуры)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000, help="Повторов на режим (default: 2000)")
+        parser.add_argument("--xml", help="XML-файл GLPI для SNMP-режима (default: тестовая фикстура)")
+
+    def handle(self, *args, **options):
+        n = options["iterations"]
+        xml_path = options["xml"] or str(SNMP_FIXTURE)
+        printer = SimpleNamespace(
+            model_display="LaserJet M428",
+            serial_number="BENCH0001",
+            mac_address="00:11:22:33:44:55",
+            ip_address="10.0.0.1",
+            device_model=SimpleNamespace(manufacturer=SimpleNamespace(name="HP")),
+        )
+        hybrid_results = {**WEB_RESULTS, **SNMP_RESULTS}
+
+        self.stdout.write(f"\nПовторов на режим: {n}")
+        self._report(
+            "SNMP",
+            n,
+            lambda: extract_page_counters(_xml_to_json_tree(xml_path)),
+            lambda: extract_page_counters(xml_to_json(xml_path)),
+        )
+        old_peak, new_peak = self._peak(_xml_to_json_tree, xml_path), self._peak(xml_to_json, xml_path)
+        self.stdout.write(
+            f"  SNMP, пик памяти на {os.path.getsize(xml_path) / 1024:.0f} КБ XML: "
+            f"было {old_peak / 1024:.0f} КБ, стало {new_peak / 1024:.0f} КБ"
+        )
+        for mode, results in (("WEB", WEB_RESULTS), ("HYBRID", hybrid_results)):
+            self._report(
+                mode,
+                n,
+                lambda r=results: extract_page_counters(self._round_trip(printer, r)),
+                lambda r=results: extract_page_counters(build_inventory_data(printer, r)),
+            )
+
+    def _round_trip(self, printer, results):
+        """Как было в опросе: export_to_xml → временный файл → xml_to_json."""
+        xml_content = export_to_xml(printer, results)
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".xml", delete=False, encoding="utf-8") as f:
+            f.write(xml_content)
+        try:
+            return xml_to_json(f.name)
+        finally:
+            os.unlink(f.name)
+
+    def _report(self, mode, n, before, after):
+        old, new = self._time(before, n), self._time(after, n)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  {mode}: было {old * 1e6 / n:.1f} мкс/опрос, стало {new * 1e6 / n:.1f} мкс/опрос "
+                f"(×{old / new:.1f})"
+            )
+        )
+
+    @staticmethod
+    def _peak(fn, *args):
+        tracemalloc.start()
+        try:
+            fn(*args)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    @staticmethod
+    def _time(fn, n):
+        fn()  # прогрев
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return time.perf_counter() - start
@@ -0,0 +1,118 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import Printer
+from inventory.snmp_native import PysnmpClient, SnmprecClient, collect_snmp_data_many
+
+# Минимальный набор данных для режима --simulate (формат snmpsim .snmprec)
+DEFAULT_SNMPREC = """
+1.3.6.1.2.1.1.1.0|4|Simulated printer
+1.3.6.1.2.1.1.5.0|4|SIM-PRN
+1.3.6.1.2.1.2.2.1.2.1|4|Ethernet
+1.3.6.1.2.1.2.2.1.6.1|4x|0017c8000001
+1.3.6.1.2.1.25.3.2.1.3.1|4|SIM P3045dn
+1.3.6.1.2.1.43.5.1.1.17.1|4|SIM0000001
+1.3.6.1.2.1.43.10.2.1.4.1.1|65|100000
+1.3.6.1.2.1.43.11.1.1.6.1.1|4|Black Toner
+1.3.6.1.2.1.43.11.1.1.8.1.1|2|100
+1.3.6.1.2.1.43.11.1.1.9.1.1|2|42
+"""
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк SNMP опроса: встроенный asyncio движок против glpi-netdiscovery (устройств/сек)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--printers", nargs="+", type=int, help="ID принтеров для реального опроса")
+        parser.add_argument("--all", action="store_true", help="Опросить все принтеры с SNMP")
+        parser.add_argument("--simulate", type=int, default=0, help="Число симулируемых устройств (без сети)")
+        parser.add_argument("--snmprec", help="Файл .snmprec для симуляции (по умолчанию встроенный набор)")
+        parser.add_argument(
+            "--latency", type=float, default=0.05, help="Задержка ответа симулятора на запрос, сек (default: 0.05)"
+        )
+        parser.add_argument("--concurrency", type=int, help="Параллелизм (default: SNMP_NATIVE_CONCURRENCY)")
+        parser.add_argument(
+            "--glpi-sample",
+            type=int,
+            default=0,
+            help="Сколько принтеров опросить через GLPI для сравнения (последовательно, как в воркере)",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"] or getattr(settings, "SNMP_NATIVE_CONCURRENCY", 100)
+
+        if options["simulate"]:
+            self._bench_simulated(options["simulate"], options["snmprec"], options["latency"], concurrency)
+            return
+
+        qs = Printer.objects.filter(polling_method__in=["SNMP", "HYBRID"])
+        if options["printers"]:
+            qs = qs.filter(id__in=options["printers"])
+        elif not options["all"]:
+            raise CommandError("Укажите --printers, --all или --simulate N")
+
+        printers = list(qs.only("id", "ip_address", "snmp_community"))
+        if not printers:
+            raise CommandError("Нет принтеров для опроса")
+
+        self._bench_native(printers, concurrency)
+        if options["glpi_sample"]:
+            self._bench_glpi(printers[: options["glpi_sample"]])
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # РЕЖИМЫ
+    # ──────────────────────────────────────────────────────────────────────────────
+
+    def _bench_simulated(self, count, snmprec_path, latency, concurrency):
+        text = DEFAULT_SNMPREC
+        if snmprec_path:
+            with open(snmprec_path, encoding="utf-8") as fh:
+                text = fh.read()
+
+        client = SnmprecClient({"public": text}, latency=latency)
+        targets = [(f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", "public") for i in range(count)]
+
+        self.stdout.write(
+            f"\nСимуляция: {count} устройств, задержка {latency * 1000:.0f} мс, параллелизм {concurrency}"
+        )
+        self._report("native (asyncio)", targets, lambda: collect_snmp_data_many(targets, client, concurrency))
+
+        serial_estimate = count * latency * 6  # get + 5 walk на устройство без параллелизма
+        self.stdout.write(f"  Оценка последовательного опроса: {serial_estimate:.1f} c")
+
+    def _bench_native(self, printers, concurrency):
+        client = PysnmpClient()
+        targets = [(p.ip_address, p.snmp_community or "public") for p in printers]
+
+        self.stdout.write(f"\nВстроенный движок: {len(targets)} устройств, параллелизм {concurrency}")
+        self._report("native (asyncio)", targets, lambda: collect_snmp_data_many(targets, client, concurrency))
+
+    def _bench_glpi(self, printers):
+        from inventory.services import _run_snmp_inventory
+
+        self.stdout.write(f"\nGLPI netdiscovery: {len(printers)} устройств (последовательно)")
+        start = time.monotonic()
+        ok_count = 0
+        for printer in printers:
+            ok, _, _ = _run_snmp_inventory(printer)
+            ok_count += int(ok)
+        self._write_result("glpi (subprocess)", len(printers), ok_count, time.monotonic() - start)
+
+    # ──────────────────────────────────────────────────────────────────────────────
+    # ВЫВОД
+    # ──────────────────────────────────────────────────────────────────────────────
+
+    def _report(self, label, targets, run):
+        start = time.monotonic()
+        results = run()
+        elapsed = time.monotonic() - start
+        ok_count = sum(1 for ok, _, _ in results.values() if ok)
+        self._write_result(label, len(targets), ok_count, elapsed)
+
+    def _write_result(self, label, total, ok_count, elapsed):
+        rate = total / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(f"  {label}: {ok_count}/{total} успешно за {elapsed:.2f} c — {rate:.1f} устройств/сек")
+        )
@@ -0,0 +1,107 @@
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.ws_broadcast import GROUP, BroadcastAggregator, LocalBuffer, org_group
+
+# channels_redis на один group_send: ZREMRANGEBYSCORE + ZRANGE участников группы + EVAL на шард
+REDIS_COMMANDS_PER_GROUP_SEND = 3
+# Общий буфер: HSET + SET NX на событие, HGETALL + DEL на окно
+REDIS_COMMANDS_PER_EVENT = 2
+REDIS_COMMANDS_PER_DRAIN = 2
+
+
+class CountingLayer:
+    """Канальный слой-счётчик: сколько group_send ушло в каждую группу."""
+
+    def __init__(self):
+        self.sends = Counter()
+
+    async def group_send(self, group, message):
+        self.sends[group] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест WebSocket-рассылки во время обхода парка: кадры на клиента и операции "
+        "канального слоя (Redis) для отдельных событий и пачек ws_broadcast. Время виртуальное, сеть не нужна"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--printers", type=int, default=2000, help="Принтеров в обходе (default: 2000)")
+        parser.add_argument("--organizations", type=int, default=20, help="Организаций (default: 20)")
+        parser.add_argument("--workers", type=int, default=8, help="Процессов воркера (default: 8)")
+        parser.add_argument("--sweep-seconds", type=float, default=600, help="Длительность обхода, сек")
+        parser.add_argument("--poll-seconds", type=float, default=2, help="От inventory_start до результата, сек")
+        parser.add_argument("--interval-ms", type=int, help="Окно пачки (default: WS_BROADCAST_INTERVAL_MS)")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        interval = options["interval_ms"] or getattr(settings, "WS_BROADCAST_INTERVAL_MS", 300) or 300
+        streams = self._sweep(options)
+
+        self.stdout.write(
+            f"\nОбход: {options['printers']} принтеров, {options['organizations']} организаций, "
+            f"{options['workers']} процессов, {options['sweep_seconds']:.0f} c"
+        )
+        shared = [sorted((item for stream in streams for item in stream), key=lambda item: item[0])]
+        events = len(shared[0])
+        for label, replay_streams, interval_ms, in_redis in (
+            ("по событию", streams, 0, False),
+            (f"пачки по {interval} мс, буфер процесса", streams, interval, False),
+            (f"пачки по {interval} мс, общий буфер Redis", shared, interval, True),
+        ):
+            sends = self._replay(replay_streams, interval_ms)
+            total = sum(sends.values())
+            redis_commands = total * REDIS_COMMANDS_PER_GROUP_SEND
+            if in_redis:
+                redis_commands += events * REDIS_COMMANDS_PER_EVENT + sends[GROUP] * REDIS_COMMANDS_PER_DRAIN
+            org_frames = [sends[org_group(org)] for org in range(options["organizations"])]
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"  {label}: кадров клиенту без фильтра {sends[GROUP]}, клиенту организации "
+                    f"~{sum(org_frames) / len(org_frames):.0f}; group_send {total}, "
+                    f"≈{redis_commands} команд Redis"
+                )
+            )
+
+    def _sweep(self, options):
+        """События опроса по процессам: [(время, событие, организация), ...] в порядке времени."""
+        rnd = random.Random(options["seed"])
+        streams = [[] for _ in range(options["workers"])]
+        for printer_id in range(1, options["printers"] + 1):
+            org_id = printer_id % options["organizations"]
+            started = rnd.uniform(0, options["sweep_seconds"])
+            stream = streams[printer_id % options["workers"]]
+            stream.append((started, {"type": "inventory_start", "printer_id": printer_id}, org_id))
+            stream.append(
+                (
+                    started + rnd.uniform(0.1, options["poll_seconds"]),
+                    {"type": "inventory_update", "printer_id": printer_id, "status": "SUCCESS"},
+                    org_id,
+                )
+            )
+        return [sorted(stream, key=lambda item: item[0]) for stream in streams]
+
+    def _replay(self, streams, interval_ms):
+        """
+        Прогоняет события через агрегатор по виртуальным часам: поток на процесс
+        (буфер процесса) или один слитый поток (общий буфер — одно окно на всех).
+        """
+        layer = CountingLayer()
+        for stream in streams:
+            # Таймер агрегатора заменён явным flush по виртуальному времени; общий Redis
+            # моделируется одним буфером на слитый поток, настоящий Redis не трогаем
+            aggregator = BroadcastAggregator(interval_ms=interval_ms and 10**9, layer=layer, buffer=LocalBuffer())
+            deadline = None
+            for at, event, org_id in stream:
+                if deadline is not None and at >= deadline:
+                    aggregator.flush()
+                    deadline = None
+                aggregator.publish(event, org_id)
+                if interval_ms and deadline is None:
+                    deadline = at + interval_ms / 1000
+            aggregator.flush()
+        return layer.sends
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.latest_state import find_inconsistencies, rebuild_latest_state
+
+
+class Command(BaseCommand):
+    help = """
+    Сверяет PrinterLatestState с историей задач и показывает расхождения.
+
+    Примеры использования:
+    python manage.py check_latest_state
+    python manage.py check_latest_state --fix
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--printer-id", type=int, action="append", help="Только указанные принтеры")
+        parser.add_argument("--fix", action="store_true", help="Пересчитать состояние расходящихся принтеров")
+        parser.add_argument("--limit", type=int, default=50, help="Сколько расхождений вывести")
+
+    def handle(self, *args, **options):
+        problems = find_inconsistencies(options["printer_id"])
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("✓ PrinterLatestState согласован с историей задач"))
+            return
+
+        printer_ids = sorted({p["printer_id"] for p in problems})
+        self.stdout.write(self.style.WARNING(f"Расхождений: {len(problems)} (принтеров: {len(printer_ids)})"))
+        for p in problems[: options["limit"]]:
+            self.stdout.write(
+                f"  - printer {p['printer_id']}: {p['field']} ожидалось {p['expected']}, в таблице {p['actual']}"
+            )
+        if len(problems) > options["limit"]:
+            self.stdout.write(f"  ... и ещё {len(problems) - options['limit']}")
+
+        if not options["fix"]:
+            raise CommandError("PrinterLatestState расходится с историей задач (запустите с --fix)")
+
+        rebuild_latest_state(printer_ids)
+        self.stdout.write(self.style.SUCCESS(f"✓ Пересчитано принтеров: {len(printer_ids)}"))
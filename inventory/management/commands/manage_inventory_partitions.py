@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.partitions import (
+    PARTITIONED_TABLES,
+    compact_partitions,
+    ensure_partitions,
+    history_cutoff,
+    is_partitioned,
+    list_partitions,
+    partitions_ahead,
+)
+
+
+class Command(BaseCommand):
+    help = """
+    Обслуживание помесячных секций истории опросов (InventoryTask, PageCounter) на PostgreSQL.
+
+    Создаёт секции на месяцы вперёд и сжимает секции, целиком ушедшие за границу полной
+    истории (INVENTORY_FULL_HISTORY_DAYS): остаётся последняя задача на принтер за день,
+    секция подменяется целиком. То же делает ежедневная задача cleanup_old_inventory_data.
+
+    Примеры использования:
+    python manage.py manage_inventory_partitions --list
+    python manage.py manage_inventory_partitions --ahead 6
+    python manage.py manage_inventory_partitions --no-compact
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--list", action="store_true", help="Только показать секции")
+        parser.add_argument(
+            "--ahead", type=int, default=None, help="Месяцев вперёд (default: INVENTORY_PARTITIONS_AHEAD)"
+        )
+        parser.add_argument("--no-compact", action="store_true", help="Не сжимать старые секции")
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError("История опросов не секционирована (нужен PostgreSQL и миграция inventory 0029)")
+
+        if not options["list"]:
+            ahead = partitions_ahead() if options["ahead"] is None else options["ahead"]
+            created = ensure_partitions(ahead)
+            self.stdout.write(f"Создано секций: {len(created)}")
+            for name in created:
+                self.stdout.write(f"  + {name}")
+
+            if not options["no_compact"]:
+                cutoff = history_cutoff()
+                self.stdout.write(f"Сжатие секций до {cutoff:%Y-%m-%d %H:%M}...")
+                result = compact_partitions(cutoff)
+                self.stdout.write(
+                    self.style.SUCCESS(f"✓ Задач удалено: {result['deleted']:,}, оставлено: {result['kept']:,}")
+                )
+
+        for table, _ in PARTITIONED_TABLES:
+            self.stdout.write(f"\n{table}:")
+            for part in list_partitions(table):
+                mark = " (сжата)" if part.compacted else ""
+                self.stdout.write(f"  {part.name}: {part.bound}{mark}")
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-16 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0022_add_hybrid_polling_method"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="printer",
+            name="snmp_backend",
+            field=models.CharField(
+                choices=[("GLPI", "GLPI Agent (glpi-netdiscovery)"), ("NATIVE", "Встроенный (asyncio SNMP)")],
+                default="GLPI",
+                help_text="GLPI — запуск glpi-netdiscovery, NATIVE — встроенный опрос без подпроцесса",
+                max_length=10,
+                verbose_name="Движок SNMP",
+            ),
+        ),
+    ]
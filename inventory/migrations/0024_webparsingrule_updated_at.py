@@ -0,0 +1,20 @@
+# Generated by Django 5.2.11 on 2026-10-16 11:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0023_printer_snmp_backend"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webparsingrule",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name="Дата изменения"),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-16 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0024_webparsingrule_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="printer",
+            name="next_poll_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Демон ставит принтер в очередь, когда наступает это время. Пусто — опрашивать сразу",
+                null=True,
+                verbose_name="Следующий опрос",
+            ),
+        ),
+        migrations.AddField(
+            model_name="printer",
+            name="poll_failure_streak",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Растёт после каждого FAILED, сбрасывается при ответе",
+                verbose_name="Неудачных опросов подряд",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="printer",
+            index=models.Index(fields=["next_poll_at"], name="inv_printer_next_poll_idx"),
+        ),
+    ]
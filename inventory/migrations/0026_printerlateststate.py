@@ -0,0 +1,121 @@
+"""PrinterLatestState — одна строка на принтер с последней задачей и последним успешным опросом.
+
+Начальное заполнение — из истории задач (то же, что делает backfill_latest_state).
+Дальше таблицу поддерживают сигналы inventory/latest_state.py.
+"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_latest_state(apps, schema_editor):
+    Printer = apps.get_model("inventory", "Printer")
+    InventoryTask = apps.get_model("inventory", "InventoryTask")
+    PageCounter = apps.get_model("inventory", "PageCounter")
+    PrinterLatestState = apps.get_model("inventory", "PrinterLatestState")
+
+    def latest(**filters):
+        return Subquery(
+            InventoryTask.objects.filter(printer_id=OuterRef("pk"), **filters)
+            .order_by("-task_timestamp", "-id")
+            .values("id")[:1]
+        )
+
+    rows = list(
+        Printer.objects.annotate(last_id=latest(), success_id=latest(status="SUCCESS"))
+        .filter(last_id__isnull=False)
+        .values_list("pk", "last_id", "success_id")
+    )
+    for start in range(0, len(rows), 1000):
+        chunk = rows[start : start + 1000]
+        task_ids = {tid for _, last_id, success_id in chunk for tid in (last_id, success_id) if tid}
+        timestamps = dict(InventoryTask.objects.filter(pk__in=task_ids).values_list("pk", "task_timestamp"))
+        counters = dict(
+            PageCounter.objects.filter(task_id__in=[s for _, _, s in chunk if s])
+            .order_by("id")
+            .values_list("task_id", "id")
+        )
+        PrinterLatestState.objects.bulk_create(
+            [
+                PrinterLatestState(
+                    printer_id=printer_id,
+                    last_task_id=last_id,
+                    last_task_at=timestamps.get(last_id),
+                    success_task_id=success_id,
+                    success_at=timestamps.get(success_id),
+                    counter_id=counters.get(success_id),
+                )
+                for printer_id, last_id, success_id in chunk
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0025_printer_poll_schedule"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrinterLatestState",
+            fields=[
+                (
+                    "printer",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="latest_state",
+                        serialize=False,
+                        to="inventory.printer",
+                        verbose_name="Принтер",
+                    ),
+                ),
+                ("last_task_at", models.DateTimeField(blank=True, null=True, verbose_name="Время последней задачи")),
+                (
+                    "success_at",
+                    models.DateTimeField(blank=True, db_index=True, null=True, verbose_name="Время успешного опроса"),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="Обновлено")),
+                (
+                    "counter",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="inventory.pagecounter",
+                        verbose_name="Счётчики успешного опроса",
+                    ),
+                ),
+                (
+                    "last_task",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="inventory.inventorytask",
+                        verbose_name="Последняя задача",
+                    ),
+                ),
+                (
+                    "success_task",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="inventory.inventorytask",
+                        verbose_name="Последний успешный опрос",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Последнее состояние принтера",
+                "verbose_name_plural": "Последние состояния принтеров",
+            },
+        ),
+        migrations.RunPython(fill_latest_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0026_printerlateststate'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventorytask',
+            name='inv_task_printer_status_ts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='inventorytask',
+            index=models.Index(fields=['printer', 'status', 'task_timestamp'], include=('id',), name='inv_task_printer_ok_ts_idx'),
+        ),
+    ]
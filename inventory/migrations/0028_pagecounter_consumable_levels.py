@@ -0,0 +1,124 @@
+"""Числовые уровни расходников в PageCounter (inventory/consumables.py).
+
+Здесь заполняются только счётчики из PrinterLatestState — их читает дашборд;
+остальная история — manage.py backfill_consumable_levels.
+"""
+
+from django.db import migrations, models
+
+from inventory.consumables import level_columns, level_values
+
+
+def fill_latest_levels(apps, schema_editor):
+    PageCounter = apps.get_model('inventory', 'PageCounter')
+    PrinterLatestState = apps.get_model('inventory', 'PrinterLatestState')
+
+    counter_ids = list(
+        PrinterLatestState.objects.filter(counter__isnull=False).order_by('counter_id').values_list('counter_id', flat=True)
+    )
+    for start in range(0, len(counter_ids), 1000):
+        counters = list(PageCounter.objects.filter(pk__in=counter_ids[start:start + 1000]))
+        for counter in counters:
+            for column, value in level_values(counter).items():
+                setattr(counter, column, value)
+        PageCounter.objects.bulk_update(counters, level_columns())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0027_inventorytask_covering_printer_status_ts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_black_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='DRUMBLACK, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_black_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='DRUMBLACK, статус'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_cyan_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='DRUMCYAN, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_cyan_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='DRUMCYAN, статус'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_magenta_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='DRUMMAGENTA, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_magenta_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='DRUMMAGENTA, статус'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_yellow_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='DRUMYELLOW, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='drum_yellow_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='DRUMYELLOW, статус'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='min_level_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Минимальный уровень, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_black_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='TONERBLACK, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_black_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='TONERBLACK, статус'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_cyan_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='TONERCYAN, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_cyan_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='TONERCYAN, статус'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_magenta_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='TONERMAGENTA, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_magenta_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='TONERMAGENTA, статус'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_yellow_pct',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='TONERYELLOW, %'),
+        ),
+        migrations.AddField(
+            model_name='pagecounter',
+            name='toner_yellow_state',
+            field=models.CharField(blank=True, choices=[('OK', 'В норме'), ('LOW', 'Заканчивается'), ('EMPTY', 'Закончился')], max_length=10, verbose_name='TONERYELLOW, статус'),
+        ),
+        migrations.AddIndex(
+            model_name='pagecounter',
+            index=models.Index(condition=models.Q(('min_level_pct__lt', 30)), fields=['min_level_pct'], name='inv_counter_low_level_idx'),
+        ),
+        migrations.RunPython(fill_latest_levels, migrations.RunPython.noop),
+    ]
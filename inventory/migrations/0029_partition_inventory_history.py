@@ -0,0 +1,67 @@
+"""Помесячное секционирование InventoryTask и PageCounter на PostgreSQL (inventory/partitions.py).
+
+Существующие таблицы не копируются: каждая становится секцией <таблица>_p_legacy
+новой секционированной таблицы. Внешние ключи на эти таблицы снимаются в БД
+(db_constraint=False) — первичный ключ секционированной таблицы включает время.
+На SQLite меняются только внешние ключи. Откат копирует таблицы обратно в
+обычные (unpartition_table) — на большой истории это долго.
+"""
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from inventory.partitions import (
+    PARTITIONED_TABLES,
+    ensure_partitions,
+    is_partitioned,
+    partition_table,
+    unpartition_table,
+)
+
+
+def partition_history(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, key in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            partition_table(schema_editor, table, key)
+    ensure_partitions()
+
+
+def unpartition_history(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, _ in PARTITIONED_TABLES:
+        if is_partitioned(table):
+            unpartition_table(schema_editor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0028_pagecounter_consumable_levels'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pagecounter',
+            name='task',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='inventory.inventorytask', verbose_name='Задача'),
+        ),
+        migrations.AlterField(
+            model_name='printerlateststate',
+            name='counter',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.pagecounter', verbose_name='Счётчики успешного опроса'),
+        ),
+        migrations.AlterField(
+            model_name='printerlateststate',
+            name='last_task',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.inventorytask', verbose_name='Последняя задача'),
+        ),
+        migrations.AlterField(
+            model_name='printerlateststate',
+            name='success_task',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.inventorytask', verbose_name='Последний успешный опрос'),
+        ),
+        migrations.RunPython(partition_history, unpartition_history),
+    ]
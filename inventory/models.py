@@ -2,6 +2,8 @@ from django.db import models
 from django.db.models import Q
 from django.db.models.functions import Lower
 
+from .consumables import LEVEL_FIELDS, LOW_LEVEL_INDEX_PCT, ConsumableState, level_columns, level_values
+
 
 class MatchRule(models.TextChoices):
     SN_MAC = "SN_MAC", "Серийник + MAC"
@@ -37,6 +39,11 @@ class PollingMethod(models.TextChoices):
     HYBRID = "HYBRID", "Совмещённый (SNMP + Web)"
 
 
+class SnmpBackend(models.TextChoices):
+    GLPI = "GLPI", "GLPI Agent (glpi-netdiscovery)"
+    NATIVE = "NATIVE", "Встроенный (asyncio SNMP)"
+
+
 class ConnectionType(models.TextChoices):
     NETWORK = "NETWORK", "Сетевой"
     USB = "USB", "USB"
@@ -99,6 +106,14 @@ class Printer(models.Model):
         max_length=10, choices=PollingMethod.choices, default=PollingMethod.SNMP, verbose_name="Метод опроса"
     )
 
+    snmp_backend = models.CharField(
+        max_length=10,
+        choices=SnmpBackend.choices,
+        default=SnmpBackend.GLPI,
+        verbose_name="Движок SNMP",
+        help_text="GLPI — запуск glpi-netdiscovery, NATIVE — встроенный опрос без подпроцесса",
+    )
+
     connection_type = models.CharField(
         max_length=10,
         choices=ConnectionType.choices,
@@ -147,6 +162,17 @@ class Printer(models.Model):
         help_text="Принтер, который заменил данный",
     )
 
+    # Адаптивное расписание опроса (inventory/scheduling.py)
+    next_poll_at = models.DateTimeField(
+        "Следующий опрос",
+        null=True,
+        blank=True,
+        help_text="Демон ставит принтер в очередь, когда наступает это время. Пусто — опрашивать сразу",
+    )
+    poll_failure_streak = models.PositiveIntegerField(
+        "Неудачных опросов подряд", default=0, help_text="Растёт после каждого FAILED, сбрасывается при ответе"
+    )
+
     class Meta:
         verbose_name = "Принтер"
         verbose_name_plural = "Принтеры"
@@ -162,6 +188,7 @@ class Printer(models.Model):
             models.Index(fields=["last_match_rule", "ip_address"], name="inv_printer_rule_ip_idx"),
             models.Index(fields=["device_model", "ip_address"], name="inv_printer_devmodel_ip_idx"),
             models.Index(fields=["is_active", "ip_address"], name="inv_printer_active_ip_idx"),
+            models.Index(fields=["next_poll_at"], name="inv_printer_next_poll_idx"),
         ]
         constraints = [
             # IP-адрес уникален только среди АКТИВНЫХ СЕТЕВЫХ принтеров
@@ -245,7 +272,11 @@ class InventoryTask(models.Model):
             models.Index(fields=["task_timestamp"]),
             models.Index(fields=["printer", "task_timestamp"]),
             models.Index(fields=["status", "task_timestamp"]),
-            models.Index(fields=["printer", "status", "-task_timestamp"], name="inv_task_printer_status_ts_idx"),
+            # Покрывающий: первый/последний успешный опрос принтера в окне (monthly_report inventory_batch)
+            # читается из индекса без обращения к таблице; обратный проход — для «последнего»
+            models.Index(
+                fields=["printer", "status", "task_timestamp"], include=["id"], name="inv_task_printer_ok_ts_idx"
+            ),
             models.Index(fields=["data_source"], name="inv_task_data_source_idx"),
         ]
 
@@ -256,7 +287,11 @@ class InventoryTask(models.Model):
 class PageCounter(models.Model):
     """Счётчики страниц и уровни расходников (тонер/драм/статусы)."""
 
-    task = models.ForeignKey(InventoryTask, on_delete=models.CASCADE, verbose_name="Задача", db_index=True)
+    # Без FK-ограничения в БД: на PostgreSQL InventoryTask секционирована (inventory/partitions.py)
+    # и её первичный ключ — (id, task_timestamp); каскадное удаление делает ORM
+    task = models.ForeignKey(
+        InventoryTask, on_delete=models.CASCADE, db_constraint=False, verbose_name="Задача", db_index=True
+    )
     bw_a3 = models.IntegerField(null=True, blank=True, db_index=True, verbose_name="ЧБ A3")
     bw_a4 = models.IntegerField(null=True, blank=True, db_index=True, verbose_name="ЧБ A4")
     color_a3 = models.IntegerField(null=True, blank=True, db_index=True, verbose_name="Цвет A3")
@@ -279,6 +314,40 @@ class PageCounter(models.Model):
     waste_toner = models.CharField(
         max_length=20, choices=[("OK", "OK"), ("WARNING", "WARNING")], blank=True, verbose_name="WASTETONER"
     )
+    # Уровни в числовом виде — заполняются в save() из строк выше (inventory/consumables.py)
+    toner_black_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="TONERBLACK, %")
+    toner_black_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="TONERBLACK, статус"
+    )
+    toner_cyan_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="TONERCYAN, %")
+    toner_cyan_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="TONERCYAN, статус"
+    )
+    toner_magenta_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="TONERMAGENTA, %")
+    toner_magenta_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="TONERMAGENTA, статус"
+    )
+    toner_yellow_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="TONERYELLOW, %")
+    toner_yellow_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="TONERYELLOW, статус"
+    )
+    drum_black_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="DRUMBLACK, %")
+    drum_black_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="DRUMBLACK, статус"
+    )
+    drum_cyan_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="DRUMCYAN, %")
+    drum_cyan_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="DRUMCYAN, статус"
+    )
+    drum_magenta_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="DRUMMAGENTA, %")
+    drum_magenta_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="DRUMMAGENTA, статус"
+    )
+    drum_yellow_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="DRUMYELLOW, %")
+    drum_yellow_state = models.CharField(
+        max_length=10, choices=ConsumableState.choices, blank=True, verbose_name="DRUMYELLOW, статус"
+    )
+    min_level_pct = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Минимальный уровень, %")
     recorded_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Время записи")
 
     class Meta:
@@ -288,11 +357,79 @@ class PageCounter(models.Model):
             models.Index(fields=["task"]),
             models.Index(fields=["total_pages"]),
             models.Index(fields=["recorded_at"]),
+            # «Расходник ниже X%» при X <= LOW_LEVEL_INDEX_PCT; счётчики с полными картриджами в индекс не попадают
+            models.Index(
+                fields=["min_level_pct"],
+                condition=Q(min_level_pct__lt=LOW_LEVEL_INDEX_PCT),
+                name="inv_counter_low_level_idx",
+            ),
         ]
 
     def __str__(self):
         return f"{self.task.printer.ip_address}: {self.total_pages} стр. @ {self.recorded_at}"
 
+    def fill_levels(self):
+        """Пересчитать числовые уровни из строковых полей (для bulk_create/bulk_update)."""
+        for column, value in level_values(self).items():
+            setattr(self, column, value)
+
+    def save(self, *args, **kwargs):
+        self.fill_levels()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & set(LEVEL_FIELDS):
+            kwargs["update_fields"] = set(update_fields) | set(level_columns())
+        super().save(*args, **kwargs)
+
+
+class PrinterLatestState(models.Model):
+    """
+    Последнее состояние принтера: последняя задача опроса и последний успешный
+    опрос со счётчиками. Одна строка на принтер, обновляется сигналами при
+    записи InventoryTask/PageCounter (inventory/latest_state.py).
+    """
+
+    printer = models.OneToOneField(
+        Printer, on_delete=models.CASCADE, primary_key=True, related_name="latest_state", verbose_name="Принтер"
+    )
+    # FK без ограничения в БД — ссылки на секционированные таблицы (см. PageCounter.task)
+    last_task = models.ForeignKey(
+        InventoryTask,
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Последняя задача",
+    )
+    last_task_at = models.DateTimeField(null=True, blank=True, verbose_name="Время последней задачи")
+    success_task = models.ForeignKey(
+        InventoryTask,
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Последний успешный опрос",
+    )
+    success_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="Время успешного опроса")
+    counter = models.ForeignKey(
+        PageCounter,
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Счётчики успешного опроса",
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Последнее состояние принтера"
+        verbose_name_plural = "Последние состояния принтеров"
+
+    def __str__(self):
+        return f"{self.printer_id}: {self.success_at or '—'}"
+
 
 class InventoryAccess(models.Model):
     class Meta:
@@ -375,6 +512,7 @@ class WebParsingRule(models.Model):
         blank=True, verbose_name="Цепочка действий", help_text="JSON список действий перед парсингом"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     class Meta:
         verbose_name = "Правило веб-парсинга"
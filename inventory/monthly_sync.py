@@ -0,0 +1,275 @@
+# inventory/monthly_sync.py
+"""
+Отложенная синхронизация результатов опроса с месячными отчётами.
+
+Раньше sync_to_monthly_reports() на каждый успешный опрос делал два запроса
+к MonthControl, поиск MonthlyReport по серийнику, save + recompute_group +
+refresh_from_db на каждую изменённую запись и group_send — во время часового
+обхода тысячи мелких транзакций на самой горячей таблице.
+
+Теперь опрос только записывает «у принтера новые счётчики» в хеш Redis кэша
+MONTHLY_SYNC_CACHE_ALIAS (по принтеру остаётся последний опрос), а задача
+flush_monthly_sync_task раз в MONTHLY_SYNC_MAX_STALENESS секунд читает хеш
+целиком и применяет всё накопленное одним проходом на месяц:
+
+    - открытые месяцы и записи отчётов — по одному запросу на всю пачку;
+    - поля счётчиков — bulk_update, total_prints — recompute_serials;
+    - одно сообщение inventory_sync_update со списком reports на группу месяца.
+
+Поля хеша удаляются только после коммита (HDEL, если значение не сменил более
+свежий опрос) — при ошибке применения опросы остаются до следующего flush().
+
+Без Redis (LocMem в тестах/разработке) или при MONTHLY_SYNC_MAX_STALENESS = 0
+опрос применяется сразу тем же кодом, как раньше.
+"""
+
+import json
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "inventory:monthly_sync:pending"
+
+# printer_id -> {"serial": ..., "counters": {...}, "polled_at": datetime}
+Pending = Dict[int, dict]
+
+# Удаляет поля хеша, значения которых не изменились с чтения: ARGV = поле, значение, ...
+_ACK_SCRIPT = """
+local removed = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        removed = removed + redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+
+
+def max_staleness() -> int:
+    return getattr(settings, "MONTHLY_SYNC_MAX_STALENESS", 60)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Накопитель
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+class RedisPending:
+    """Хеш printer_id -> последний опрос, общий для всех процессов."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def put(self, printer_id: int, entry: dict) -> None:
+        self._client.hset(PENDING_KEY, printer_id, json.dumps(entry, default=str))
+
+    def read(self) -> Tuple[Pending, Dict[bytes, bytes]]:
+        """Returns: (опросы, сырые поля хеша для ack())."""
+        raw = self._client.hgetall(PENDING_KEY)
+
+        pending = {}
+        for printer_id, value in raw.items():
+            entry = json.loads(value)
+            entry["polled_at"] = datetime.fromisoformat(entry["polled_at"])
+            pending[int(printer_id)] = entry
+        return pending, raw
+
+    def ack(self, raw: Dict[bytes, bytes]) -> None:
+        """Удаляет применённые опросы; поле, перезаписанное новым опросом, остаётся."""
+        if not raw:
+            return
+        args = [part for item in raw.items() for part in item]
+        self._client.eval(_ACK_SCRIPT, 1, PENDING_KEY, *args)
+
+
+def _redis_pending() -> Optional[RedisPending]:
+    alias = getattr(settings, "MONTHLY_SYNC_CACHE_ALIAS", "inventory")
+    if not alias:
+        return None
+    try:
+        from django_redis import get_redis_connection
+
+        return RedisPending(get_redis_connection(alias))
+    except Exception:
+        # Кэш не Redis — применяем опросы сразу
+        return None
+
+
+def record(printer, counters: dict, immediate: bool = False) -> None:
+    """
+    Запоминает новые счётчики принтера для ближайшего flush().
+
+    immediate=True (ручной опрос) — применяет сразу, не дожидаясь пачки.
+    """
+    if not printer.serial_number:
+        logger.debug("monthly_sync: принтер без serial_number, пропускаем")
+        return
+
+    entry = {"serial": printer.serial_number, "counters": counters, "polled_at": timezone.now()}
+    pending = None if immediate or max_staleness() <= 0 else _redis_pending()
+    if pending is not None:
+        try:
+            pending.put(printer.id, entry)
+            return
+        except Exception as e:
+            logger.warning(f"monthly_sync: буфер недоступен, применяем опрос принтера {printer.id} сразу: {e}")
+
+    apply_pending({printer.id: entry})
+
+
+def flush() -> int:
+    """
+    Применяет все накопленные опросы. Returns: количество обновлённых записей отчётов.
+
+    Если apply_pending() упал, опросы остаются в хеше: следующий flush() применит
+    их снова (уже применённые месяцы повторно не меняются — значения те же).
+    """
+    pending = _redis_pending()
+    if pending is None:
+        return 0
+    entries, raw = pending.read()
+    if not entries:
+        return 0
+    updated = apply_pending(entries)
+    pending.ack(raw)
+    return updated
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Применение пачки
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def apply_pending(entries: Pending) -> int:
+    """
+    Обновляет записи MonthlyReport в открытых месяцах с автосинхронизацией.
+
+    Правила те же, что у ручной синхронизации (_assign_autofields): поля с ручной
+    правкой не трогаем, в группе дублей первая строка получает A4, остальные — A3.
+    Опрос старше inventory_last_ok записи (запись уже обновил более свежий опрос)
+    пропускается.
+
+    Returns:
+        Количество записей, у которых изменились счётчики.
+    """
+    from monthly_report.models import MonthControl, MonthlyReport
+    from monthly_report.services import excel_export, month_metrics, recompute_serials
+    from monthly_report.services.duplicate_index import get_duplicate_index
+    from monthly_report.services_inventory_sync import _assign_autofields
+
+    editable_months = list(
+        MonthControl.objects.filter(edit_until__gt=timezone.now(), auto_sync_enabled=True).values_list(
+            "month", flat=True
+        )
+    )
+    if not editable_months:
+        logger.info("monthly_sync: нет открытых месяцев с включенной автосинхронизацией")
+        return 0
+
+    # Два принтера с одним серийником — берём более свежий опрос
+    by_serial = {}
+    for entry in sorted(entries.values(), key=lambda e: e["polled_at"]):
+        by_serial[entry["serial"]] = entry
+
+    reports = list(MonthlyReport.objects.filter(serial_number__in=by_serial, month__in=editable_months))
+    if not reports:
+        return 0
+
+    # Позиции в группах дублей — из индекса месяца
+    duplicate_index = {month: get_duplicate_index(month) for month in {report.month for report in reports}}
+    dup_position = {}
+    for report in reports:
+        dup = duplicate_index[report.month].lookup(report.id)
+        if dup:
+            dup_position[report.id] = dup.position
+
+    touched = defaultdict(list)
+    fields = defaultdict(set)
+    changed_reports = defaultdict(list)
+    # Сигнатуры строк для метрик месяца до и после (bulk_update не шлёт post_save)
+    signatures_before = defaultdict(Counter)
+    signatures_after = defaultdict(Counter)
+    for report in reports:
+        entry = by_serial[report.serial_number]
+        if report.inventory_last_ok and report.inventory_last_ok > entry["polled_at"]:
+            continue
+
+        position = dup_position.get(report.id)
+        signatures_before[report.month][month_metrics.signature(report, position)] += 1
+        changed, updated_fields = _assign_autofields(
+            report=report,
+            start=None,
+            end=entry["counters"],
+            only_empty=False,
+            is_duplicate=report.id in dup_position,
+            dup_position=dup_position.get(report.id, 0),
+        )
+        report.inventory_last_ok = entry["polled_at"]
+        updated_fields.add("inventory_last_ok")
+        signatures_after[report.month][month_metrics.signature(report, position)] += 1
+
+        touched[report.month].append(report)
+        fields[report.month] |= updated_fields
+        if changed:
+            changed_reports[report.month].append(report)
+
+    updated = 0
+    for month, month_reports in touched.items():
+        with transaction.atomic():
+            MonthlyReport.objects.bulk_update(month_reports, sorted(fields[month]), batch_size=500)
+            excel_export.touch(month)
+            recomputed = recompute_serials(month, {r.serial_number for r in changed_reports[month]})
+            month_metrics.apply_delta(month, signatures_before[month], signatures_after[month])
+
+        totals = {row.id: row.total_prints for row in recomputed}
+        for report in changed_reports[month]:
+            report.total_prints = totals.get(report.id, report.total_prints)
+        _send_month_update(month, changed_reports[month])
+        updated += len(changed_reports[month])
+
+    logger.info(f"monthly_sync: {len(entries)} опросов, обновлено {updated} записей в {len(touched)} месяцах")
+    return updated
+
+
+def _send_month_update(month, reports) -> None:
+    """Одно inventory_sync_update со всеми обновлёнными записями месяца."""
+    if not reports:
+        return
+
+    from monthly_report.views import _annotate_anomalies_api
+
+    anomalies = _annotate_anomalies_api(reports, month, threshold=2000)
+    message = {
+        "type": "inventory_sync_update",
+        "reports": [
+            {
+                "report_id": report.id,
+                "a4_bw_end": report.a4_bw_end,
+                "a4_color_end": report.a4_color_end,
+                "a3_bw_end": report.a3_bw_end,
+                "a3_color_end": report.a3_color_end,
+                "total_prints": report.total_prints,
+                "is_anomaly": anomalies.get(report.id, {}).get("is_anomaly", False),
+                "anomaly_info": anomalies.get(report.id, {"is_anomaly": False, "has_history": False}),
+                "inventory_last_ok": report.inventory_last_ok.isoformat() if report.inventory_last_ok else None,
+            }
+            for report in reports
+        ],
+        "source": "inventory_auto_sync",
+    }
+
+    group_name = f"monthly_report_{month.year}_{month.month}"
+    try:
+        async_to_sync(get_channel_layer().group_send)(group_name, message)
+    except Exception as e:
+        logger.error(f"monthly_sync: ошибка отправки WebSocket в {group_name}: {e}")
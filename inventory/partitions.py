@@ -0,0 +1,507 @@
+"""
+Помесячное секционирование истории опросов и хранение по одной записи в день.
+
+На PostgreSQL InventoryTask и PageCounter — секционированные таблицы
+(PARTITION BY RANGE) по времени опроса: задачи по task_timestamp, счётчики по
+recorded_at (время записи счётчика = время его опроса, и другой колонки с
+временем задачи у PageCounter нет). Секции:
+
+    <таблица>_pYYYYMM   — месяц, границы — полночь 1-го числа в локальной TZ;
+    <таблица>_p_legacy  — вся история до секционирования (миграция 0029
+                          подключила старую таблицу как есть, без копирования);
+    <таблица>_p_default — страховка: строки вне созданных месяцев.
+
+Хранение то же, что было у cleanup_old_inventory_data: всё за последние
+INVENTORY_FULL_HISTORY_DAYS дней, старше — последняя задача (max id) на
+принтер за локальный день со своими счётчиками. Только теперь секция, целиком
+ушедшая за эту границу, сжимается один раз и целиком: нужные строки копируются
+в новую таблицу, она подменяет секцию (DETACH/ATTACH), старая удаляется —
+без построчного DELETE, без раздувания WAL и работы для autovacuum. Сжатая
+секция помечается комментарием и больше не трогается. Ссылки
+PrinterLatestState на удалённые строки обнуляются, как делал SET_NULL.
+
+Хвост между границей хранения и концом последнего целого месяца сжимается,
+когда месяц закончится: оставленные строки совпадают с прежней очисткой,
+меняется только момент.
+
+SQLite и несекционированный PostgreSQL — прежний алгоритм удаления, но по дням и пачками
+без списка id в памяти (delete_old_history).
+
+Обслуживание — manage.py manage_inventory_partitions и ежедневная задача
+cleanup_old_inventory_data.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TASK_TABLE = "inventory_inventorytask"
+COUNTER_TABLE = "inventory_pagecounter"
+LATEST_STATE_TABLE = "inventory_printerlateststate"
+
+# (таблица, колонка секционирования)
+PARTITIONED_TABLES = ((TASK_TABLE, "task_timestamp"), (COUNTER_TABLE, "recorded_at"))
+
+COMPACTED_MARK = "compacted"
+
+# Строк за одно удаление в несекционированном режиме
+DELETE_BATCH = 5000
+
+Partition = namedtuple("Partition", "name bound lower upper is_default compacted")
+
+
+def full_history_days() -> int:
+    return getattr(settings, "INVENTORY_FULL_HISTORY_DAYS", 90)
+
+
+def partitions_ahead() -> int:
+    return getattr(settings, "INVENTORY_PARTITIONS_AHEAD", 3)
+
+
+def history_cutoff() -> datetime:
+    """Граница полной истории: старше неё — по одной задаче на принтер в день."""
+    return timezone.now() - timedelta(days=full_history_days())
+
+
+def month_start(month: date) -> datetime:
+    """Начало месяца в локальной TZ — граница секций."""
+    return datetime(month.year, month.month, 1, tzinfo=timezone.get_current_timezone())
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def _qn(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def _ts_literal(ts: datetime) -> str:
+    # Границы секций — литералы в DDL, значения формируются здесь же
+    return f"'{ts.isoformat()}'"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Состояние
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def is_partitioned(table: str = TASK_TABLE) -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table: str) -> List[Partition]:
+    """Секции таблицы по возрастанию границ; default — последней."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            r"""
+            SELECT c.relname,
+                   pg_get_expr(c.relpartbound, c.oid),
+                   (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM \(''([^'']+)''\)'))[1]::timestamptz,
+                   (regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \(''([^'']+)''\)'))[1]::timestamptz,
+                   pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT',
+                   coalesce(obj_description(c.oid, 'pg_class'), '') = %s
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            ORDER BY 5, 4
+            """,
+            [COMPACTED_MARK, table],
+        )
+        return [Partition(*row) for row in cursor.fetchall()]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Перевод таблицы в секционированную (миграция 0029)
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def partition_table(schema_editor, table: str, key: str) -> None:
+    """
+    Превращает обычную таблицу в секционированную по key без копирования данных:
+    таблица переименовывается в <table>_p_legacy и подключается секцией
+    [MINVALUE, начало следующего месяца); создаётся default-секция.
+
+    Ссылающиеся на таблицу внешние ключи должны быть сняты заранее: первичный
+    ключ секционированной таблицы включает колонку секционирования.
+    """
+    legacy = f"{table}_p_legacy"
+    execute = schema_editor.execute
+    qn = schema_editor.quote_name
+
+    with schema_editor.connection.cursor() as cursor:
+        # Граница — после самой поздней строки, даже если часы какого-то опроса ушли вперёд
+        cursor.execute(f"SELECT max({qn(key)}) FROM {qn(table)}")
+        latest = cursor.fetchone()[0]
+        last_month = max(timezone.localdate(), timezone.localdate(latest) if latest else timezone.localdate())
+        bound = month_start(_next_month(last_month.replace(day=1)))
+        cursor.execute(
+            "SELECT attidentity, pg_get_serial_sequence(%s, 'id') FROM pg_attribute "
+            "WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+            [table, table],
+        )
+        identity, serial_seq = cursor.fetchone()
+        cursor.execute(f"SELECT coalesce(max(id), 0) FROM {qn(table)}")
+        max_id = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid), x.indisprimary FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid WHERE x.indrelid = to_regclass(%s)",
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+
+    execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+
+    # id: identity-колонку секцией сделать нельзя — последовательность переходит к новой таблице
+    sequence = serial_seq or f"{table}_id_seq"
+    if identity:
+        execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP IDENTITY")
+        execute(f"CREATE SEQUENCE {sequence} AS bigint")
+    else:
+        execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP DEFAULT")
+    execute("SELECT setval(%s, %s, false)", [sequence, max_id + 1])
+
+    # Первичный ключ секционированной таблицы — (id, key); такой же ключ заранее строится на старой таблице
+    for name, _, primary in indexes:
+        if primary:
+            execute(f"ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(name)}")
+    execute(f"ALTER TABLE {qn(legacy)} ADD CONSTRAINT {qn(f'{legacy}_pkey')} PRIMARY KEY (id, {qn(key)})")
+
+    execute(
+        f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE ({qn(key)})"
+    )
+    execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)")
+    execute(f"ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id")
+    execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_pkey')} PRIMARY KEY (id, {qn(key)})")
+
+    # Индексы и внешние ключи — на родителе под прежними именами (определения сняты до
+    # переименования и ссылаются на имя родителя); при подключении старой таблицы
+    # PostgreSQL привяжет её одинаковые индексы и ключи, а не построит заново
+    for name, definition, primary in indexes:
+        if primary:
+            continue
+        execute(f"ALTER INDEX {qn(name)} RENAME TO {qn(f'{name[:56]}_legacy')}")
+        execute(definition)
+    for name, definition in foreign_keys:
+        execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+    # CHECK с границей секции избавляет ATTACH от проверки каждой строки под эксклюзивной блокировкой
+    check = f"{table}_p_legacy_bound"
+    execute(f"ALTER TABLE {qn(legacy)} ADD CONSTRAINT {qn(check)} CHECK ({qn(key)} < {_ts_literal(bound)})")
+    execute(
+        f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(legacy)} FOR VALUES FROM (MINVALUE) TO ({_ts_literal(bound)})"
+    )
+    execute(f"ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(check)}")
+    execute(f"CREATE TABLE {qn(f'{table}_p_default')} PARTITION OF {qn(table)} DEFAULT")
+
+
+def unpartition_table(schema_editor, table: str) -> None:
+    """
+    Обратно к обычной таблице (откат миграции 0029): все строки копируются в новую
+    таблицу, секционированная удаляется. На большой истории — долго.
+
+    Первичный ключ снова (id), индексы и внешние ключи — под прежними именами;
+    id остаётся на последовательности (DEFAULT nextval), а не identity — для
+    Django разницы нет.
+    """
+    plain = f"{table[:50]}_unpartitioned"
+    execute = schema_editor.execute
+    qn = schema_editor.quote_name
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary",
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+
+    execute(f"CREATE TABLE {qn(plain)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING STORAGE)")
+    execute(f"INSERT INTO {qn(plain)} SELECT * FROM {qn(table)}")
+    # Последовательность принадлежит родителю и удалилась бы вместе с ним
+    execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    execute(f"DROP TABLE {qn(table)}")
+    execute(f"ALTER TABLE {qn(plain)} RENAME TO {qn(table)}")
+    execute(f"ALTER SEQUENCE {sequence} OWNED BY {qn(table)}.id")
+    execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_pkey')} PRIMARY KEY (id)")
+    for name, definition in indexes:
+        execute(definition.replace(" ON ONLY ", " ON ", 1))
+    for name, definition in foreign_keys:
+        execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Новые секции
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def ensure_partitions(ahead: Optional[int] = None) -> List[str]:
+    """
+    Создаёт месячные секции с текущего месяца на ahead месяцев вперёд (уже покрытые
+    месяцы пропускаются). Строки, попавшие за это время в default, переносятся
+    в новую секцию. Returns: имена созданных секций.
+    """
+    ahead = partitions_ahead() if ahead is None else ahead
+    created = []
+    for table, key in PARTITIONED_TABLES:
+        if not is_partitioned(table):
+            continue
+        month = timezone.localdate().replace(day=1)
+        for _ in range(ahead + 1):
+            if not _covered(table, month_start(month)):
+                _create_partition(table, key, month)
+                created.append(partition_name(table, month))
+            month = _next_month(month)
+    if created:
+        logger.info(f"ensure_partitions: созданы секции {', '.join(created)}")
+    return created
+
+
+def _covered(table: str, ts: datetime) -> bool:
+    return any(
+        not p.is_default and (p.lower is None or p.lower <= ts) and (p.upper is None or ts < p.upper)
+        for p in list_partitions(table)
+    )
+
+
+def _create_partition(table: str, key: str, month: date) -> None:
+    name = partition_name(table, month)
+    lower, upper = _ts_literal(month_start(month)), _ts_literal(month_start(_next_month(month)))
+    default = f"{table}_p_default"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {_qn(name)} (LIKE {_qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {_qn(default)} WHERE {_qn(key)} >= {lower} AND {_qn(key)} < {upper} "
+            f"RETURNING *) INSERT INTO {_qn(name)} SELECT * FROM moved"
+        )
+        if cursor.rowcount:
+            logger.warning(f"ensure_partitions: {cursor.rowcount} строк перенесено из {default} в {name}")
+        cursor.execute(f"ALTER TABLE {_qn(table)} ATTACH PARTITION {_qn(name)} FOR VALUES FROM ({lower}) TO ({upper})")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Хранение
+# ─────────────────────────────────────────────────────────────────────────────
+
+
+def compact_history(cutoff: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Оставляет по одной задаче на принтер в день для истории старше cutoff.
+    Returns: {"deleted": ..., "kept": ...} по задачам.
+    """
+    cutoff = cutoff or history_cutoff()
+    if is_partitioned(TASK_TABLE):
+        return compact_partitions(cutoff)
+    return delete_old_history(cutoff)
+
+
+def compact_partitions(cutoff: datetime) -> Dict[str, int]:
+    """Сжимает ещё не сжатые секции, целиком лежащие до cutoff: сначала задачи, потом их счётчики."""
+    tz_name = timezone.get_current_timezone_name()
+    result = {"deleted": 0, "kept": 0}
+    for part in _due(TASK_TABLE, cutoff):
+        total, kept = _swap(
+            TASK_TABLE,
+            part,
+            f"SELECT * FROM {_qn(part.name)} WHERE id IN (SELECT max(id) FROM {_qn(part.name)} "
+            f"GROUP BY printer_id, (task_timestamp AT TIME ZONE %s)::date)",
+            [tz_name],
+        )
+        result["deleted"] += total - kept
+        result["kept"] += kept
+
+    for part in _due(COUNTER_TABLE, cutoff):
+        _swap(
+            COUNTER_TABLE,
+            part,
+            f"SELECT c.* FROM {_qn(part.name)} c WHERE EXISTS "
+            f"(SELECT 1 FROM {_qn(TASK_TABLE)} t WHERE t.id = c.task_id)",
+            [],
+        )
+
+    if result["deleted"]:
+        _clear_dangling_latest_state()
+    return result
+
+
+def _due(table: str, cutoff: datetime) -> List[Partition]:
+    return [
+        p
+        for p in list_partitions(table)
+        if not p.is_default and not p.compacted and p.upper is not None and p.upper <= cutoff
+    ]
+
+
+def _swap(table: str, part: Partition, select_sql: str, params) -> tuple:
+    """
+    Подменяет секцию таблицей только с нужными строками. Returns: (было строк, осталось).
+
+    Новая таблица получает те же индексы, внешние ключи и CHECK с границей секции
+    до подмены — ATTACH только правит каталог. Эксклюзивная блокировка родителя
+    (DETACH) держится лишь на DETACH/ATTACH/DROP/RENAME в конце транзакции.
+    """
+    key = dict(PARTITIONED_TABLES)[table]
+    new = f"{part.name[:61]}_c"
+    check = f"{part.name[:57]}_bound"
+    with connection.cursor() as cursor:
+        indexes, foreign_keys = _index_and_fk_defs(cursor, part.name)
+
+    # Отдельная короткая транзакция: ADD FOREIGN KEY блокирует изменение принтеров до её конца
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {_qn(new)}")  # остаток прерванного прогона
+        cursor.execute(
+            f"CREATE TABLE {_qn(new)} (LIKE {_qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)"
+        )
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {_qn(new)} ADD CONSTRAINT {_qn(name)} {definition}")
+        cursor.execute(f"ALTER TABLE {_qn(new)} ADD CONSTRAINT {_qn(check)} CHECK ({_bound_sql(key, part)})")
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Внешние ключи Django отложенные: проверки — сразу при копировании, иначе CREATE INDEX не пройдёт
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            # SHARE: строки секции не меняются до подмены, чтения (и вставки в другие секции) идут
+            cursor.execute(f"LOCK TABLE {_qn(part.name)} IN SHARE MODE")
+            cursor.execute(f"SELECT count(*) FROM {_qn(part.name)}")
+            total = cursor.fetchone()[0]
+            cursor.execute(f"INSERT INTO {_qn(new)} {select_sql}", params)
+            kept = cursor.rowcount
+            for name, unique, using, constraint in indexes:
+                if constraint:
+                    cursor.execute(f"ALTER TABLE {_qn(new)} ADD CONSTRAINT {_qn(f'{name[:61]}_c')} {constraint}")
+                else:
+                    unique = "UNIQUE " if unique else ""
+                    cursor.execute(f"CREATE {unique}INDEX {_qn(f'{name[:61]}_c')} ON {_qn(new)}{using}")
+
+            # Блокировка родителя — только на подмену
+            cursor.execute(f"ALTER TABLE {_qn(table)} DETACH PARTITION {_qn(part.name)}")
+            cursor.execute(f"ALTER TABLE {_qn(table)} ATTACH PARTITION {_qn(new)} {part.bound}")
+            cursor.execute(f"DROP TABLE {_qn(part.name)}")
+            cursor.execute(f"ALTER TABLE {_qn(new)} RENAME TO {_qn(part.name)}")
+            for name, *_ in indexes:
+                cursor.execute(f"ALTER INDEX {_qn(f'{name[:61]}_c')} RENAME TO {_qn(name)}")
+            cursor.execute(f"ALTER TABLE {_qn(part.name)} DROP CONSTRAINT {_qn(check)}")
+            cursor.execute(f"COMMENT ON TABLE {_qn(part.name)} IS '{COMPACTED_MARK}'")
+    except Exception:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {_qn(new)}")
+        raise
+    logger.info(f"compact_partitions: {part.name} — осталось {kept} из {total}")
+    return total, kept
+
+
+def _index_and_fk_defs(cursor, table: str) -> tuple:
+    """
+    Индексы таблицы — (имя, unique, «USING ...» из определения, определение ограничения)
+    и её внешние ключи — (имя, определение). Индексы первичного ключа и других
+    ограничений пересоздаются через ADD CONSTRAINT: ATTACH привязывает к ним только
+    индекс, за которым стоит ограничение.
+    """
+    cursor.execute(
+        """
+        SELECT i.relname, x.indisunique, pg_get_indexdef(i.oid), pg_get_constraintdef(con.oid)
+        FROM pg_index x
+        JOIN pg_class i ON i.oid = x.indexrelid
+        LEFT JOIN pg_constraint con
+               ON con.conindid = i.oid AND con.conrelid = x.indrelid AND con.contype IN ('p', 'u', 'x')
+        WHERE x.indrelid = to_regclass(%s)
+        """,
+        [table],
+    )
+    indexes = [
+        (name, unique, indexdef[indexdef.index(" USING ") :], constraint)
+        for name, unique, indexdef, constraint in cursor.fetchall()
+    ]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [table],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _bound_sql(key: str, part: Partition) -> str:
+    """Условие CHECK, совпадающее с границами секции."""
+    conditions = [f"{_qn(key)} < {_ts_literal(part.upper)}"]
+    if part.lower is not None:
+        conditions.insert(0, f"{_qn(key)} >= {_ts_literal(part.lower)}")
+    return " AND ".join(conditions)
+
+
+def _clear_dangling_latest_state() -> None:
+    """Ссылки PrinterLatestState на удалённые задачи и счётчики — в NULL (как on_delete=SET_NULL)."""
+    with connection.cursor() as cursor:
+        for column, target in (
+            ("last_task_id", TASK_TABLE),
+            ("success_task_id", TASK_TABLE),
+            ("counter_id", COUNTER_TABLE),
+        ):
+            cursor.execute(
+                f"UPDATE {_qn(LATEST_STATE_TABLE)} s SET {column} = NULL WHERE s.{column} IS NOT NULL "
+                f"AND NOT EXISTS (SELECT 1 FROM {_qn(target)} x WHERE x.id = s.{column})"
+            )
+
+
+def delete_old_history(cutoff: datetime) -> Dict[str, int]:
+    """
+    Без секций: удаляет задачи старше cutoff, кроме последней (max id) на принтер
+    за день, пачками по DELETE_BATCH. Счётчики удаляются каскадом.
+
+    Идём по локальным дням: подзапрос «кого оставить» группирует строки одного
+    дня (по индексу task_timestamp), а не всю старую историю на каждую пачку.
+    """
+    from django.db.models import Max
+    from django.db.models.functions import TruncDate
+
+    from .models import InventoryTask
+
+    old = InventoryTask.objects.filter(task_timestamp__lt=cutoff)
+    days = old.annotate(date=TruncDate("task_timestamp")).order_by("date").values_list("date", flat=True).distinct()
+    tz = timezone.get_current_timezone()
+    deleted = kept = 0
+    for day in list(days):
+        start = datetime(day.year, day.month, day.day, tzinfo=tz)
+        end = datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+        rows = old.filter(task_timestamp__gte=start, task_timestamp__lt=end).order_by()
+        keep = rows.values("printer_id").annotate(max_id=Max("id")).values("max_id")
+        kept += rows.values("printer_id").distinct().count()
+        while True:
+            batch = list(rows.exclude(id__in=keep).values_list("id", flat=True)[:DELETE_BATCH])
+            if not batch:
+                break
+            with transaction.atomic():
+                InventoryTask.objects.filter(id__in=batch).delete()
+            deleted += len(batch)
+    return {"deleted": deleted, "kept": kept}
@@ -0,0 +1,156 @@
+# inventory/scheduling.py
+"""
+Адаптивное расписание опроса принтеров.
+
+Демон по-прежнему запускается каждые POLL_INTERVAL_MINUTES, но ставит в очередь
+только принтеры, у которых подошёл Printer.next_poll_at:
+
+- после подряд идущих FAILED интервал растёт экспоненциально
+  (POLL_INTERVAL_MINUTES * 2^(streak-1), не больше POLL_MAX_BACKOFF_MINUTES);
+- после успешного опроса интервал зависит от скорости счётчика: принтер,
+  который печатает мало, опрашивается реже (не реже POLL_MAX_INTERVAL_MINUTES);
+- ручной опрос, VALIDATION_ERROR и т.п. сбрасывают серию неудач — устройство на связи.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import InventoryTask, PageCounter, Printer
+
+logger = logging.getLogger(__name__)
+
+
+def _minutes(name: str, default: int) -> int:
+    return int(getattr(settings, name, default))
+
+
+def base_interval() -> timedelta:
+    return timedelta(minutes=_minutes("POLL_INTERVAL_MINUTES", 60))
+
+
+def backoff_interval(streak: int) -> timedelta:
+    """Интервал после streak подряд неудачных опросов."""
+    base = _minutes("POLL_INTERVAL_MINUTES", 60)
+    limit = _minutes("POLL_MAX_BACKOFF_MINUTES", 24 * 60)
+    return timedelta(minutes=min(base * 2 ** max(streak - 1, 0), limit))
+
+
+def velocity_interval(pages_per_day: Optional[float]) -> timedelta:
+    """
+    Интервал после успешного опроса.
+
+    Цель — примерно POLL_PAGES_PER_POLL новых страниц между опросами.
+    Скорость неизвестна (мало истории) — базовый интервал.
+    """
+    base = _minutes("POLL_INTERVAL_MINUTES", 60)
+    limit = max(base, _minutes("POLL_MAX_INTERVAL_MINUTES", 6 * 60))
+
+    if pages_per_day is None:
+        return timedelta(minutes=base)
+    if pages_per_day <= 0:
+        return timedelta(minutes=limit)
+
+    pages_per_poll = getattr(settings, "POLL_PAGES_PER_POLL", 20)
+    minutes = pages_per_poll / pages_per_day * 24 * 60
+    return timedelta(minutes=min(max(minutes, base), limit))
+
+
+def next_poll_after(
+    now: datetime, failed: bool, failure_streak: int, pages_per_day: Optional[float]
+) -> Tuple[datetime, int]:
+    """
+    Следующее время опроса и новая серия неудач.
+
+    Returns:
+        (next_poll_at, failure_streak)
+    """
+    if failed:
+        streak = failure_streak + 1
+        return now + backoff_interval(streak), streak
+    return now + velocity_interval(pages_per_day), 0
+
+
+def is_due(next_poll_at: Optional[datetime], now: datetime) -> bool:
+    """То же условие, что due_printers_q(), для одного принтера."""
+    if not getattr(settings, "POLL_ADAPTIVE_SCHEDULE", True) or next_poll_at is None:
+        return True
+    return next_poll_at < now + base_interval()
+
+
+def due_printers_q(now: datetime) -> Q:
+    """
+    Фильтр принтеров, которые надо опросить в текущий запуск демона.
+
+    Берём всё, что наступит до следующего запуска: время считается от
+    окончания опроса, и без этого запаса долгий обход сдвигал бы
+    принтер на лишний час.
+    """
+    if not getattr(settings, "POLL_ADAPTIVE_SCHEDULE", True):
+        return Q()
+    return Q(next_poll_at__isnull=True) | Q(next_poll_at__lt=now + base_interval())
+
+
+def _reading_total(counter: dict) -> int:
+    total = counter["total_pages"] or 0
+    if not total:
+        total = sum(counter[f] or 0 for f in ("bw_a4", "color_a4", "bw_a3", "color_a3"))
+    return total
+
+
+def counter_velocity(printer_id: int, now: Optional[datetime] = None) -> Optional[float]:
+    """
+    Страниц в сутки по успешным опросам за POLL_VELOCITY_WINDOW_DAYS.
+    None — истории меньше суток или счётчики не заполнены.
+    """
+    now = now or timezone.now()
+    window_start = now - timedelta(days=getattr(settings, "POLL_VELOCITY_WINDOW_DAYS", 14))
+    readings = PageCounter.objects.filter(
+        task__printer_id=printer_id, task__status="SUCCESS", task__task_timestamp__gte=window_start
+    ).values("task__task_timestamp", "total_pages", "bw_a4", "color_a4", "bw_a3", "color_a3")
+
+    first = readings.order_by("task__task_timestamp").first()
+    last = readings.order_by("-task__task_timestamp").first()
+    if not first or not last:
+        return None
+
+    days = (last["task__task_timestamp"] - first["task__task_timestamp"]).total_seconds() / 86400
+    first_total, last_total = _reading_total(first), _reading_total(last)
+    if days < 1 or not last_total:
+        return None
+    return max(last_total - first_total, 0) / days
+
+
+def update_poll_schedule(
+    printer_id: int, now: Optional[datetime] = None, since: Optional[datetime] = None
+) -> Optional[datetime]:
+    """
+    Пересчитывает next_poll_at по последней задаче опроса принтера.
+
+    since — начало только что завершённого опроса: учитываются лишь задачи, записанные
+    после него. Опрос без новой задачи (пропущен, принтер не найден) расписание не
+    трогает — иначе старая FAILED-задача снова и снова увеличивала бы poll_failure_streak.
+    """
+    now = now or timezone.now()
+
+    tasks = InventoryTask.objects.filter(printer_id=printer_id)
+    if since is not None:
+        tasks = tasks.filter(task_timestamp__gte=since)
+    last_status = tasks.order_by("-task_timestamp").values_list("status", flat=True).first()
+    if last_status is None:
+        return None
+
+    streak = Printer.objects.filter(pk=printer_id).values_list("poll_failure_streak", flat=True).first() or 0
+    failed = last_status == "FAILED"
+    velocity = None if failed else counter_velocity(printer_id, now)
+
+    next_at, streak = next_poll_after(now, failed, streak, velocity)
+    Printer.objects.filter(pk=printer_id).update(next_poll_at=next_at, poll_failure_streak=streak)
+
+    if failed and streak > 1:
+        logger.info(f"Printer {printer_id}: {streak} failed polls in a row, next poll at {next_at:%Y-%m-%d %H:%M}")
+    return next_at
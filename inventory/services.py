@@ -4,19 +4,28 @@ import logging
 import os
 import platform
 import re
-import tempfile
 import threading
 import xml.etree.ElementTree as ET
 from typing import Optional, Tuple, Union
 
-from asgiref.sync import async_to_sync
-
-from channels.layers import get_channel_layer
 from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 
-from .models import InventoryTask, PageCounter, PollingMethod, Printer, PrinterChangeLog, WebParsingRule
+from . import inflight, monthly_sync, ws_broadcast
+from .browser_pool import BrowserPoolTimeout
+from .models import (
+    InventoryTask,
+    PageCounter,
+    PollingMethod,
+    Printer,
+    PrinterChangeLog,
+    PrinterLatestState,
+    SnmpBackend,
+    WebParsingRule,
+)
+from .scheduling import update_poll_schedule
+from .snmp_native import collect_snmp_data
 from .utils import (
     extract_mac_address,
     extract_page_counters,
@@ -26,7 +35,7 @@ from .utils import (
     validate_inventory,
     xml_to_json,
 )
-from .web_parser import execute_web_parsing, export_to_xml
+from .web_parser import build_inventory_data, execute_web_parsing
 
 # ──────────────────────────────────────────────────────────────────────────────
 # ПУТИ ВЫВОДА GLPI
@@ -188,6 +197,20 @@ def _save_xml_export(printer, xml_content: str) -> None:
         print(f"   ⚠️  Ошибка сохранения XML: {e}")
 
 
+def _schedule_xml_export(printer, results: dict) -> None:
+    """
+    Ставит выгрузку XML для GLPI в очередь exports — опрос не ждёт сериализации
+    и записи файла. Если брокер недоступен, выгрузка пропускается: файл хранит
+    только последнее состояние, его перепишет следующий успешный опрос.
+    """
+    from .tasks import save_xml_export_task
+
+    try:
+        save_xml_export_task.apply_async(args=[printer.id, results])
+    except Exception as e:
+        logger.warning(f"XML export for {printer.ip_address} not queued: {e}")
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # ОБРАБОТКА ЗАМЕНЫ ОБОРУДОВАНИЯ
 # ──────────────────────────────────────────────────────────────────────────────
@@ -539,6 +562,30 @@ def _run_snmp_inventory(printer: Printer) -> Tuple[bool, Optional[str], str]:
     return True, xml_path, ""
 
 
+def _collect_snmp(printer: Printer, snmp_result: Optional[Tuple[bool, dict, str]] = None) -> Tuple[bool, dict, str]:
+    """
+    SNMP опрос выбранным для принтера движком.
+    snmp_result — результат встроенного опроса, уже собранный пакетом демона.
+
+    Returns:
+        (success, data, error_message) — data в формате xml_to_json()
+    """
+    if printer.snmp_backend == SnmpBackend.NATIVE:
+        if snmp_result is not None:
+            return snmp_result
+        community = getattr(printer, "snmp_community", None) or "public"
+        return collect_snmp_data(printer.ip_address, community)
+
+    ok, xml_path, error = _run_snmp_inventory(printer)
+    if not ok:
+        return False, {}, error
+
+    data = xml_to_json(xml_path)
+    if not data:
+        return False, {}, "SNMP XML parse error"
+    return True, data, ""
+
+
 def _is_cartridge_error(value) -> bool:
     """
     Определяет, является ли значение картриджа/расходника ошибочным или пустым.
@@ -755,24 +802,7 @@ def _merge_snmp_web_data(snmp_data: dict, web_data: dict, printer_ip: str) -> Tu
     return True, merged, ""
 
 
-def _hybrid_data_to_xml(printer: Printer, merged_data: dict) -> str:
-    """
-    Конвертирует объединённые данные в XML формат.
-
-    Returns:
-        XML строка
-    """
-    from .web_parser import export_to_xml
-
-    return export_to_xml(printer, merged_data)
-
-
-# ──────────────────────────────────────────────────────────────────────────────
-# АВТОМАТИЧЕСКАЯ СИНХРОНИЗАЦИЯ С MONTHLY REPORT
-# ──────────────────────────────────────────────────────────────────────────────
-
-
-def sync_to_monthly_reports(printer, counters):
+def sync_to_monthly_reports(printer, counters, immediate=False):
     """
     Автоматически обновляет MonthlyReport записи после успешного опроса.
 
@@ -780,160 +810,13 @@ def sync_to_monthly_reports(printer, counters):
     - Записи в открытых для редактирования месяцах (MonthControl.edit_until > now)
     - Поля где manual_edit_* = False (не редактировались вручную)
 
-    Отправляет WebSocket уведомления для real-time обновления.
+    Опрос ставится в накопитель monthly_sync и применяется пачкой вместе с
+    остальными не позже чем через MONTHLY_SYNC_MAX_STALENESS секунд;
+    immediate=True — сразу (ручной опрос). WebSocket-уведомление уходит одно
+    на месяц со всеми обновлёнными записями.
     """
     try:
-
-        from monthly_report.models import MonthControl, MonthlyReport
-        from monthly_report.services import recompute_group
-
-        # Получаем serial_number из printer
-        serial = printer.serial_number
-        if not serial:
-            logger.debug("sync_to_monthly_reports: принтер без serial_number, пропускаем")
-            return
-
-        # Находим открытые для редактирования месяцы С ВКЛЮЧЕННОЙ АВТОСИНХРОНИЗАЦИЕЙ
-        now = timezone.now()
-
-        # Сначала найдем все открытые месяцы
-        all_editable = MonthControl.objects.filter(edit_until__gt=now)
-        logger.info(f"sync_to_monthly_reports: найдено {all_editable.count()} открытых месяцев")
-
-        # Затем фильтруем по auto_sync_enabled
-        editable_months = MonthControl.objects.filter(
-            edit_until__gt=now, auto_sync_enabled=True  # Только месяцы с включенной автосинхронизацией
-        ).values_list("month", flat=True)
-
-        logger.info(f"sync_to_monthly_reports: из них {len(editable_months)} с включенной автосинхронизацией")
-
-        if not editable_months:
-            logger.info("sync_to_monthly_reports: нет открытых месяцев с включенной автосинхронизацией")
-            return
-
-        # Находим все MonthlyReport для этого serial_number в открытых месяцах
-        reports = MonthlyReport.objects.filter(serial_number=serial, month__in=editable_months)
-
-        if not reports.exists():
-            logger.debug(f"sync_to_monthly_reports: нет записей для serial={serial} в открытых месяцах")
-            return
-
-        logger.info(f"sync_to_monthly_reports: найдено {reports.count()} записей для обновления (serial={serial})")
-
-        # Определяем дубли - используем ту же логику, что в services_inventory_sync.py
-        reports_list = list(reports)
-        from collections import defaultdict
-
-        duplicate_groups = defaultdict(list)
-
-        # Группируем по (month, serial_number, inventory_number)
-        # ВАЖНО: включаем month, т.к. обрабатываем несколько месяцев одновременно!
-        # Каждый месяц имеет свои собственные пары дублей
-        for report in reports_list:
-            sn = (report.serial_number or "").strip()
-            inv = (report.inventory_number or "").strip()
-            if not sn and not inv:
-                continue
-            # Ключ: (month, serial, inventory) - месяц ОБЯЗАТЕЛЬНО включаем!
-            duplicate_groups[(report.month, sn, inv)].append(report)
-
-        # Сортируем записи внутри каждой группы по order_number и id
-        for key in duplicate_groups:
-            duplicate_groups[key].sort(key=lambda x: (getattr(x, "order_number", 0), x.id))
-
-        # Создаем маппинг report_id -> позицию в группе дублей
-        report_dup_info = {}
-        for key, group_reports in duplicate_groups.items():
-            if len(group_reports) >= 2:  # Только группы с 2+ записями = дубли
-                for position, report in enumerate(group_reports):
-                    report_dup_info[report.id] = {"is_duplicate": True, "position": position}
-                    logger.info(
-                        f"  Дубль: month={key[0]}, serial={key[1]}, inv={key[2]}, report_id={report.id}, position={position}"
-                    )
-
-        # Используем ту же логику, что и в ручной синхронизации
-        from monthly_report.services_inventory_sync import _assign_autofields
-
-        channel_layer = get_channel_layer()
-        updated_reports = []
-
-        for report in reports_list:
-            # Определяем является ли запись дублем и её позицию
-            dup_info = report_dup_info.get(report.id, {"is_duplicate": False, "position": 0})
-            is_duplicate = dup_info["is_duplicate"]
-            dup_position = dup_info["position"]
-
-            logger.info(f"  Обработка report_id={report.id}: is_duplicate={is_duplicate}, position={dup_position}")
-            logger.info(
-                f"  Счетчики из принтера: bw_a4={counters.get('bw_a4')}, color_a4={counters.get('color_a4')}, bw_a3={counters.get('bw_a3')}, color_a3={counters.get('color_a3')}"
-            )
-
-            # Используем унифицированную функцию обновления полей
-            # start=None т.к. автосинхронизация не трогает start поля
-            changed, updated_fields_set = _assign_autofields(
-                report=report,
-                start=None,
-                end=counters,
-                only_empty=False,
-                is_duplicate=is_duplicate,
-                dup_position=dup_position,
-            )
-
-            # Обновляем метку последнего опроса
-            report.inventory_last_ok = now
-            updated_fields_set.add("inventory_last_ok")
-
-            # Показываем итоговое состояние
-            logger.info(
-                f"  Итоговые значения report_id={report.id}: a4_bw_end={report.a4_bw_end}, a4_color_end={report.a4_color_end}, a3_bw_end={report.a3_bw_end}, a3_color_end={report.a3_color_end}"
-            )
-            logger.info(f"  Обновлено полей: {updated_fields_set}")
-
-            if updated_fields_set:
-                report.save(update_fields=list(updated_fields_set))
-
-            # Пересчитываем total_prints для группы
-            if changed:
-                try:
-                    recompute_group(report.month, report.serial_number, report.inventory_number)
-                    report.refresh_from_db()
-                    updated_reports.append(report)
-                    logger.info(f"  Пересчитано total_prints для report_id={report.id}: {report.total_prints}")
-                except Exception as e:
-                    logger.error(f"  Ошибка пересчёта для report_id={report.id}: {e}")
-
-        # Отправляем WebSocket уведомления для обновлённых записей
-        for report in updated_reports:
-            group_name = f"monthly_report_{report.month.year}_{report.month.month}"
-
-            # Вычисляем информацию об аномалии
-            from monthly_report.views import _annotate_anomalies_api
-
-            anomaly_data = _annotate_anomalies_api([report], report.month, threshold=2000)
-            anomaly_info = anomaly_data.get(report.id, {"is_anomaly": False, "has_history": False})
-
-            message = {
-                "type": "inventory_sync_update",
-                "report_id": report.id,
-                "a4_bw_end": report.a4_bw_end,
-                "a4_color_end": report.a4_color_end,
-                "a3_bw_end": report.a3_bw_end,
-                "a3_color_end": report.a3_color_end,
-                "total_prints": report.total_prints,
-                "is_anomaly": anomaly_info["is_anomaly"],
-                "anomaly_info": anomaly_info,
-                "inventory_last_ok": report.inventory_last_ok.isoformat() if report.inventory_last_ok else None,
-                "source": "inventory_auto_sync",
-            }
-
-            try:
-                async_to_sync(channel_layer.group_send)(group_name, message)
-                logger.info(f"  WebSocket отправлен в {group_name} для report_id={report.id}")
-            except Exception as e:
-                logger.error(f"  Ошибка отправки WebSocket: {e}")
-
-        logger.info(f"sync_to_monthly_reports: обновлено {len(updated_reports)} записей")
-
+        monthly_sync.record(printer, counters, immediate=immediate)
     except Exception as e:
         logger.error(f"sync_to_monthly_reports: критическая ошибка: {e}", exc_info=True)
 
@@ -944,20 +827,53 @@ def sync_to_monthly_reports(printer, counters):
 
 
 def run_inventory_for_printer(
-    printer_id: int, xml_path: Optional[str] = None, triggered_by: str = "manual"
+    printer_id: int,
+    xml_path: Optional[str] = None,
+    triggered_by: str = "manual",
+    snmp_result: Optional[Tuple[bool, dict, str]] = None,
 ) -> Tuple[bool, str]:
     """
     Полный цикл инвентаризации с автоматическим выбором метода.
     Если у принтера есть правила веб-парсинга - используется WEB, иначе SNMP.
+    После опроса, записавшего задачу, пересчитывается Printer.next_poll_at (см. inventory/scheduling.py).
 
     Args:
         printer_id: ID принтера
         xml_path: Путь к XML файлу (опционально)
         triggered_by: 'manual' (ручной запуск) или 'daemon' (автоматический опрос)
+        snmp_result: готовый результат встроенного SNMP-опроса (пакет демона, collect_snmp_data_many)
+
+    Если принтер уже опрашивается (inventory/inflight.py), новый опрос не
+    запускается: ручной вызов получает результат идущего, демон пропускает принтер.
     """
+    if triggered_by == "daemon":
+        inflight.release_queued([printer_id])
+
+    def _poll():
+        started = timezone.now()
+        result = _run_inventory_for_printer(printer_id, xml_path, triggered_by, snmp_result)
+        try:
+            update_poll_schedule(printer_id, since=started)
+        except Exception as e:
+            logger.error(f"Failed to update poll schedule for printer {printer_id}: {e}", exc_info=True)
+        return result
+
+    result = inflight.single_flight(printer_id, _poll, wait=triggered_by != "daemon")
+    if result is None:
+        return False, "Poll already in progress"
+    return tuple(result)
+
+
+def _run_inventory_for_printer(
+    printer_id: int,
+    xml_path: Optional[str],
+    triggered_by: str,
+    snmp_result: Optional[Tuple[bool, dict, str]] = None,
+) -> Tuple[bool, str]:
     start_time = timezone.now()
     printer = None
-    temp_xml_path = None
+    data = None
+    xml_export = None  # результаты WEB/HYBRID для XML-выгрузки GLPI
 
     try:
         try:
@@ -966,10 +882,9 @@ def run_inventory_for_printer(
             logger.error(f"Printer {printer_id} not found")
             return False, f"Printer {printer_id} not found"
 
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            "inventory_updates",
+        ws_broadcast.publish(
             {"type": "inventory_start", "printer_id": printer.id, "triggered_by": triggered_by},
+            printer.organization_id,
         )
 
         ip = printer.ip_address
@@ -996,7 +911,7 @@ def run_inventory_for_printer(
                 return False, error_msg
 
             # 1. Сначала SNMP
-            snmp_success, snmp_xml_path, snmp_error = _run_snmp_inventory(printer)
+            snmp_success, snmp_data, snmp_error = _collect_snmp(printer, snmp_result)
             if not snmp_success:
                 InventoryTask.objects.create(
                     printer=printer, status="FAILED", error_message=f"SNMP failed: {snmp_error}"
@@ -1004,13 +919,6 @@ def run_inventory_for_printer(
                 logger.error(f"Hybrid polling failed for {ip}: SNMP error - {snmp_error}")
                 return False, f"SNMP failed: {snmp_error}"
 
-            # Парсим SNMP данные
-            snmp_data = xml_to_json(snmp_xml_path)
-            if not snmp_data:
-                error_msg = "SNMP XML parse error"
-                InventoryTask.objects.create(printer=printer, status="FAILED", error_message=error_msg)
-                return False, error_msg
-
             # 2. Потом Web
             web_success, web_results, web_error = execute_web_parsing(printer, list(web_rules))
             if not web_success:
@@ -1029,18 +937,9 @@ def run_inventory_for_printer(
                 logger.error(f"Hybrid polling failed for {ip}: {merge_error}")
                 return False, f"Data merge failed: {merge_error}"
 
-            # 4. Генерируем XML из объединённых данных
-            xml_content = _hybrid_data_to_xml(printer, merged_data)
-
-            # Сохраняем XML во временный файл
-            with tempfile.NamedTemporaryFile(mode="w", suffix=".xml", delete=False, encoding="utf-8") as f:
-                f.write(xml_content)
-                temp_xml_path = f.name
-
-            xml_path = temp_xml_path
-
-            # Сохраняем XML экспорт для GLPI
-            _save_xml_export(printer, xml_content)
+            # 4. Объединённые данные сразу в структуру xml_to_json(); XML для GLPI — отложенно, после успешного опроса
+            data = build_inventory_data(printer, merged_data)
+            xml_export = merged_data
 
         # ───────────────────────────────────────────────────────────
         # ВЕБ-ПАРСИНГ (только Web)
@@ -1058,18 +957,9 @@ def run_inventory_for_printer(
                 logger.error(f"Web parsing failed for {ip}: {error_msg}")
                 return False, error_msg
 
-            # Генерируем XML из результатов
-            xml_content = export_to_xml(printer, results)
-
-            # Сохраняем XML во временный файл для дальнейшей обработки
-            with tempfile.NamedTemporaryFile(mode="w", suffix=".xml", delete=False, encoding="utf-8") as f:
-                f.write(xml_content)
-                temp_xml_path = f.name
-
-            xml_path = temp_xml_path
-
-            # Сохраняем XML экспорт для GLPI
-            _save_xml_export(printer, xml_content)
+            # Результаты сразу в структуру xml_to_json(); XML для GLPI — отложенно, после успешного опроса
+            data = build_inventory_data(printer, results)
+            xml_export = results
 
             # Обновляем метод опроса
             if printer.polling_method != PollingMethod.WEB:
@@ -1089,7 +979,15 @@ def run_inventory_for_printer(
 
             community = getattr(printer, "snmp_community", None) or "public"
 
-            if not xml_path:
+            if not xml_path and printer.snmp_backend == SnmpBackend.NATIVE:
+                # Встроенный опрос: без подпроцесса и XML-файла
+                ok, data, error_msg = snmp_result or collect_snmp_data(ip, community)
+                if not ok:
+                    InventoryTask.objects.create(printer=printer, status="FAILED", error_message=error_msg)
+                    logger.error(f"Native SNMP failed for {ip}: {error_msg}")
+                    return False, error_msg
+
+            elif not xml_path:
                 # HTTP проверка (опционально)
                 if getattr(settings, "HTTP_CHECK", True):
                     ok_check, err = send_device_get_request(ip)
@@ -1133,7 +1031,8 @@ def run_inventory_for_printer(
         # ОБЩАЯ ОБРАБОТКА XML (одинакова для обоих методов)
         # ═══════════════════════════════════════════════════════════════
 
-        data = xml_to_json(xml_path)
+        if data is None:
+            data = xml_to_json(xml_path)
 
         if not data:
             error_msg = "XML parse error"
@@ -1149,8 +1048,7 @@ def run_inventory_for_printer(
             error_msg = "No valid page counters in XML"
             logger.warning(f"No valid page counters found for {ip}")
             InventoryTask.objects.create(printer=printer, status="FAILED", error_message=error_msg)
-            async_to_sync(channel_layer.group_send)(
-                "inventory_updates",
+            ws_broadcast.publish(
                 {
                     "type": "inventory_update",
                     "printer_id": printer.id,
@@ -1158,6 +1056,7 @@ def run_inventory_for_printer(
                     "message": error_msg,
                     "triggered_by": triggered_by,
                 },
+                printer.organization_id,
             )
             return False, error_msg
 
@@ -1179,8 +1078,7 @@ def run_inventory_for_printer(
 
                 InventoryTask.objects.create(printer=printer, status="FAILED", error_message=error_msg)
 
-                async_to_sync(channel_layer.group_send)(
-                    "inventory_updates",
+                ws_broadcast.publish(
                     {
                         "type": "inventory_update",
                         "printer_id": printer.id,
@@ -1188,6 +1086,7 @@ def run_inventory_for_printer(
                         "message": error_msg,
                         "triggered_by": triggered_by,
                     },
+                    printer.organization_id,
                 )
 
                 return False, error_msg
@@ -1203,8 +1102,7 @@ def run_inventory_for_printer(
 
                 InventoryTask.objects.create(printer=printer, status="FAILED", error_message=error_msg)
 
-                async_to_sync(channel_layer.group_send)(
-                    "inventory_updates",
+                ws_broadcast.publish(
                     {
                         "type": "inventory_update",
                         "printer_id": printer.id,
@@ -1212,6 +1110,7 @@ def run_inventory_for_printer(
                         "message": error_msg,
                         "triggered_by": triggered_by,
                     },
+                    printer.organization_id,
                 )
 
                 return False, error_msg
@@ -1291,12 +1190,13 @@ def run_inventory_for_printer(
                 "timestamp": int(task.task_timestamp.timestamp() * 1000),
                 "triggered_by": triggered_by,
             }
-            async_to_sync(channel_layer.group_send)("inventory_updates", update_payload)
+            ws_broadcast.publish(update_payload, printer.organization_id)
             return False, f"Historical validation failed: {historical_error}"
 
-        # Сохраняем данные
-        task = InventoryTask.objects.create(printer=printer, status="SUCCESS", match_rule=rule)
-        PageCounter.objects.create(task=task, **counters)
+        # Сохраняем данные (вместе с PrinterLatestState — сигналы в latest_state.py)
+        with transaction.atomic():
+            task = InventoryTask.objects.create(printer=printer, status="SUCCESS", match_rule=rule)
+            PageCounter.objects.create(task=task, **counters)
 
         # Обновляем последнее правило
         if rule:
@@ -1312,7 +1212,7 @@ def run_inventory_for_printer(
             logger.info(
                 f"  Счетчики для синхронизации: bw_a4={counters.get('bw_a4')}, color_a4={counters.get('color_a4')}, bw_a3={counters.get('bw_a3')}, color_a3={counters.get('color_a3')}"
             )
-            sync_to_monthly_reports(printer, counters)
+            sync_to_monthly_reports(printer, counters, immediate=triggered_by == "manual")
         except Exception as e:
             logger.error(f"Ошибка синхронизации с monthly_report: {e}", exc_info=True)
             # Не прерываем выполнение, просто логируем
@@ -1343,14 +1243,22 @@ def run_inventory_for_printer(
             "timestamp": int(task.task_timestamp.timestamp() * 1000),
             "triggered_by": triggered_by,
         }
-        async_to_sync(channel_layer.group_send)("inventory_updates", update_payload)
+        ws_broadcast.publish(update_payload, printer.organization_id)
 
         duration = (timezone.now() - start_time).total_seconds()
         method = "WEB" if use_web_parsing else "SNMP"
         logger.info(f"✓ Inventory completed for {ip} in {duration:.2f}s (method: {method})")
 
+        if xml_export is not None:
+            _schedule_xml_export(printer, xml_export)
+
         return True, "Success"
 
+    except BrowserPoolTimeout:
+        # Браузера не дождались — принтер не опрашивался: без FAILED-задачи, опрос повторит очередь
+        logger.warning(f"Browser pool busy, poll of printer {printer_id} deferred")
+        raise
+
     except Exception as e:
         ip_safe = getattr(printer, "ip_address", f"id={printer_id}") if printer else f"id={printer_id}"
         error_msg = f"Unexpected error: {str(e)}"
@@ -1362,8 +1270,7 @@ def run_inventory_for_printer(
 
                 # Отправляем WebSocket уведомление об ошибке
                 try:
-                    async_to_sync(channel_layer.group_send)(
-                        "inventory_updates",
+                    ws_broadcast.publish(
                         {
                             "type": "inventory_update",
                             "printer_id": printer.id,
@@ -1371,6 +1278,7 @@ def run_inventory_for_printer(
                             "message": error_msg,
                             "triggered_by": triggered_by,
                         },
+                        printer.organization_id,
                     )
                 except Exception as ws_error:
                     logger.error(f"Failed to send WebSocket notification: {ws_error}")
@@ -1380,14 +1288,6 @@ def run_inventory_for_printer(
 
         return False, error_msg
 
-    finally:
-        # Очистка временного XML файла
-        if temp_xml_path and os.path.exists(temp_xml_path):
-            try:
-                os.unlink(temp_xml_path)
-            except Exception as e:
-                logger.warning(f"Failed to delete temp XML {temp_xml_path}: {e}")
-
 
 # ──────────────────────────────────────────────────────────────────────────────
 # DEPRECATED/СОВМЕСТИМОСТЬ
@@ -1417,56 +1317,67 @@ def inventory_daemon():
 # ──────────────────────────────────────────────────────────────────────────────
 
 
+def inventory_status_from_state(state) -> dict:
+    """
+    Статус последней инвентаризации из PrinterLatestState
+    (state=None — принтер ещё ни разу не опрашивался успешно).
+    """
+    task = state.success_task if state else None
+    if task is None:
+        return {
+            "task_id": None,
+            "timestamp": None,
+            "status": "NEVER_RUN",
+            "match_rule": None,
+            "counters": {},
+            "is_fresh": False,
+        }
+
+    counter = state.counter
+    return {
+        "task_id": task.id,
+        "timestamp": task.task_timestamp.isoformat(),
+        "status": task.status,
+        "match_rule": task.match_rule,
+        "counters": (
+            {
+                "bw_a4": counter.bw_a4,
+                "color_a4": counter.color_a4,
+                "bw_a3": counter.bw_a3,
+                "color_a3": counter.color_a3,
+                "total_pages": counter.total_pages,
+                "drum_black": counter.drum_black,
+                "drum_cyan": counter.drum_cyan,
+                "drum_magenta": counter.drum_magenta,
+                "drum_yellow": counter.drum_yellow,
+                "toner_black": counter.toner_black,
+                "toner_cyan": counter.toner_cyan,
+                "toner_magenta": counter.toner_magenta,
+                "toner_yellow": counter.toner_yellow,
+                "fuser_kit": counter.fuser_kit,
+                "transfer_kit": counter.transfer_kit,
+                "waste_toner": counter.waste_toner,
+            }
+            if counter
+            else {}
+        ),
+        "is_fresh": False,
+    }
+
+
 def get_printer_inventory_status(printer_id: int) -> dict:
     """
-    Получает статус последней инвентаризации НАПРЯМУЮ ИЗ БД.
+    Получает статус последней инвентаризации НАПРЯМУЮ ИЗ БД (один запрос к PrinterLatestState).
     """
+    state = None
     try:
-        last_task = (
-            InventoryTask.objects.filter(printer_id=printer_id, status="SUCCESS").order_by("-task_timestamp").first()
+        state = (
+            PrinterLatestState.objects.select_related("success_task", "counter").filter(printer_id=printer_id).first()
         )
-        if last_task:
-            counter = PageCounter.objects.filter(task=last_task).first()
-            return {
-                "task_id": last_task.id,
-                "timestamp": last_task.task_timestamp.isoformat(),
-                "status": last_task.status,
-                "match_rule": last_task.match_rule,
-                "counters": (
-                    {
-                        "bw_a4": getattr(counter, "bw_a4", None),
-                        "color_a4": getattr(counter, "color_a4", None),
-                        "bw_a3": getattr(counter, "bw_a3", None),
-                        "color_a3": getattr(counter, "color_a3", None),
-                        "total_pages": getattr(counter, "total_pages", None),
-                        "drum_black": getattr(counter, "drum_black", ""),
-                        "drum_cyan": getattr(counter, "drum_cyan", ""),
-                        "drum_magenta": getattr(counter, "drum_magenta", ""),
-                        "drum_yellow": getattr(counter, "drum_yellow", ""),
-                        "toner_black": getattr(counter, "toner_black", ""),
-                        "toner_cyan": getattr(counter, "toner_cyan", ""),
-                        "toner_magenta": getattr(counter, "toner_magenta", ""),
-                        "toner_yellow": getattr(counter, "toner_yellow", ""),
-                        "fuser_kit": getattr(counter, "fuser_kit", ""),
-                        "transfer_kit": getattr(counter, "transfer_kit", ""),
-                        "waste_toner": getattr(counter, "waste_toner", ""),
-                    }
-                    if counter
-                    else {}
-                ),
-                "is_fresh": False,
-            }
     except Exception as e:
         logger.error(f"Error getting inventory status for printer {printer_id}: {e}")
 
-    return {
-        "task_id": None,
-        "timestamp": None,
-        "status": "NEVER_RUN",
-        "match_rule": None,
-        "counters": {},
-        "is_fresh": False,
-    }
+    return inventory_status_from_state(state)
 
 
 def get_glpi_info() -> dict:
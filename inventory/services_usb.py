@@ -7,14 +7,13 @@ import secrets
 from datetime import timedelta
 from datetime import timezone as dt_timezone
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from dateutil import parser as dateparser
 from django.core.cache import cache
 from django.db import transaction
 from django.utils import timezone
 
 from contracts.models import ContractDevice
+from . import ws_broadcast
 from .models import (
     ConnectionType,
     DataSource,
@@ -173,11 +172,7 @@ def _ws_notify(printer: Printer, task: InventoryTask, counters: dict, reading_ts
     if (timezone.now() - reading_ts) > timedelta(hours=1):
         return
     try:
-        layer = get_channel_layer()
-        if layer is None:
-            return
-        async_to_sync(layer.group_send)(
-            "inventory_updates",
+        ws_broadcast.publish(
             {
                 "type": "inventory_update",
                 "printer_id": printer.id,
@@ -192,6 +187,7 @@ def _ws_notify(printer: Printer, task: InventoryTask, counters: dict, reading_ts
                 "timestamp": int(task.task_timestamp.timestamp() * 1000),
                 "triggered_by": "usb_agent",
             },
+            printer.organization_id,
         )
     except Exception as e:  # pragma: no cover — WS-сбой не должен ломать reading
         logger.warning("USB: WS notify failed: %s", e)
@@ -0,0 +1,456 @@
+# inventory/snmp_native.py
+"""
+Встроенный asyncio SNMP-опрос принтеров (без запуска glpi-netdiscovery).
+
+Собирает ту же вложенную структуру, которую xml_to_json() строит из XML
+GLPI-агента (CONTENT → DEVICE → INFO / PAGECOUNTERS / CARTRIDGES / PORTS),
+поэтому дальше данные идут через extract_page_counters() / validate_inventory()
+без изменений.
+
+Опрос сотен устройств выполняется в одном event loop с ограничением
+параллелизма через asyncio.Semaphore (SNMP_NATIVE_CONCURRENCY).
+
+Транспорт вынесен в клиент с методами get()/walk():
+- PysnmpClient — реальный SNMP v2c через pysnmp (опциональная зависимость);
+- SnmprecClient — данные в формате snmpsim (.snmprec) без сети, для тестов
+  и бенчмарков.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# ──────────────────────────────────────────────────────────────────────────────
+# OID (SNMPv2-MIB, HOST-RESOURCES-MIB, IF-MIB, Printer-MIB)
+# ──────────────────────────────────────────────────────────────────────────────
+
+SYS_DESCR = "1.3.6.1.2.1.1.1.0"
+SYS_NAME = "1.3.6.1.2.1.1.5.0"
+HR_DEVICE_DESCR = "1.3.6.1.2.1.25.3.2.1.3.1"
+PRT_SERIAL = "1.3.6.1.2.1.43.5.1.1.17.1"
+
+INFO_OIDS = {
+    "DESCRIPTION": SYS_DESCR,
+    "NAME": SYS_NAME,
+    "MODEL": HR_DEVICE_DESCR,
+    "SERIAL": PRT_SERIAL,
+}
+
+# Тег PAGECOUNTERS → OID-кандидаты (берётся первый непустой). Теги те же,
+# что читает extract_page_counters(). В Printer-MIB есть только общий
+# счётчик; цветность и форматы — только в частных MIB производителей.
+PAGECOUNTER_OIDS = {
+    "TOTAL": ["1.3.6.1.2.1.43.10.2.1.4.1.1"],  # prtMarkerLifeCount
+    "COLOR": [
+        "1.3.6.1.4.1.11.2.3.9.4.2.1.4.1.2.7.0",  # HP: total color pages
+        "1.3.6.1.4.1.1347.42.3.1.2.1.1.1.3",  # Kyocera: printed full color
+    ],
+    "BW_A4": [],
+    "BW_A3": [],
+    "COLOR_A4": [],
+    "COLOR_A3": [],
+}
+
+IF_DESCR = "1.3.6.1.2.1.2.2.1.2"
+IF_PHYS_ADDRESS = "1.3.6.1.2.1.2.2.1.6"
+
+SUPPLY_DESCR = "1.3.6.1.2.1.43.11.1.1.6.1"
+SUPPLY_MAX_CAPACITY = "1.3.6.1.2.1.43.11.1.1.8.1"
+SUPPLY_LEVEL = "1.3.6.1.2.1.43.11.1.1.9.1"
+
+# Printer-MIB: -3 = "что-то осталось", -2 = неизвестно
+SUPPLY_LEVEL_SOME_REMAINING = -3
+
+_SUPPLY_COLORS = ("BLACK", "CYAN", "MAGENTA", "YELLOW")
+
+
+class SnmpCollectError(Exception):
+    """Устройство не ответило или вернуло ошибку SNMP."""
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# НОРМАЛИЗАЦИЯ
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _oid_key(oid: str) -> Tuple[int, ...]:
+    """Ключ сортировки OID в лексикографическом (числовом) порядке."""
+    return tuple(int(part) for part in oid.strip(".").split(".") if part)
+
+
+def _format_mac(value: str) -> str:
+    """ifPhysAddress → AA:BB:CC:DD:EE:FF (pysnmp отдаёт бинарные строки как 0x...)."""
+    raw = (value or "").strip()
+    if raw.lower().startswith("0x"):
+        raw = raw[2:]
+    hexes = "".join(ch for ch in raw if ch in "0123456789abcdefABCDEF")
+    if len(hexes) != 12:
+        return ""
+    return ":".join(hexes[i : i + 2] for i in range(0, 12, 2)).upper()
+
+
+def classify_supply(description: str) -> Optional[str]:
+    """
+    Сопоставляет prtMarkerSuppliesDescription тегу CARTRIDGES в стиле GLPI:
+    TONERBLACK, DRUMCYAN, DEVELOPERBLACK, WASTETONER, FUSERKIT, TRANSFERKIT.
+    """
+    desc = (description or "").lower()
+    if not desc:
+        return None
+
+    if "waste" in desc:
+        return "WASTETONER"
+    if "fuser" in desc:
+        return "FUSERKIT"
+    if "transfer" in desc or "belt" in desc:
+        return "TRANSFERKIT"
+
+    if "drum" in desc or "photoconductor" in desc or "opc" in desc or "imaging" in desc:
+        kind = "DRUM"
+    elif "developer" in desc:
+        kind = "DEVELOPER"
+    elif "toner" in desc or "cartridge" in desc or "ink" in desc:
+        kind = "TONER"
+    else:
+        return None
+
+    for color in _SUPPLY_COLORS:
+        if color.lower() in desc:
+            return f"{kind}{color}"
+    # Монохромные устройства часто не указывают цвет
+    return f"{kind}BLACK" if kind in ("TONER", "DRUM", "DEVELOPER") else None
+
+
+def _supply_value(level: Optional[str], max_capacity: Optional[str]) -> str:
+    """Уровень расходника в процентах (как у GLPI) или OK для «что-то осталось»."""
+    try:
+        lvl = int(level)
+    except (TypeError, ValueError):
+        return ""
+    if lvl == SUPPLY_LEVEL_SOME_REMAINING:
+        return "OK"
+    if lvl < 0:
+        return ""
+    try:
+        cap = int(max_capacity)
+    except (TypeError, ValueError):
+        cap = 0
+    if cap > 0:
+        return str(max(0, min(100, round(lvl * 100 / cap))))
+    return str(lvl) if lvl <= 100 else ""
+
+
+def build_inventory_data(
+    ip: str,
+    info: Dict[str, str],
+    counters: Dict[str, str],
+    interfaces: Dict[str, Dict[str, str]],
+    supplies: Dict[str, Dict[str, str]],
+) -> dict:
+    """
+    Собирает результат опроса в структуру xml_to_json().
+
+    interfaces: {ifIndex: {"descr": ..., "mac": ...}}
+    supplies: {index: {"descr": ..., "level": ..., "max": ...}}
+    """
+    ports = []
+    for idx in sorted(interfaces, key=lambda x: int(x) if str(x).isdigit() else 0):
+        iface = interfaces[idx]
+        mac = _format_mac(iface.get("mac", ""))
+        port = {"IFNUMBER": str(idx), "IFDESCR": iface.get("descr", "")}
+        if mac:
+            port["MAC"] = mac
+        ports.append(port)
+
+    cartridges = {}
+    for idx in sorted(supplies, key=lambda x: int(x) if str(x).isdigit() else 0):
+        supply = supplies[idx]
+        tag = classify_supply(supply.get("descr", ""))
+        if not tag or tag in cartridges:
+            continue
+        value = _supply_value(supply.get("level"), supply.get("max"))
+        if value:
+            cartridges[tag] = value
+
+    device_info = {
+        "IPS": {"IP": ip},
+        "TYPE": "PRINTER",
+        "SERIAL": (info.get("SERIAL") or "").strip(),
+        "MODEL": (info.get("MODEL") or "").strip(),
+        "NAME": (info.get("NAME") or "").strip(),
+        "DESCRIPTION": (info.get("DESCRIPTION") or "").strip(),
+    }
+    # MAC первого интерфейса с адресом — как в INFO у GLPI
+    first_mac = next((p["MAC"] for p in ports if p.get("MAC")), "")
+    if first_mac:
+        device_info["MAC"] = first_mac
+
+    device = {"INFO": device_info, "PAGECOUNTERS": dict(counters)}
+    if cartridges:
+        device["CARTRIDGES"] = cartridges
+    if ports:
+        device["PORTS"] = {"PORT": ports}
+
+    return {"CONTENT": {"DEVICE": device}, "QUERY": "SNMPQUERY"}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# КЛИЕНТЫ
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+class PysnmpClient:
+    """
+    SNMP v2c поверх pysnmp (asyncio hlapi). Один SnmpEngine на event loop —
+    все запросы пачки идут через один UDP-диспетчер.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, retries: Optional[int] = None):
+        try:
+            from pysnmp.hlapi.v3arch import asyncio as hlapi  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("Для встроенного SNMP-опроса требуется пакет pysnmp (pip install pysnmp)") from e
+
+        self._hlapi = hlapi
+        self._engine = hlapi.SnmpEngine()
+        self.timeout = timeout if timeout is not None else getattr(settings, "SNMP_NATIVE_TIMEOUT", 2.0)
+        self.retries = retries if retries is not None else getattr(settings, "SNMP_NATIVE_RETRIES", 1)
+
+    async def _target(self, ip: str, port: int):
+        return await self._hlapi.UdpTransportTarget.create((ip, port), timeout=self.timeout, retries=self.retries)
+
+    @staticmethod
+    def _is_empty(value) -> bool:
+        from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
+
+        return isinstance(value, (NoSuchObject, NoSuchInstance, EndOfMibView))
+
+    async def get(self, ip: str, community: str, oids: Iterable[str], port: int = 161) -> Dict[str, str]:
+        hl = self._hlapi
+        error_indication, error_status, _, var_binds = await hl.get_cmd(
+            self._engine,
+            hl.CommunityData(community, mpModel=1),
+            await self._target(ip, port),
+            hl.ContextData(),
+            *[hl.ObjectType(hl.ObjectIdentity(oid)) for oid in oids],
+            lookupMib=False,
+        )
+        if error_indication:
+            raise SnmpCollectError(str(error_indication))
+        if error_status:
+            raise SnmpCollectError(error_status.prettyPrint())
+        return {str(name): value.prettyPrint() for name, value in var_binds if not self._is_empty(value)}
+
+    async def walk(self, ip: str, community: str, oid: str, port: int = 161) -> Dict[str, str]:
+        hl = self._hlapi
+        result = {}
+        async for error_indication, error_status, _, var_binds in hl.walk_cmd(
+            self._engine,
+            hl.CommunityData(community, mpModel=1),
+            await self._target(ip, port),
+            hl.ContextData(),
+            hl.ObjectType(hl.ObjectIdentity(oid)),
+            lookupMib=False,
+            lexicographicMode=False,
+        ):
+            if error_indication:
+                raise SnmpCollectError(str(error_indication))
+            if error_status:
+                raise SnmpCollectError(error_status.prettyPrint())
+            for name, value in var_binds:
+                if not self._is_empty(value):
+                    result[str(name)] = value.prettyPrint()
+        return result
+
+    def close(self):
+        try:
+            self._engine.close_dispatcher()
+        except Exception:
+            pass
+
+
+def parse_snmprec(text: str) -> Dict[str, str]:
+    """
+    Разбирает данные в формате snmpsim (.snmprec): ``oid|tag|value``.
+    Бинарные строки (тег 4x) отдаются как 0x..., как это делает pysnmp.
+    """
+    records = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split("|", 2)
+        if len(parts) != 3:
+            continue
+        oid, tag, value = parts
+        if tag.endswith("x"):
+            value = "0x" + value.lower()
+        records[oid.strip(".")] = value
+    return records
+
+
+class SnmprecClient:
+    """
+    Клиент без сети поверх снимков snmpsim: community → набор записей snmprec.
+    Неизвестное community ведёт себя как молчащее устройство (таймаут).
+
+    latency — искусственная задержка на запрос (для бенчмарка параллелизма).
+    """
+
+    def __init__(self, datasets: Dict[str, str], latency: float = 0.0):
+        self._data = {community: parse_snmprec(text) for community, text in datasets.items()}
+        self._sorted = {community: sorted(records, key=_oid_key) for community, records in self._data.items()}
+        self.latency = latency
+
+    async def _records(self, community: str) -> Dict[str, str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        records = self._data.get(community)
+        if records is None:
+            raise SnmpCollectError("No SNMP response received before timeout")
+        return records
+
+    async def get(self, ip: str, community: str, oids: Iterable[str], port: int = 161) -> Dict[str, str]:
+        records = await self._records(community)
+        return {oid: records[oid] for oid in oids if oid in records}
+
+    async def walk(self, ip: str, community: str, oid: str, port: int = 161) -> Dict[str, str]:
+        records = await self._records(community)
+        prefix = oid.strip(".") + "."
+        return {key: records[key] for key in self._sorted[community] if key.startswith(prefix)}
+
+    def close(self):
+        pass
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ОПРОС
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def pagecounter_oids() -> Dict[str, List[str]]:
+    """
+    PAGECOUNTER_OIDS с добавками из SNMP_NATIVE_PAGECOUNTER_OIDS
+    ({тег: [OID, ...]}); OID из настроек проверяются первыми.
+    """
+    extra = getattr(settings, "SNMP_NATIVE_PAGECOUNTER_OIDS", None) or {}
+    merged = {tag: list(candidates) for tag, candidates in PAGECOUNTER_OIDS.items()}
+    for tag, candidates in extra.items():
+        first = [oid.strip(".") for oid in candidates]
+        merged[tag] = first + [oid for oid in merged.get(tag, []) if oid not in first]
+    return merged
+
+
+def _table_column(rows: Dict[str, str], column_oid: str) -> Dict[str, str]:
+    """{полный OID: значение} → {индекс строки: значение}."""
+    prefix = column_oid + "."
+    return {oid[len(prefix) :]: value for oid, value in rows.items() if oid.startswith(prefix)}
+
+
+async def collect_device(client, ip: str, community: str = "public", port: int = 161) -> dict:
+    """
+    Опрашивает одно устройство и возвращает структуру xml_to_json().
+    Поднимает SnmpCollectError, если устройство не отвечает.
+    """
+    counter_oids = pagecounter_oids()
+    scalar_oids = list(INFO_OIDS.values())
+    for candidates in counter_oids.values():
+        scalar_oids.extend(candidates)
+
+    scalars = await client.get(ip, community, scalar_oids, port=port)
+    if not scalars:
+        raise SnmpCollectError(f"{ip}: устройство не вернуло ни одного значения")
+
+    info = {tag: scalars.get(oid, "") for tag, oid in INFO_OIDS.items()}
+    counters = {}
+    for tag, candidates in counter_oids.items():
+        for oid in candidates:
+            if scalars.get(oid) not in (None, ""):
+                counters[tag] = scalars[oid]
+                break
+
+    # Таблицы интерфейсов и расходников — параллельно в рамках одного устройства
+    if_descr, if_phys, sup_descr, sup_max, sup_level = await asyncio.gather(
+        client.walk(ip, community, IF_DESCR, port=port),
+        client.walk(ip, community, IF_PHYS_ADDRESS, port=port),
+        client.walk(ip, community, SUPPLY_DESCR, port=port),
+        client.walk(ip, community, SUPPLY_MAX_CAPACITY, port=port),
+        client.walk(ip, community, SUPPLY_LEVEL, port=port),
+    )
+
+    interfaces = {}
+    for idx, descr in _table_column(if_descr, IF_DESCR).items():
+        interfaces.setdefault(idx, {})["descr"] = descr
+    for idx, mac in _table_column(if_phys, IF_PHYS_ADDRESS).items():
+        interfaces.setdefault(idx, {})["mac"] = mac
+
+    supplies = {}
+    for idx, descr in _table_column(sup_descr, SUPPLY_DESCR).items():
+        supplies.setdefault(idx, {})["descr"] = descr
+    for idx, cap in _table_column(sup_max, SUPPLY_MAX_CAPACITY).items():
+        supplies.setdefault(idx, {})["max"] = cap
+    for idx, level in _table_column(sup_level, SUPPLY_LEVEL).items():
+        supplies.setdefault(idx, {})["level"] = level
+
+    return build_inventory_data(ip, info, counters, interfaces, supplies)
+
+
+async def collect_many(
+    targets: Iterable[Tuple], client=None, concurrency: Optional[int] = None
+) -> Dict[str, Tuple[bool, dict, str]]:
+    """
+    Параллельный опрос списка устройств.
+
+    targets: кортежи (ip, community) или (ip, community, port).
+    Returns: {ip: (success, data, error_message)}
+    """
+    limit = concurrency or getattr(settings, "SNMP_NATIVE_CONCURRENCY", 100)
+    semaphore = asyncio.Semaphore(max(1, limit))
+    own_client = client is None
+    client = client or PysnmpClient()
+
+    async def poll_one(target):
+        ip, community, port = (tuple(target) + (161,))[:3]
+        async with semaphore:
+            try:
+                data = await collect_device(client, ip, community or "public", port)
+                return ip, (True, data, "")
+            except SnmpCollectError as e:
+                return ip, (False, {}, f"SNMP: {e}")
+            except Exception as e:
+                logger.error(f"Native SNMP error for {ip}: {e}", exc_info=True)
+                return ip, (False, {}, f"SNMP: {e}")
+
+    try:
+        results = await asyncio.gather(*(poll_one(t) for t in targets))
+    finally:
+        if own_client:
+            client.close()
+    return dict(results)
+
+
+def collect_snmp_data(ip: str, community: str = "public", port: int = 161, client=None) -> Tuple[bool, dict, str]:
+    """
+    Синхронная обёртка для опроса одного принтера из run_inventory_for_printer().
+    Пакетный опрос демона идёт через collect_snmp_data_many() (см. inventory/tasks.py).
+
+    Returns:
+        (success, data, error_message)
+    """
+    started = time.monotonic()
+    results = asyncio.run(collect_many([(ip, community, port)], client=client, concurrency=1))
+    ok, data, error = results[ip]
+    logger.info(f"Native SNMP poll for {ip}: {'OK' if ok else 'FAIL'} in {time.monotonic() - started:.2f}s")
+    return ok, data, error
+
+
+def collect_snmp_data_many(
+    targets: List[Tuple], client=None, concurrency: Optional[int] = None
+) -> Dict[str, Tuple[bool, dict, str]]:
+    """Синхронная обёртка над collect_many() для пакетного опроса."""
+    return asyncio.run(collect_many(targets, client=client, concurrency=concurrency))
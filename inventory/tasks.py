@@ -1,11 +1,13 @@
 # inventory/tasks.py
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from celery import shared_task
 from django.utils import timezone
 
-from .models import InventoryTask, Printer
+from . import inflight
+from .browser_pool import BrowserPoolTimeout
+from .models import Printer
 from .services import run_inventory_for_printer
 
 logger = logging.getLogger(__name__)
@@ -109,15 +111,175 @@ def run_inventory_task(self, printer_id: int, xml_path: Optional[str] = None) ->
         }
 
 
+def _poll_printer_for_daemon(printer_id: int, snmp_result: Optional[Tuple[bool, dict, str]] = None) -> Dict[str, Any]:
+    """
+    Опрос одного принтера внутри пакетной задачи.
+    Каждый опрос сам пишет InventoryTask и шлёт WebSocket-обновление,
+    поэтому статусы по принтерам остаются раздельными.
+    snmp_result — данные встроенного SNMP, собранные заранее для всего пакета.
+    """
+    try:
+        printer = Printer.objects.only("id", "ip_address").get(pk=printer_id)
+    except Printer.DoesNotExist:
+        logger.error(f"Printer {printer_id} does not exist")
+        return {"success": False, "error": f"Printer {printer_id} not found", "printer_id": printer_id}
+
+    success, message = run_inventory_for_printer(printer_id, triggered_by="daemon", snmp_result=snmp_result)
+    return {"success": success, "message": message, "printer_id": printer_id, "printer_ip": printer.ip_address}
+
+
+def _poll_in_batch_thread(printer_id: int, snmp_result: Optional[Tuple[bool, dict, str]] = None) -> Dict[str, Any]:
+    """Обёртка для потока пула: своё соединение с БД закрываем сразу после опроса."""
+    from django.db import connection
+
+    try:
+        return _poll_printer_for_daemon(printer_id, snmp_result=snmp_result)
+    finally:
+        connection.close()
+
+
+def _prefetch_native_snmp(printer_ids: List[int]) -> Dict[int, Tuple[bool, dict, str]]:
+    """
+    Встроенный SNMP-опрос всех NATIVE-принтеров пакета одним event loop
+    (collect_snmp_data_many, параллелизм SNMP_NATIVE_CONCURRENCY).
+    Принтеры с правилами веб-парсинга SNMP не используют (кроме HYBRID) и пропускаются.
+    При ошибке возвращает {} — тогда каждый принтер опрашивается сам.
+    """
+    from django.db.models import Exists, OuterRef, Q
+
+    from .models import PollingMethod, SnmpBackend, WebParsingRule
+    from .snmp_native import collect_snmp_data_many
+
+    has_rules = WebParsingRule.objects.filter(printer=OuterRef("pk"))
+    targets = list(
+        Printer.objects.filter(pk__in=printer_ids, snmp_backend=SnmpBackend.NATIVE)
+        .filter(Q(polling_method=PollingMethod.HYBRID) | ~Exists(has_rules))
+        .values_list("id", "ip_address", "snmp_community")
+    )
+    if not targets:
+        return {}
+
+    try:
+        by_ip = collect_snmp_data_many([(ip, community or "public") for _, ip, community in targets])
+    except Exception as exc:
+        logger.error(f"Native SNMP prefetch failed for batch: {exc}", exc_info=True)
+        return {}
+    return {printer_id: by_ip[ip] for printer_id, ip, _ in targets if ip in by_ip}
+
+
+@shared_task(bind=True, priority=1, queue="low_priority", ignore_result=True)
+def run_inventory_batch_task(self, printer_ids: List[int]) -> Dict[str, Any]:
+    """
+    Пакетный опрос принтеров (для периодического демона).
+
+    Одно сообщение брокера на INVENTORY_BATCH_SIZE принтеров; внутри —
+    пул из INVENTORY_BATCH_CONCURRENCY потоков. SNMP-данные NATIVE-принтеров пакета
+    собираются заранее одним asyncio-проходом (_prefetch_native_snmp). Принтеры, опрос которых
+    упал с исключением или не дождался браузера из пула (BrowserPoolTimeout),
+    переотправляются одиночными run_inventory_task (там работают обычные повторы).
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from celery.exceptions import SoftTimeLimitExceeded
+    from django.conf import settings
+
+    concurrency = max(1, min(getattr(settings, "INVENTORY_BATCH_CONCURRENCY", 8), len(printer_ids)))
+    started = timezone.now()
+    logger.info(f"Starting inventory batch: {len(printer_ids)} printers, {concurrency} threads")
+
+    snmp_results = _prefetch_native_snmp(printer_ids)
+
+    outcomes = {}
+    crashed = []
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inventory-batch")
+    futures = {executor.submit(_poll_in_batch_thread, pid, snmp_results.get(pid)): pid for pid in printer_ids}
+
+    try:
+        for future in as_completed(futures):
+            printer_id = futures[future]
+            try:
+                outcomes[printer_id] = future.result()
+            except BrowserPoolTimeout:
+                # Браузеры процесса заняты остальными WEB-опросами пачки — опросим позже
+                logger.warning(f"Browser pool busy, re-queueing printer {printer_id}")
+                crashed.append(printer_id)
+            except Exception as exc:
+                logger.error(f"Error in batch inventory for printer {printer_id}: {exc}", exc_info=True)
+                crashed.append(printer_id)
+    except SoftTimeLimitExceeded:
+        not_started = [pid for future, pid in futures.items() if future.cancel()]
+        logger.error(f"Inventory batch hit time limit, re-queueing {len(not_started)} not started printers")
+        if not_started:
+            run_inventory_batch_task.apply_async(args=[not_started], priority=1)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for printer_id in crashed:
+        run_inventory_task.apply_async(args=[printer_id], priority=1, countdown=60)
+
+    success_count = sum(1 for outcome in outcomes.values() if outcome.get("success"))
+    elapsed = (timezone.now() - started).total_seconds()
+    logger.info(
+        f"Inventory batch completed in {elapsed:.1f}s: "
+        f"{success_count} success, {len(outcomes) - success_count} failed, {len(crashed)} re-queued"
+    )
+
+    return {
+        "success": True,
+        "total": len(printer_ids),
+        "succeeded": success_count,
+        "failed": len(outcomes) - success_count,
+        "requeued": crashed,
+        "duration": elapsed,
+        "timestamp": timezone.now().isoformat(),
+    }
+
+
+@shared_task(priority=0, queue="exports", ignore_result=True)
+def save_xml_export_task(printer_id: int, results: Dict[str, Any]) -> None:
+    """
+    Пишет XML-выгрузку для GLPI по результатам успешного WEB/HYBRID опроса.
+    Вынесено из опроса: счётчики обрабатываются без XML, файл нужен только GLPI.
+    """
+    from .services import _save_xml_export
+    from .web_parser import export_to_xml
+
+    printer = Printer.objects.select_related("device_model__manufacturer").filter(pk=printer_id).first()
+    if printer is None:
+        return
+    _save_xml_export(printer, export_to_xml(printer, results))
+
+
+@shared_task(priority=5, queue="high_priority", ignore_result=True)
+def flush_ws_broadcast_task() -> int:
+    """Страховка рассылки WebSocket: забирает окно, брошенное погибшим процессом (inventory/ws_broadcast.py)."""
+    from . import ws_broadcast
+
+    return ws_broadcast.flush_stale()
+
+
+@shared_task(priority=5, queue="high_priority", ignore_result=True)
+def flush_monthly_sync_task() -> int:
+    """
+    Применяет накопленные опросы к месячным отчётам (inventory/monthly_sync.py).
+    Очередь high_priority: в low_priority flush ждал бы за пачками опроса и истекал.
+    """
+    from . import monthly_sync
+
+    return monthly_sync.flush()
+
+
 @shared_task(bind=True, queue="daemon")
 def inventory_daemon_task(self):
     """
     Периодическая задача для опроса всех принтеров.
-    Запускает обычные (низкоприоритетные) задачи.
+    Запускает низкоприоритетные пакетные задачи (run_inventory_batch_task)
+    по INVENTORY_BATCH_SIZE принтеров в одном сообщении брокера.
 
     ОПТИМИЗАЦИЯ:
     - Проверяет размер очереди перед добавлением новых задач
     - Фильтрует принтеры по активным организациям
+    - Берёт только принтеры, у которых подошёл next_poll_at (адаптивное расписание)
     - Предотвращает переполнение очереди Redis
     """
     import os
@@ -168,15 +330,16 @@ def inventory_daemon_task(self):
         # 2. Или принтеры без организации (для совместимости)
         from django.db.models import Q
 
-        printers = (
-            Printer.objects.filter(Q(organization__active=True) | Q(organization__isnull=True))
-            .select_related("organization")
-            .order_by("id")
-        )
+        from .scheduling import due_printers_q
+
+        candidates = Printer.objects.filter(Q(organization__active=True) | Q(organization__isnull=True))
+        printers = candidates.filter(due_printers_q(timezone.now())).select_related("organization").order_by("id")
 
         total_count = printers.count()
+        not_due_count = candidates.count() - total_count
 
-        logger.warning(f"Found {total_count} printers in active organizations")
+        logger.warning(f"Found {total_count} printers due for polling in active organizations")
+        logger.warning(f"Skipped by adaptive schedule (not due yet): {not_due_count}")
 
         # Логируем первые и последние ID для проверки
         if printers.exists():
@@ -186,35 +349,48 @@ def inventory_daemon_task(self):
 
         if not printers.exists():
             logger.warning("No printers found - exiting")
-            return {"success": True, "message": "No printers to poll", "count": 0}
+            return {"success": True, "message": "No printers to poll", "count": 0, "not_due": not_due_count}
+
+        # Запускаем задачи пачками по INVENTORY_BATCH_SIZE принтеров
+        # (batch_size <= 1 — по одной задаче на принтер, как раньше)
+        batch_size = max(1, getattr(settings, "INVENTORY_BATCH_SIZE", 50))
+        due_ids = list(printers.values_list("id", flat=True))
+
+        # Не ставим повторно принтеры, которые уже в очереди или опрашиваются (inventory/inflight.py)
+        printer_ids = inflight.claim_queued(due_ids)
+        in_flight_count = len(due_ids) - len(printer_ids)
+        logger.warning(f"Skipped as already queued or running: {in_flight_count}")
 
-        # Запускаем задачи для каждого принтера
         task_ids = []
+        queued_ids = []
         failed_to_queue = []
-        sample_ips = []
+        sample_ips = [
+            f"{p.id}:{p.ip_address} ({p.organization.name if p.organization else 'No Org'})" for p in printers[:20]
+        ]
 
-        for idx, printer in enumerate(printers, 1):
+        for offset in range(0, len(printer_ids), batch_size):
+            chunk = printer_ids[offset : offset + batch_size]
             try:
-                # Используем обычную (низкоприоритетную) задачу
-                task = run_inventory_task.apply_async(args=[printer.id], priority=1)
+                if batch_size == 1:
+                    # Используем обычную (низкоприоритетную) задачу
+                    task = run_inventory_task.apply_async(args=[chunk[0]], priority=1)
+                else:
+                    task = run_inventory_batch_task.apply_async(args=[chunk], priority=1)
                 task_ids.append(task.id)
+                queued_ids.extend(chunk)
 
-                # Сохраняем примеры IP
-                if len(sample_ips) < 20:
-                    org_name = printer.organization.name if printer.organization else "No Org"
-                    sample_ips.append(f"{printer.id}:{printer.ip_address} ({org_name})")
-
-                # Логируем прогресс каждые 100 принтеров
-                if idx % 100 == 0:
-                    logger.warning(f"Progress: {idx}/{total_count} tasks queued")
+                # Логируем прогресс каждые ~100 принтеров
+                if (offset + len(chunk)) // 100 > offset // 100:
+                    logger.warning(f"Progress: {offset + len(chunk)}/{total_count} printers queued")
 
             except Exception as e:
-                logger.error(f"FAILED to queue task for printer {printer.id} ({printer.ip_address}): {e}")
-                failed_to_queue.append(printer.id)
+                logger.error(f"FAILED to queue task for printers {chunk[0]}..{chunk[-1]}: {e}")
+                failed_to_queue.extend(chunk)
+                inflight.release_queued(chunk)
 
         logger.warning("=" * 80)
         logger.warning("DAEMON COMPLETED")
-        logger.warning(f"Successfully queued: {len(task_ids)}/{total_count}")
+        logger.warning(f"Successfully queued: {len(queued_ids)}/{total_count} printers in {len(task_ids)} messages")
         logger.warning(f"Failed to queue: {len(failed_to_queue)}")
         logger.warning(f"Queue size before: {current_queue_size:,}")
         logger.warning(f"Queue size after: ~{current_queue_size + len(task_ids):,}")
@@ -227,11 +403,15 @@ def inventory_daemon_task(self):
 
         return {
             "success": True,
-            "message": f"Queued {len(task_ids)}/{total_count} inventory tasks",
+            "message": f"Queued {len(queued_ids)}/{total_count} printers in {len(task_ids)} tasks",
             "task_ids": task_ids[:10],
             "failed_ids": failed_to_queue,
             "total_printers": total_count,
             "queued_tasks": len(task_ids),
+            "queued_printers": len(queued_ids),
+            "not_due": not_due_count,
+            "in_flight": in_flight_count,
+            "batch_size": batch_size,
             "previous_queue_size": current_queue_size,
             "timestamp": timezone.now().isoformat(),
         }
@@ -329,41 +509,23 @@ def cleanup_old_inventory_data():
     Задача для очистки старых данных инвентаризации (БД и Redis).
 
     Стратегия очистки:
-    - Для данных старше 90 дней: оставляем только последнюю запись за каждый день для каждого принтера
-    - Для данных младше 90 дней: храним всё (для детальной отладки)
+    - Для данных старше INVENTORY_FULL_HISTORY_DAYS (90) дней: оставляем только последнюю запись за каждый день
+      для каждого принтера
+    - Для данных младше: храним всё (для детальной отладки)
 
     Это позволяет сохранить полную историю за годы при минимальном использовании места.
+    На PostgreSQL история секционирована по месяцам (inventory/partitions.py): создаются секции
+    на месяцы вперёд, а старые сжимаются подменой секции целиком, без построчного DELETE.
     """
     try:
-        from datetime import timedelta
-
         import redis
 
-        from django.db.models import Max
-        from django.db.models.functions import TruncDate
+        from .partitions import compact_history, ensure_partitions, history_cutoff
 
         # 1. Умная очистка БД: оставляем последнюю запись за каждый день
-        cutoff_date = timezone.now() - timedelta(days=90)
-
-        # Находим ID последних записей за каждый день для каждого принтера
-        # TruncDate обрезает timestamp до даты (без времени)
-        tasks_to_keep = (
-            InventoryTask.objects.filter(task_timestamp__lt=cutoff_date)
-            .annotate(date=TruncDate("task_timestamp"))  # Группируем по дате
-            .values("printer_id", "date")  # Для каждого принтера и даты
-            .annotate(max_id=Max("id"))  # Находим ID последней записи
-            .values_list("max_id", flat=True)
-        )
-
-        # Подсчитываем сколько записей удалим
-        tasks_to_delete = InventoryTask.objects.filter(task_timestamp__lt=cutoff_date).exclude(
-            id__in=list(tasks_to_keep)
-        )
-        deleted_count = tasks_to_delete.count()
-        kept_count = len(tasks_to_keep)
-
-        # Удаляем все старые записи, кроме последних за каждый день
-        tasks_to_delete.delete()
+        ensure_partitions()
+        retention = compact_history(history_cutoff())
+        deleted_count, kept_count = retention["deleted"], retention["kept"]
 
         logger.info(
             f"Cleaned up {deleted_count} old inventory tasks from database "
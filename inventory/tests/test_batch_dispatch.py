@@ -0,0 +1,185 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from inventory.browser_pool import BrowserPoolTimeout
+from inventory.models import PollingMethod, Printer, SnmpBackend, WebParsingRule
+from inventory.tasks import _poll_printer_for_daemon, inventory_daemon_task, run_inventory_batch_task
+
+
+def _no_redis():
+    return mock.patch("redis.StrictRedis", side_effect=ConnectionError("no redis"))
+
+
+class DaemonDispatchTests(TestCase):
+    def setUp(self):
+        caches["inventory"].clear()  # отметки очереди inventory/inflight.py
+        Printer.objects.bulk_create(
+            [Printer(ip_address=f"10.2.{i // 250}.{i % 250 + 1}", serial_number=f"SN{i:04d}") for i in range(120)]
+        )
+        self.ids = list(Printer.objects.order_by("id").values_list("id", flat=True))
+
+    @override_settings(INVENTORY_BATCH_SIZE=50)
+    def test_dispatches_chunks(self):
+        with (
+            _no_redis(),
+            mock.patch("inventory.tasks.run_inventory_batch_task.apply_async") as batch,
+            mock.patch("inventory.tasks.run_inventory_task.apply_async") as single,
+        ):
+            result = inventory_daemon_task()
+
+        single.assert_not_called()
+        chunks = [c.kwargs["args"][0] for c in batch.call_args_list]
+        self.assertEqual([len(c) for c in chunks], [50, 50, 20])
+        self.assertEqual(sum(chunks, []), self.ids)
+        self.assertEqual(result["queued_tasks"], 3)
+        self.assertEqual(result["queued_printers"], 120)
+
+    @override_settings(INVENTORY_BATCH_SIZE=1)
+    def test_batch_size_one_keeps_per_printer_tasks(self):
+        with (
+            _no_redis(),
+            mock.patch("inventory.tasks.run_inventory_batch_task.apply_async") as batch,
+            mock.patch("inventory.tasks.run_inventory_task.apply_async") as single,
+        ):
+            result = inventory_daemon_task()
+
+        batch.assert_not_called()
+        self.assertEqual(single.call_count, 120)
+        self.assertEqual(result["queued_printers"], 120)
+
+    def test_failed_chunk_reported(self):
+        with (
+            _no_redis(),
+            mock.patch(
+                "inventory.tasks.run_inventory_batch_task.apply_async", side_effect=[mock.Mock(id="a"), OSError]
+            ),
+        ):
+            with override_settings(INVENTORY_BATCH_SIZE=60):
+                result = inventory_daemon_task()
+
+        self.assertEqual(result["failed_ids"], self.ids[60:])
+        self.assertEqual(result["queued_printers"], 60)
+
+
+class BatchTaskTests(SimpleTestCase):
+    def _fake_poll(self, crash_ids=()):
+        state = {"active": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def poll(printer_id, snmp_result=None):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            try:
+                time.sleep(0.005)
+                if printer_id in crash_ids:
+                    raise RuntimeError("boom")
+                return {"success": printer_id % 2 == 0, "printer_id": printer_id}
+            finally:
+                with lock:
+                    state["active"] -= 1
+
+        return poll, state
+
+    @override_settings(INVENTORY_BATCH_CONCURRENCY=4)
+    def test_outcomes_counted_and_parallelism_bounded(self):
+        poll, state = self._fake_poll()
+        with (
+            mock.patch("inventory.tasks._prefetch_native_snmp", return_value={}),
+            mock.patch("inventory.tasks._poll_printer_for_daemon", side_effect=poll),
+        ):
+            result = run_inventory_batch_task(list(range(1, 21)))
+
+        self.assertEqual(result["total"], 20)
+        self.assertEqual(result["succeeded"], 10)
+        self.assertEqual(result["failed"], 10)
+        self.assertLessEqual(state["peak"], 4)
+        self.assertGreater(state["peak"], 1)
+
+    def test_crashed_printers_requeued_individually(self):
+        poll, _ = self._fake_poll(crash_ids={3, 7})
+        with (
+            mock.patch("inventory.tasks._prefetch_native_snmp", return_value={}),
+            mock.patch("inventory.tasks._poll_printer_for_daemon", side_effect=poll),
+            mock.patch("inventory.tasks.run_inventory_task.apply_async") as single,
+        ):
+            result = run_inventory_batch_task(list(range(1, 11)))
+
+        self.assertEqual(sorted(result["requeued"]), [3, 7])
+        self.assertEqual(sorted(c.kwargs["args"][0] for c in single.call_args_list), [3, 7])
+        self.assertEqual(result["succeeded"] + result["failed"], 8)
+
+    def test_printers_without_free_browser_requeued(self):
+        def poll(printer_id, snmp_result=None):
+            if printer_id in (2, 5):
+                raise BrowserPoolTimeout("busy")
+            return {"success": True, "printer_id": printer_id}
+
+        with (
+            mock.patch("inventory.tasks._prefetch_native_snmp", return_value={}),
+            mock.patch("inventory.tasks._poll_printer_for_daemon", side_effect=poll),
+            mock.patch("inventory.tasks.run_inventory_task.apply_async") as single,
+        ):
+            result = run_inventory_batch_task(list(range(1, 7)))
+
+        self.assertEqual(sorted(result["requeued"]), [2, 5])
+        self.assertEqual(sorted(c.kwargs["args"][0] for c in single.call_args_list), [2, 5])
+        self.assertEqual((result["succeeded"], result["failed"]), (4, 0))
+
+
+class PollPrinterForDaemonTests(TestCase):
+    def test_runs_inventory_with_daemon_trigger(self):
+        printer = Printer.objects.create(ip_address="10.3.0.1", serial_number="SN1")
+        with mock.patch("inventory.tasks.run_inventory_for_printer", return_value=(True, "ok")) as run:
+            outcome = _poll_printer_for_daemon(printer.id)
+
+        run.assert_called_once_with(printer.id, triggered_by="daemon", snmp_result=None)
+        self.assertEqual(outcome["printer_ip"], "10.3.0.1")
+        self.assertTrue(outcome["success"])
+
+    def test_missing_printer(self):
+        outcome = _poll_printer_for_daemon(999999)
+        self.assertFalse(outcome["success"])
+
+
+class NativeSnmpPrefetchTests(TestCase):
+    def test_native_printers_collected_in_one_pass(self):
+        native = Printer.objects.create(
+            ip_address="10.4.0.1", serial_number="N1", snmp_community="mono", snmp_backend=SnmpBackend.NATIVE
+        )
+        hybrid = Printer.objects.create(
+            ip_address="10.4.0.2",
+            serial_number="N2",
+            snmp_backend=SnmpBackend.NATIVE,
+            polling_method=PollingMethod.HYBRID,
+        )
+        web = Printer.objects.create(ip_address="10.4.0.3", serial_number="N3", snmp_backend=SnmpBackend.NATIVE)
+        WebParsingRule.objects.create(printer=web, url_path="/status", field_name="counter", xpath="//td")
+        WebParsingRule.objects.create(printer=hybrid, url_path="/status", field_name="counter", xpath="//td")
+        glpi = Printer.objects.create(ip_address="10.4.0.4", serial_number="G1")
+
+        polled = {}
+
+        def fake_collect_many(targets, *args, **kwargs):
+            polled["targets"] = sorted(targets)
+            return {ip: (True, {"ip": ip}, "") for ip, _ in targets}
+
+        def fake_poll(printer_id, snmp_result=None):
+            polled[printer_id] = snmp_result
+            return {"success": True, "printer_id": printer_id}
+
+        with (
+            mock.patch("inventory.snmp_native.collect_snmp_data_many", side_effect=fake_collect_many),
+            mock.patch("inventory.tasks._poll_printer_for_daemon", side_effect=fake_poll),
+        ):
+            run_inventory_batch_task([native.id, hybrid.id, web.id, glpi.id])
+
+        self.assertEqual(polled["targets"], [("10.4.0.1", "mono"), ("10.4.0.2", "public")])
+        self.assertEqual(polled[native.id], (True, {"ip": "10.4.0.1"}, ""))
+        self.assertEqual(polled[hybrid.id], (True, {"ip": "10.4.0.2"}, ""))
+        self.assertIsNone(polled[web.id])
+        self.assertIsNone(polled[glpi.id])
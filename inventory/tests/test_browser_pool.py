@@ -0,0 +1,207 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from inventory import browser_pool
+from inventory.browser_pool import BrowserPool, BrowserPoolTimeout
+
+
+class FakeDriver:
+    """Минимальная замена WebDriver: считает вызовы, умеет «ломаться»."""
+
+    created = 0
+
+    def __init__(self):
+        FakeDriver.created += 1
+        self.alive = True
+        self.quit_called = False
+        self.cookies_cleared = 0
+        self.visited = []
+        self.window_handles = ["main"]
+        self.switch_to = mock.Mock()
+
+    def execute_script(self, script):
+        if not self.alive:
+            raise RuntimeError("session deleted")
+        return 1 if script == "return 1" else None
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == "Network.clearBrowserCookies":
+            self.cookies_cleared += 1
+
+    def get(self, url):
+        if not self.alive:
+            raise RuntimeError("session deleted")
+        self.visited.append(url)
+
+    def close(self):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+class BrowserPoolTests(SimpleTestCase):
+    def setUp(self):
+        FakeDriver.created = 0
+
+    def test_driver_reused_and_reset_between_leases(self):
+        pool = BrowserPool(factory=FakeDriver, size=1)
+
+        with pool.lease() as first:
+            first.visited.append("http://10.0.0.1/")
+        with pool.lease() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(FakeDriver.created, 1)
+        self.assertEqual(first.cookies_cleared, 2)
+        self.assertEqual(first.visited[-1], "about:blank")
+
+    def test_recycled_after_max_uses(self):
+        pool = BrowserPool(factory=FakeDriver, size=1, max_uses=2)
+
+        drivers = []
+        for _ in range(3):
+            with pool.lease() as driver:
+                drivers.append(driver)
+
+        self.assertIs(drivers[0], drivers[1])
+        self.assertIsNot(drivers[1], drivers[2])
+        self.assertTrue(drivers[1].quit_called)
+        self.assertEqual(pool.stats()["total"], 1)
+
+    def test_dead_driver_replaced_on_checkout(self):
+        pool = BrowserPool(factory=FakeDriver, size=1)
+
+        with pool.lease() as first:
+            pass
+        first.alive = False
+
+        with pool.lease() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.quit_called)
+
+    def test_driver_broken_during_lease_discarded(self):
+        pool = BrowserPool(factory=FakeDriver, size=1)
+
+        with pool.lease() as driver:
+            driver.alive = False  # reset упадёт на get("about:blank")
+
+        self.assertTrue(driver.quit_called)
+        self.assertEqual(pool.stats(), {"size": 1, "total": 0, "idle": 0, "leased": 0})
+
+    def test_checkout_timeout(self):
+        pool = BrowserPool(factory=FakeDriver, size=1)
+        driver = pool.acquire()
+
+        started = time.monotonic()
+        with self.assertRaises(BrowserPoolTimeout):
+            pool.acquire(timeout=0.05)
+        self.assertLess(time.monotonic() - started, 1)
+
+        pool.release(driver)
+        self.assertIs(pool.acquire(timeout=0.05), driver)
+
+    def test_factory_failure_frees_slot(self):
+        pool = BrowserPool(factory=mock.Mock(side_effect=RuntimeError("no edge")), size=1)
+
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+        self.assertEqual(pool.stats()["total"], 0)
+
+    def test_concurrent_leases_never_exceed_size(self):
+        pool = BrowserPool(factory=FakeDriver, size=3, checkout_timeout=5)
+        in_use = set()
+        peak = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(5):
+                with pool.lease() as driver:
+                    with lock:
+                        in_use.add(id(driver))
+                        peak.append(len(in_use))
+                    time.sleep(0.002)
+                    with lock:
+                        in_use.discard(id(driver))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertLessEqual(max(peak), 3)
+        self.assertLessEqual(FakeDriver.created, 3)
+
+    def test_size_zero_disables_pooling(self):
+        pool = BrowserPool(factory=FakeDriver, size=0)
+
+        with pool.lease() as first:
+            pass
+        with pool.lease() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.quit_called)
+
+    def test_close_quits_idle_drivers(self):
+        pool = BrowserPool(factory=FakeDriver, size=2)
+        with pool.lease() as driver:
+            pass
+
+        pool.close()
+
+        self.assertTrue(driver.quit_called)
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+
+class GetBrowserPoolTests(SimpleTestCase):
+    def tearDown(self):
+        browser_pool._pool = None
+        browser_pool._pool_pid = None
+
+    def test_new_pool_after_fork(self):
+        with mock.patch("inventory.browser_pool.os.getpid", return_value=100):
+            parent = browser_pool.get_browser_pool()
+            self.assertIs(browser_pool.get_browser_pool(), parent)
+        with mock.patch("inventory.browser_pool.os.getpid", return_value=101):
+            self.assertIsNot(browser_pool.get_browser_pool(), parent)
+
+    @override_settings(WEB_STATIC_FETCH=False)
+    def test_web_parsing_leases_from_pool(self):
+        from inventory.web_parser import execute_web_parsing
+
+        FakeDriver.created = 0
+        pool = BrowserPool(factory=FakeDriver, size=1)
+        printer = mock.Mock(ip_address="10.0.0.5", web_username="")
+        rule = mock.Mock(
+            id=1,
+            protocol="http",
+            url_path="/status",
+            is_calculated=False,
+            actions_chain="",
+            xpath="//td",
+            regex_pattern="",
+            regex_replacement="",
+            field_name="counter",
+        )
+
+        with mock.patch("inventory.web_parser.get_browser_pool", return_value=pool):
+            FakeDriver.page_source = "<table><tr><td>1234</td></tr></table>"
+            try:
+                ok, results, _ = execute_web_parsing(printer, [rule])
+                execute_web_parsing(printer, [rule])
+            finally:
+                del FakeDriver.page_source
+
+        self.assertTrue(ok)
+        self.assertEqual(results["counter"], 1234)
+        self.assertEqual(FakeDriver.created, 1)
+        self.assertEqual(pool.stats()["idle"], 1)
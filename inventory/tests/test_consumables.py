@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from dashboard.services import _parse_percent, get_low_consumables
+from inventory.consumables import ConsumableState, parse_level
+from inventory.models import InventoryTask, PageCounter, Printer
+
+# Значения уровней, встречавшиеся в опросах GLPI, веб-парсинга и USB-агента
+CORPUS = [
+    "",
+    "0",
+    "5",
+    "19",
+    "20",
+    "75",
+    "75%",
+    "100",
+    "100%",
+    " 42 % ",
+    "79.5%",
+    "<5%",
+    "10-20%",
+    "150%",
+    "1900 стр.",
+    "-1",
+    "-2",
+    "-3",
+    "N/A",
+    "--",
+    "OK",
+    "ok",
+    "Normal",
+    "WARNING",
+    "LOW",
+    "Near End",
+    "Empty",
+    "Replace",
+    "Мало",
+    "Заканчивается",
+    "Замените картридж",
+    "Unknown",
+    "x" * 20,
+]
+
+
+class ParseLevelTests(SimpleTestCase):
+    def test_parity_with_parse_percent_below_threshold(self):
+        for raw in CORPUS:
+            pct, _ = parse_level(raw)
+            legacy = _parse_percent(raw)
+            for threshold in range(0, 101):
+                with self.subTest(raw=raw, threshold=threshold):
+                    self.assertEqual(pct is not None and pct < threshold, legacy is not None and legacy < threshold)
+
+    def test_percent_out_of_range_is_unknown(self):
+        self.assertEqual(parse_level("150%"), (None, ""))
+        self.assertEqual(parse_level("1900 стр."), (None, ""))
+
+    def test_status_only_values(self):
+        self.assertEqual(parse_level("OK"), (None, ConsumableState.OK))
+        self.assertEqual(parse_level("WARNING"), (None, ConsumableState.LOW))
+        self.assertEqual(parse_level("Near End"), (None, ConsumableState.LOW))
+        self.assertEqual(parse_level("Empty"), (None, ConsumableState.EMPTY))
+        self.assertEqual(parse_level("N/A"), (None, ""))
+        self.assertEqual(parse_level("75%"), (75, ""))
+
+
+class ConsumableLevelColumnsTests(TestCase):
+    def setUp(self):
+        self.printer = Printer.objects.create(ip_address="10.8.0.1", serial_number="CL1")
+
+    def _counter(self, **levels):
+        task = InventoryTask.objects.create(printer=self.printer, status="SUCCESS")
+        return PageCounter.objects.create(task=task, **levels)
+
+    def test_save_fills_levels(self):
+        counter = self._counter(toner_black="15%", toner_cyan="OK", drum_black="80")
+        counter.refresh_from_db()
+        self.assertEqual(counter.toner_black_pct, 15)
+        self.assertEqual(counter.toner_cyan_state, ConsumableState.OK)
+        self.assertEqual(counter.drum_black_pct, 80)
+        self.assertEqual(counter.min_level_pct, 15)
+
+        counter.toner_black = "90%"
+        counter.save(update_fields=["toner_black"])
+        counter.refresh_from_db()
+        self.assertEqual(counter.min_level_pct, 80)
+
+    def test_low_consumables_filtered_in_sql(self):
+        self._counter(toner_black="12%", drum_black="95")
+        data = get_low_consumables.__wrapped__(threshold=20)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]["low_consumables"], {"toner_black": 12})
+        self.assertEqual(get_low_consumables.__wrapped__(threshold=10), [])
+
+    def test_backfill_command(self):
+        counter = self._counter(toner_black="7%")
+        PageCounter.objects.filter(pk=counter.pk).update(toner_black_pct=None, min_level_pct=None)
+
+        call_command("backfill_consumable_levels", stdout=StringIO())
+
+        counter.refresh_from_db()
+        self.assertEqual((counter.toner_black_pct, counter.min_level_pct), (7, 7))
@@ -0,0 +1,162 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+
+from inventory import inflight
+from inventory.models import Printer
+from inventory.services import run_inventory_for_printer
+from inventory.tasks import inventory_daemon_task
+
+
+class FakePollBackend:
+    """Опрос, который держится, пока тест не отпустит release."""
+
+    def __init__(self, result=(True, "Success"), error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+        self.started.set()
+        assert self.release.wait(5), "poll was never released"
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def _run_concurrently(n, fn, backend):
+    """n вызовов fn: первый занимает опрос, остальные стартуют, когда он уже идёт."""
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        first = pool.submit(fn)
+        assert backend.started.wait(5)
+        rest = [pool.submit(fn) for _ in range(n - 1)]
+        threading.Timer(0.3, backend.release.set).start()
+        return [f.result(timeout=10) for f in [first, *rest]]
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        caches["inventory"].clear()
+        patcher = mock.patch.object(inflight, "WAIT_STEP", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_callers_share_one_poll(self):
+        backend = FakePollBackend(result={"total": 42})
+
+        results = _run_concurrently(5, lambda: inflight.single_flight(1, backend), backend)
+
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(results, [{"total": 42}] * 5)
+        self.assertFalse(inflight.is_running(1))
+
+    def test_no_wait_skips_running_printer(self):
+        backend = FakePollBackend()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            owner = pool.submit(inflight.single_flight, 2, backend)
+            backend.started.wait(5)
+            self.assertIsNone(inflight.single_flight(2, backend, wait=False))
+            backend.release.set()
+            owner.result(timeout=5)
+
+        self.assertEqual(backend.calls, 1)
+
+    def test_followers_see_owner_failure(self):
+        backend = FakePollBackend(error=RuntimeError("agent crashed"))
+
+        def call():
+            try:
+                return inflight.single_flight(3, backend)
+            except Exception as e:
+                return type(e)
+
+        results = _run_concurrently(3, call, backend)
+
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(results, [RuntimeError, inflight.SingleFlightError, inflight.SingleFlightError])
+        self.assertFalse(inflight.is_running(3))
+
+    def test_takes_over_after_owner_vanished(self):
+        cache = caches["inventory"]
+        cache.add(inflight.running_key(4), "dead-worker", 60)
+        threading.Timer(0.1, cache.delete, args=[inflight.running_key(4)]).start()
+
+        self.assertEqual(inflight.single_flight(4, lambda: "fresh"), "fresh")
+
+    def test_different_kinds_do_not_block_each_other(self):
+        backend = FakePollBackend()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            owner = pool.submit(inflight.single_flight, 5, backend)
+            backend.started.wait(5)
+            self.assertEqual(inflight.single_flight(5, lambda: "web", kind="web_parse"), "web")
+            backend.release.set()
+            owner.result(timeout=5)
+
+
+class RunInventorySingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        caches["inventory"].clear()
+
+    def test_manual_callers_attach_and_daemon_skips(self):
+        backend = FakePollBackend(result=(True, "Success"))
+        with (
+            mock.patch("inventory.services._run_inventory_for_printer", backend),
+            mock.patch("inventory.services.update_poll_schedule"),
+            mock.patch.object(inflight, "WAIT_STEP", 0.01),
+        ):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                manual = [pool.submit(run_inventory_for_printer, 7, None, "manual")]
+                backend.started.wait(5)
+                manual += [pool.submit(run_inventory_for_printer, 7, None, "manual") for _ in range(2)]
+                daemon = run_inventory_for_printer(7, triggered_by="daemon")
+                threading.Timer(0.3, backend.release.set).start()
+                results = [f.result(timeout=5) for f in manual]
+
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(results, [(True, "Success")] * 3)
+        self.assertEqual(daemon, (False, "Poll already in progress"))
+
+
+class DaemonInFlightTests(TestCase):
+    def setUp(self):
+        caches["inventory"].clear()
+        self.printers = [Printer.objects.create(ip_address=f"10.12.0.{i}", serial_number=f"IF{i}") for i in range(1, 5)]
+        self.ids = [p.id for p in self.printers]
+
+    def _daemon(self):
+        with (
+            mock.patch("redis.StrictRedis", side_effect=ConnectionError),
+            mock.patch("inventory.tasks.run_inventory_batch_task.apply_async") as batch,
+        ):
+            result = inventory_daemon_task()
+        return sum((c.kwargs["args"][0] for c in batch.call_args_list), []), result
+
+    def test_skips_running_and_already_queued(self):
+        caches["inventory"].add(inflight.running_key(self.ids[0]), "busy", 60)
+
+        queued, result = self._daemon()
+        self.assertEqual(queued, self.ids[1:])
+        self.assertEqual(result["in_flight"], 1)
+
+        # Следующий запуск демона, пока пачка ещё в очереди, ничего не дублирует
+        queued, _ = self._daemon()
+        self.assertEqual(queued, [])
+
+    def test_queued_mark_released_when_poll_starts(self):
+        self._daemon()
+        with (
+            mock.patch("inventory.services._run_inventory_for_printer", return_value=(True, "Success")),
+            mock.patch("inventory.services.update_poll_schedule"),
+        ):
+            run_inventory_for_printer(self.ids[2], triggered_by="daemon")
+
+        queued, _ = self._daemon()
+        self.assertEqual(queued, [self.ids[2]])
@@ -0,0 +1,149 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from inventory.browser_pool import BrowserPoolTimeout
+from inventory.models import InventoryTask, PageCounter, PollingMethod, Printer, WebParsingRule
+from inventory.services import run_inventory_for_printer
+from inventory.tasks import save_xml_export_task
+from inventory.utils import extract_page_counters, xml_to_json
+from inventory.web_parser import build_inventory_data, export_to_xml
+
+FIXTURES = Path(__file__).parent / "fixtures" / "glpi"
+
+WEB_RESULTS = {
+    "serial_number": "WEB123",
+    "mac_address": "00:11:22:33:44:55",
+    "counter": "15200",
+    "counter_a4_bw": "12000",
+    "counter_a4_color": "3200",
+    "toner_black": "40",
+    "drum_black": "OK",
+}
+
+
+def _xml_round_trip(printer, results):
+    """Старый путь WEB-опроса: XML во временный файл и обратно."""
+    with tempfile.NamedTemporaryFile("w", suffix=".xml", delete=False, encoding="utf-8") as f:
+        f.write(export_to_xml(printer, results))
+    try:
+        return xml_to_json(f.name)
+    finally:
+        os.unlink(f.name)
+
+
+class XmlToJsonTests(SimpleTestCase):
+    def test_snmp_fixture(self):
+        data = xml_to_json(FIXTURES / "netinventory_kyocera.xml")
+
+        device = data["CONTENT"]["DEVICE"]
+        self.assertEqual(data["QUERY"], "SNMPQUERY")
+        self.assertEqual(device["INFO"]["SERIAL"], "VCF9Z04123")
+        self.assertEqual(device["INFO"]["IPS"]["IP"], ["10.10.5.21", "127.0.0.1"])
+        self.assertEqual([p["IFNAME"] for p in device["PORTS"]["PORT"]], ["eth0", "lo0"])
+        self.assertEqual(extract_page_counters(data)["total_pages"], 123456)
+
+    def test_empty_leaf_is_empty_string(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".xml", delete=False) as f:
+            f.write("<REQUEST><A/><B><C>1</C><C/></B></REQUEST>")
+        self.addCleanup(os.unlink, f.name)
+
+        self.assertEqual(xml_to_json(f.name), {"A": "", "B": {"C": ["1", ""]}})
+
+    def test_broken_or_missing_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".xml", delete=False) as f:
+            f.write("<REQUEST><CONTENT><DEVICE>")
+        self.addCleanup(os.unlink, f.name)
+
+        self.assertEqual(xml_to_json(f.name), {})
+        self.assertEqual(xml_to_json("/nonexistent/inventory.xml"), {})
+
+
+class BuildInventoryDataTests(TestCase):
+    def setUp(self):
+        self.printer = Printer.objects.create(ip_address="10.11.0.1", serial_number="WEB123")
+
+    def test_matches_xml_round_trip(self):
+        for results in (
+            WEB_RESULTS,
+            {},
+            {"counter": None, "serial_number": None, "toner_cyan": 0},
+            {"mac_address": "a&b<c>", "counter_a3_bw": " 7 "},
+        ):
+            with self.subTest(results=results):
+                self.assertEqual(build_inventory_data(self.printer, results), _xml_round_trip(self.printer, results))
+
+
+class WebPollWithoutXmlTests(TestCase):
+    def setUp(self):
+        self.printer = Printer.objects.create(
+            ip_address="10.11.0.2", serial_number="WEB123", polling_method=PollingMethod.WEB
+        )
+        WebParsingRule.objects.create(
+            printer=self.printer, protocol="http", url_path="/status", field_name="counter", xpath="//td"
+        )
+
+    def test_counters_saved_and_export_queued(self):
+        with (
+            mock.patch("inventory.services.execute_web_parsing", return_value=(True, dict(WEB_RESULTS), "")),
+            mock.patch("inventory.tasks.save_xml_export_task.apply_async") as queued,
+            mock.patch("inventory.services._save_xml_export") as saved_inline,
+            mock.patch("tempfile.NamedTemporaryFile") as tmp,
+        ):
+            ok, _ = run_inventory_for_printer(self.printer.id)
+
+        self.assertTrue(ok)
+        tmp.assert_not_called()
+        saved_inline.assert_not_called()
+        queued.assert_called_once_with(args=[self.printer.id, WEB_RESULTS])
+
+        task = InventoryTask.objects.get(printer=self.printer)
+        self.assertEqual(task.status, "SUCCESS")
+        counter = PageCounter.objects.get(task=task)
+        self.assertEqual(counter.total_pages, 15200)
+        self.assertEqual(counter.toner_black, "40")
+
+    def test_export_task_writes_xml(self):
+        with mock.patch("inventory.services._save_xml_export") as saved:
+            save_xml_export_task(self.printer.id, WEB_RESULTS)
+
+        saved.assert_called_once()
+        self.assertIn("<SERIAL>WEB123</SERIAL>", saved.call_args.args[1])
+
+    def test_poll_not_blocked_when_broker_down(self):
+        with (
+            mock.patch("inventory.services.execute_web_parsing", return_value=(True, dict(WEB_RESULTS), "")),
+            mock.patch("inventory.tasks.save_xml_export_task.apply_async", side_effect=ConnectionError),
+            mock.patch("inventory.services._save_xml_export") as saved_inline,
+        ):
+            ok, _ = run_inventory_for_printer(self.printer.id)
+
+        self.assertTrue(ok)
+        saved_inline.assert_not_called()
+
+    def test_no_export_when_poll_rejected(self):
+        with (
+            mock.patch(
+                "inventory.services.execute_web_parsing",
+                return_value=(True, {"serial_number": "OTHER999", "counter": 10}, ""),
+            ),
+            mock.patch("inventory.tasks.save_xml_export_task.apply_async") as queued,
+        ):
+            ok, _ = run_inventory_for_printer(self.printer.id)
+
+        self.assertFalse(ok)
+        queued.assert_not_called()
+
+    def test_busy_browser_pool_defers_poll_without_failure(self):
+        with (
+            mock.patch("inventory.services.execute_web_parsing", side_effect=BrowserPoolTimeout("busy")),
+            mock.patch("inventory.services.update_poll_schedule") as schedule,
+        ):
+            with self.assertRaises(BrowserPoolTimeout):
+                run_inventory_for_printer(self.printer.id)
+
+        self.assertFalse(InventoryTask.objects.filter(printer=self.printer).exists())
+        schedule.assert_not_called()
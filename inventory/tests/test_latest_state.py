@@ -0,0 +1,165 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from inventory.latest_state import find_inconsistencies, rebuild_latest_state
+from inventory.models import InventoryTask, PageCounter, Printer, PrinterLatestState
+from inventory.services import get_printer_inventory_status
+from inventory.views.api_views import api_printers
+
+
+class LatestStateSignalTests(TestCase):
+    def setUp(self):
+        self.printer = Printer.objects.create(ip_address="10.7.0.1", serial_number="LS1")
+
+    def _poll(self, status="SUCCESS", total=None):
+        task = InventoryTask.objects.create(printer=self.printer, status=status)
+        counter = PageCounter.objects.create(task=task, total_pages=total) if total is not None else None
+        return task, counter
+
+    def _state(self):
+        return PrinterLatestState.objects.get(printer=self.printer)
+
+    def test_success_poll_recorded(self):
+        task, counter = self._poll(total=100)
+        state = self._state()
+
+        self.assertEqual(state.last_task_id, task.id)
+        self.assertEqual(state.success_task_id, task.id)
+        self.assertEqual(state.counter_id, counter.id)
+        self.assertEqual(state.success_at, task.task_timestamp)
+
+    def test_failed_poll_keeps_last_success(self):
+        ok, counter = self._poll(total=100)
+        failed, _ = self._poll(status="FAILED")
+        state = self._state()
+
+        self.assertEqual(state.last_task_id, failed.id)
+        self.assertEqual(state.success_task_id, ok.id)
+        self.assertEqual(state.counter_id, counter.id)
+
+    def test_older_task_does_not_overwrite(self):
+        newer, newer_counter = self._poll(total=200)
+
+        late = InventoryTask(printer=self.printer, status="SUCCESS")
+        late.save()
+        # Показание, пришедшее с опозданием (USB-агент выгрузил старую очередь)
+        InventoryTask.objects.filter(pk=late.pk).update(task_timestamp=newer.task_timestamp - timedelta(hours=3))
+        late.refresh_from_db()
+        PrinterLatestState.objects.filter(printer=self.printer).update(
+            last_task=newer,
+            last_task_at=newer.task_timestamp,
+            success_task=newer,
+            success_at=newer.task_timestamp,
+            counter=newer_counter,
+        )
+        PageCounter.objects.create(task=late, total_pages=150)
+
+        state = self._state()
+        self.assertEqual(state.success_task_id, newer.id)
+        self.assertEqual(state.counter_id, newer_counter.id)
+
+    def test_status_read_in_one_query(self):
+        task, _ = self._poll(total=321)
+        with self.assertNumQueries(1):
+            status = get_printer_inventory_status(self.printer.id)
+
+        self.assertEqual(status["task_id"], task.id)
+        self.assertEqual(status["counters"]["total_pages"], 321)
+
+    def test_never_polled(self):
+        self.assertEqual(get_printer_inventory_status(self.printer.id)["status"], "NEVER_RUN")
+
+
+class BackfillAndCheckTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.printers = [Printer.objects.create(ip_address=f"10.8.0.{i}", serial_number=f"BF{i}") for i in range(1, 5)]
+        self.expected = {}
+        for i, printer in enumerate(self.printers):
+            for hours_ago, status in [(30, "SUCCESS"), (20, "SUCCESS"), (10, "FAILED")][: i + 1]:
+                task = InventoryTask.objects.create(printer=printer, status=status)
+                InventoryTask.objects.filter(pk=task.pk).update(task_timestamp=now - timedelta(hours=hours_ago))
+                if status == "SUCCESS":
+                    PageCounter.objects.create(task=task, total_pages=1000 - hours_ago)
+        # Четвёртый принтер ни разу не опрашивался
+        InventoryTask.objects.filter(printer=self.printers[3]).delete()
+        rebuild_latest_state()
+        self.expected = {
+            s.printer_id: (s.last_task_id, s.success_task_id, s.counter_id) for s in PrinterLatestState.objects.all()
+        }
+
+    def test_backfill_matches_history(self):
+        self.assertEqual(find_inconsistencies(), [])
+        self.assertNotIn(self.printers[3].id, self.expected)
+
+        last, success, _ = self.expected[self.printers[2].id]
+        self.assertEqual(InventoryTask.objects.get(pk=last).status, "FAILED")
+        self.assertEqual(PageCounter.objects.get(task_id=success).total_pages, 980)
+
+    def test_backfill_command_from_empty_table(self):
+        PrinterLatestState.objects.all().delete()
+        call_command("backfill_latest_state", stdout=StringIO())
+
+        self.assertEqual(
+            {s.printer_id: (s.last_task_id, s.success_task_id, s.counter_id) for s in PrinterLatestState.objects.all()},
+            self.expected,
+        )
+
+    def test_checker_reports_and_fixes_drift(self):
+        PrinterLatestState.objects.filter(printer=self.printers[1]).update(counter=None)
+        PrinterLatestState.objects.filter(printer=self.printers[0]).delete()
+
+        problems = find_inconsistencies()
+        self.assertEqual(
+            {(p["printer_id"], p["field"]) for p in problems},
+            {
+                (self.printers[1].id, "counter_id"),
+                (self.printers[0].id, "row"),
+            },
+        )
+
+        with self.assertRaises(CommandError):
+            call_command("check_latest_state", stdout=StringIO())
+        call_command("check_latest_state", "--fix", stdout=StringIO())
+        self.assertEqual(find_inconsistencies(), [])
+
+
+class ApiPrintersQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("viewer", password="x")
+        self.user.user_permissions.add(
+            *Permission.objects.filter(codename__in=["access_inventory_app", "view_printer"])
+        )
+        self.factory = RequestFactory()
+
+    def _add_printers(self, n, offset):
+        for i in range(n):
+            printer = Printer.objects.create(ip_address=f"10.9.{offset}.{i + 1}", serial_number=f"Q{offset}-{i}")
+            task = InventoryTask.objects.create(printer=printer, status="SUCCESS")
+            PageCounter.objects.create(task=task, total_pages=i)
+
+    def _queries(self):
+        request = self.factory.get("/inventory/api/printers/", {"per_page": 100})
+        request.user = User.objects.get(pk=self.user.pk)  # свежий объект — без кэша прав
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_printers(request)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), json.loads(response.content)
+
+    def test_query_count_independent_of_page_size(self):
+        self._add_printers(3, 0)
+        few, _ = self._queries()
+        self._add_printers(30, 1)
+        many, data = self._queries()
+
+        self.assertEqual(few, many)
+        totals = {p["counters"]["total"] for p in data["printers"]}
+        self.assertIn(29, totals)
@@ -0,0 +1,172 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory import monthly_sync
+from inventory.models import Printer
+from inventory.services import sync_to_monthly_reports
+from monthly_report.models import MonthControl, MonthlyReport, MonthMetrics
+from monthly_report.services import month_metrics
+
+MONTH = date(2025, 5, 1)
+
+
+class FakeRedis:
+    """Хеш, HGETALL и скрипт подтверждения — ровно то, что нужно RedisPending."""
+
+    def __init__(self):
+        self.hashes = {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[str(field).encode()] = value.encode()
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def eval(self, script, numkeys, key, *args):
+        assert script == monthly_sync._ACK_SCRIPT
+        fields = self.hashes.get(key, {})
+        removed = 0
+        for field, value in zip(args[::2], args[1::2]):
+            if fields.get(field) == value:
+                del fields[field]
+                removed += 1
+        return removed
+
+
+class RecordingLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+def _counters(bw_a4, bw_a3=0):
+    return {"bw_a4": bw_a4, "color_a4": 0, "bw_a3": bw_a3, "color_a3": 0}
+
+
+class MonthlySyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        MonthControl.objects.create(month=MONTH, edit_until=timezone.now() + timedelta(days=1))
+        MonthControl.objects.create(month=date(2025, 4, 1), edit_until=timezone.now() - timedelta(days=1))
+        self.single = Printer.objects.create(ip_address="10.13.0.1", serial_number="MS-SINGLE")
+        self.dup = Printer.objects.create(ip_address="10.13.0.2", serial_number="MS-DUP")
+
+        def report(order, sn, month=MONTH, inv="INV"):
+            return MonthlyReport.objects.create(
+                month=month,
+                order_number=order,
+                organization="Org",
+                branch="Branch",
+                city="City",
+                address="Addr",
+                equipment_model="Model",
+                serial_number=sn,
+                inventory_number=inv,
+                a4_bw_start=100,
+                a3_bw_start=10,
+            )
+
+        self.single_report = report(1, "MS-SINGLE")
+        self.dup_first = report(2, "MS-DUP")
+        self.dup_second = report(3, "MS-DUP")
+        self.closed_report = report(1, "MS-SINGLE", month=date(2025, 4, 1))
+
+        self.redis = FakeRedis()
+        self.layer = RecordingLayer()
+        for patcher in (
+            mock.patch.object(monthly_sync, "_redis_pending", lambda: monthly_sync.RedisPending(self.redis)),
+            mock.patch.object(monthly_sync, "get_channel_layer", lambda: self.layer),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_polls_are_applied_in_one_batch(self):
+        sync_to_monthly_reports(self.single, _counters(150, 30))
+        sync_to_monthly_reports(self.dup, _counters(400, 70))
+        sync_to_monthly_reports(self.single, _counters(180, 40))
+
+        self.single_report.refresh_from_db()
+        self.assertEqual(self.single_report.a4_bw_end, 0)
+        self.assertEqual(self.layer.sent, [])
+
+        month_metrics.get_counts(MONTH)
+        self.assertEqual(monthly_sync.flush(), 3)
+        # Метрики месяца сдвинуты дельтой и совпадают с полным пересчётом
+        self.assertIsNotNone(MonthMetrics.objects.get(month=MONTH).counts)
+        self.assertIsNone(month_metrics.verify(MONTH))
+
+        self.single_report.refresh_from_db()
+        self.assertEqual((self.single_report.a4_bw_end, self.single_report.a3_bw_end), (180, 40))
+        self.assertEqual(self.single_report.total_prints, 80 + 30)
+        # Дубли: первая строка получает A4, вторая — A3
+        self.dup_first.refresh_from_db()
+        self.dup_second.refresh_from_db()
+        self.assertEqual((self.dup_first.a4_bw_end, self.dup_first.total_prints), (400, 300))
+        self.assertEqual((self.dup_second.a3_bw_end, self.dup_second.total_prints), (70, 60))
+        # Закрытый месяц не трогаем
+        self.closed_report.refresh_from_db()
+        self.assertIsNone(self.closed_report.inventory_last_ok)
+
+        (group, message), *rest = self.layer.sent
+        self.assertEqual(rest, [])
+        self.assertEqual(group, "monthly_report_2025_5")
+        self.assertEqual(message["type"], "inventory_sync_update")
+        self.assertEqual(
+            {(r["report_id"], r["total_prints"]) for r in message["reports"]},
+            {(self.single_report.id, 110), (self.dup_first.id, 300), (self.dup_second.id, 60)},
+        )
+        self.assertEqual(monthly_sync.flush(), 0)
+
+    def test_pending_poll_does_not_override_newer_manual_poll(self):
+        sync_to_monthly_reports(self.single, _counters(150))
+        sync_to_monthly_reports(self.single, _counters(170), immediate=True)
+
+        self.single_report.refresh_from_db()
+        self.assertEqual(self.single_report.a4_bw_end, 170)
+
+        monthly_sync.flush()
+        self.single_report.refresh_from_db()
+        self.assertEqual(self.single_report.a4_bw_end, 170)
+
+    def test_failed_apply_keeps_polls_for_next_flush(self):
+        sync_to_monthly_reports(self.single, _counters(150, 30))
+
+        with mock.patch.object(monthly_sync, "apply_pending", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                monthly_sync.flush()
+
+        self.assertEqual(monthly_sync.flush(), 1)
+        self.single_report.refresh_from_db()
+        self.assertEqual(self.single_report.a4_bw_end, 150)
+        self.assertEqual(self.redis.hashes[monthly_sync.PENDING_KEY], {})
+
+    def test_poll_recorded_during_apply_is_kept(self):
+        sync_to_monthly_reports(self.single, _counters(150))
+        apply_pending = monthly_sync.apply_pending
+
+        def apply_while_polling(entries):
+            sync_to_monthly_reports(self.single, _counters(190))
+            return apply_pending(entries)
+
+        with mock.patch.object(monthly_sync, "apply_pending", side_effect=apply_while_polling):
+            monthly_sync.flush()
+
+        self.single_report.refresh_from_db()
+        self.assertEqual(self.single_report.a4_bw_end, 150)
+        self.assertEqual(monthly_sync.flush(), 1)
+        self.single_report.refresh_from_db()
+        self.assertEqual(self.single_report.a4_bw_end, 190)
+
+    def test_without_buffer_applies_immediately(self):
+        with mock.patch.object(monthly_sync, "_redis_pending", return_value=None):
+            sync_to_monthly_reports(self.single, _counters(125, 10))
+
+        self.single_report.refresh_from_db()
+        self.assertEqual((self.single_report.a4_bw_end, self.single_report.total_prints), (125, 25))
+        self.assertEqual(len(self.layer.sent), 1)
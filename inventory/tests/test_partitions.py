@@ -0,0 +1,251 @@
+import random
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.functions import TruncDate
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from inventory.models import InventoryTask, PageCounter, Printer, PrinterLatestState
+from inventory.partitions import (
+    COUNTER_TABLE,
+    PARTITIONED_TABLES,
+    TASK_TABLE,
+    compact_history,
+    compact_partitions,
+    ensure_partitions,
+    is_partitioned,
+    list_partitions,
+    month_start,
+    partition_name,
+    partition_table,
+    unpartition_table,
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _kept_task_ids(cutoff):
+    """Задачи старше cutoff, которые оставляет прежняя очистка: max id на принтер за день."""
+    return set(
+        InventoryTask.objects.filter(task_timestamp__lt=cutoff)
+        .annotate(date=TruncDate("task_timestamp"))
+        .values("printer_id", "date")
+        .annotate(max_id=Max("id"))
+        .values_list("max_id", flat=True)
+    )
+
+
+def _legacy_retention(cutoff):
+    """Прежняя очистка из cleanup_old_inventory_data — эталон."""
+    InventoryTask.objects.filter(task_timestamp__lt=cutoff).exclude(id__in=list(_kept_task_ids(cutoff))).delete()
+
+
+def _create_history(now, printers=3, polls=300):
+    """~120 дней истории по нескольку опросов в день, в том числе около полуночи и границы хранения."""
+    rnd = random.Random(7)
+    for i in range(printers):
+        printer = Printer.objects.create(ip_address=f"10.9.0.{i}", serial_number=f"RT{i}")
+        for _ in range(polls):
+            task = InventoryTask.objects.create(printer=printer, status="SUCCESS" if rnd.random() < 0.8 else "FAILED")
+            InventoryTask.objects.filter(pk=task.pk).update(
+                task_timestamp=now - timedelta(minutes=rnd.randrange(120 * 24 * 60))
+            )
+            if task.status == "SUCCESS":
+                PageCounter.objects.create(task=task, total_pages=rnd.randrange(10**5))
+
+
+def _snapshot():
+    return (
+        set(InventoryTask.objects.values_list("id", flat=True)),
+        set(PageCounter.objects.values_list("id", flat=True)),
+        set(PrinterLatestState.objects.values_list("printer_id", "last_task_id", "success_task_id", "counter_id")),
+    )
+
+
+class HistoryRetentionTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.cutoff = now - timedelta(days=90)
+        _create_history(now)
+
+    def _snapshot(self):
+        return _snapshot()
+
+    def _legacy_snapshot(self):
+        try:
+            with transaction.atomic():
+                _legacy_retention(self.cutoff)
+                expected = self._snapshot()
+                raise _Rollback
+        except _Rollback:
+            pass
+        return expected
+
+    def test_fallback_keeps_same_rows_as_legacy_cleanup(self):
+        self.assertFalse(is_partitioned())
+        expected = self._legacy_snapshot()
+        before = InventoryTask.objects.count()
+
+        result = compact_history(self.cutoff)
+
+        self.assertEqual(self._snapshot(), expected)
+        self.assertEqual(result["deleted"], before - len(expected[0]))
+        self.assertEqual(result["kept"], InventoryTask.objects.filter(task_timestamp__lt=self.cutoff).count())
+        self.assertGreater(result["deleted"], 0)
+
+    def test_small_batches_give_same_result(self):
+        expected = self._legacy_snapshot()
+
+        with mock.patch("inventory.partitions.DELETE_BATCH", 50):
+            compact_history(self.cutoff)
+
+        self.assertEqual(self._snapshot(), expected)
+
+
+def _index_names(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = to_regclass(%s) AND NOT x.indisprimary",
+            [table],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _count(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+@skipUnless(connection.vendor == "postgresql", "секционирование есть только на PostgreSQL")
+class PartitionedHistoryTests(TransactionTestCase):
+    """
+    Путь PostgreSQL: перевод таблиц с данными в секционированные (миграция 0029),
+    новые месячные секции и сжатие. DDL должен реально коммититься (подмена секций,
+    параллельные соединения) — поэтому TransactionTestCase; в конце схема
+    возвращается в исходное состояние.
+    """
+
+    def setUp(self):
+        self.addCleanup(self._set_partitioned, is_partitioned())
+        self._set_partitioned(False)
+        self.now = timezone.now()
+        _create_history(self.now, polls=100)
+        self.before = _snapshot()
+        self.indexes = {table: _index_names(table) for table, _ in PARTITIONED_TABLES}
+        self._set_partitioned(True)
+
+    def _set_partitioned(self, partitioned):
+        with connection.schema_editor() as editor:
+            for table, key in PARTITIONED_TABLES:
+                if is_partitioned(table) == partitioned:
+                    continue
+                if partitioned:
+                    partition_table(editor, table, key)
+                else:
+                    unpartition_table(editor, table)
+
+    def test_existing_rows_attached_as_legacy_partition(self):
+        for table, _ in PARTITIONED_TABLES:
+            legacy, default = list_partitions(table)
+            self.assertEqual((legacy.name, legacy.lower), (f"{table}_p_legacy", None))
+            self.assertTrue(default.is_default)
+            self.assertEqual(_count(default.name), 0)
+            self.assertEqual(_index_names(table), self.indexes[table])
+        self.assertEqual(_snapshot(), self.before)
+        self.assertEqual(_count(f"{TASK_TABLE}_p_legacy"), len(self.before[0]))
+
+        # Последовательность id продолжается, каскад ORM работает без внешних ключей в БД
+        printer = Printer.objects.get(serial_number="RT0")
+        task = InventoryTask.objects.create(printer=printer, status="SUCCESS")
+        PageCounter.objects.create(task=task, total_pages=1)
+        self.assertGreater(task.id, max(self.before[0]))
+        printer_id = printer.id
+        printer.delete()
+        self.assertFalse(InventoryTask.objects.filter(printer_id=printer_id).exists())
+        self.assertFalse(PageCounter.objects.filter(task_id=task.id).exists())
+
+    def test_reverse_restores_plain_tables(self):
+        self._set_partitioned(False)
+
+        for table, _ in PARTITIONED_TABLES:
+            self.assertFalse(is_partitioned(table))
+            self.assertEqual(_index_names(table), self.indexes[table])
+        self.assertEqual(_snapshot(), self.before)
+        task = InventoryTask.objects.create(printer=Printer.objects.first(), status="SUCCESS")
+        self.assertGreater(task.id, max(self.before[0]))
+
+    def test_next_month_partition_takes_rows_from_default(self):
+        month = timezone.localdate().replace(day=1)
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        # Legacy-секция покрывает текущий месяц; опрос с часами на месяц вперёд попадает в default
+        ahead = month_start(next_month) + timedelta(days=1)
+        task = InventoryTask.objects.create(printer=Printer.objects.first(), status="SUCCESS")
+        counter = PageCounter.objects.create(task=task, total_pages=1)
+        InventoryTask.objects.filter(pk=task.pk).update(task_timestamp=ahead)
+        PageCounter.objects.filter(pk=counter.pk).update(recorded_at=ahead)
+        self.assertEqual(_count(f"{TASK_TABLE}_p_default"), 1)
+
+        created = ensure_partitions(ahead=1)
+
+        self.assertEqual(created, [partition_name(TASK_TABLE, next_month), partition_name(COUNTER_TABLE, next_month)])
+        for table, _ in PARTITIONED_TABLES:
+            self.assertEqual(_count(f"{table}_p_default"), 0)
+            self.assertEqual(_count(partition_name(table, next_month)), 1)
+        self.assertEqual(InventoryTask.objects.get(pk=task.pk).task_timestamp, ahead)
+        self.assertEqual(ensure_partitions(ahead=1), [])
+
+    def test_compaction_alongside_concurrent_polls(self):
+        ensure_partitions(ahead=1)
+        legacy = list_partitions(TASK_TABLE)[0]
+        kept = _kept_task_ids(legacy.upper)
+        kept_counters = set(PageCounter.objects.filter(task_id__in=kept).values_list("id", flat=True))
+        legacy_indexes = {table: _index_names(f"{table}_p_legacy") for table, _ in PARTITIONED_TABLES}
+
+        # Опросы идут в следующий месяц, пока legacy-секция (вся история) сжимается
+        polled, errors = [], []
+        started, stop = threading.Event(), threading.Event()
+        printer = Printer.objects.get(serial_number="RT1")
+
+        def poll():
+            try:
+                while not stop.is_set() or len(polled) < 20:
+                    task = InventoryTask.objects.create(printer=printer, status="SUCCESS")
+                    polled.append((task.id, PageCounter.objects.create(task=task, total_pages=len(polled)).id))
+                    InventoryTask.objects.filter(printer=printer).count()
+                    started.set()
+            except Exception as e:
+                errors.append(e)
+                started.set()
+            finally:
+                connection.close()
+
+        poller = threading.Thread(target=poll, daemon=True)
+        with mock.patch("django.utils.timezone.now", return_value=legacy.upper + timedelta(days=1)):
+            poller.start()
+            try:
+                started.wait(10)
+                result = compact_partitions(legacy.upper)
+            finally:
+                stop.set()
+                poller.join(30)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(result, {"deleted": len(self.before[0]) - len(kept), "kept": len(kept)})
+        tasks, counters, _ = _snapshot()
+        self.assertEqual(tasks, kept | {task_id for task_id, _ in polled})
+        self.assertEqual(counters, kept_counters | {counter_id for _, counter_id in polled})
+        self.assertFalse(PrinterLatestState.objects.exclude(last_task_id__in=tasks).exclude(last_task_id=None).exists())
+
+        for table, _ in PARTITIONED_TABLES:
+            legacy = list_partitions(table)[0]
+            self.assertTrue(legacy.compacted)
+            self.assertEqual(_index_names(legacy.name), legacy_indexes[table])
+        self.assertEqual(compact_partitions(legacy.upper), {"deleted": 0, "kept": 0})
@@ -0,0 +1,248 @@
+from collections import deque
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from inventory.models import InventoryTask, PageCounter, Printer
+from inventory.scheduling import (
+    backoff_interval,
+    counter_velocity,
+    is_due,
+    next_poll_after,
+    update_poll_schedule,
+    velocity_interval,
+)
+from inventory.tasks import inventory_daemon_task
+
+SCHEDULE_SETTINGS = dict(
+    POLL_INTERVAL_MINUTES=60,
+    POLL_MAX_BACKOFF_MINUTES=24 * 60,
+    POLL_MAX_INTERVAL_MINUTES=6 * 60,
+    POLL_PAGES_PER_POLL=20,
+    POLL_VELOCITY_WINDOW_DAYS=14,
+    POLL_ADAPTIVE_SCHEDULE=True,
+)
+
+
+@override_settings(**SCHEDULE_SETTINGS)
+class IntervalTests(SimpleTestCase):
+    def test_backoff_doubles_and_caps(self):
+        hours = [backoff_interval(streak) / timedelta(hours=1) for streak in range(1, 8)]
+        self.assertEqual(hours, [1, 2, 4, 8, 16, 24, 24])
+
+    def test_velocity_interval(self):
+        self.assertEqual(velocity_interval(None), timedelta(hours=1))
+        self.assertEqual(velocity_interval(2000), timedelta(hours=1))  # печатает много — базовый
+        self.assertEqual(velocity_interval(160), timedelta(hours=3))  # 20 страниц за 3 часа
+        self.assertEqual(velocity_interval(2), timedelta(hours=6))  # потолок
+        self.assertEqual(velocity_interval(0), timedelta(hours=6))
+
+    def test_success_resets_streak(self):
+        now = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(next_poll_after(now, True, 3, None), (now + timedelta(hours=8), 4))
+        self.assertEqual(next_poll_after(now, False, 3, None), (now + timedelta(hours=1), 0))
+
+    def test_due_within_next_daemon_run(self):
+        now = datetime(2026, 3, 1, 14, 0, tzinfo=dt_timezone.utc)
+        self.assertTrue(is_due(None, now))
+        self.assertTrue(is_due(now + timedelta(minutes=40), now))
+        self.assertFalse(is_due(now + timedelta(minutes=61), now))
+
+    @override_settings(POLL_ADAPTIVE_SCHEDULE=False)
+    def test_disabled_schedule_polls_everything(self):
+        now = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        self.assertTrue(is_due(now + timedelta(days=3), now))
+
+
+@override_settings(**SCHEDULE_SETTINGS)
+class UpdatePollScheduleTests(TestCase):
+    def setUp(self):
+        self.printer = Printer.objects.create(ip_address="10.5.0.1", serial_number="SCH1")
+        self.now = timezone.now()
+
+    def _task(self, status, hours_ago, total=None):
+        task = InventoryTask.objects.create(printer=self.printer, status=status)
+        InventoryTask.objects.filter(pk=task.pk).update(task_timestamp=self.now - timedelta(hours=hours_ago))
+        if total is not None:
+            PageCounter.objects.create(task=task, total_pages=total)
+        return task
+
+    def test_consecutive_failures_back_off(self):
+        for expected_streak, expected_hours in [(1, 1), (2, 2), (3, 4)]:
+            self._task("FAILED", 0)
+            next_at = update_poll_schedule(self.printer.id, self.now)
+            self.printer.refresh_from_db()
+            self.assertEqual(self.printer.poll_failure_streak, expected_streak)
+            self.assertEqual(next_at, self.now + timedelta(hours=expected_hours))
+
+    def test_success_uses_counter_velocity(self):
+        self.printer.poll_failure_streak = 5
+        self.printer.save()
+        self._task("SUCCESS", 48, total=1000)
+        self._task("SUCCESS", 0, total=1004)  # 2 страницы в сутки
+
+        self.assertAlmostEqual(counter_velocity(self.printer.id, self.now), 2.0)
+        next_at = update_poll_schedule(self.printer.id, self.now)
+
+        self.printer.refresh_from_db()
+        self.assertEqual(self.printer.poll_failure_streak, 0)
+        self.assertEqual(next_at, self.now + timedelta(hours=6))
+
+    def test_short_history_uses_base_interval(self):
+        self._task("SUCCESS", 2, total=10)
+        self._task("SUCCESS", 0, total=10)
+        self.assertIsNone(counter_velocity(self.printer.id, self.now))
+        self.assertEqual(update_poll_schedule(self.printer.id, self.now), self.now + timedelta(hours=1))
+
+    def test_validation_error_counts_as_reachable(self):
+        self.printer.poll_failure_streak = 3
+        self.printer.save()
+        self._task("VALIDATION_ERROR", 0)
+
+        update_poll_schedule(self.printer.id, self.now)
+        self.printer.refresh_from_db()
+        self.assertEqual(self.printer.poll_failure_streak, 0)
+
+    def test_no_new_task_keeps_schedule(self):
+        self.printer.poll_failure_streak = 2
+        self.printer.next_poll_at = self.now + timedelta(hours=2)
+        self.printer.save()
+        self._task("FAILED", 3)
+
+        self.assertIsNone(update_poll_schedule(self.printer.id, self.now, since=self.now - timedelta(seconds=1)))
+        self.printer.refresh_from_db()
+        self.assertEqual(self.printer.poll_failure_streak, 2)
+        self.assertEqual(self.printer.next_poll_at, self.now + timedelta(hours=2))
+
+    def test_skipped_poll_does_not_bump_failure_streak(self):
+        from inventory.services import run_inventory_for_printer
+
+        self.printer.poll_failure_streak = 2
+        self.printer.save()
+        self._task("FAILED", 3)
+
+        with mock.patch("inventory.services._run_inventory_for_printer", return_value=(False, "skipped")):
+            run_inventory_for_printer(self.printer.id, triggered_by="daemon")
+
+        self.printer.refresh_from_db()
+        self.assertEqual(self.printer.poll_failure_streak, 2)
+
+    def test_run_inventory_updates_schedule(self):
+        from inventory.services import run_inventory_for_printer
+
+        with (
+            mock.patch("inventory.services._collect_snmp", return_value=(False, {}, "timeout")),
+            mock.patch("inventory.services._run_snmp_inventory", return_value=(False, None, "GLPI failed")),
+        ):
+            run_inventory_for_printer(self.printer.id, triggered_by="daemon")
+
+        self.printer.refresh_from_db()
+        self.assertEqual(self.printer.poll_failure_streak, 1)
+        self.assertIsNotNone(self.printer.next_poll_at)
+
+
+@override_settings(**SCHEDULE_SETTINGS, INVENTORY_BATCH_SIZE=50)
+class DaemonDueFilterTests(TestCase):
+    def setUp(self):
+        caches["inventory"].clear()  # отметки очереди inventory/inflight.py
+
+    def test_only_due_printers_queued(self):
+        now = timezone.now()
+        due = Printer.objects.create(ip_address="10.6.0.1", serial_number="D1", next_poll_at=now - timedelta(hours=1))
+        new = Printer.objects.create(ip_address="10.6.0.2", serial_number="D2")
+        Printer.objects.create(ip_address="10.6.0.3", serial_number="D3", next_poll_at=now + timedelta(hours=5))
+
+        with (
+            mock.patch("redis.StrictRedis", side_effect=ConnectionError),
+            mock.patch("inventory.tasks.run_inventory_batch_task.apply_async") as batch,
+        ):
+            result = inventory_daemon_task()
+
+        self.assertEqual(batch.call_args.kwargs["args"][0], [due.id, new.id])
+        self.assertEqual(result["not_due"], 1)
+
+
+@override_settings(**SCHEDULE_SETTINGS)
+class FleetSimulationTests(SimpleTestCase):
+    """
+    30 дней почасовых запусков демона по синтетическому парку.
+    Сравниваем число опросов с прежним «каждый принтер каждый час».
+    """
+
+    DAYS = 30
+    START = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+
+    @staticmethod
+    def _fleet():
+        fleet = []
+        fleet += [{"kind": "offline", "online": lambda t: False, "ppd": 0} for _ in range(40)]
+        fleet += [{"kind": "flaky", "online": lambda t: not 5 <= t.days < 15, "ppd": 30} for _ in range(20)]
+        fleet += [{"kind": "quiet", "online": lambda t: True, "ppd": 3} for _ in range(60)]
+        fleet += [{"kind": "busy", "online": lambda t: True, "ppd": 600} for _ in range(80)]
+        for device in fleet:
+            device.update(next_at=None, streak=0, readings=deque(), polls=0, gaps=[], last_poll=None)
+        return fleet
+
+    @staticmethod
+    def _velocity(readings, now):
+        while readings and readings[0][0] < now - timedelta(days=14):
+            readings.popleft()
+        if len(readings) < 2 or (readings[-1][0] - readings[0][0]) < timedelta(days=1):
+            return None
+        days = (readings[-1][0] - readings[0][0]).total_seconds() / 86400
+        return (readings[-1][1] - readings[0][1]) / days
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fleet = cls._simulate()
+
+    @classmethod
+    def _simulate(cls):
+        fleet = cls._fleet()
+        for hour in range(cls.DAYS * 24):
+            now = cls.START + timedelta(hours=hour)
+            elapsed = now - cls.START
+            for device in fleet:
+                if not is_due(device["next_at"], now):
+                    continue
+
+                device["polls"] += 1
+                if device["last_poll"] is not None:
+                    device["gaps"].append(now - device["last_poll"])
+                device["last_poll"] = now
+
+                online = device["online"](elapsed)
+                if online:
+                    total = int(device["ppd"] * elapsed.total_seconds() / 86400)
+                    device["readings"].append((now, total))
+                velocity = cls._velocity(device["readings"], now) if online else None
+                device["next_at"], device["streak"] = next_poll_after(now, not online, device["streak"], velocity)
+        return fleet
+
+    def test_poll_volume_reduced(self):
+        fleet = self.fleet
+        baseline = len(fleet) * self.DAYS * 24
+        adaptive = sum(d["polls"] for d in fleet)
+
+        self.assertLess(adaptive, baseline * 0.6)
+
+        by_kind = {}
+        for d in fleet:
+            by_kind.setdefault(d["kind"], []).append(d["polls"])
+
+        # Активные принтеры опрашиваются так же часто, как раньше
+        self.assertEqual(set(by_kind["busy"]), {self.DAYS * 24})
+        # Недоступные месяц — около раза в сутки после разгона backoff
+        self.assertLess(max(by_kind["offline"]), 40)
+        # «Тихие»: первые сутки — базовый интервал (скорость ещё неизвестна), дальше раз в 6 часов
+        self.assertLessEqual(max(by_kind["quiet"]), 24 + (self.DAYS - 1) * 4 + 1)
+
+    def test_recovered_device_polled_within_max_backoff(self):
+        for device in (d for d in self.fleet if d["kind"] == "flaky"):
+            self.assertLessEqual(max(device["gaps"]), timedelta(hours=24))
+            self.assertEqual(device["streak"], 0)
@@ -0,0 +1,237 @@
+"""
+Тесты встроенного asyncio SNMP-опроса (inventory/snmp_native.py).
+
+Данные устройств заданы в формате snmpsim (.snmprec) и отдаются через
+SnmprecClient без сети. Для проверки против живого snmpsim:
+
+    snmpsim-command-responder --data-dir=<dir> --agent-udpv4-endpoint=127.0.0.1:1161
+    SNMPSIM_ENDPOINT=127.0.0.1:1161 SNMPSIM_COMMUNITY=<имя .snmprec> python manage.py test inventory.tests.test_snmp_native
+"""
+
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from inventory.models import InventoryTask, PageCounter, Printer, SnmpBackend
+from inventory.snmp_native import (
+    SnmprecClient,
+    classify_supply,
+    collect_many,
+    collect_snmp_data,
+    collect_snmp_data_many,
+    parse_snmprec,
+)
+from inventory.utils import extract_mac_address, extract_page_counters, validate_inventory
+
+MONO_SNMPREC = """
+1.3.6.1.2.1.1.1.0|4|Kyocera ECOSYS P3045dn
+1.3.6.1.2.1.1.5.0|4|KM-OFFICE-1
+1.3.6.1.2.1.2.2.1.2.1|4|Ethernet
+1.3.6.1.2.1.2.2.1.2.2|4|Loopback
+1.3.6.1.2.1.2.2.1.6.1|4x|0017c8aabbcc
+1.3.6.1.2.1.2.2.1.6.2|4|
+1.3.6.1.2.1.25.3.2.1.3.1|4|ECOSYS P3045dn
+1.3.6.1.2.1.43.5.1.1.17.1|4|VCF8Z12345
+1.3.6.1.2.1.43.10.2.1.4.1.1|65|123456
+1.3.6.1.2.1.43.11.1.1.6.1.1|4|TK-3160 Toner
+1.3.6.1.2.1.43.11.1.1.6.1.2|4|Waste Toner Box
+1.3.6.1.2.1.43.11.1.1.8.1.1|2|12500
+1.3.6.1.2.1.43.11.1.1.8.1.2|2|-2
+1.3.6.1.2.1.43.11.1.1.9.1.1|2|5000
+1.3.6.1.2.1.43.11.1.1.9.1.2|2|-3
+"""
+
+COLOR_SNMPREC = """
+1.3.6.1.2.1.1.5.0|4|COLOR-1
+1.3.6.1.2.1.2.2.1.2.1|4|Gigabit Ethernet
+1.3.6.1.2.1.2.2.1.6.1|4x|001122334455
+1.3.6.1.2.1.43.5.1.1.17.1|4|CLR0001
+1.3.6.1.2.1.43.10.2.1.4.1.1|65|5000
+1.3.6.1.2.1.43.11.1.1.6.1.1|4|Black Toner
+1.3.6.1.2.1.43.11.1.1.6.1.2|4|Cyan Toner
+1.3.6.1.2.1.43.11.1.1.6.1.3|4|Drum Unit Magenta
+1.3.6.1.2.1.43.11.1.1.8.1.1|2|100
+1.3.6.1.2.1.43.11.1.1.8.1.2|2|100
+1.3.6.1.2.1.43.11.1.1.8.1.3|2|100
+1.3.6.1.2.1.43.11.1.1.9.1.1|2|80
+1.3.6.1.2.1.43.11.1.1.9.1.2|2|15
+1.3.6.1.2.1.43.11.1.1.9.1.3|2|60
+"""
+
+
+def _client(**kwargs):
+    return SnmprecClient({"mono": MONO_SNMPREC, "color": COLOR_SNMPREC}, **kwargs)
+
+
+class ParseSnmprecTests(SimpleTestCase):
+    def test_hex_values_prefixed(self):
+        records = parse_snmprec(MONO_SNMPREC)
+        self.assertEqual(records["1.3.6.1.2.1.2.2.1.6.1"], "0x0017c8aabbcc")
+        self.assertEqual(records["1.3.6.1.2.1.43.5.1.1.17.1"], "VCF8Z12345")
+
+    def test_comments_and_garbage_skipped(self):
+        self.assertEqual(parse_snmprec("# comment\n\nbroken line\n1.2.3|2|7"), {"1.2.3": "7"})
+
+
+class ClassifySupplyTests(SimpleTestCase):
+    def test_colors_and_kinds(self):
+        self.assertEqual(classify_supply("Black Toner"), "TONERBLACK")
+        self.assertEqual(classify_supply("Drum Unit Cyan"), "DRUMCYAN")
+        self.assertEqual(classify_supply("Developer Yellow"), "DEVELOPERYELLOW")
+
+    def test_special_units(self):
+        self.assertEqual(classify_supply("Waste Toner Box"), "WASTETONER")
+        self.assertEqual(classify_supply("Fuser Kit"), "FUSERKIT")
+        self.assertEqual(classify_supply("Transfer Belt"), "TRANSFERKIT")
+
+    def test_mono_without_color_is_black(self):
+        self.assertEqual(classify_supply("TK-3160 Toner"), "TONERBLACK")
+
+    def test_unknown(self):
+        self.assertIsNone(classify_supply("Staples"))
+        self.assertIsNone(classify_supply(""))
+
+
+class CollectDeviceTests(SimpleTestCase):
+    def test_mono_device_structure_matches_glpi_format(self):
+        ok, data, err = collect_snmp_data("10.0.0.1", "mono", client=_client())
+        self.assertTrue(ok, err)
+
+        dev = data["CONTENT"]["DEVICE"]
+        self.assertEqual(dev["INFO"]["SERIAL"], "VCF8Z12345")
+        self.assertEqual(dev["INFO"]["MODEL"], "ECOSYS P3045dn")
+        self.assertEqual(dev["PAGECOUNTERS"]["TOTAL"], "123456")
+        self.assertEqual(dev["CARTRIDGES"]["TONERBLACK"], "40")
+        self.assertEqual(dev["CARTRIDGES"]["WASTETONER"], "OK")
+
+    def test_output_consumed_by_existing_pipeline(self):
+        _, data, _ = collect_snmp_data("10.0.0.1", "mono", client=_client())
+
+        self.assertEqual(extract_mac_address(data), "00:17:C8:AA:BB:CC")
+        counters = extract_page_counters(data)
+        self.assertEqual(counters["bw_a4"], 123456)
+        self.assertEqual(counters["total_pages"], 123456)
+        self.assertEqual(counters["toner_black"], "40")
+
+        valid, err, rule = validate_inventory(data, "10.0.0.1", "VCF8Z12345", "00:17:c8:aa:bb:cc")
+        self.assertTrue(valid, err)
+        self.assertEqual(rule, "SN_MAC")
+
+    def test_color_device_detected_by_supplies(self):
+        _, data, _ = collect_snmp_data("10.0.0.2", "color", client=_client())
+        counters = extract_page_counters(data)
+        self.assertEqual(counters["color_a4"], 5000)
+        self.assertEqual(counters["bw_a4"], 0)
+        self.assertEqual(counters["toner_cyan"], "15")
+        self.assertEqual(counters["drum_magenta"], "60")
+
+    def test_vendor_color_counter_collected(self):
+        hp = "1.3.6.1.2.1.43.10.2.1.4.1.1|65|900\n1.3.6.1.4.1.11.2.3.9.4.2.1.4.1.2.7.0|65|300\n"
+        _, data, _ = collect_snmp_data("10.0.0.4", "hp", client=SnmprecClient({"hp": hp}))
+        self.assertEqual(data["CONTENT"]["DEVICE"]["PAGECOUNTERS"], {"TOTAL": "900", "COLOR": "300"})
+
+    @override_settings(
+        SNMP_NATIVE_PAGECOUNTER_OIDS={"COLOR_A3": ["1.3.6.1.4.1.99999.1.3"], "COLOR_A4": [".1.3.6.1.4.1.99999.1.4"]}
+    )
+    def test_format_counters_from_settings(self):
+        rec = "1.3.6.1.2.1.43.10.2.1.4.1.1|65|1000\n1.3.6.1.4.1.99999.1.3|65|200\n1.3.6.1.4.1.99999.1.4|65|800\n"
+        _, data, _ = collect_snmp_data("10.0.0.5", "a3", client=SnmprecClient({"a3": rec}))
+        counters = extract_page_counters(data)
+        self.assertEqual(counters["color_a3"], 200)
+        self.assertEqual(counters["color_a4"], 800)
+        self.assertEqual(counters["total_pages"], 1000)
+
+    def test_silent_device_returns_error(self):
+        ok, data, err = collect_snmp_data("10.0.0.3", "unknown", client=_client())
+        self.assertFalse(ok)
+        self.assertEqual(data, {})
+        self.assertIn("timeout", err)
+
+
+class CollectManyTests(SimpleTestCase):
+    def test_mixed_results(self):
+        results = collect_snmp_data_many(
+            [("10.0.0.1", "mono"), ("10.0.0.2", "color"), ("10.0.0.3", "silent")], client=_client()
+        )
+        self.assertTrue(results["10.0.0.1"][0])
+        self.assertTrue(results["10.0.0.2"][0])
+        self.assertFalse(results["10.0.0.3"][0])
+
+    def test_parallelism_is_bounded(self):
+        class CountingClient(SnmprecClient):
+            in_flight = 0
+            peak = 0
+
+            async def get(self, *args, **kwargs):
+                type(self).in_flight += 1
+                type(self).peak = max(type(self).peak, type(self).in_flight)
+                try:
+                    await asyncio.sleep(0.005)
+                    return await super().get(*args, **kwargs)
+                finally:
+                    type(self).in_flight -= 1
+
+        client = CountingClient({"mono": MONO_SNMPREC})
+        targets = [(f"10.0.1.{i}", "mono") for i in range(40)]
+        results = asyncio.run(collect_many(targets, client=client, concurrency=7))
+
+        self.assertEqual(len(results), 40)
+        self.assertTrue(all(ok for ok, _, _ in results.values()))
+        self.assertLessEqual(CountingClient.peak, 7)
+        self.assertGreater(CountingClient.peak, 1)
+
+
+class NativeBackendInventoryTests(TestCase):
+    def setUp(self):
+        self.printer = Printer.objects.create(
+            ip_address="10.0.0.1",
+            serial_number="VCF8Z12345",
+            snmp_community="mono",
+            snmp_backend=SnmpBackend.NATIVE,
+        )
+
+    def test_run_inventory_uses_native_collector_without_glpi(self):
+        from inventory.services import run_inventory_for_printer
+
+        def fake_collect(ip, community):
+            return collect_snmp_data(ip, community, client=_client())
+
+        with (
+            mock.patch("inventory.services.collect_snmp_data", side_effect=fake_collect),
+            mock.patch("inventory.services.run_glpi_command") as glpi,
+        ):
+            ok, msg = run_inventory_for_printer(self.printer.id)
+
+        self.assertTrue(ok, msg)
+        glpi.assert_not_called()
+        task = InventoryTask.objects.get(printer=self.printer)
+        self.assertEqual(task.status, "SUCCESS")
+        self.assertEqual(PageCounter.objects.get(task=task).total_pages, 123456)
+        self.printer.refresh_from_db()
+        self.assertEqual(self.printer.mac_address, "00:17:C8:AA:BB:CC")
+
+    def test_native_failure_recorded_as_failed_task(self):
+        from inventory.services import run_inventory_for_printer
+
+        with mock.patch("inventory.services.collect_snmp_data", return_value=(False, {}, "SNMP: timeout")):
+            ok, msg = run_inventory_for_printer(self.printer.id)
+
+        self.assertFalse(ok)
+        self.assertEqual(InventoryTask.objects.get(printer=self.printer).status, "FAILED")
+
+
+@unittest.skipUnless(os.getenv("SNMPSIM_ENDPOINT"), "SNMPSIM_ENDPOINT не задан — живой snmpsim не запущен")
+class LiveSnmpsimTests(SimpleTestCase):
+    """Проверка PysnmpClient против запущенного snmpsim-command-responder."""
+
+    def test_collect_from_simulator(self):
+        from inventory.snmp_native import PysnmpClient
+
+        host, _, port = os.environ["SNMPSIM_ENDPOINT"].partition(":")
+        community = os.getenv("SNMPSIM_COMMUNITY", "public")
+        ok, data, err = collect_snmp_data(host, community, port=int(port or 161), client=PysnmpClient(timeout=1))
+        self.assertTrue(ok, err)
+        self.assertIn("PAGECOUNTERS", data["CONTENT"]["DEVICE"])
@@ -1,14 +1,19 @@
 from datetime import timedelta
+from unittest import mock
 
+from django.core.cache import caches
+from django.db import transaction
 from django.test import TestCase
 from django.utils import timezone
 
+from inventory.counter_window import get_counter_window
 from inventory.models import InventoryTask, PageCounter, Printer
 from inventory.utils import validate_against_history
 
 
 class ValidateAgainstHistoryTests(TestCase):
     def setUp(self):
+        caches["inventory"].clear()
         self.printer = Printer.objects.create(
             ip_address="10.0.0.10",
             serial_number="SN-HIST-1",
@@ -75,3 +80,101 @@ class ValidateAgainstHistoryTests(TestCase):
         self._add_success({"bw_a4": 1000, "total_pages": 1000}, age_hours=2)
         ok, err, _ = validate_against_history(self.printer, {"bw_a4": 1200, "total_pages": 1200})
         self.assertTrue(ok, msg=err)
+
+
+class CounterWindowTests(TestCase):
+    def setUp(self):
+        caches["inventory"].clear()
+        self.printer = Printer.objects.create(ip_address="10.0.0.11", serial_number="SN-WIN-1")
+
+    def _save_poll(self, total):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = InventoryTask.objects.create(printer=self.printer, status="SUCCESS")
+            PageCounter.objects.create(task=task, bw_a4=total, total_pages=total)
+        return task
+
+    def test_steady_state_validation_without_sql(self):
+        self._save_poll(1000)
+        validate_against_history(self.printer, {"bw_a4": 1010, "total_pages": 1010})  # промах — окно из БД
+        self._save_poll(1010)
+
+        with self.assertNumQueries(0):
+            ok, err, _ = validate_against_history(self.printer, {"bw_a4": 1020, "total_pages": 1020})
+        self.assertTrue(ok, msg=err)
+
+        # Новый снимок попал в окно: уменьшение считается от 1010, а не от 1000
+        with self.assertNumQueries(0):
+            ok, err, _ = validate_against_history(self.printer, {"bw_a4": 5, "total_pages": 5})
+        self.assertFalse(ok)
+        self.assertIn("1010", err)
+
+    def test_window_capped_and_matches_db(self):
+        validate_against_history(self.printer, {"total_pages": 1})
+        tasks = [self._save_poll(100 * i) for i in range(1, 8)]
+
+        window = get_counter_window(self.printer.id)
+        self.assertEqual([s["task_id"] for s in window], [t.id for t in reversed(tasks[-5:])])
+
+        caches["inventory"].clear()
+        self.assertEqual(get_counter_window(self.printer.id), window)
+
+    def test_rolled_back_save_not_cached(self):
+        validate_against_history(self.printer, {"total_pages": 1})
+        try:
+            with transaction.atomic():
+                task = InventoryTask.objects.create(printer=self.printer, status="SUCCESS")
+                PageCounter.objects.create(task=task, total_pages=10_000)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertEqual(get_counter_window(self.printer.id), [])
+
+    def test_edited_counter_drops_window(self):
+        self._save_poll(1000)
+        self.assertEqual(get_counter_window(self.printer.id)[0]["total_pages"], 1000)
+
+        counter = PageCounter.objects.get(task__printer=self.printer)
+        counter.total_pages = 1500
+        with self.captureOnCommitCallbacks(execute=True):
+            counter.save()
+
+        self.assertEqual(get_counter_window(self.printer.id)[0]["total_pages"], 1500)
+
+    def test_deleted_counter_drops_window(self):
+        self._save_poll(1000)
+        bad = self._save_poll(90_000)
+        self.assertEqual(get_counter_window(self.printer.id)[0]["total_pages"], 90_000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PageCounter.objects.get(task=bad).delete()
+
+        self.assertEqual(get_counter_window(self.printer.id)[0]["total_pages"], 1000)
+
+    def test_deleted_task_drops_window(self):
+        self._save_poll(1000)
+        bad = self._save_poll(90_000)
+        self.assertEqual(get_counter_window(self.printer.id)[0]["total_pages"], 90_000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bad.delete()
+
+        self.assertEqual([s["total_pages"] for s in get_counter_window(self.printer.id)], [1000])
+
+    def test_task_status_change_drops_window(self):
+        self._save_poll(1000)
+        bad = self._save_poll(90_000)
+        self.assertEqual(get_counter_window(self.printer.id)[0]["total_pages"], 90_000)
+
+        bad.status = "VALIDATION_ERROR"
+        with self.captureOnCommitCallbacks(execute=True):
+            bad.save(update_fields=["status"])
+
+        self.assertEqual(get_counter_window(self.printer.id)[0]["total_pages"], 1000)
+
+    def test_cache_failure_falls_back_to_db(self):
+        self._save_poll(1000)
+        with mock.patch("inventory.counter_window._cache", side_effect=ConnectionError("redis down")):
+            ok, err, _ = validate_against_history(self.printer, {"bw_a4": 10, "total_pages": 10})
+        self.assertFalse(ok)
+        self.assertIn("уменьшение", err)
@@ -0,0 +1,340 @@
+"""
+Статический (HTTP + lxml) и браузерный режимы execute_web_parsing.
+
+Корпус — сохранённые страницы принтеров в fixtures/web_pages; оба режима
+должны давать одинаковые результаты.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+
+from django.test import SimpleTestCase, override_settings
+
+from inventory.browser_pool import BrowserPool, BrowserPoolTimeout
+from inventory.web_parser import execute_web_parsing, get_compiled_rule
+
+FIXTURES = Path(__file__).parent / "fixtures" / "web_pages"
+UPDATED = datetime(2026, 1, 1)
+
+
+def _rule(rule_id, url_path, field_name, xpath="", regex="", replacement="", actions="", source=None, formula=""):
+    return SimpleNamespace(
+        id=rule_id,
+        updated_at=UPDATED,
+        protocol="http",
+        url_path=url_path,
+        field_name=field_name,
+        xpath=xpath,
+        regex_pattern=regex,
+        regex_replacement=replacement,
+        actions_chain=actions,
+        is_calculated=bool(formula),
+        source_rules=json.dumps(source) if source else "",
+        calculation_formula=formula,
+    )
+
+
+CORPUS = {
+    "kyocera_status.html": (
+        "/status.htm",
+        [
+            _rule(101, "/status.htm", "serial_number", '//td[text()="Serial Number"]/following-sibling::td'),
+            _rule(102, "/status.htm", "mac_address", '//td[.="MAC Address"]/following-sibling::td/text()'),
+            _rule(103, "/status.htm", "counter", '//table[@id="counters"]//tr[td[1]="Printed pages"]/td[2]'),
+            _rule(104, "/status.htm", "variable_1", '//table[@id="counters"]//tr[td[1]="Copy (A4)"]/td[2]'),
+            _rule(105, "/status.htm", "variable_2", '//table[@id="counters"]//tr[td[1]="Print (A3)"]/td[2]'),
+            _rule(106, "", "counter_a4_bw", source=[104, 105], formula="rule_104 + rule_105 * 2"),
+            _rule(107, "/status.htm", "toner_black", '//span[@class="level"]', regex=r"(\d+)%"),
+        ],
+    ),
+    "hp_usage.html": (
+        "/hp/device/InternalPages/Index?id=UsagePage",
+        [
+            _rule(
+                201,
+                "/hp/device/InternalPages/Index?id=UsagePage",
+                "counter_a4_bw",
+                '//td[@id="UsagePage.EquivalentImpressionsTable.Monochrome.Total"]',
+            ),
+            _rule(
+                202,
+                "/hp/device/InternalPages/Index?id=UsagePage",
+                "counter_a4_color",
+                '//td[@id="UsagePage.EquivalentImpressionsTable.Color.Total"]',
+            ),
+            _rule(
+                203,
+                "/hp/device/InternalPages/Index?id=UsagePage",
+                "counter",
+                '//td[@id="UsagePage.EquivalentImpressionsTable.Total.Total"]/text()',
+            ),
+            _rule(
+                204,
+                "/hp/device/InternalPages/Index?id=UsagePage",
+                "serial_number",
+                '//p[@id="DeviceSerialNumber"]',
+                regex=r"Serial:\s*(\w+)",
+            ),
+            _rule(
+                205,
+                "/hp/device/InternalPages/Index?id=UsagePage",
+                "mac_address",
+                '//p[@id="MacAddr"]',
+                regex=r"MAC:\s*",
+                replacement="",
+            ),
+        ],
+    ),
+    "ricoh_counter.html": (
+        "/web/guest/ru/websys/status/getUnificationCounter.cgi",
+        [
+            _rule(
+                301,
+                "/web/guest/ru/websys/status/getUnificationCounter.cgi",
+                "counter",
+                '//dt[.="Total"]/following-sibling::dd[1]',
+            ),
+            _rule(
+                302,
+                "/web/guest/ru/websys/status/getUnificationCounter.cgi",
+                "variable_1",
+                '//dt[.="Printer: Black & White"]/following-sibling::dd[1]',
+            ),
+            _rule(
+                303,
+                "/web/guest/ru/websys/status/getUnificationCounter.cgi",
+                "variable_2",
+                '//dt[.="Copier: Black & White"]/following-sibling::dd[1]',
+            ),
+            _rule(304, "", "counter_a4_bw", source=[302, 303], formula="rule_302 + rule_303"),
+            _rule(
+                305,
+                "/web/guest/ru/websys/status/getUnificationCounter.cgi",
+                "serial_number",
+                '//div[@id="machine"]',
+                regex=r"ID:\s*(\S+)",
+            ),
+            _rule(306, "/web/guest/ru/websys/status/getUnificationCounter.cgi", "variable_3", "count(//dt)"),
+            _rule(307, "/web/guest/ru/websys/status/getUnificationCounter.cgi", "counter_a3_bw", "//span[@id='none']"),
+        ],
+    ),
+}
+
+PRINTER = SimpleNamespace(ip_address="10.1.1.1", web_username="", web_password="")
+
+
+class FakeSession:
+    def __init__(self, pages, status_code=200, error=None):
+        self.pages = pages
+        self.status_code = status_code
+        self.error = error
+        self.calls = []
+        self.cookies = mock.Mock()
+
+    def get(self, url, auth=None, timeout=None):
+        self.calls.append(url)
+        if self.error:
+            raise self.error
+        body = self.pages[url]
+        return SimpleNamespace(
+            status_code=self.status_code, headers={"Content-Type": "text/html"}, content=body, text=body.decode()
+        )
+
+
+class PageDriver:
+    """WebDriver, отдающий сохранённые страницы."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.page_source = ""
+        self.visited = []
+        self.window_handles = ["main"]
+        self.switch_to = mock.Mock()
+
+    def get(self, url):
+        self.visited.append(url)
+        self.page_source = self.pages.get(url, b"<html></html>").decode("utf-8", "replace")
+
+    def execute_script(self, script):
+        return 1
+
+    def execute_cdp_cmd(self, cmd, params):
+        pass
+
+    def quit(self):
+        pass
+
+
+def _pages(name, url_path):
+    return {f"http://{PRINTER.ip_address}{url_path}": (FIXTURES / name).read_bytes()}
+
+
+class StaticModeParityTests(SimpleTestCase):
+    def _run_static(self, pages, rules, driver_pages=None):
+        session = FakeSession(pages)
+        pool = BrowserPool(factory=lambda: PageDriver(driver_pages or pages), size=1)
+        with (
+            mock.patch("inventory.web_parser._get_http_session", return_value=session),
+            mock.patch("inventory.web_parser.get_browser_pool", return_value=pool) as get_pool,
+        ):
+            result = execute_web_parsing(PRINTER, rules)
+        return result, session, get_pool
+
+    @override_settings(WEB_STATIC_FETCH=False)
+    def _run_browser(self, pages, rules):
+        pool = BrowserPool(factory=lambda: PageDriver(pages), size=1)
+        with mock.patch("inventory.web_parser.get_browser_pool", return_value=pool):
+            return execute_web_parsing(PRINTER, rules)
+
+    def test_fixture_corpus_identical_in_both_modes(self):
+        for name, (url_path, rules) in CORPUS.items():
+            with self.subTest(page=name):
+                pages = _pages(name, url_path)
+                browser = self._run_browser(pages, rules)
+                static, _, _ = self._run_static(pages, rules)
+
+                self.assertTrue(browser[0], browser[2])
+                self.assertEqual(static[1], browser[1])
+
+    def test_expected_values_from_corpus(self):
+        url_path, rules = CORPUS["kyocera_status.html"]
+        (ok, results, _), _, _ = self._run_static(_pages("kyocera_status.html", url_path), rules)
+
+        self.assertEqual(
+            results,
+            {
+                "serial_number": "VCF9Z04123",
+                "mac_address": "00:17:C8:4A:11:B2",
+                "counter": 123456,
+                "counter_a4_bw": 40001 + 1200 * 2,
+                "toner_black": 35,
+            },
+        )
+
+    def test_each_url_fetched_once_without_browser(self):
+        url_path, rules = CORPUS["kyocera_status.html"]
+        (ok, _, _), session, get_pool = self._run_static(_pages("kyocera_status.html", url_path), rules)
+
+        self.assertTrue(ok)
+        self.assertEqual(len(session.calls), 1)
+        get_pool.assert_not_called()
+        session.cookies.clear.assert_called_once()
+
+    def test_action_chain_rules_go_to_browser(self):
+        url_path, rules = CORPUS["hp_usage.html"]
+        rules = list(rules) + [
+            _rule(
+                210,
+                url_path,
+                "counter_a3_color",
+                '//td[@id="UsagePage.EquivalentImpressionsTable.Color.Total"]',
+                actions=json.dumps([{"type": "wait", "wait": 0}]),
+            )
+        ]
+        (ok, results, _), session, get_pool = self._run_static(_pages("hp_usage.html", url_path), rules)
+
+        self.assertEqual(len(session.calls), 1)
+        get_pool.assert_called_once()
+        self.assertEqual(results["counter_a3_color"], 5210)
+        self.assertEqual(results["counter_a4_bw"], 18734)
+
+    def test_rules_after_action_chain_read_page_left_by_actions(self):
+        url = f"http://{PRINTER.ip_address}/counters.htm"
+        pages = {url: b"<html><body><td id='c'>100</td></body></html>"}
+        rules = [
+            _rule(401, "/counters.htm", "counter_a4_bw", "//td[@id='c']"),
+            _rule(402, "/counters.htm", "counter_a3_bw", "//td[@id='c']", actions=json.dumps([{"type": "click"}])),
+            _rule(403, "/counters.htm", "counter", "//td[@id='c']"),
+        ]
+
+        def show_next_page(driver, action):
+            driver.page_source = "<html><body><td id='c'>250</td></body></html>"
+
+        with mock.patch("inventory.web_parser.execute_action", side_effect=show_next_page):
+            (ok, results, _), session, get_pool = self._run_static(pages, rules)
+
+        self.assertTrue(ok)
+        get_pool.assert_called_once()
+        self.assertEqual(results, {"counter_a4_bw": 100, "counter_a3_bw": 250, "counter": 250})
+
+    def test_javascript_page_falls_back_to_browser(self):
+        url_path, rules = CORPUS["ricoh_counter.html"]
+        rendered = _pages("ricoh_counter.html", url_path)
+        shell = {url: b"<html><body><div id='app'></div></body></html>" for url in rendered}
+
+        (ok, results, _), _, get_pool = self._run_static(shell, rules, driver_pages=rendered)
+
+        get_pool.assert_called_once()
+        self.assertEqual(results, self._run_browser(rendered, rules)[1])
+
+    def test_http_error_falls_back_to_browser(self):
+        url_path, rules = CORPUS["kyocera_status.html"]
+        pages = _pages("kyocera_status.html", url_path)
+        session = FakeSession(pages, status_code=401)
+        pool = BrowserPool(factory=lambda: PageDriver(pages), size=1)
+
+        with (
+            mock.patch("inventory.web_parser._get_http_session", return_value=session),
+            mock.patch("inventory.web_parser.get_browser_pool", return_value=pool),
+        ):
+            ok, results, _ = execute_web_parsing(PRINTER, rules)
+
+        self.assertTrue(ok)
+        self.assertEqual(results["counter"], 123456)
+
+    def test_busy_browser_pool_is_not_a_parse_error(self):
+        url_path, rules = CORPUS["hp_usage.html"]
+        rules = list(rules) + [
+            _rule(210, url_path, "counter_a3_color", "//td", actions=json.dumps([{"type": "click"}]))
+        ]
+        pool = mock.Mock(acquire=mock.Mock(side_effect=BrowserPoolTimeout("busy")))
+
+        with (
+            mock.patch(
+                "inventory.web_parser._get_http_session", return_value=FakeSession(_pages("hp_usage.html", url_path))
+            ),
+            mock.patch("inventory.web_parser.get_browser_pool", return_value=pool),
+        ):
+            with self.assertRaises(BrowserPoolTimeout):
+                execute_web_parsing(PRINTER, rules)
+
+    def test_unreachable_device_does_not_start_browser(self):
+        url_path, rules = CORPUS["kyocera_status.html"]
+        session = FakeSession({}, error=requests.ConnectionError("timed out"))
+
+        with (
+            mock.patch("inventory.web_parser._get_http_session", return_value=session),
+            mock.patch("inventory.web_parser.get_browser_pool") as get_pool,
+        ):
+            ok, results, error = execute_web_parsing(PRINTER, rules)
+
+        self.assertFalse(ok)
+        self.assertIn("Ошибка загрузки", error)
+        get_pool.assert_not_called()
+
+
+class CompiledRuleCacheTests(SimpleTestCase):
+    def test_cached_per_id_and_updated_at(self):
+        rule = _rule(9001, "/", "counter", "//td")
+        first = get_compiled_rule(rule)
+
+        self.assertIs(get_compiled_rule(_rule(9001, "/", "counter", "//td")), first)
+
+        edited = _rule(9001, "/", "counter", "//th")
+        edited.updated_at = datetime(2026, 2, 1)
+        self.assertIsNot(get_compiled_rule(edited), first)
+
+    def test_invalid_xpath_reports_rule_error(self):
+        rule = _rule(9002, "/", "counter", "//td[")
+        session = FakeSession({"http://10.1.1.1/": b"<html><td>1</td></html>"})
+
+        with mock.patch("inventory.web_parser._get_http_session", return_value=session):
+            ok, _, error = execute_web_parsing(PRINTER, [rule])
+
+        self.assertFalse(ok)
+        self.assertIn("Ошибка парсинга counter", error)
@@ -0,0 +1,213 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase
+
+from inventory.consumers import InventoryConsumer
+from inventory.tasks import flush_ws_broadcast_task
+from inventory.ws_broadcast import GROUP, WINDOW_KEY, BroadcastAggregator, LocalBuffer, RedisBuffer, org_group
+
+
+class RecordingLayer:
+    def __init__(self):
+        self.sent = []
+        self.event = threading.Event()
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+        self.event.set()
+
+
+class FakeRedis:
+    """Ровно те команды, что нужны RedisBuffer; TTL окна не моделируется."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.keys = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        results = []
+        for name, args, kwargs in self.calls:
+            if name == "hset":
+                key, field, value = args
+                self.redis.hashes.setdefault(key, {})[str(field).encode()] = value.encode()
+                results.append(1)
+            elif name == "set":
+                key, value = args
+                opened = key not in self.redis.keys
+                self.redis.keys.setdefault(key, value)
+                results.append(True if opened else None)
+            elif name == "hgetall":
+                results.append(dict(self.redis.hashes.get(args[0], {})))
+            elif name == "delete":
+                results.append(int(self.redis.hashes.pop(args[0], None) is not None))
+            elif name == "exists":
+                results.append(int(args[0] in self.redis.keys or bool(self.redis.hashes.get(args[0]))))
+        return results
+
+
+def _update(printer_id, status="SUCCESS", **extra):
+    return {"type": "inventory_update", "printer_id": printer_id, "status": status, **extra}
+
+
+class BroadcastAggregatorTests(SimpleTestCase):
+    def setUp(self):
+        self.layer = RecordingLayer()
+        self.aggregator = BroadcastAggregator(interval_ms=60_000, layer=self.layer)
+        self.addCleanup(self.aggregator.flush)
+
+    def test_keeps_latest_event_per_printer(self):
+        self.aggregator.publish({"type": "inventory_start", "printer_id": 1}, organization_id=10)
+        self.aggregator.publish(_update(1, total=100), organization_id=10)
+        self.aggregator.publish(_update(2, status="FAILED"), organization_id=20)
+        self.aggregator.publish(_update(1, total=105), organization_id=10)
+
+        self.assertEqual(self.layer.sent, [])
+        self.assertEqual(self.aggregator.flush(), 3)
+
+        sent = dict(self.layer.sent)
+        self.assertEqual(sent[GROUP]["type"], "inventory_batch")
+        self.assertEqual(sent[GROUP]["events"], [_update(1, total=105), _update(2, status="FAILED")])
+        self.assertEqual(sent[org_group(10)]["events"], [_update(1, total=105)])
+        self.assertEqual(sent[org_group(20)]["events"], [_update(2, status="FAILED")])
+
+    def test_flush_empty_buffer_sends_nothing(self):
+        self.assertEqual(self.aggregator.flush(), 0)
+        self.assertEqual(self.layer.sent, [])
+
+    def test_event_without_organization_goes_only_to_common_group(self):
+        self.aggregator.publish(_update(3))
+        self.aggregator.flush()
+
+        self.assertEqual([group for group, _ in self.layer.sent], [GROUP])
+
+    def test_timer_flushes_batch(self):
+        aggregator = BroadcastAggregator(interval_ms=20, layer=self.layer)
+        for total in range(10):
+            aggregator.publish(_update(7, total=total))
+
+        self.assertTrue(self.layer.event.wait(2))
+        self.assertEqual(self.layer.sent, [(GROUP, {"type": "inventory_batch", "events": [_update(7, total=9)]})])
+
+    def test_zero_interval_sends_each_event_as_is(self):
+        aggregator = BroadcastAggregator(interval_ms=0, layer=self.layer)
+        aggregator.publish(_update(4), organization_id=30)
+
+        self.assertEqual(self.layer.sent, [(GROUP, _update(4)), (org_group(30), _update(4))])
+
+
+class SharedBufferTests(SimpleTestCase):
+    def test_processes_share_one_window(self):
+        layer, redis = RecordingLayer(), FakeRedis()
+        workers = [BroadcastAggregator(interval_ms=60_000, layer=layer, buffer=RedisBuffer(redis)) for _ in range(3)]
+        for worker in workers:
+            self.addCleanup(worker.flush)
+
+        for printer_id, worker in enumerate(workers * 2, start=1):
+            worker.publish(_update(printer_id % 4, total=printer_id), organization_id=None)
+
+        # Окно открыл первый процесс; остальные только дописали хеш
+        self.assertIsNotNone(workers[0]._timer)
+        self.assertIsNone(workers[1]._timer)
+        self.assertEqual(workers[0].flush(), 1)
+
+        (group, message), *rest = layer.sent
+        self.assertEqual(rest, [])
+        self.assertEqual(
+            sorted((e["printer_id"], e["total"]) for e in message["events"]), [(0, 4), (1, 5), (2, 6), (3, 3)]
+        )
+        self.assertEqual(workers[1].flush(), 0)
+
+
+class StaleWindowFlushTests(SimpleTestCase):
+    def setUp(self):
+        self.layer, self.redis = RecordingLayer(), FakeRedis()
+        self.owner = BroadcastAggregator(interval_ms=60_000, layer=self.layer, buffer=RedisBuffer(self.redis))
+        self.beat = BroadcastAggregator(interval_ms=60_000, layer=self.layer, buffer=RedisBuffer(self.redis))
+
+    def _owner_dies(self):
+        self.owner._timer.cancel()
+        self.owner._timer = None
+
+    def test_open_window_left_to_its_owner(self):
+        self.owner.publish(_update(1))
+        self.addCleanup(self.owner.flush)
+
+        self.assertEqual(self.beat.flush_stale(), 0)
+        self.assertEqual(self.layer.sent, [])
+
+    def test_expired_window_of_dead_process_flushed(self):
+        self.owner.publish(_update(1, total=10), organization_id=3)
+        self.owner.publish(_update(2))
+        self._owner_dies()
+        self.redis.keys.pop(WINDOW_KEY)  # TTL окна истёк
+
+        self.assertEqual(self.beat.flush_stale(), 2)
+        self.assertEqual(sorted(e["printer_id"] for e in dict(self.layer.sent)[GROUP]["events"]), [1, 2])
+        self.assertEqual(self.beat.flush_stale(), 0)
+
+    def test_nothing_pending(self):
+        self.assertEqual(self.beat.flush_stale(), 0)
+
+    def test_local_buffer_skipped(self):
+        aggregator = BroadcastAggregator(interval_ms=60_000, layer=self.layer, buffer=LocalBuffer())
+        aggregator.publish(_update(5))
+        self.addCleanup(aggregator.flush)
+
+        self.assertEqual(aggregator.flush_stale(), 0)
+        self.assertEqual(self.layer.sent, [])
+
+    def test_periodic_task(self):
+        with mock.patch("inventory.ws_broadcast._aggregator", self.beat):
+            self.owner.publish(_update(1))
+            self._owner_dies()
+            self.redis.keys.pop(WINDOW_KEY)
+
+            self.assertEqual(flush_ws_broadcast_task(), 1)
+        self.assertEqual(len(self.layer.sent), 1)
+
+
+class InventoryConsumerGroupsTests(SimpleTestCase):
+    async def _connect(self, query=""):
+        communicator = WebsocketCommunicator(InventoryConsumer.as_asgi(), f"/ws/inventory/{query}")
+        communicator.scope["user"] = SimpleNamespace(is_anonymous=False)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _scenario(self):
+        everything = await self._connect()
+        only_org = await self._connect("?org=5")
+        layer = get_channel_layer()
+
+        await layer.group_send(org_group(6), {"type": "inventory_batch", "events": [_update(2)]})
+        await layer.group_send(org_group(5), {"type": "inventory_batch", "events": [_update(1)]})
+        await layer.group_send(GROUP, {"type": "inventory_batch", "events": [_update(1), _update(2)]})
+
+        self.assertEqual((await only_org.receive_json_from())["events"], [_update(1)])
+        self.assertEqual(len((await everything.receive_json_from())["events"]), 2)
+        self.assertTrue(await only_org.receive_nothing())
+        self.assertTrue(await everything.receive_nothing())
+
+        await everything.disconnect()
+        await only_org.disconnect()
+
+    def test_org_subscription_receives_only_own_events(self):
+        async_to_sync(self._scenario)()
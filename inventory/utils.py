@@ -156,28 +156,32 @@ def run_glpi_command(command, timeout=300):
 def xml_to_json(xml_path):
     """
     Парсит XML-файл и возвращает вложенный словарь (без атрибутов).
+
+    Потоковый разбор (iterparse): элемент превращается в dict/строку на закрывающем
+    теге и сразу очищается, так что в памяти живут только ещё не собранные ветви.
     """
+    pending = {}  # элемент -> готовое значение, пока родитель не закрыт
+    result = {}
     try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
+        for _, elem in ET.iterparse(xml_path):
+            d = {}
+            for child in elem:
+                val = pending.pop(child)
+                tag = child.tag
+                if tag in d:
+                    if isinstance(d[tag], list):
+                        d[tag].append(val)
+                    else:
+                        d[tag] = [d[tag], val]
+                else:
+                    d[tag] = val
+            pending[elem] = d if len(elem) else (elem.text or "")
+            result = d  # последним закрывается корень
+            elem.clear()
     except Exception:
         return {}
 
-    def recurse(elem):
-        d = {}
-        for child in elem:
-            val = recurse(child) if list(child) else (child.text or "")
-            tag = child.tag
-            if tag in d:
-                if isinstance(d[tag], list):
-                    d[tag].append(val)
-                else:
-                    d[tag] = [d[tag], val]
-            else:
-                d[tag] = val
-        return d
-
-    return recurse(root)
+    return result
 
 
 # ---------- ВАЛИДАЦИЯ/ИМПОРТ ----------
@@ -350,20 +354,15 @@ def validate_against_history(printer, new_counters):
         tuple: (is_valid: bool, error_message: str, validation_rule: str)
     """
 
-    from .models import InventoryTask, PageCounter
+    from .counter_window import get_counter_window, snapshot_time
 
-    # Получаем последние 5 успешных записей для анализа паттерна
-    recent_tasks = InventoryTask.objects.filter(printer=printer, status="SUCCESS").order_by("-task_timestamp")[:5]
+    # Последние 5 успешных снимков счётчиков (новые первыми) — из кэша, при промахе из БД
+    recent_counters = get_counter_window(printer.id)
 
-    if not recent_tasks.exists():
+    if not recent_counters:
         # Нет истории - принимаем данные
         return True, None, None
 
-    recent_counters = PageCounter.objects.filter(task__in=recent_tasks).order_by("-task__task_timestamp")
-
-    if not recent_counters.exists():
-        return True, None, None
-
     # Анализируем исторические паттерны
     historical_patterns = {
         "had_a3": False,
@@ -377,12 +376,12 @@ def validate_against_history(printer, new_counters):
         historical_patterns["total_records"] += 1
 
         # Проверяем наличие A3 счетчиков
-        if (counter.bw_a3 and counter.bw_a3 > 0) or (counter.color_a3 and counter.color_a3 > 0):
+        if (counter["bw_a3"] or 0) > 0 or (counter["color_a3"] or 0) > 0:
             historical_patterns["had_a3"] = True
             historical_patterns["had_a3_count"] += 1
 
         # Проверяем наличие цветных счетчиков
-        if (counter.color_a3 and counter.color_a3 > 0) or (counter.color_a4 and counter.color_a4 > 0):
+        if (counter["color_a3"] or 0) > 0 or (counter["color_a4"] or 0) > 0:
             historical_patterns["had_color"] = True
             historical_patterns["had_color_count"] += 1
 
@@ -415,9 +414,8 @@ def validate_against_history(printer, new_counters):
 
     # 3. Проверка на значительное уменьшение счетчиков (возможная перезагрузка/сброс)
     # 4. Проверка на аномальное увеличение счетчиков (защита от глюков Kyocera)
-    if recent_counters.exists():
-        latest = recent_counters.first()
-        latest_task = latest.task
+    if recent_counters:
+        latest = recent_counters[0]
 
         # Получаем время последнего опроса
         from datetime import timedelta
@@ -428,7 +426,7 @@ def validate_against_history(printer, new_counters):
         time_window_hours = getattr(settings, "ANOMALY_CHECK_TIME_WINDOW_HOURS", 24)
         skip_check_days = getattr(settings, "ANOMALY_SKIP_CHECK_DAYS", 30)
 
-        time_since_last_poll = timezone.now() - latest_task.task_timestamp
+        time_since_last_poll = timezone.now() - snapshot_time(latest)
         is_recent_poll = time_since_last_poll < timedelta(hours=time_window_hours)
         is_very_old_poll = time_since_last_poll > timedelta(days=skip_check_days)
 
@@ -442,7 +440,7 @@ def validate_against_history(printer, new_counters):
         ]
 
         for field, name in counters_to_check:
-            old_value = getattr(latest, field, None) or 0
+            old_value = latest.get(field) or 0
             new_value = new_counters.get(field, 0) or 0
 
             # Проверка на уменьшение (более чем на 10%)
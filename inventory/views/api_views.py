@@ -30,7 +30,7 @@ from ..api_docs_decorators import (
     api_status_statistics_schema,
     api_system_status_schema,
 )
-from ..models import InventoryTask, Organization, PageCounter, Printer, PrinterChangeLog, USBAgent
+from ..models import InventoryTask, Organization, Printer, PrinterChangeLog, USBAgent
 from ..services import (
     extract_device_info_from_xml,
     extract_serial_from_xml,
@@ -82,7 +82,13 @@ def api_printers(request):
         per_page = 100
 
     # Базовый запрос с оптимизацией
-    qs = Printer.objects.select_related("organization", "device_model", "device_model__manufacturer").all()
+    qs = Printer.objects.select_related(
+        "organization",
+        "device_model",
+        "device_model__manufacturer",
+        "latest_state__success_task",
+        "latest_state__counter",
+    ).all()
 
     # Фильтр по активности (по умолчанию только активные)
     if q_active == "true":
@@ -128,26 +134,15 @@ def api_printers(request):
     paginator = Paginator(qs, per_page)
     page_obj = paginator.get_page(request.GET.get("page", 1))
 
-    # Получаем ID принтеров на текущей странице
-    printer_ids = [p.id for p in page_obj]
-
-    # Получаем задачи и счётчики
+    # Последняя успешная задача и её счётчики приходят тем же запросом (PrinterLatestState)
     tasks_dict = {}
-    if printer_ids:
-        for printer_id in printer_ids:
-            task = (
-                InventoryTask.objects.filter(printer_id=printer_id, status="SUCCESS")
-                .order_by("-task_timestamp")
-                .first()
-            )
-            if task:
-                tasks_dict[printer_id] = task
-
-    task_ids = [task.id for task in tasks_dict.values()]
     counters_dict = {}
-    if task_ids:
-        counters = PageCounter.objects.filter(task_id__in=task_ids).select_related("task")
-        counters_dict = {c.task_id: c for c in counters}
+    for p in page_obj:
+        state = getattr(p, "latest_state", None)
+        if state and state.success_task:
+            tasks_dict[p.id] = state.success_task
+            if state.counter:
+                counters_dict[state.success_task.id] = state.counter
 
     # Резолвим hostname USB-агентов одним запросом — для отображения вместо 0.0.0.0
     usb_agent_ids = {t.agent_id for t in tasks_dict.values() if t.data_source == "USB_AGENT" and t.agent_id}
@@ -266,20 +261,20 @@ def api_printer(request, pk):
     """
     pk = int(pk)
     printer = get_object_or_404(
-        Printer.objects.select_related("organization", "device_model", "device_model__manufacturer"), pk=pk
+        Printer.objects.select_related(
+            "organization",
+            "device_model",
+            "device_model__manufacturer",
+            "latest_state__success_task",
+            "latest_state__counter",
+        ),
+        pk=pk,
     )
 
-    # Получаем последнюю успешную задачу
-    task = (
-        InventoryTask.objects.filter(printer_id=pk, status="SUCCESS")  # Используем printer_id для консистентности
-        .order_by("-task_timestamp")
-        .first()
-    )
-
-    # Получаем счётчики
-    counter = None
-    if task:
-        counter = PageCounter.objects.filter(task=task).first()
+    # Последняя успешная задача и её счётчики (PrinterLatestState)
+    state = getattr(printer, "latest_state", None)
+    task = state.success_task if state else None
+    counter = state.counter if task else None
 
     # Вычисляем timestamp
     ts_ms = ""
@@ -15,7 +15,7 @@ from django.utils import timezone
 from django.utils.timezone import localtime
 
 from ..models import InventoryTask, Printer
-from ..services import get_printer_inventory_status
+from ..services import inventory_status_from_state
 
 logger = logging.getLogger(__name__)
 
@@ -31,16 +31,16 @@ logger = logging.getLogger(__name__)
 def export_excel(request):
     """
     Экспорт списка принтеров в Excel с фильтрацией.
-    БЕЗ кэширования - данные читаются напрямую из БД.
+    БЕЗ кэширования - данные читаются напрямую из БД (последние опросы меняются
+    постоянно), книга пишется потоково по мере чтения iterator().
     """
-    import openpyxl
-    from openpyxl.utils import get_column_letter
-
     from django.db.models import Q
     from django.http import HttpResponse
     from django.utils.timezone import localtime
 
-    from ..services import get_printer_inventory_status
+    from printer_inventory.xlsx import DATETIME, XLSX_CONTENT_TYPE, StreamingWorkbook
+
+    from ..services import inventory_status_from_state
 
     # Параметры фильтрации
     q_ip = request.GET.get("q_ip", "").strip()
@@ -53,8 +53,15 @@ def export_excel(request):
     q_device_model = request.GET.get("q_device_model", "").strip()
     q_model_text = request.GET.get("q_model_text", "").strip()
 
-    # Базовый queryset
-    qs = Printer.objects.select_related("organization", "device_model", "device_model__manufacturer").all()
+    # Базовый queryset; последнее состояние — тем же запросом
+    qs = Printer.objects.select_related(
+        "organization",
+        "device_model",
+        "device_model__manufacturer",
+        "latest_state__last_task",
+        "latest_state__success_task",
+        "latest_state__counter",
+    ).all()
 
     # Применяем фильтры
     if q_ip:
@@ -93,47 +100,46 @@ def export_excel(request):
     # ──────────────────────────────
     # Создаём Excel
     # ──────────────────────────────
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Printers"
-
-    # Заголовки — добавлена колонка "Производитель"
-    headers = [
-        "Организация",
-        "IP-адрес",
-        "Серийный №",
-        "MAC-адрес",
-        "Производитель",
-        "Модель",
-        "ЧБ A4",
-        "Цвет A4",
-        "ЧБ A3",
-        "Цвет A3",
-        "Всего",
-        "Тонер K",
-        "Тонер C",
-        "Тонер M",
-        "Тонер Y",
-        "Барабан K",
-        "Барабан C",
-        "Барабан M",
-        "Барабан Y",
-        "Fuser Kit",
-        "Transfer Kit",
-        "Waste Toner",
-        "Правило",
-        "Дата последнего опроса",
-        "Статус последнего опроса",
-        "Последняя ошибка",
+    # Заголовки и ширины: write_only не даёт подобрать ширину по данным после записи
+    columns = [
+        ("Организация", 40),
+        ("IP-адрес", 16),
+        ("Серийный №", 20),
+        ("MAC-адрес", 19),
+        ("Производитель", 16),
+        ("Модель", 32),
+        ("ЧБ A4", 10),
+        ("Цвет A4", 10),
+        ("ЧБ A3", 10),
+        ("Цвет A3", 10),
+        ("Всего", 10),
+        ("Тонер K", 10),
+        ("Тонер C", 10),
+        ("Тонер M", 10),
+        ("Тонер Y", 10),
+        ("Барабан K", 11),
+        ("Барабан C", 11),
+        ("Барабан M", 11),
+        ("Барабан Y", 11),
+        ("Fuser Kit", 10),
+        ("Transfer Kit", 13),
+        ("Waste Toner", 13),
+        ("Правило", 17),
+        ("Дата последнего опроса", 24),
+        ("Статус последнего опроса", 26),
+        ("Последняя ошибка", 50),
     ]
-
-    # Заголовки — жирным
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = openpyxl.styles.Font(bold=True)
-
-    col_widths = [len(h) for h in headers]
-    date_col_idx = headers.index("Дата последнего опроса") + 1
+    headers = [header for header, _ in columns]
+    date_col_idx = headers.index("Дата последнего опроса")
+
+    wb = StreamingWorkbook(header_color=None)
+    ws = wb.sheet(
+        "Printers",
+        headers,
+        widths=[width for _, width in columns],
+        styles=[None] * date_col_idx + [DATETIME],
+        freeze=None,
+    )
 
     rule_label = {
         "SN_MAC": "Серийник+MAC",
@@ -144,9 +150,9 @@ def export_excel(request):
     # ──────────────────────────────
     # Заполняем данные
     # ──────────────────────────────
-    row_idx = 2
-    for p in qs:
-        inv_status = get_printer_inventory_status(p.id)
+    for p in qs.iterator(chunk_size=500):
+        state = getattr(p, "latest_state", None)
+        inv_status = inventory_status_from_state(state)
         counters = inv_status.get("counters", {})
 
         # Дата последнего опроса
@@ -159,7 +165,7 @@ def export_excel(request):
                 pass
 
         # Последняя задача
-        last_task = InventoryTask.objects.filter(printer=p).order_by("-task_timestamp").first()
+        last_task = state.last_task if state else None
         if last_task:
             try:
                 status_map = dict(InventoryTask.STATUS_CHOICES)
@@ -201,29 +207,12 @@ def export_excel(request):
             last_status,
             last_error,
         ]
-
-        for col_idx, val in enumerate(values, 1):
-            cell = ws.cell(row=row_idx, column=col_idx, value=val)
-            if col_idx == date_col_idx and dt_value:
-                cell.number_format = "dd.mm.yyyy hh:mm"
-
-            disp = val if val is not None else ""
-            if hasattr(val, "strftime"):
-                disp = val.strftime("%d.%m.%Y %H:%M")
-            col_widths[col_idx - 1] = max(col_widths[col_idx - 1], len(str(disp)))
-
-        row_idx += 1
-
-    # ──────────────────────────────
-    # Автоподбор ширины колонок
-    # ──────────────────────────────
-    for i, w in enumerate(col_widths, start=1):
-        ws.column_dimensions[get_column_letter(i)].width = min(max(w + 2, 10), 50)
+        ws.append(values)
 
     # ──────────────────────────────
     # Ответ пользователю
     # ──────────────────────────────
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    response = HttpResponse(content_type=XLSX_CONTENT_TYPE)
     response["Content-Disposition"] = 'attachment; filename="printers.xlsx"'
     wb.save(response)
     return response
@@ -296,16 +285,15 @@ def export_amb(request):
 
     # Получаем данные инвентаризации напрямую из БД
     counters_by_serial = {}
-    for serial in serials:
-        try:
-            printer = Printer.objects.get(serial_number=serial)
-            inv_status = get_printer_inventory_status(printer.id)
-            counters = inv_status.get("counters", {})
-            timestamp = inv_status.get("timestamp")
-            if counters and timestamp:
-                counters_by_serial[serial] = {"counters": counters, "timestamp": timestamp}
-        except Printer.DoesNotExist:
-            continue
+    printers = Printer.objects.filter(serial_number__in=serials).select_related(
+        "latest_state__success_task", "latest_state__counter"
+    )
+    for printer in printers:
+        inv_status = inventory_status_from_state(getattr(printer, "latest_state", None))
+        counters = inv_status.get("counters", {})
+        timestamp = inv_status.get("timestamp")
+        if counters and timestamp:
+            counters_by_serial[printer.serial_number] = {"counters": counters, "timestamp": timestamp}
 
     # Добавляем колонку для даты опроса
     date_col = ws.max_column + 1
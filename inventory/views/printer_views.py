@@ -20,6 +20,7 @@ from django.views.decorators.http import require_POST
 
 from access.services.change_log_service import ChangeLogService
 
+from .. import inflight
 from ..forms import PrinterForm
 from ..models import InventoryTask, PageCounter, Printer, WebParsingRule
 from ..services import inventory_daemon, run_inventory_for_printer
@@ -328,8 +329,10 @@ def poll_printer(request, printer_id):
             {"success": False, "error": "Нет настроенных правил парсинга для этого принтера"}, status=400
         )
 
-    # Выполняем парсинг
-    success, results, error_message = execute_web_parsing(printer, list(rules))
+    # Выполняем парсинг; параллельный запрос того же принтера получит результат этого запуска
+    success, results, error_message = inflight.single_flight(
+        printer.id, lambda: execute_web_parsing(printer, list(rules)), kind="web_parse"
+    ) or (False, {}, "Опрос принтера уже выполняется")
 
     if not success:
         return JsonResponse({"success": False, "error": error_message}, status=400)
@@ -358,7 +361,7 @@ def poll_printer(request, printer_id):
             logger.info(
                 f"poll_printer: вызываем sync_to_monthly_reports для принтера {printer.id} с счетчиками: {counters}"
             )
-            sync_to_monthly_reports(printer, counters)
+            sync_to_monthly_reports(printer, counters, immediate=True)
         except Exception as e:
             logger.error(f"poll_printer: ошибка синхронизации с monthly_report: {e}", exc_info=True)
 
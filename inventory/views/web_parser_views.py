@@ -176,7 +176,7 @@ def fetch_page(request):
     from selenium.webdriver.support import expected_conditions as EC  # <-- Добавьте этот импорт
     from selenium.webdriver.support.ui import WebDriverWait
 
-    from ..web_parser import create_selenium_driver
+    from ..browser_pool import BrowserPoolTimeout, get_browser_pool
 
     data = json.loads(request.body)
     url = data.get("url")
@@ -188,9 +188,10 @@ def fetch_page(request):
     if not is_valid:
         return JsonResponse({"success": False, "error": error_msg}, status=400)
 
+    pool = get_browser_pool()
     driver = None
     try:
-        driver = create_selenium_driver()
+        driver = pool.acquire()
 
         if username:
             from urllib.parse import urlparse, urlunparse
@@ -237,13 +238,16 @@ def fetch_page(request):
 
         return JsonResponse({"success": True, "content": page_source, "url": final_url})
 
+    except BrowserPoolTimeout:
+        return JsonResponse({"success": False, "error": "Все браузеры заняты, повторите попытку позже"}, status=503)
+
     except Exception as e:
         logger.error(f"Error in fetch_page: {e}", exc_info=True)
         return JsonResponse({"success": False, "error": "Ошибка загрузки страницы"}, status=400)
 
     finally:
         if driver:
-            driver.quit()
+            pool.release(driver)
 
 
 @login_required
@@ -410,7 +414,8 @@ def execute_action(request):
     from selenium.webdriver.support import expected_conditions as EC
     from selenium.webdriver.support.ui import WebDriverWait
 
-    from ..web_parser import apply_regex_processing, create_selenium_driver
+    from ..browser_pool import BrowserPoolTimeout, get_browser_pool
+    from ..web_parser import apply_regex_processing
 
     data = json.loads(request.body)
     url = data.get("url")
@@ -423,9 +428,10 @@ def execute_action(request):
     if not is_valid:
         return JsonResponse({"success": False, "error": error_msg}, status=400)
 
+    pool = get_browser_pool()
     driver = None
     try:
-        driver = create_selenium_driver()
+        driver = pool.acquire()
 
         if username:
             from urllib.parse import urlparse, urlunparse
@@ -578,6 +584,9 @@ def execute_action(request):
             }
         )
 
+    except BrowserPoolTimeout:
+        return JsonResponse({"success": False, "error": "Все браузеры заняты, повторите попытку позже"}, status=503)
+
     except Exception as e:
         import traceback
 
@@ -586,7 +595,7 @@ def execute_action(request):
 
     finally:
         if driver:
-            driver.quit()
+            pool.release(driver)
 
 
 @login_required
@@ -5,11 +5,15 @@ import logging
 import os
 import platform
 import re
+import threading
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
 from typing import Any, Dict, Optional, Tuple
 from xml.dom import minidom
 
-from lxml import html
+import requests
+import urllib3
+from lxml import etree, html
 from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -17,8 +21,18 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 from urllib3.util.ssl_ import create_urllib3_context
 
+from django.conf import settings
+
+from .browser_pool import BrowserPoolTimeout, get_browser_pool
+
 logger = logging.getLogger(__name__)
 
+BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
+)
+
 
 class SSLAdapter(HTTPAdapter):
     """Адаптер для старых SSL протоколов"""
@@ -60,11 +74,7 @@ def create_selenium_driver():
         edge_options.add_argument("--ignore-ssl-errors")
 
         # User Agent
-        edge_options.add_argument(
-            "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
-        )
+        edge_options.add_argument(f"--user-agent={BROWSER_USER_AGENT}")
 
         # Отключаем автоматизацию
         edge_options.add_argument("--disable-blink-features=AutomationControlled")
@@ -233,12 +243,224 @@ def safe_eval_formula(formula: str, context: Dict[str, int]) -> int:
         raise ValueError(f"Ошибка вычисления формулы '{formula}': {str(e)}")
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# ПРЕДКОМПИЛЯЦИЯ ПРАВИЛ И HTTP-СЕССИЯ
+# ──────────────────────────────────────────────────────────────────────────────
+
+_COMPILED_RULES_MAX = 2048
+_compiled_rules: "OrderedDict[tuple, CompiledRule]" = OrderedDict()
+_compiled_lock = threading.Lock()
+_http_local = threading.local()
+
+
+class CompiledRule:
+    """Предкомпилированные XPath и regex правила парсинга."""
+
+    __slots__ = ("xpath", "regex")
+
+    def __init__(self, rule):
+        try:
+            self.xpath = etree.XPath(rule.xpath)
+        except etree.XPathSyntaxError:
+            # Невалидное выражение вычисляем как раньше — ошибка попадёт в errors правила
+            expr = rule.xpath
+            self.xpath = lambda tree: tree.xpath(expr)
+
+        self.regex = rule.regex_pattern
+        if rule.regex_pattern:
+            try:
+                self.regex = re.compile(rule.regex_pattern)
+            except re.error:
+                pass  # apply_regex_processing залогирует и вернёт значение как есть
+
+
+def get_compiled_rule(rule) -> CompiledRule:
+    """CompiledRule из кэша процесса, ключ — (id правила, updated_at)."""
+    if rule.id is None:
+        return CompiledRule(rule)
+
+    key = (rule.id, getattr(rule, "updated_at", None))
+    with _compiled_lock:
+        compiled = _compiled_rules.get(key)
+        if compiled is not None:
+            _compiled_rules.move_to_end(key)
+            return compiled
+
+    compiled = CompiledRule(rule)
+    with _compiled_lock:
+        _compiled_rules[key] = compiled
+        while len(_compiled_rules) > _COMPILED_RULES_MAX:
+            _compiled_rules.popitem(last=False)
+    return compiled
+
+
+def _get_http_session() -> requests.Session:
+    """Пул HTTP-соединений потока (после fork создаётся заново)."""
+    session = getattr(_http_local, "session", None)
+    if session is None or getattr(_http_local, "pid", None) != os.getpid():
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        session = requests.Session()
+        session.mount("https://", SSLAdapter(pool_connections=32, pool_maxsize=4))
+        session.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=4))
+        session.headers["User-Agent"] = BROWSER_USER_AGENT
+        session.verify = False
+        _http_local.session = session
+        _http_local.pid = os.getpid()
+    return session
+
+
+def _url_with_credentials(url: str, printer) -> str:
+    """Подставляет логин/пароль принтера в URL (basic auth для браузера)."""
+    if not printer.web_username:
+        return url
+
+    from urllib.parse import urlparse, urlunparse
+
+    parsed = urlparse(url)
+    return urlunparse(
+        (
+            parsed.scheme,
+            f"{printer.web_username}:{printer.web_password}@{parsed.netloc}",
+            parsed.path,
+            parsed.params,
+            parsed.query,
+            parsed.fragment,
+        )
+    )
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ВЫПОЛНЕНИЕ ПРАВИЛ
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _evaluate_rule(rule, tree, results: dict, rule_results: dict) -> bool:
+    """
+    Применяет правило к разобранному документу.
+
+    Returns:
+        True — XPath нашёл значение, False — пустой результат
+    """
+    compiled = get_compiled_rule(rule)
+    result = compiled.xpath(tree)
+
+    if not result:
+        return False
+
+    if isinstance(result, list):
+        raw_value = result[0].text_content().strip() if hasattr(result[0], "text_content") else str(result[0])
+    else:
+        raw_value = result.text_content().strip() if hasattr(result, "text_content") else str(result)
+
+    # Применяем regex
+    processed_value = apply_regex_processing(raw_value, compiled.regex, rule.regex_replacement)
+
+    # Обработка в зависимости от типа поля
+    if rule.field_name == "mac_address":
+        results[rule.field_name] = normalize_mac_address(processed_value)
+    elif rule.field_name == "serial_number":
+        results[rule.field_name] = processed_value
+    else:
+        # Для счетчиков извлекаем числовое значение
+        numeric_value = extract_numeric_value(processed_value)
+        rule_results[rule.id] = numeric_value
+        # Переменные (variable_*) — только для формул, не сохраняем в результаты
+        if not rule.field_name.startswith("variable_"):
+            results[rule.field_name] = numeric_value
+
+    return True
+
+
+def _parse_static(printer, url: str, url_rules: list, results: dict, rule_results: dict, errors: list) -> list:
+    """
+    Статический режим: один HTTP-запрос и один разбор документа на URL.
+
+    Returns:
+        Правила, которые нужно повторить в браузере (страница требует JS
+        или отдала HTTP-ошибку, XPath ничего не нашёл).
+    """
+    session = _get_http_session()
+    auth = (printer.web_username, printer.web_password or "") if printer.web_username else None
+
+    try:
+        response = session.get(url, auth=auth, timeout=getattr(settings, "WEB_STATIC_TIMEOUT", 30))
+    except requests.RequestException as e:
+        errors.append(f"Ошибка загрузки {url}: {str(e)}")
+        logger.error(f"URL loading error {url}: {e}")
+        return []
+
+    if response.status_code >= 400:
+        logger.info(f"Static fetch {url} returned HTTP {response.status_code}, falling back to browser")
+        return list(url_rules)
+
+    # Кодировку из заголовка берём явно, иначе lxml определит её по <meta>
+    if "charset" in response.headers.get("Content-Type", "").lower():
+        document = response.text
+    else:
+        document = response.content
+
+    try:
+        tree = html.fromstring(document)
+    except (etree.ParserError, ValueError):
+        return list(url_rules)
+
+    fallback = []
+    for rule in url_rules:
+        try:
+            if not _evaluate_rule(rule, tree, results, rule_results):
+                fallback.append(rule)
+        except Exception as e:
+            errors.append(f"Ошибка парсинга {rule.field_name}: {str(e)}")
+            logger.error(f"Parsing error for {rule.field_name}: {e}", exc_info=True)
+
+    if fallback:
+        logger.info(f"Static fetch {url}: {len(fallback)} rule(s) without result, falling back to browser")
+    return fallback
+
+
+def _parse_with_browser(driver, printer, url: str, url_rules: list, results: dict, rule_results: dict, errors: list):
+    """Браузерный режим: загрузка страницы, цепочки действий, разбор после каждого изменения DOM."""
+    try:
+        driver.get(_url_with_credentials(url, printer))
+    except Exception as e:
+        errors.append(f"Ошибка загрузки {url}: {str(e)}")
+        logger.error(f"URL loading error {url}: {e}", exc_info=True)
+        return
+
+    tree = None
+    for rule in url_rules:
+        try:
+            # Выполняем цепочку действий если есть
+            if rule.actions_chain:
+                tree = None
+                for action in json.loads(rule.actions_chain):
+                    execute_action(driver, action)
+
+            if tree is None:
+                tree = html.fromstring(driver.page_source)
+
+            _evaluate_rule(rule, tree, results, rule_results)
+
+        except Exception as e:
+            errors.append(f"Ошибка парсинга {rule.field_name}: {str(e)}")
+            logger.error(f"Parsing error for {rule.field_name}: {e}", exc_info=True)
+
+
 def execute_web_parsing(printer, rules: list) -> Tuple[bool, Dict[str, Any], str]:
     """
     Выполняет веб-парсинг принтера по заданным правилам.
 
+    Правила без цепочки действий, идущие до первого правила с действиями на
+    том же URL, выполняются без браузера (HTTP + lxml, WEB_STATIC_FETCH).
+    Браузер из пула берётся для цепочек действий, правил после них и
+    страниц, которым нужен JavaScript.
+
     Returns:
         (success, results_dict, error_message)
+
+    Raises:
+        BrowserPoolTimeout: все браузеры процесса заняты — страница не опрашивалась,
+            это не ошибка принтера; вызывающий ставит опрос в очередь заново.
     """
 
     if not rules:
@@ -248,130 +470,83 @@ def execute_web_parsing(printer, rules: list) -> Tuple[bool, Dict[str, Any], str
     errors = []
     rule_results = {}  # Для вычисляемых полей
 
-    driver = None
+    # Группируем правила по URL (вычисляемые поля обработаем позже)
+    rules_by_url = {}
+    for rule in rules:
+        if rule.is_calculated:
+            continue
+        url = f"{rule.protocol}://{printer.ip_address}{rule.url_path}"
+        rules_by_url.setdefault(url, []).append(rule)
 
-    try:
-        driver = create_selenium_driver()
-
-        # Группируем правила по URL
-        rules_by_url = {}
-        for rule in rules:
-            url = f"{rule.protocol}://{printer.ip_address}{rule.url_path}"
-            if url not in rules_by_url:
-                rules_by_url[url] = []
-            rules_by_url[url].append(rule)
+    static_enabled = getattr(settings, "WEB_STATIC_FETCH", True)
 
-        # Обрабатываем каждый URL
+    browser_rules_by_url = {}
+    try:
         for url, url_rules in rules_by_url.items():
-            try:
-                # Аутентификация если нужна
-                if printer.web_username:
-                    from urllib.parse import urlparse, urlunparse
-
-                    parsed = urlparse(url)
-                    url = urlunparse(
-                        (
-                            parsed.scheme,
-                            f"{printer.web_username}:{printer.web_password}@{parsed.netloc}",
-                            parsed.path,
-                            parsed.params,
-                            parsed.query,
-                            parsed.fragment,
-                        )
-                    )
-
-                driver.get(url)
-
-                # Обрабатываем правила для этого URL
-                for rule in url_rules:
-                    if rule.is_calculated:
-                        continue  # Вычисляемые поля обработаем позже
-
-                    try:
-                        # Выполняем цепочку действий если есть
-                        if rule.actions_chain:
-                            actions = json.loads(rule.actions_chain)
-                            for action in actions:
-                                execute_action(driver, action)
-
-                        # Парсим значение
-                        tree = html.fromstring(driver.page_source)
-                        result = tree.xpath(rule.xpath)
-
-                        if result:
-                            if isinstance(result, list):
-                                raw_value = (
-                                    result[0].text_content().strip()
-                                    if hasattr(result[0], "text_content")
-                                    else str(result[0])
-                                )
-                            else:
-                                raw_value = (
-                                    result.text_content().strip() if hasattr(result, "text_content") else str(result)
-                                )
-
-                            # Применяем regex
-                            processed_value = apply_regex_processing(
-                                raw_value, rule.regex_pattern, rule.regex_replacement
-                            )
-
-                            # Обработка в зависимости от типа поля
-                            if rule.field_name == "mac_address":
-                                final_value = normalize_mac_address(processed_value)
-                                results[rule.field_name] = final_value
-                            elif rule.field_name == "serial_number":
-                                results[rule.field_name] = processed_value
-                            else:
-                                # Для счетчиков извлекаем числовое значение
-                                numeric_value = extract_numeric_value(processed_value)
-                                rule_results[rule.id] = numeric_value
-                                # Переменные (variable_*) — только для формул, не сохраняем в результаты
-                                if not rule.field_name.startswith("variable_"):
-                                    results[rule.field_name] = numeric_value
-
-                    except Exception as e:
-                        errors.append(f"Ошибка парсинга {rule.field_name}: {str(e)}")
-                        logger.error(f"Parsing error for {rule.field_name}: {e}", exc_info=True)
-
-            except Exception as e:
-                errors.append(f"Ошибка загрузки {url}: {str(e)}")
-                logger.error(f"URL loading error {url}: {e}", exc_info=True)
-
-        # Обрабатываем вычисляемые поля
-        for rule in rules:
-            if not rule.is_calculated:
+            if static_enabled:
+                # Без браузера — только правила до первой цепочки действий: следующие
+                # за ней читают страницу в том виде, в каком её оставили действия.
+                first_action = next((i for i, r in enumerate(url_rules) if r.actions_chain), len(url_rules))
+                static_rules = url_rules[:first_action]
+                pending = {id(r) for r in url_rules[first_action:]}
+                if static_rules:
+                    fallback = _parse_static(printer, url, static_rules, results, rule_results, errors)
+                    pending.update(id(r) for r in fallback)
+                url_rules = [r for r in url_rules if id(r) in pending]
+
+            if url_rules:
+                browser_rules_by_url[url] = url_rules
+    finally:
+        if static_enabled:
+            _get_http_session().cookies.clear()
+
+    if browser_rules_by_url:
+        pool = get_browser_pool()
+        driver = None
+        try:
+            driver = pool.acquire()
+            for url, url_rules in browser_rules_by_url.items():
+                _parse_with_browser(driver, printer, url, url_rules, results, rule_results, errors)
+        except BrowserPoolTimeout:
+            raise
+        except Exception as e:
+            errors.append(f"Ошибка браузера: {str(e)}")
+            logger.error(f"Browser error for {printer.ip_address}: {e}", exc_info=True)
+        finally:
+            if driver:
+                pool.release(driver)
+
+    # Обрабатываем вычисляемые поля
+    for rule in rules:
+        if not rule.is_calculated:
+            continue
+
+        try:
+            source_rule_ids = json.loads(rule.source_rules) if rule.source_rules else []
+            formula = rule.calculation_formula
+
+            if not source_rule_ids or not formula:
+                errors.append(f"Вычисляемое поле {rule.field_name} не имеет источников или формулы")
                 continue
 
-            try:
-                source_rule_ids = json.loads(rule.source_rules) if rule.source_rules else []
-                formula = rule.calculation_formula
-
-                if not source_rule_ids or not formula:
-                    errors.append(f"Вычисляемое поле {rule.field_name} не имеет источников или формулы")
-                    continue
-
-                # Создаем контекст для вычисления
-                context = {}
-                for rule_id in source_rule_ids:
-                    if rule_id in rule_results:
-                        context[f"rule_{rule_id}"] = rule_results[rule_id]
-                    else:
-                        errors.append(f"Правило {rule_id} не имеет результата для формулы {rule.field_name}")
-
-                if len(context) != len(source_rule_ids):
-                    continue
+            # Создаем контекст для вычисления
+            context = {}
+            for rule_id in source_rule_ids:
+                if rule_id in rule_results:
+                    context[f"rule_{rule_id}"] = rule_results[rule_id]
+                else:
+                    errors.append(f"Правило {rule_id} не имеет результата для формулы {rule.field_name}")
 
-                # Вычисляем формулу
-                result_value = safe_eval_formula(formula, context)
-                results[rule.field_name] = result_value
+            if len(context) != len(source_rule_ids):
+                continue
 
-            except Exception as e:
-                errors.append(f"Ошибка вычисления {rule.field_name}: {str(e)}")
-                logger.error(f"Calculation error for {rule.field_name}: {e}", exc_info=True)
+            # Вычисляем формулу
+            result_value = safe_eval_formula(formula, context)
+            results[rule.field_name] = result_value
 
-    finally:
-        if driver:
-            driver.quit()
+        except Exception as e:
+            errors.append(f"Ошибка вычисления {rule.field_name}: {str(e)}")
+            logger.error(f"Calculation error for {rule.field_name}: {e}", exc_info=True)
 
     if not results:
         return False, {}, "; ".join(errors) if errors else "Нет результатов"
@@ -404,96 +579,79 @@ def execute_action(driver, action: dict):
         time.sleep(wait)
 
 
-def export_to_xml(printer, results: Dict[str, Any]) -> str:
-    """Экспортирует результаты в XML формат совместимый с GLPI"""
-
-    root = ET.Element("REQUEST")
-
-    # DEVICEID
-    device_id = ET.SubElement(root, "DEVICEID")
-    device_id.text = results.get("serial_number", "unknown")
-
-    # QUERY
-    query = ET.SubElement(root, "QUERY")
-    query.text = "WEBQUERY"
-
-    # CONTENT
-    content = ET.SubElement(root, "CONTENT")
-
-    # DEVICE
-    device = ET.SubElement(content, "DEVICE")
-
-    # INFO
-    info = ET.SubElement(device, "INFO")
+def _text(value) -> str:
+    return "" if value is None else str(value)
 
-    model_elem = ET.SubElement(info, "MODEL")
-    model_elem.text = printer.model_display or ""
 
-    name_elem = ET.SubElement(info, "NAME")
-    name_elem.text = printer.model_display or ""
-
-    serial_elem = ET.SubElement(info, "SERIAL")
-    serial_elem.text = results.get("serial_number", printer.serial_number) or ""
-
-    mac_elem = ET.SubElement(info, "MAC")
-    mac_elem.text = results.get("mac_address", printer.mac_address) or ""
+def build_inventory_data(printer, results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Результаты веб-парсинга в той же структуре, что xml_to_json() отдаёт для XML GLPI.
 
-    manufacturer_elem = ET.SubElement(info, "MANUFACTURER")
+    Используется напрямую для извлечения счётчиков и валидации (без XML);
+    export_to_xml() сериализует эту же структуру для выгрузки в GLPI.
+    """
     if printer.device_model and printer.device_model.manufacturer:
-        manufacturer_elem.text = printer.device_model.manufacturer.name
+        manufacturer = printer.device_model.manufacturer.name
     else:
-        manufacturer_elem.text = "Unknown"
-
-    type_elem = ET.SubElement(info, "TYPE")
-    type_elem.text = "PRINTER"
+        manufacturer = "Unknown"
 
-    # IPS
-    ips_elem = ET.SubElement(info, "IPS")
-    ip_elem = ET.SubElement(ips_elem, "IP")
     clean_ip = printer.ip_address.replace("http://", "").replace("https://", "").split(":")[0].split("/")[0]
-    ip_elem.text = clean_ip
 
-    # PAGECOUNTERS
-    pagecounters = ET.SubElement(device, "PAGECOUNTERS")
-
-    total_elem = ET.SubElement(pagecounters, "TOTAL")
-    total_elem.text = str(results.get("counter", 0))
-
-    bw_a4_elem = ET.SubElement(pagecounters, "BW_A4")
-    bw_a4_elem.text = str(results.get("counter_a4_bw", 0))
-
-    bw_a3_elem = ET.SubElement(pagecounters, "BW_A3")
-    bw_a3_elem.text = str(results.get("counter_a3_bw", 0))
-
-    color_a4_elem = ET.SubElement(pagecounters, "COLOR_A4")
-    color_a4_elem.text = str(results.get("counter_a4_color", 0))
-
-    color_a3_elem = ET.SubElement(pagecounters, "COLOR_A3")
-    color_a3_elem.text = str(results.get("counter_a3_color", 0))
+    device = {
+        "INFO": {
+            "MODEL": printer.model_display or "",
+            "NAME": printer.model_display or "",
+            "SERIAL": _text(results.get("serial_number", printer.serial_number)),
+            "MAC": _text(results.get("mac_address", printer.mac_address)),
+            "MANUFACTURER": manufacturer,
+            "TYPE": "PRINTER",
+            "IPS": {"IP": clean_ip},
+        },
+        "PAGECOUNTERS": {
+            "TOTAL": str(results.get("counter", 0)),
+            "BW_A4": str(results.get("counter_a4_bw", 0)),
+            "BW_A3": str(results.get("counter_a3_bw", 0)),
+            "COLOR_A4": str(results.get("counter_a4_color", 0)),
+            "COLOR_A3": str(results.get("counter_a3_color", 0)),
+        },
+    }
 
     # CARTRIDGES (расходники)
     if any(k.startswith(("toner_", "drum_")) for k in results.keys()):
-        cartridges = ET.SubElement(device, "CARTRIDGES")
-
+        cartridges = {}
         for color in ["black", "cyan", "magenta", "yellow"]:
-            toner_key = f"toner_{color}"
-            drum_key = f"drum_{color}"
-
-            if toner_key in results:
-                toner_elem = ET.SubElement(cartridges, f"TONER{color.upper()}")
-                toner_elem.text = str(results[toner_key])
+            if f"toner_{color}" in results:
+                cartridges[f"TONER{color.upper()}"] = str(results[f"toner_{color}"])
+            if f"drum_{color}" in results:
+                cartridges[f"DRUM{color.upper()}"] = str(results[f"drum_{color}"])
+        # Пустой элемент xml_to_json() возвращает строкой
+        device["CARTRIDGES"] = cartridges or ""
+
+    return {
+        "DEVICEID": _text(results.get("serial_number", "unknown")),
+        "QUERY": "WEBQUERY",
+        "CONTENT": {
+            "DEVICE": device,
+            "MODULEVERSION": "6.8",
+            "PROCESSNUMBER": "1",
+        },
+    }
+
+
+def _fill_element(parent: ET.Element, data: Dict[str, Any]) -> None:
+    for tag, value in data.items():
+        child = ET.SubElement(parent, tag)
+        if isinstance(value, dict):
+            _fill_element(child, value)
+        elif value:
+            child.text = value
 
-            if drum_key in results:
-                drum_elem = ET.SubElement(cartridges, f"DRUM{color.upper()}")
-                drum_elem.text = str(results[drum_key])
 
-    # MODULEVERSION
-    moduleversion = ET.SubElement(content, "MODULEVERSION")
-    moduleversion.text = "6.8"
+def export_to_xml(printer, results: Dict[str, Any]) -> str:
+    """Экспортирует результаты в XML формат совместимый с GLPI"""
 
-    # PROCESSNUMBER
-    processnumber = ET.SubElement(content, "PROCESSNUMBER")
-    processnumber.text = "1"
+    root = ET.Element("REQUEST")
+    _fill_element(root, build_inventory_data(printer, results))
 
     # Форматируем XML
     xml_str = ET.tostring(root, encoding="unicode")
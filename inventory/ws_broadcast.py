@@ -0,0 +1,256 @@
+# inventory/ws_broadcast.py
+"""
+Объединённая рассылка WebSocket-событий опроса (группа inventory_updates).
+
+Раньше каждый опрос делал 2+ group_send, и во время часового обхода каждый
+открытый браузер получал тысячи отдельных кадров. Теперь события копятся в
+буфере по принтеру (остаётся только последнее состояние) и раз в
+WS_BROADCAST_INTERVAL_MS уходят одним кадром:
+
+    {"type": "inventory_batch", "events": [{"type": "inventory_update", ...}, ...]}
+
+Буфер общий для всех процессов — хеш в Redis кэша WS_BROADCAST_CACHE_ALIAS.
+Процесс, первым положивший событие в пустое окно (SET NX с TTL окна), через
+интервал забирает хеш целиком (HGETALL + DEL в транзакции) и рассылает пачку.
+Если Redis недоступен (или кэш не Redis), события копятся в памяти процесса.
+
+Таймер живёт только в процессе, открывшем окно. Если процесс погиб (SIGKILL,
+перезапуск воркера — atexit не срабатывает), хвост забирает периодическая
+flush_ws_broadcast_task: окно уже истекло, а хеш не пуст (flush_stale()).
+
+Кадр отправляется в общую группу и в группы организаций
+inventory_updates_org_<id> — клиент, подписанный через ?org=<id>, получает
+только свои принтеры (см. InventoryConsumer).
+
+WS_BROADCAST_INTERVAL_MS = 0 — прежнее поведение: каждое событие отдельным
+сообщением без задержки.
+"""
+
+import atexit
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+GROUP = "inventory_updates"
+
+PENDING_KEY = "inventory:ws_broadcast:pending"
+WINDOW_KEY = "inventory:ws_broadcast:window"
+
+Item = Tuple[dict, Optional[int]]  # (событие, организация)
+
+
+def org_group(organization_id: int) -> str:
+    return f"{GROUP}_org_{organization_id}"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Буферы
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+class LocalBuffer:
+    """Буфер в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: Dict[int, Item] = {}
+
+    def put(self, printer_id: int, item: Item, interval_ms: int) -> bool:
+        with self._lock:
+            self._items[printer_id] = item
+        return True
+
+    def drain(self) -> List[Item]:
+        with self._lock:
+            items, self._items = list(self._items.values()), {}
+        return items
+
+
+class RedisBuffer:
+    """Общий для процессов буфер: хеш printer_id -> событие и ключ-окно."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def put(self, printer_id: int, item: Item, interval_ms: int) -> bool:
+        """Returns: True — окно открыл этот процесс, ему и рассылать."""
+        pipe = self._client.pipeline(transaction=False)
+        pipe.hset(PENDING_KEY, printer_id, json.dumps(item, default=str))
+        pipe.set(WINDOW_KEY, 1, nx=True, px=max(interval_ms, 1))
+        _, opened = pipe.execute()
+        return bool(opened)
+
+    def is_stale(self) -> bool:
+        """Окно истекло, а события остались — открывший окно процесс их не забрал."""
+        pipe = self._client.pipeline(transaction=False)
+        pipe.exists(WINDOW_KEY)
+        pipe.exists(PENDING_KEY)
+        window, pending = pipe.execute()
+        return bool(pending) and not window
+
+    def drain(self) -> List[Item]:
+        pipe = self._client.pipeline(transaction=True)
+        pipe.hgetall(PENDING_KEY)
+        pipe.delete(PENDING_KEY)
+        raw, _ = pipe.execute()
+        return [tuple(json.loads(value)) for value in raw.values()]
+
+
+def _redis_buffer() -> Optional[RedisBuffer]:
+    alias = getattr(settings, "WS_BROADCAST_CACHE_ALIAS", "inventory")
+    if not alias:
+        return None
+    try:
+        from django_redis import get_redis_connection
+
+        return RedisBuffer(get_redis_connection(alias))
+    except Exception:
+        # Кэш не Redis (LocMem в тестах/разработке) — буфер процесса
+        return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Агрегатор
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+class BroadcastAggregator:
+    def __init__(self, interval_ms: Optional[int] = None, layer=None, buffer=None):
+        self._interval_ms = interval_ms
+        self._layer = layer
+        self._buffer = buffer
+        self._local = LocalBuffer()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def interval_ms(self) -> int:
+        if self._interval_ms is not None:
+            return self._interval_ms
+        return getattr(settings, "WS_BROADCAST_INTERVAL_MS", 300)
+
+    def _get_layer(self):
+        return self._layer if self._layer is not None else get_channel_layer()
+
+    def _get_buffer(self):
+        if self._buffer is None:
+            self._buffer = _redis_buffer() or self._local
+        return self._buffer
+
+    def publish(self, event: dict, organization_id: Optional[int] = None) -> None:
+        interval = self.interval_ms
+        if interval <= 0:
+            self._send([(event, organization_id)], batch=False)
+            return
+
+        item = (event, organization_id)
+        try:
+            opened = self._get_buffer().put(event["printer_id"], item, interval)
+        except Exception as e:
+            logger.warning(f"WebSocket broadcast buffer unavailable, buffering locally: {e}")
+            opened = self._local.put(event["printer_id"], item, interval)
+
+        if opened:
+            self._schedule(interval)
+
+    def _schedule(self, interval: int) -> None:
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(interval / 1000, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> int:
+        """
+        Забирает накопленные события и рассылает их пачкой.
+
+        Returns:
+            Количество group_send (общая группа + группы организаций).
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        items = self._local.drain()
+        buffer = self._get_buffer()
+        if buffer is not self._local:
+            try:
+                items += buffer.drain()
+            except Exception as e:
+                logger.warning(f"WebSocket broadcast buffer drain failed: {e}")
+
+        if not items:
+            return 0
+        # Событие из общего буфера новее локального (локальные — только при сбое Redis)
+        latest = {event["printer_id"]: (event, org_id) for event, org_id in items}
+        return self._send(list(latest.values()), batch=True)
+
+    def flush_stale(self) -> int:
+        """
+        Рассылает события общего буфера, оставшиеся после истёкшего окна.
+        Буфер процесса (без Redis) другим процессам не виден — там ничего не делаем.
+        """
+        buffer = self._get_buffer()
+        if buffer is self._local:
+            return 0
+        try:
+            stale = buffer.is_stale()
+        except Exception as e:
+            logger.warning(f"WebSocket broadcast buffer check failed: {e}")
+            return 0
+        if not stale:
+            return 0
+        logger.info("WebSocket broadcast window expired with pending events, flushing")
+        return self.flush()
+
+    def _send(self, items: List[Item], batch: bool) -> int:
+        layer = self._get_layer()
+        if layer is None:
+            return 0
+
+        by_org: Dict[int, list] = {}
+        for event, organization_id in items:
+            if organization_id is not None:
+                by_org.setdefault(organization_id, []).append(event)
+
+        messages = [(GROUP, [event for event, _ in items])]
+        messages += [(org_group(org_id), events) for org_id, events in by_org.items()]
+
+        sent = 0
+        for group, events in messages:
+            message = {"type": "inventory_batch", "events": events} if batch else events[0]
+            try:
+                async_to_sync(layer.group_send)(group, message)
+                sent += 1
+            except Exception as e:
+                logger.warning(f"WebSocket broadcast to {group} failed: {e}")
+        return sent
+
+
+_aggregator = BroadcastAggregator()
+
+
+def publish(event: dict, organization_id: Optional[int] = None) -> None:
+    """Ставит событие опроса в рассылку (событие должно содержать printer_id)."""
+    _aggregator.publish(event, organization_id)
+
+
+def flush() -> int:
+    return _aggregator.flush()
+
+
+def flush_stale() -> int:
+    return _aggregator.flush_stale()
+
+
+# Не теряем хвост буфера при остановке воркера
+atexit.register(flush)
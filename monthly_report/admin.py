@@ -13,6 +13,7 @@ from inventory.models import Organization
 
 from .models import BulkChangeLog, CounterChangeLog, MonthControl, MonthlyReport
 from .models_modelspec import PrinterModelSpec, SerialEditOverride
+from .signals import enqueue_serial_stats_refresh
 
 
 @admin.register(PrinterModelSpec)
@@ -236,11 +237,13 @@ def open_until_month_end(modeladmin, request, queryset):
         updates.append(mc)
     if updates:
         MonthControl.objects.bulk_update(updates, ["edit_until"])
+        enqueue_serial_stats_refresh()
 
 
 @admin.action(description="Закрыть редактирование")
 def close_editing(modeladmin, request, queryset):
     queryset.update(edit_until=None)
+    enqueue_serial_stats_refresh()
 
 
 @admin.register(MonthControl)
@@ -584,6 +584,22 @@ api_month_detail_schema = extend_schema(
         OpenApiParameter(name="total_max", description="Максимальное количество отпечатков", type=int, required=False),
         OpenApiParameter(name="page", description="Номер страницы", type=int, required=False),
         OpenApiParameter(name="per_page", description="Записей на странице", type=int, required=False),
+        OpenApiParameter(
+            name="cursor",
+            description=(
+                "Keyset-пагинация вместо page: пустая строка — первая страница, дальше pagination.next_cursor "
+                "из предыдущего ответа"
+            ),
+            type=str,
+            required=False,
+        ),
+        OpenApiParameter(
+            name="count",
+            description="Подсчёт total: exact (по умолчанию для page) или approx (оценка для больших выборок, "
+            "по умолчанию для cursor; pagination.total_is_estimate)",
+            type=str,
+            required=False,
+        ),
     ],
     responses={
         200: OpenApiResponse(
@@ -103,6 +103,8 @@ class MonthlyReportConsumer(AsyncJsonWebsocketConsumer):
 
         event содержит:
         - type: 'inventory_sync_update'
+        - reports: список обновлений ниже — пачка из inventory/monthly_sync.py
+          (одно сообщение на месяц); без reports — одиночное обновление:
         - report_id: ID записи MonthlyReport
         - a4_bw_end, a4_color_end, a3_bw_end, a3_color_end: обновлённые счётчики
         - total_prints: пересчитанное итоговое значение
@@ -111,6 +113,16 @@ class MonthlyReportConsumer(AsyncJsonWebsocketConsumer):
         - inventory_last_ok: время последнего успешного опроса
         - source: 'inventory_auto_sync'
         """
+        if "reports" in event:
+            await self.send_json(
+                {
+                    "type": "inventory_sync_update",
+                    "reports": event["reports"],
+                    "source": event.get("source", "inventory_auto_sync"),
+                }
+            )
+            return
+
         await self.send_json(
             {
                 "type": "inventory_sync_update",
@@ -147,3 +159,18 @@ class MonthlyReportConsumer(AsyncJsonWebsocketConsumer):
                 "action": event["action"],
             }
         )
+
+    async def import_progress(self, event):
+        """
+        Прогресс фоновой загрузки Excel в месяц (monthly_report/services/excel_import.py)
+
+        event содержит:
+        - type: 'import_progress'
+        - task_id: ID задачи import_month_excel_task
+        - percent, message: ход загрузки
+        - done: загрузка завершена; при ошибке — error (и unknown_organizations / errors),
+          при успехе — count
+        """
+        await self.send_json(
+            {key: value for key, value in event.items() if key != "type"} | {"type": "import_progress"}
+        )
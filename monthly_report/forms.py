@@ -1,50 +1,11 @@
 from __future__ import annotations
 
 import calendar
-import re
-import unicodedata
 from datetime import datetime
 
-import pandas as pd
-
 from django import forms
 from django.utils import timezone
 
-from inventory.models import Organization
-
-from .models import MonthControl, MonthlyReport
-from .specs import allowed_counter_fields, ensure_model_specs, get_spec_for_model_name
-
-
-class UnknownOrganizationsError(Exception):
-    """Raised when uploaded file contains organizations not present in the directory."""
-
-    def __init__(self, unknown: list[str]):
-        self.unknown = unknown
-        super().__init__(f"Unknown organizations: {unknown}")
-
-
-def _normalize_org_name(name: str) -> str:
-    """Normalize organization name for matching: NFKC, casefold, collapse whitespace."""
-    if not name:
-        return ""
-    s = unicodedata.normalize("NFKC", str(name))
-    s = s.replace("\xa0", " ").replace("ё", "е").replace("Ё", "Е")
-    s = re.sub(r"\s+", " ", s).strip().casefold()
-    return s
-
-
-COUNTER_FIELDS = {
-    "a4_bw_start",
-    "a4_bw_end",
-    "a4_color_start",
-    "a4_color_end",
-    "a3_bw_start",
-    "a3_bw_end",
-    "a3_color_start",
-    "a3_color_end",
-}
-
 
 class ExcelUploadForm(forms.Form):
     excel_file = forms.FileField(label="Загрузить Excel-файл")
@@ -72,136 +33,6 @@ class ExcelUploadForm(forms.Form):
         initial=False,
     )
 
-    # ---------- helpers ----------
-    @staticmethod
-    def _norm(s: str) -> str:
-        if s is None:
-            return ""
-        s = unicodedata.normalize("NFKC", str(s)).strip().lower()
-        s = (
-            s.replace("\xa0", " ")
-            .replace("ё", "е")
-            .replace("ч/б", "чб")
-            .replace("№", "no")
-            .replace("а4", "a4")
-            .replace("а3", "a3")
-        )
-        s = re.sub(r"[^a-z0-9а-я]+", "", s)
-        return s
-
-    @staticmethod
-    def _to_int(x) -> int:
-        if x is None:
-            return 0
-        if isinstance(x, (int, float)) and not pd.isna(x):
-            try:
-                return int(float(x))
-            except Exception:
-                return 0
-        s = str(x).strip().replace(" ", "").replace(",", ".")  # ← убираем пробелы
-        if s == "" or s.lower() == "nan":
-            return 0
-        m = re.search(r"-?\d+(\.\d+)?", s)
-        try:
-            return int(float(m.group(0))) if m else 0
-        except Exception:
-            return 0
-
-    @staticmethod
-    def _to_float(x) -> float:
-        if x is None:
-            return 0.0
-        if isinstance(x, (int, float)) and not pd.isna(x):
-            return float(x)
-        s = str(x).strip().replace(" ", "").replace(",", ".")  # ← убираем пробелы
-        if s == "" or s.lower() == "nan":
-            return 0.0
-        m = re.search(r"-?\d+(\.\d+)?", s)
-        try:
-            return float(m.group(0)) if m else 0.0
-        except Exception:
-            return 0.0
-
-    # нормализованные заголовки -> поля модели
-    ALIASES = {
-        # идентификация
-        "nopp": "order_number",
-        "noпп": "order_number",
-        "организация": "organization",
-        "филиал": "branch",
-        "город": "city",
-        "адрес": "address",
-        "модель": "equipment_model",
-        "модельинаименованиеоборудования": "equipment_model",
-        "серийныйномероборудования": "serial_number",
-        "серийныйномер": "serial_number",
-        "серийныйno": "serial_number",
-        "серийный": "serial_number",
-        "инвномер": "inventory_number",
-        "инвno": "inventory_number",
-        "инв": "inventory_number",
-        # A4 короткие
-        "a4чбначало": "a4_bw_start",
-        "a4чбконец": "a4_bw_end",
-        "a4цветначало": "a4_color_start",
-        "a4цветконец": "a4_color_end",
-        # A4 длинные
-        "показаниесчетчикаa4чбнаначалопериода": "a4_bw_start",
-        "показаниесчетчикаa4чбнаконецпериода": "a4_bw_end",
-        "показаниесчетчикаa4цветныенаначалопериода": "a4_color_start",
-        "показаниесчетчикаa4цветныенаконецпериода": "a4_color_end",
-        # A3 короткие
-        "a3чбначало": "a3_bw_start",
-        "a3чбконец": "a3_bw_end",
-        "a3цветначало": "a3_color_start",
-        "a3цветконец": "a3_color_end",
-        # A3 длинные
-        "показаниесчетчикаa3чбнаначалопериода": "a3_bw_start",
-        "показаниесчетчикаa3чбнаконецпериода": "a3_bw_end",
-        "показаниесчетчикаa3цветныенаначалопериода": "a3_color_start",
-        "показаниесчетчикаa3цветныенаконецпериода": "a3_color_end",
-        # SLA
-        "анорматив": "normative_availability",
-        "dнедоступность": "actual_downtime",
-        "lнепросроченные": "non_overdue_requests",
-        "wобщее": "total_requests",
-        "нормативноевременидоступностиa": "normative_availability",
-        "фактическиевремененедоступностиd": "actual_downtime",
-        "количествонепросроченныхзапросовl": "non_overdue_requests",
-        "общеколичествозапросовw": "total_requests",
-        "итогоотпечатков": None,  # игнорировать колонку из файла
-    }
-
-    TOKENS = {
-        "a4_bw_start": [["a4"], ["чб", "bw", "моно"], ["начало", "start"]],
-        "a4_bw_end": [["a4"], ["чб", "bw", "моно"], ["конец", "end", "оконч"]],
-        "a4_color_start": [["a4"], ["цвет", "color"], ["начало", "start"]],
-        "a4_color_end": [["a4"], ["цвет", "color"], ["конец", "end", "оконч"]],
-        "a3_bw_start": [["a3"], ["чб", "bw", "моно"], ["начало", "start"]],
-        "a3_bw_end": [["a3"], ["чб", "bw", "моно"], ["конец", "end", "оконч"]],
-        "a3_color_start": [["a3"], ["цвет", "color"], ["начало", "start"]],
-        "a3_color_end": [["a3"], ["цвет", "color"], ["конец", "end", "оконч"]],
-    }
-
-    def _find_column(self, norm_to_real: dict[str, str], field: str) -> str | None:
-        # точные алиасы
-        for norm_name, model_field in self.ALIASES.items():
-            if model_field == field and norm_name in norm_to_real:
-                return norm_to_real[norm_name]
-        # эвристика токенов
-        tokens = self.TOKENS.get(field)
-        if not tokens:
-            return None
-        for norm_name, real in norm_to_real.items():
-            ok = True
-            for group in tokens:
-                if not any(tok in norm_name for tok in group):
-                    ok = False
-                    break
-            if ok:
-                return real
-        return None
-
     # ---------- утилиты контроля редактирования ----------
     @staticmethod
     def _month_end_dt(month_date) -> datetime:
@@ -228,178 +59,12 @@ class ExcelUploadForm(forms.Form):
             cleaned["edit_until"] = None
         return cleaned
 
-    # ---------- основной импорт ----------
-    def process_data(self) -> int:
-        excel_file = self.cleaned_data["excel_file"]
-        month = self.cleaned_data["month"].replace(day=1)
-
-        # по желанию — очистка месяца перед загрузкой
-        if self.cleaned_data.get("replace_month"):
-            MonthlyReport.objects.filter(month=month).delete()
-
-        df = pd.read_excel(excel_file, sheet_name=0, dtype=str, keep_default_na=False)
-
-        # возможная первая "служебная" строка с порядковыми номерами колонок ("1 2 3 ... N").
-        # Используем строгую проверку: ключевые текстовые поля (организация, модель, серийник)
-        # одновременно состоят из короткого числа или пусты — у реального принтера хотя бы одно
-        # из них почти всегда содержит буквы, поэтому ложного срабатывания не будет.
-        if len(df) > 0:
-            raw_norm_to_real = {self._norm(c): c for c in df.columns}
-            first = df.iloc[0].astype(str).str.strip()
-            short_num_re = re.compile(r"\d{1,3}")
-            key_cols = [
-                self._find_column(raw_norm_to_real, f) for f in ("organization", "equipment_model", "serial_number")
-            ]
-            key_cols = [c for c in key_cols if c is not None]
-            keys_look_numeric = bool(key_cols) and all(
-                first.get(c, "") == "" or short_num_re.fullmatch(first.get(c, "")) is not None for c in key_cols
-            )
-            only_numbers = first.apply(lambda v: short_num_re.fullmatch(v) is not None).sum() >= max(
-                4, min(8, len(df.columns) // 2)
-            )
-            if keys_look_numeric and only_numbers:
-                df = df.iloc[1:].reset_index(drop=True)
-
-        norm_to_real = {self._norm(col): col for col in df.columns}
-
-        # ---- проверка организаций по справочнику inventory.Organization ----
-        # Делаем ПОСЛЕ среза служебной строки, чтобы её фиктивные значения
-        # (например, порядковые номера колонок) не попали в список "неизвестных".
-        org_col = self._find_column(norm_to_real, "organization")
-        if org_col is not None and len(df) > 0:
-            file_orgs: dict[str, str] = {}  # normalized -> first original spelling
-            for v in df[org_col].astype(str):
-                original = v.strip()
-                if not original:
-                    continue
-                norm = _normalize_org_name(original)
-                if norm and norm not in file_orgs:
-                    file_orgs[norm] = original
-            if file_orgs:
-                known = {_normalize_org_name(n) for n in Organization.objects.values_list("name", flat=True)}
-                unknown = sorted({orig for norm, orig in file_orgs.items() if norm not in known})
-                if unknown:
-                    raise UnknownOrganizationsError(unknown)
-
-        def col(field: str) -> str | None:
-            return self._find_column(norm_to_real, field)
-
-        rows: list[MonthlyReport] = []
-        models_seen: set[str] = set()
-
-        for idx, row in df.iterrows():
-
-            def get_s(field, default=""):
-                c = col(field)
-                v = row.get(c, "") if c else ""
-                return str(v).strip() if v is not None else default
-
-            def get_i(field):
-                c = col(field)
-                return self._to_int(row.get(c)) if c else 0
-
-            def get_f(field):
-                c = col(field)
-                return self._to_float(row.get(c)) if c else 0.0
-
-            # № п/п
-            c_num = col("order_number")
-            order_number = self._to_int(row.get(c_num)) if c_num else 0
-            if not order_number:
-                order_number = idx + 1
-
-            # счётчики (ints)
-            a4_bw_s = get_i("a4_bw_start")
-            a4_bw_e = get_i("a4_bw_end")
-            a4_cl_s = get_i("a4_color_start")
-            a4_cl_e = get_i("a4_color_end")
-            a3_bw_s = get_i("a3_bw_start")
-            a3_bw_e = get_i("a3_bw_end")
-            a3_cl_s = get_i("a3_color_start")
-            a3_cl_e = get_i("a3_color_end")
-
-            data = {
-                "month": month,
-                "order_number": order_number,
-                "organization": get_s("organization"),
-                "branch": get_s("branch"),
-                "city": get_s("city"),
-                "address": get_s("address"),
-                "equipment_model": get_s("equipment_model"),
-                "serial_number": get_s("serial_number"),
-                "inventory_number": get_s("inventory_number"),
-                "a4_bw_start": a4_bw_s,
-                "a4_bw_end": a4_bw_e,
-                "a4_color_start": a4_cl_s,
-                "a4_color_end": a4_cl_e,
-                "a3_bw_start": a3_bw_s,
-                "a3_bw_end": a3_bw_e,
-                "a3_color_start": a3_cl_s,
-                "a3_color_end": a3_cl_e,
-                "normative_availability": get_f("normative_availability"),
-                "actual_downtime": get_f("actual_downtime"),
-                "non_overdue_requests": get_i("non_overdue_requests"),
-                "total_requests": get_i("total_requests"),
-            }
-
-            # ---- применяем ограничения «справочника моделей» ----
-            spec = get_spec_for_model_name(data["equipment_model"])
-            allowed = allowed_counter_fields(spec)  # вернёт полный набор, если правил нет/выкл.
-            for f in COUNTER_FIELDS:
-                if f not in allowed:
-                    data[f] = 0
-
-            # базовый total = A4 + A3 (точные «раскладки» сделает recompute_month)
-            a4 = max(0, data["a4_bw_end"] - data["a4_bw_start"]) + max(0, data["a4_color_end"] - data["a4_color_start"])
-            a3 = max(0, data["a3_bw_end"] - data["a3_bw_start"]) + max(0, data["a3_color_end"] - data["a3_color_start"])
-            data["total_prints"] = a4 + a3
-
-            # пропустить полностью пустые строки
-            if not any(
-                [
-                    data["organization"],
-                    data["equipment_model"],
-                    data["serial_number"],
-                    data["inventory_number"],
-                    data["a4_bw_start"],
-                    data["a4_bw_end"],
-                    data["a4_color_start"],
-                    data["a4_color_end"],
-                    data["a3_bw_start"],
-                    data["a3_bw_end"],
-                    data["a3_color_start"],
-                    data["a3_color_end"],
-                    data["normative_availability"],
-                    data["actual_downtime"],
-                    data["non_overdue_requests"],
-                    data["total_requests"],
-                ]
-            ):
-                continue
-
-            rows.append(MonthlyReport(**data))
-            models_seen.add(data["equipment_model"])
-
-        if rows:
-            # 1) Для всех новых моделей создадим «свободные» правила (разрешено всё)
-            ensure_model_specs(models_seen, enforce=False)
-
-            # 2) Сохраняем строки отчёта
-            MonthlyReport.objects.bulk_create(rows, batch_size=1000)
-
-            # 3) Пересчитываем раскладку total_prints
-            from .services import recompute_month
-
-            recompute_month(month)
-
-        # ---- зафиксировать режим редактирования и публикацию для месяца ----
-        allow = self.cleaned_data.get("allow_edit", False)
+    def import_options(self) -> dict:
+        """Параметры загрузки для import_month_excel_task (JSON-сериализуемые)."""
         edit_until = self.cleaned_data.get("edit_until")
-        is_published = self.cleaned_data.get("is_published", False)
-
-        mc, _ = MonthControl.objects.get_or_create(month=month)
-        mc.edit_until = self._month_end_dt(month) if (allow and not edit_until) else (edit_until if allow else None)
-        mc.is_published = is_published
-        mc.save(update_fields=["edit_until", "is_published"])
-
-        return len(rows)
+        return {
+            "replace_month": self.cleaned_data.get("replace_month", False),
+            "allow_edit": self.cleaned_data.get("allow_edit", False),
+            "edit_until": edit_until.isoformat() if edit_until else None,
+            "is_published": self.cleaned_data.get("is_published", False),
+        }
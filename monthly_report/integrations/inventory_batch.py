@@ -1,14 +1,20 @@
 from __future__ import annotations
 
 import logging
-from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, Iterable
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 from django.apps import apps
+from django.db import connection
+from django.db.models import OuterRef, Subquery
 
 logger = logging.getLogger(__name__)
 
+COUNTER_FIELDS = ("bw_a4", "color_a4", "bw_a3", "color_a3")
+
+# Принтеров на один запрос первого/последнего счётчика
+PRINTER_CHUNK = 500
+
 
 def get_counters_for_month_batch(
     serial_numbers: Iterable[str], period_start_utc: datetime, period_end_utc: datetime
@@ -27,7 +33,6 @@ def get_counters_for_month_batch(
     """
     try:
         Printer = apps.get_model("inventory", "Printer")
-        PageCounter = apps.get_model("inventory", "PageCounter")
     except LookupError as e:
         logger.warning(f"Модели inventory не найдены: {e}")
         return {}
@@ -47,66 +52,15 @@ def get_counters_for_month_batch(
 
     logger.debug(f"Найдено {len(printer_map)} принтеров из {len(serial_list)} серийников")
 
-    # ====== ЗАПРОС 2: Получаем все счетчики за период ======
-    tasks_counters = (
-        PageCounter.objects.filter(
-            task__printer_id__in=list(printer_map.keys()),
-            task__status="SUCCESS",
-            task__task_timestamp__gte=period_start_utc,
-            task__task_timestamp__lte=period_end_utc,
-        )
-        .select_related("task")
-        .order_by("task__printer_id", "task__task_timestamp")
-        .values("task__printer_id", "task__task_timestamp", "bw_a4", "color_a4", "bw_a3", "color_a3")
-    )
-
-    # ====== ГРУППИРУЕМ ПО ПРИНТЕРУ ======
-    printer_counters = defaultdict(list)
-
-    for tc in tasks_counters:
-        printer_counters[tc["task__printer_id"]].append(
-            {
-                "timestamp": tc["task__task_timestamp"],
-                "bw_a4": tc["bw_a4"],
-                "color_a4": tc["color_a4"],
-                "bw_a3": tc["bw_a3"],
-                "color_a3": tc["color_a3"],
-            }
-        )
-
-    logger.debug(f"Найдено счетчиков для {len(printer_counters)} принтеров")
-
-    # ====== ФОРМИРУЕМ РЕЗУЛЬТАТ ======
+    # ====== ЗАПРОС 2: первый и последний счётчик каждого принтера — на стороне БД ======
     result = {}
-
-    for printer_id, counters in printer_counters.items():
-        if not counters:
-            continue
-
+    for printer_id, first, last in iter_first_last_counters(list(printer_map), period_start_utc, period_end_utc):
         printer = printer_map[printer_id]
-        sn = printer["serial_number"]
-
-        # Сортируем по времени (на всякий случай, хотя уже должно быть отсортировано)
-        counters.sort(key=lambda x: x["timestamp"])
-
-        start_counter = counters[0]
-        end_counter = counters[-1]
-
-        result[sn] = {
+        result[printer["serial_number"]] = {
             "ip": printer["ip_address"],
-            "last_ok": end_counter["timestamp"],
-            "start": {
-                "bw_a4": start_counter["bw_a4"],
-                "color_a4": start_counter["color_a4"],
-                "bw_a3": start_counter["bw_a3"],
-                "color_a3": start_counter["color_a3"],
-            },
-            "end": {
-                "bw_a4": end_counter["bw_a4"],
-                "color_a4": end_counter["color_a4"],
-                "bw_a3": end_counter["bw_a3"],
-                "color_a3": end_counter["color_a3"],
-            },
+            "last_ok": last["timestamp"],
+            "start": {field: first[field] for field in COUNTER_FIELDS},
+            "end": {field: last[field] for field in COUNTER_FIELDS},
         }
 
     logger.info(
@@ -115,3 +69,91 @@ def get_counters_for_month_batch(
     )
 
     return result
+
+
+def iter_first_last_counters(
+    printer_ids: List[int], period_start_utc: datetime, period_end_utc: datetime, chunk_size: int = PRINTER_CHUNK
+) -> Iterator[Tuple[int, Dict[str, Any], Dict[str, Any]]]:
+    """
+    (printer_id, первый, последний) — самые ранний и поздний PageCounter успешных опросов
+    принтера в окне [period_start_utc, period_end_utc]; словари с timestamp и COUNTER_FIELDS.
+    Принтеры без опросов в окне пропускаются. При равном времени опроса берётся
+    меньший / больший id счётчика.
+
+    Раньше все счётчики периода (миллионы строк за месяц) выгружались в Python ради двух
+    на принтер. Теперь на каждый принтер — две выборки «первая строка» по индексу
+    inv_task_printer_ok_ts_idx (printer, status, task_timestamp) INCLUDE (id): объём
+    работы зависит от числа принтеров, а не от истории опросов. Принтеры обрабатываются
+    пачками по chunk_size.
+    """
+    fetch = _fetch_chunk_postgres if connection.vendor == "postgresql" else _fetch_chunk_portable
+    for start in range(0, len(printer_ids), chunk_size):
+        yield from fetch(printer_ids[start : start + chunk_size], period_start_utc, period_end_utc)
+
+
+def _fetch_chunk_postgres(printer_ids, period_start_utc, period_end_utc):
+    """
+    LATERAL ... ORDER BY ... LIMIT 1 в обе стороны: по индексу — ровно одна строка
+    с каждого конца окна. DISTINCT ON / row_number() здесь хуже: им нужно пройти
+    и отсортировать все опросы окна, прежде чем оставить по одному на принтер.
+    """
+    InventoryTask = apps.get_model("inventory", "InventoryTask")
+    PageCounter = apps.get_model("inventory", "PageCounter")
+    qn = connection.ops.quote_name
+    counters = ", ".join(f"c.{qn(field)}" for field in COUNTER_FIELDS)
+
+    def edge(direction):
+        return (
+            f"SELECT t.{qn('task_timestamp')}, {counters} "
+            f"FROM {qn(InventoryTask._meta.db_table)} t "
+            f"JOIN {qn(PageCounter._meta.db_table)} c ON c.{qn('task_id')} = t.{qn('id')} "
+            f"WHERE t.{qn('printer_id')} = p.id AND t.{qn('status')} = 'SUCCESS' "
+            f"AND t.{qn('task_timestamp')} >= %s AND t.{qn('task_timestamp')} <= %s "
+            f"ORDER BY t.{qn('task_timestamp')} {direction}, c.{qn('id')} {direction} LIMIT 1"
+        )
+
+    sql = (
+        f"SELECT p.id, f.*, l.* FROM unnest(%s::bigint[]) AS p(id) "
+        f"CROSS JOIN LATERAL ({edge('ASC')}) f "
+        f"CROSS JOIN LATERAL ({edge('DESC')}) l"
+    )
+    width = 1 + len(COUNTER_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(printer_ids), period_start_utc, period_end_utc, period_start_utc, period_end_utc])
+        for row in cursor.fetchall():
+            yield row[0], _edge(row[1 : 1 + width]), _edge(row[1 + width :])
+
+
+def _fetch_chunk_portable(printer_ids, period_start_utc, period_end_utc):
+    """Коррелированные подзапросы «первая строка» (ORM) и затем сами счётчики по id — два запроса на пачку."""
+    Printer = apps.get_model("inventory", "Printer")
+    PageCounter = apps.get_model("inventory", "PageCounter")
+
+    window = PageCounter.objects.filter(
+        task__printer_id=OuterRef("pk"),
+        task__status="SUCCESS",
+        task__task_timestamp__gte=period_start_utc,
+        task__task_timestamp__lte=period_end_utc,
+    )
+    edges = list(
+        Printer.objects.filter(id__in=printer_ids)
+        .annotate(
+            first_id=Subquery(window.order_by("task__task_timestamp", "id").values("id")[:1]),
+            last_id=Subquery(window.order_by("-task__task_timestamp", "-id").values("id")[:1]),
+        )
+        .filter(first_id__isnull=False)
+        .values_list("id", "first_id", "last_id")
+    )
+    counter_ids = {counter_id for _, first_id, last_id in edges for counter_id in (first_id, last_id)}
+    rows = {
+        row[0]: _edge(row[1:])
+        for row in PageCounter.objects.filter(id__in=counter_ids).values_list(
+            "id", "task__task_timestamp", *COUNTER_FIELDS
+        )
+    }
+    for printer_id, first_id, last_id in edges:
+        yield printer_id, rows[first_id], rows[last_id]
+
+
+def _edge(values) -> Dict[str, Any]:
+    return {"timestamp": values[0], **dict(zip(COUNTER_FIELDS, values[1:]))}
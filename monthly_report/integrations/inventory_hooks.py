@@ -62,6 +62,7 @@ def on_inventory_snapshot_saved(sender, instance, created, **kwargs):
 
         # Обновляем поля *_end_auto в записях
         updated_reports = []
+        ip_changed_months = set()
         for report in reports:
             updated = False
 
@@ -85,6 +86,7 @@ def on_inventory_snapshot_saved(sender, instance, created, **kwargs):
                 printer_ip = getattr(printer, "ip_address", None)
                 if printer_ip and report.device_ip != printer_ip:
                     report.device_ip = printer_ip
+                    ip_changed_months.add(report.month)
                     updated = True
 
             if hasattr(report, "inventory_last_ok"):
@@ -120,6 +122,14 @@ def on_inventory_snapshot_saved(sender, instance, created, **kwargs):
 
             MonthlyReport.objects.bulk_update(updated_reports, actual_fields)
 
+            # bulk_update мимо сигналов: смена IP меняет потенциал автозаполнения в метриках месяца
+            from ..services import excel_export, month_metrics
+
+            for month in ip_changed_months:
+                month_metrics.invalidate(month)
+            for month in {report.month for report in updated_reports}:
+                excel_export.touch(month)
+
             logger.info(f"Автосинхронизация: обновлено {len(updated_reports)} записей для принтера {serial_number}")
 
             # Опционально: пересчитываем группы
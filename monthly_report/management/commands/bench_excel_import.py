@@ -0,0 +1,175 @@
+import io
+import random
+import re
+import time
+from datetime import date
+
+from openpyxl import Workbook
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.models import Organization
+from monthly_report.models import MonthlyReport
+from monthly_report.services import excel_import, recompute_month
+from monthly_report.specs import allowed_counter_fields, ensure_model_specs, get_spec_for_model_name
+
+HEADERS = [
+    "№ п/п",
+    "Организация",
+    "Филиал",
+    "Город",
+    "Адрес",
+    "Модель и наименование оборудования",
+    "Серийный номер оборудования",
+    "Инв номер",
+    "A4 ч/б начало",
+    "A4 ч/б конец",
+    "A4 цвет начало",
+    "A4 цвет конец",
+    "A3 ч/б начало",
+    "A3 ч/б конец",
+    "A3 цвет начало",
+    "A3 цвет конец",
+    "А норматив",
+    "D недоступность",
+    "L непросроченные",
+    "W общее",
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _to_number(x) -> float:
+    s = str(x).strip().replace(" ", "").replace(",", ".")
+    m = re.search(r"-?\d+(\.\d+)?", s)
+    return float(m.group(0)) if m else 0.0
+
+
+def _legacy_import(source, month_dt) -> int:
+    """Прежний разбор: df.iterrows(), поиск колонки и регулярка на каждую ячейку, спецификация на строку."""
+    df = excel_import.read_sheet(source).drop(columns="_excel_row")
+    norm_to_real = {excel_import.norm_header(c): c for c in df.columns}
+    rows = []
+    for idx, row in df.iterrows():
+
+        def col(field):
+            return excel_import.find_column(norm_to_real, field)
+
+        data = {"month": month_dt, "order_number": int(_to_number(row.get(col("order_number")))) or idx + 1}
+        for field in excel_import.TEXT_FIELDS:
+            data[field] = str(row.get(col(field), "")).strip()
+        for field in excel_import.INT_FIELDS:
+            data[field] = int(_to_number(row.get(col(field)))) if col(field) else 0
+        for field in excel_import.FLOAT_FIELDS:
+            data[field] = _to_number(row.get(col(field))) if col(field) else 0.0
+        allowed = allowed_counter_fields(get_spec_for_model_name(data["equipment_model"]))
+        for field in excel_import.COUNTER_FIELDS:
+            if field not in allowed:
+                data[field] = 0
+        data["total_prints"] = sum(
+            max(0, data[f"{fmt}_end"] - data[f"{fmt}_start"]) for fmt in ("a4_bw", "a4_color", "a3_bw", "a3_color")
+        )
+        rows.append(MonthlyReport(**data))
+    ensure_model_specs({r.equipment_model for r in rows}, enforce=False)
+    MonthlyReport.objects.bulk_create(rows, batch_size=1000)
+    recompute_month(month_dt)
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк загрузки месяца из Excel: прежний построчный разбор (iterrows) против колоночного "
+        "(pandas + staging + INSERT ... SELECT), по этапам. Синтетическая книга строится в памяти, "
+        "загрузки выполняются в транзакции и откатываются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=30000, help="Строк в книге (default: 30000)")
+        parser.add_argument("--month", default="1990-01", help="Месяц для загрузки, YYYY-MM (default: 1990-01)")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        year, month = map(int, options["month"].split("-"))
+        month_date = date(year, month, 1)
+        if MonthlyReport.objects.filter(month=month_date).exists():
+            self.stdout.write(self.style.ERROR(f"За {options['month']} уже есть данные — выберите пустой месяц"))
+            return
+
+        started = time.perf_counter()
+        data, organizations = self._workbook(options)
+        self.stdout.write(f"\nСтрок в книге: {options['rows']}, книга собрана за {time.perf_counter() - started:.1f} c")
+
+        try:
+            with transaction.atomic():
+                for name in organizations:
+                    Organization.objects.get_or_create(name=name)
+                self._run_columnar(io.BytesIO(data), month_date)
+                self._run("прежний построчный разбор", lambda: _legacy_import(io.BytesIO(data), month_date))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _workbook(self, options):
+        rnd = random.Random(options["seed"])
+        organizations = [f"ООО Бенч-{i}" for i in range(1, 41)]
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(HEADERS)
+        for i in range(options["rows"]):
+            start = rnd.randint(0, 100000)
+            # часть чисел — как их присылают: с пробелами-разделителями и запятой
+            end = f"{start + rnd.randint(0, 5000):,}".replace(",", " ")
+            ws.append(
+                [
+                    i + 1,
+                    rnd.choice(organizations),
+                    f"Участок {rnd.randint(1, 40)}",
+                    rnd.choice(["Иркутск", "Ангарск", "Братск"]),
+                    f"ул. Ленина, {rnd.randint(1, 200)}",
+                    rnd.choice(["HP LaserJet M402", "Kyocera M2040", "Canon MF443", "Xerox C235"]),
+                    f"BI{i:06d}",
+                    f"INV{i:06d}",
+                    start,
+                    end,
+                    0,
+                    rnd.randint(0, 300),
+                    "",
+                    "",
+                    "",
+                    "",
+                    "720,0",
+                    rnd.randint(0, 10),
+                    rnd.randint(0, 5),
+                    5,
+                ]
+            )
+        buf = io.BytesIO()
+        wb.save(buf)
+        return buf.getvalue(), organizations
+
+    def _run_columnar(self, source, month_date):
+        marks = []
+
+        def progress(percent, message):
+            # этапы staging сводим в один
+            if message.startswith("Загружено строк"):
+                message = "Загрузка в staging"
+            if not marks or marks[-1][0] != message:
+                marks.append((message, time.perf_counter()))
+
+        self._run(
+            "колоночная загрузка",
+            lambda: excel_import.import_month(source, month_date, replace_month=True, progress=progress),
+        )
+        marks.append(("", time.perf_counter()))
+        for (message, started), (_, finished) in zip(marks, marks[1:]):
+            self.stdout.write(f"    {message.rstrip('…')}: {finished - started:.2f} c")
+        MonthlyReport.objects.filter(month=month_date).delete()
+
+    def _run(self, label, func):
+        started = time.perf_counter()
+        count = func()
+        self.stdout.write(self.style.SUCCESS(f"  {label}: {time.perf_counter() - started:.2f} c, строк {count}"))
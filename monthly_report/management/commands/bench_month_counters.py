@@ -0,0 +1,143 @@
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from inventory.models import InventoryTask, PageCounter, Printer
+from monthly_report.integrations.inventory_batch import COUNTER_FIELDS, get_counters_for_month_batch
+
+# Вставка пачками сырым executemany: bulk_create перезаписал бы task_timestamp (auto_now_add)
+INSERT_CHUNK = 20000
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _legacy_counters(serials, period_start, period_end):
+    """Прежняя выборка: все счётчики периода в Python, первый и последний — по принтеру."""
+    printer_map = {p["id"]: p for p in Printer.objects.filter(serial_number__in=serials).values("id", "serial_number")}
+    counters = defaultdict(list)
+    for row in (
+        PageCounter.objects.filter(
+            task__printer_id__in=list(printer_map),
+            task__status="SUCCESS",
+            task__task_timestamp__gte=period_start,
+            task__task_timestamp__lte=period_end,
+        )
+        .order_by("task__printer_id", "task__task_timestamp")
+        .values("task__printer_id", "task__task_timestamp", *COUNTER_FIELDS)
+    ):
+        counters[row["task__printer_id"]].append(row)
+    return {printer_map[pid]["serial_number"]: (rows[0], rows[-1]) for pid, rows in counters.items()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк первого/последнего счётчика принтеров за месяц (синхронизация monthly_report): прежняя "
+        "выгрузка всех счётчиков периода в Python против выборки на стороне БД. Синтетическая история "
+        "опросов создаётся в транзакции и откатывается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5_000_000, help="Опросов в истории (default: 5000000)")
+        parser.add_argument("--printers", type=int, default=2000, help="Принтеров (default: 2000)")
+        parser.add_argument("--months", type=int, default=12, help="Глубина истории в месяцах (default: 12)")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                serials, period_start, period_end = self._build(options)
+                self.stdout.write(
+                    f"\nОпросов: {options['rows']}, принтеров: {options['printers']}, "
+                    f"история создана за {time.perf_counter() - started:.0f} c"
+                )
+                new = self._run(
+                    "на стороне БД", lambda: get_counters_for_month_batch(serials, period_start, period_end)
+                )
+                old = self._run(
+                    "прежняя, все счётчики в Python", lambda: _legacy_counters(serials, period_start, period_end)
+                )
+                mismatched = [
+                    sn
+                    for sn, (first, last) in old.items()
+                    if new[sn]["start"]["bw_a4"] != first["bw_a4"] or new[sn]["end"]["bw_a4"] != last["bw_a4"]
+                ]
+                self.stdout.write(f"  расхождений: {len(mismatched) + abs(len(new) - len(old))}")
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _build(self, options):
+        rnd = random.Random(options["seed"])
+        printers = Printer.objects.bulk_create(
+            [
+                Printer(
+                    ip_address=f"10.{200 + i // 65536}.{i // 256 % 256}.{i % 256}", serial_number=f"BENCH-FL-{i:06d}"
+                )
+                for i in range(options["printers"])
+            ]
+        )
+        printer_ids = [p.pk for p in printers]
+
+        history_end = timezone.make_aware(datetime(1990, 1, 1)) + timedelta(days=30 * options["months"])
+        span = 30 * 24 * 3600 * options["months"]
+        task_table = InventoryTask._meta.db_table
+        counter_table = PageCounter._meta.db_table
+        task_id = (InventoryTask.objects.order_by("-pk").values_list("pk", flat=True).first() or 0) + 1
+        counter_id = (PageCounter.objects.order_by("-pk").values_list("pk", flat=True).first() or 0) + 1
+
+        with connection.cursor() as cursor:
+            for chunk_start in range(0, options["rows"], INSERT_CHUNK):
+                tasks, counters = [], []
+                for _ in range(min(INSERT_CHUNK, options["rows"] - chunk_start)):
+                    ts = connection.ops.adapt_datetimefield_value(history_end - timedelta(seconds=rnd.randrange(span)))
+                    status = "SUCCESS" if rnd.random() < 0.9 else "FAILED"
+                    tasks.append((task_id, rnd.choice(printer_ids), ts, status, "SNMP_LOCAL", ""))
+                    counters.append((counter_id, task_id, rnd.randint(0, 10**6), 0, "", ts))
+                    task_id += 1
+                    counter_id += 1
+                cursor.executemany(
+                    f"INSERT INTO {task_table} (id, printer_id, task_timestamp, status, data_source, agent_id) "
+                    f"VALUES (%s, %s, %s, %s, %s, %s)",
+                    tasks,
+                )
+                cursor.executemany(
+                    f"INSERT INTO {counter_table} (id, task_id, bw_a4, color_a4, "
+                    f"drum_black, drum_cyan, drum_magenta, drum_yellow, toner_black, toner_cyan, toner_magenta, "
+                    f"toner_yellow, fuser_kit, transfer_kit, waste_toner, recorded_at) "
+                    f"VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    [(cid, tid, bw, color) + (blank,) * 11 + (ts,) for cid, tid, bw, color, blank, ts in counters],
+                )
+            if connection.vendor == "postgresql":
+                cursor.execute(f"ANALYZE {task_table}")
+                cursor.execute(f"ANALYZE {counter_table}")
+
+        # Последний полный месяц истории
+        period_end = history_end - timedelta(seconds=1)
+        period_start = history_end - timedelta(days=30)
+        return [p.serial_number for p in printers], period_start, period_end
+
+    def _run(self, label, func):
+        queries = []
+
+        def count(execute, sql, sql_params, many, context):
+            queries.append(sql)
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  {label}: {elapsed:.2f} c, запросов {len(queries)}, принтеров с данными {len(result)}"
+            )
+        )
+        return result
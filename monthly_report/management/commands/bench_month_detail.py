@@ -0,0 +1,113 @@
+import json
+import random
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from monthly_report.models import MonthlyReport
+from monthly_report.views import api_month_detail
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк api_month_detail: поиск и пагинация (page/offset, cursor, полная сериализация "
+        "через show_unfilled). Синтетический месяц создаётся в транзакции и откатывается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000, help="Строк в месяце (default: 50000)")
+        parser.add_argument("--month", default="1990-01", help="Месяц для синтетики, YYYY-MM (default: 1990-01)")
+        parser.add_argument("--per-page", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        year, month = map(int, options["month"].split("-"))
+        month_date = date(year, month, 1)
+        if MonthlyReport.objects.filter(month=month_date).exists():
+            self.stdout.write(self.style.ERROR(f"За {options['month']} уже есть данные — выберите пустой месяц"))
+            return
+
+        try:
+            with transaction.atomic():
+                self._build(month_date, options)
+                if connection.vendor == "postgresql":
+                    with connection.cursor() as cursor:
+                        cursor.execute("ANALYZE monthly_report_monthlyreport")
+                self.user = get_user_model().objects.create_superuser("bench-month-detail", "", None)
+                self.factory = RequestFactory()
+                self.stdout.write(f"\nСтрок в месяце: {options['rows']}, на странице: {options['per_page']}")
+
+                per_page = options["per_page"]
+                last_page = options["rows"] // per_page
+                self._run("первая страница", year, month, per_page=per_page)
+                self._run(f"страница {last_page} (OFFSET)", year, month, per_page=per_page, page=last_page)
+                data = self._run("cursor, первая страница", year, month, per_page=per_page, cursor="")
+                self._run(
+                    "cursor, следующая страница",
+                    year,
+                    month,
+                    per_page=per_page,
+                    cursor=data["pagination"]["next_cursor"],
+                )
+                self._run("поиск q, первая страница", year, month, per_page=per_page, q="участок 12")
+                self._run("поиск q, cursor", year, month, per_page=per_page, q="участок 12", cursor="")
+                self._run("поиск q, серийник", year, month, per_page=per_page, q="BN0421")
+                self._run("все строки (show_unfilled)", year, month, per_page=per_page, show_unfilled="true")
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _build(self, month_date, options):
+        rnd = random.Random(options["seed"])
+        cities = ["Иркутск", "Ангарск", "Братск", "Шелехов", "Усолье-Сибирское"]
+        streets = ["Ленина", "Карла Маркса", "Байкальская", "Советская", "Лермонтова"]
+        rows = []
+        for i in range(options["rows"]):
+            city = rnd.choice(cities)
+            rows.append(
+                MonthlyReport(
+                    month=month_date,
+                    order_number=i + 1,
+                    organization=f"ООО Филиал-{rnd.randint(1, 300)}",
+                    branch=f"{city}ский участок {rnd.randint(1, 40)}",
+                    city=city,
+                    address=f"ул. {rnd.choice(streets)}, {rnd.randint(1, 200)}",
+                    equipment_model=rnd.choice(["HP LaserJet M402", "Kyocera M2040", "Canon MF443", "Xerox B215"]),
+                    serial_number=f"BN{i:06d}",
+                    inventory_number=f"INV{rnd.randint(0, 999999):06d}",
+                    a4_bw_end=rnd.randint(0, 5000),
+                    total_prints=rnd.randint(0, 5000),
+                )
+            )
+        MonthlyReport.objects.bulk_create(rows, batch_size=1000)
+
+    def _run(self, label, year, month, **params):
+        request = self.factory.get(f"/monthly-report/api/month/{year}/{month}/", params)
+        request.user = self.user
+        queries = []
+
+        def count(execute, sql, sql_params, many, context):
+            queries.append(sql)
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            response = api_month_detail(request, year, month)
+            elapsed = time.perf_counter() - started
+        data = json.loads(response.content)
+        pagination = data["pagination"]
+        total = f"{pagination['total']}{' (оценка)' if pagination.get('total_is_estimate') else ''}"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  {label}: {elapsed:.3f} c, запросов {len(queries)}, строк {len(data['reports'])}, всего {total}"
+            )
+        )
+        return data
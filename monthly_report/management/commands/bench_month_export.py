@@ -0,0 +1,130 @@
+import io
+import random
+import resource
+import time
+import tracemalloc
+from datetime import date
+
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from monthly_report.models import MonthlyReport
+from monthly_report.services import excel_export
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _legacy_workbook(month_dt):
+    """Прежний экспорт: обычная книга в памяти, объекты стилей на каждую ячейку."""
+    wb = Workbook()
+    ws = wb.active
+    thin = Border(left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
+    for col_idx, (header, _, _) in enumerate(excel_export.COLUMNS, start=1):
+        cell = ws.cell(row=1, column=col_idx, value=header)
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        cell.border = thin
+    fields = [field for _, field, _ in excel_export.COLUMNS]
+    reports = MonthlyReport.objects.filter(month__year=month_dt.year, month__month=month_dt.month).order_by(
+        "order_number", "organization", "city", "equipment_model", "serial_number"
+    )
+    for row_idx, report in enumerate(reports, start=2):
+        for col_idx, field in enumerate(fields, start=1):
+            cell = ws.cell(row=row_idx, column=col_idx, value=getattr(report, field))
+            cell.border = thin
+            if col_idx == 1:
+                cell.alignment = Alignment(horizontal="center")
+            elif col_idx >= 9:
+                cell.alignment = Alignment(horizontal="right")
+            else:
+                cell.alignment = Alignment(horizontal="left")
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк Excel-выгрузки месяца: прежняя книга в памяти против потоковой записи и отдачи "
+        "из кэша файлов (время и пик памяти). Синтетический месяц создаётся в транзакции и откатывается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000, help="Строк в месяце (default: 50000)")
+        parser.add_argument("--month", default="1990-01", help="Месяц для синтетики, YYYY-MM (default: 1990-01)")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="Пик Python-памяти каждого прогона через tracemalloc (замедляет запись в разы)",
+        )
+
+    def handle(self, *args, **options):
+        year, month = map(int, options["month"].split("-"))
+        month_date = date(year, month, 1)
+        if MonthlyReport.objects.filter(month=month_date).exists():
+            self.stdout.write(self.style.ERROR(f"За {options['month']} уже есть данные — выберите пустой месяц"))
+            return
+
+        try:
+            with transaction.atomic():
+                self._build(month_date, options)
+                self.stdout.write(f"\nСтрок в месяце: {options['rows']}")
+                # Потоковый вариант первым: ru_maxrss — пик процесса, он только растёт
+                trace = options["trace_memory"]
+                self._run("потоковая запись", lambda: excel_export.build_month_export(month_date), trace)
+                self._run("повторно, из кэша файлов", lambda: excel_export.build_month_export(month_date), trace)
+                self._run("прежняя книга в памяти", lambda: _legacy_workbook(month_date), trace)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _build(self, month_date, options):
+        rnd = random.Random(options["seed"])
+        rows = []
+        for i in range(options["rows"]):
+            start = rnd.randint(0, 100000)
+            rows.append(
+                MonthlyReport(
+                    month=month_date,
+                    order_number=i + 1,
+                    organization=f"ООО Филиал-{rnd.randint(1, 300)}",
+                    branch=f"Участок {rnd.randint(1, 40)}",
+                    city=rnd.choice(["Иркутск", "Ангарск", "Братск"]),
+                    address=f"ул. Ленина, {rnd.randint(1, 200)}",
+                    equipment_model=rnd.choice(["HP LaserJet M402", "Kyocera M2040", "Canon MF443"]),
+                    serial_number=f"BX{i:06d}",
+                    inventory_number=f"INV{i:06d}",
+                    a4_bw_start=start,
+                    a4_bw_end=start + rnd.randint(0, 5000),
+                    normative_availability=720,
+                    actual_downtime=rnd.randint(0, 10),
+                    k1=rnd.uniform(95, 100),
+                )
+            )
+        MonthlyReport.objects.bulk_create(rows, batch_size=1000)
+
+    def _run(self, label, func, trace):
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        traced = ""
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            traced = f", пик Python-памяти {peak / 2**20:.1f} МБ"
+        size = result.stat().st_size if hasattr(result, "stat") else len(result)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  {label}: {elapsed:.2f} c{traced}, пик RSS процесса {maxrss:.0f} МБ, файл {size / 2**20:.1f} МБ"
+            )
+        )
@@ -0,0 +1,125 @@
+import random
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+
+from monthly_report.models import MonthlyReport
+from monthly_report.services import recompute_group, recompute_month
+
+
+class _Rollback(Exception):
+    pass
+
+
+def recompute_month_by_groups(month) -> None:
+    """Прежний пересчёт месяца — recompute_group на каждую группу (эталон для тестов и бенчмарка)."""
+    with transaction.atomic():
+        serials = (
+            MonthlyReport.objects.filter(month=month)
+            .exclude(serial_number__isnull=True)
+            .exclude(serial_number__exact="")
+            .values_list("serial_number", flat=True)
+            .distinct()
+        )
+        for sn in serials:
+            recompute_group(month, sn, None)
+
+        # Инвентарные только у тех строк, где нет SN
+        inventories = (
+            MonthlyReport.objects.filter(month=month)
+            .filter(models.Q(serial_number__isnull=True) | models.Q(serial_number__exact=""))
+            .exclude(inventory_number__isnull=True)
+            .exclude(inventory_number__exact="")
+            .values_list("inventory_number", flat=True)
+            .distinct()
+        )
+        for inv in inventories:
+            recompute_group(month, None, inv)
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк пересчёта месяца: прежний recompute_group на каждую группу против пересчёта "
+        "одним проходом. Синтетический месяц создаётся в транзакции и откатывается"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20000, help="Строк в месяце (default: 20000)")
+        parser.add_argument("--duplicates", type=float, default=0.1, help="Доля строк-дублей (default: 0.1)")
+        parser.add_argument("--month", default="1990-01", help="Месяц для синтетики, YYYY-MM (default: 1990-01)")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        year, month = map(int, options["month"].split("-"))
+        month_date = date(year, month, 1)
+        if MonthlyReport.objects.filter(month=month_date).exists():
+            self.stdout.write(self.style.ERROR(f"За {options['month']} уже есть данные — выберите пустой месяц"))
+            return
+
+        try:
+            with transaction.atomic():
+                self._build(month_date, options)
+                self.stdout.write(f"\nСтрок в месяце: {options['rows']}")
+                self._run("по группам", recompute_month_by_groups, month_date)
+                MonthlyReport.objects.filter(month=month_date).update(total_prints=0)
+                self._run("одним проходом, после загрузки (total_prints, K1, K2)", recompute_month, month_date)
+                MonthlyReport.objects.filter(month=month_date).update(total_prints=0)
+                self._run("одним проходом, только total_prints", recompute_month, month_date)
+                self._run("одним проходом, без изменений", recompute_month, month_date)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _build(self, month_date, options):
+        rnd = random.Random(options["seed"])
+        rows = []
+        serials = []
+        for i in range(options["rows"]):
+            if serials and rnd.random() < options["duplicates"]:
+                sn = rnd.choice(serials).lower()
+            else:
+                sn = f"BENCH{i:06d}" if rnd.random() > 0.05 else ""
+                if sn:
+                    serials.append(sn)
+            start = rnd.randint(0, 100_000)
+            rows.append(
+                MonthlyReport(
+                    month=month_date,
+                    order_number=i + 1,
+                    organization="Bench",
+                    branch="Bench",
+                    city="Bench",
+                    address="Bench",
+                    equipment_model="Bench",
+                    serial_number=sn,
+                    inventory_number=f"INV{i:06d}",
+                    a4_bw_start=start,
+                    a4_bw_end=start + rnd.randint(0, 5000),
+                    a3_bw_start=start,
+                    a3_bw_end=start + rnd.randint(0, 500),
+                    normative_availability=720,
+                    actual_downtime=rnd.randint(0, 10),
+                    total_requests=2,
+                    non_overdue_requests=1,
+                )
+            )
+        MonthlyReport.objects.bulk_create(rows, batch_size=1000)
+
+    def _run(self, label, fn, month_date):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql.split(None, 1)[0])
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            fn(month_date)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"  {label}: {elapsed:.2f} c, запросов {len(queries)} (UPDATE {queries.count('UPDATE')})"
+            )
+        )
@@ -8,7 +8,7 @@ from django.db.models.functions import Coalesce, Greatest
 
 from monthly_report.models import MonthlyReport
 from monthly_report.models_modelspec import PaperFormat, PrinterModelSpec
-from monthly_report.specs import SPEC_CACHE
+from monthly_report.specs import clear_spec_cache
 
 COUNTER_FIELDS = {
     "a4_bw_start",
@@ -182,7 +182,7 @@ class Command(BaseCommand):
                 self.stdout.write(f"OK {name} (без изменений)")
 
         if not dry:
-            SPEC_CACHE.clear()
+            clear_spec_cache()
 
         # Переписать существующие строки под правила (обнулить запрещённые поля) и пересчитать месяцы
         if opt["rewrite_existing"]:
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from monthly_report.models import MonthMetrics
+from monthly_report.services import month_metrics
+
+
+class Command(BaseCommand):
+    help = "Сверить сырые счётчики метрик месяцев (MonthMetrics) с полным пересчётом"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Только этот месяц, YYYY-MM")
+        parser.add_argument("--fix", action="store_true", help="Пересобрать расходящиеся счётчики")
+
+    def handle(self, *args, **options):
+        months = MonthMetrics.objects.filter(counts__isnull=False).order_by("month").values_list("month", flat=True)
+        if options["month"]:
+            year, month = map(int, options["month"].split("-"))
+            months = months.filter(month=date(year, month, 1))
+
+        mismatched = 0
+        for month in months:
+            diff = month_metrics.verify(month)
+            if diff is None:
+                continue
+            mismatched += 1
+            self.stdout.write(
+                self.style.WARNING(f"{month:%Y-%m}: хранится {diff['stored']}, пересчёт {diff['actual']}")
+            )
+            if options["fix"]:
+                month_metrics.rebuild(month)
+
+        if mismatched:
+            action = "пересобрано" if options["fix"] else "используйте --fix для пересборки"
+            self.stdout.write(self.style.ERROR(f"Расхождений: {mismatched} ({action})"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Проверено месяцев: {len(months)}, расхождений нет"))
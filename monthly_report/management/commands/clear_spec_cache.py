@@ -2,7 +2,8 @@
 Очистка кэша спецификаций моделей принтеров.
 
 Кэш автоматически очищается при изменении/удалении PrinterModelSpec через админку,
-но эта команда позволяет очистить его вручную если нужно.
+но эта команда позволяет очистить его вручную если нужно: поднимает поколение кэша,
+и все веб- и Celery-процессы перечитают справочник (printer_inventory/coherent_cache.py).
 
 Использование:
     python manage.py clear_spec_cache
@@ -54,5 +55,8 @@ class Command(BaseCommand):
 
         if before_count == 0:
             self.stdout.write(
-                self.style.WARNING("\nПримечание: Кэш уже был пуст. " "Возможно, сервер был недавно перезапущен.")
+                self.style.WARNING(
+                    "\nПримечание: локальный кэш этой команды был пуст; кэши веб- и Celery-процессов "
+                    "сбросятся при следующей сверке поколения."
+                )
             )
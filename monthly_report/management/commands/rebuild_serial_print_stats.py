@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from monthly_report.models import SerialPrintStats
+from monthly_report.services.serial_stats import refresh_serial_stats
+
+
+class Command(BaseCommand):
+    help = "Полностью пересобрать накопительную статистику печати по серийникам (SerialPrintStats)"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            deleted, _ = SerialPrintStats.objects.all().delete()
+            months = refresh_serial_stats()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Удалено строк: {deleted}; свёрнуто месяцев: {months}; "
+                f"строк статистики: {SerialPrintStats.objects.count()}"
+            )
+        )
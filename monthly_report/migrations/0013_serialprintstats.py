@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monthly_report', '0012_alter_monthlyreport_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerialPrintStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serial_key', models.CharField(max_length=100, verbose_name='Серийный номер (нормализованный)')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('total', models.BigIntegerField(default=0, verbose_name='Сумма total_prints')),
+                ('total_sq', models.BigIntegerField(default=0, verbose_name='Сумма квадратов total_prints')),
+            ],
+            options={
+                'verbose_name': 'Статистика печати по серийнику',
+                'verbose_name_plural': 'Статистика печати по серийникам',
+                'indexes': [models.Index(fields=['month'], name='sps_month')],
+                'constraints': [models.UniqueConstraint(fields=('serial_key', 'month'), name='sps_serial_month_uniq')],
+            },
+        ),
+    ]
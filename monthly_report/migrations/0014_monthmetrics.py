@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monthly_report', '0013_serialprintstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='Месяц')),
+                ('counts', models.JSONField(blank=True, null=True, verbose_name='Счётчики')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Метрики месяца',
+                'verbose_name_plural': 'Метрики месяцев',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+"""GIN-индексы pg_trgm для общего поиска api_month_detail.
+
+Поиск q — icontains по семи полям, на PostgreSQL это UPPER(поле) LIKE UPPER('%q%');
+индексы построены ровно по UPPER(поле::text). Строятся CONCURRENTLY, чтобы не
+блокировать запись в таблицу отчётов, поэтому миграция не атомарная.
+"""
+
+from django.db import migrations
+
+SEARCH_FIELDS = {
+    "organization": "mr_org_trgm",
+    "branch": "mr_branch_trgm",
+    "city": "mr_city_trgm",
+    "address": "mr_address_trgm",
+    "equipment_model": "mr_model_trgm",
+    "serial_number": "mr_serial_trgm",
+    "inventory_number": "mr_inv_trgm",
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for field, name in SEARCH_FIELDS.items():
+        schema_editor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON monthly_report_monthlyreport "
+            f'USING gin (UPPER("{field}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in SEARCH_FIELDS.values():
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("monthly_report", "0014_monthmetrics"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
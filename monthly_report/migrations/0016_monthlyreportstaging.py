@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+def set_unlogged(apps, schema_editor):
+    # Строки живут одну транзакцию загрузки — WAL для них не нужен
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE monthly_report_monthlyreportstaging SET UNLOGGED")
+
+
+def set_logged(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE monthly_report_monthlyreportstaging SET LOGGED")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monthly_report', '0015_monthlyreport_trigram_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyReportStaging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.UUIDField(db_index=True, verbose_name='Загрузка')),
+                ('row_number', models.PositiveIntegerField(verbose_name='Строка файла')),
+                ('order_number', models.BigIntegerField(default=0)),
+                ('organization', models.CharField(max_length=255)),
+                ('branch', models.CharField(max_length=255)),
+                ('city', models.CharField(max_length=255)),
+                ('address', models.CharField(max_length=255)),
+                ('equipment_model', models.CharField(max_length=255)),
+                ('serial_number', models.CharField(max_length=100)),
+                ('inventory_number', models.CharField(max_length=100)),
+                ('a4_bw_start', models.BigIntegerField(default=0)),
+                ('a4_bw_end', models.BigIntegerField(default=0)),
+                ('a4_color_start', models.BigIntegerField(default=0)),
+                ('a4_color_end', models.BigIntegerField(default=0)),
+                ('a3_bw_start', models.BigIntegerField(default=0)),
+                ('a3_bw_end', models.BigIntegerField(default=0)),
+                ('a3_color_start', models.BigIntegerField(default=0)),
+                ('a3_color_end', models.BigIntegerField(default=0)),
+                ('total_prints', models.BigIntegerField(default=0)),
+                ('normative_availability', models.FloatField(default=0.0)),
+                ('actual_downtime', models.FloatField(default=0.0)),
+                ('non_overdue_requests', models.BigIntegerField(default=0)),
+                ('total_requests', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Строка загрузки Excel',
+                'verbose_name_plural': 'Строки загрузки Excel',
+                'default_permissions': (),
+            },
+        ),
+        migrations.RunPython(set_unlogged, set_logged),
+    ]
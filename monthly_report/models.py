@@ -2,13 +2,38 @@
 
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import Avg, Count
+from django.db.models import DEFERRED
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
 
 
+def calc_k1_k2(normative_availability, actual_downtime, total_requests, non_overdue_requests):
+    """K1 = ((A - D)/A)*100%, K2 = (L/W)*100%, оба в пределах [0, 100]."""
+    A = float(normative_availability or 0.0)
+    D = max(0.0, float(actual_downtime or 0.0))
+    W = int(total_requests or 0)
+    L = int(non_overdue_requests or 0)
+
+    k1 = ((A - D) / A * 100.0) if A > 0 else 0.0
+    k2 = (L / W * 100.0) if W > 0 else 0.0
+    return max(0.0, min(k1, 100.0)), max(0.0, min(k2, 100.0))
+
+
+# Поля, определяющие группу дублей строки и её позицию в группе
+DUP_KEY_FIELDS = ("month", "serial_number", "inventory_number", "order_number")
+
+# Поля, от которых зависят метрики месяца (заполненность, автозаполнение)
+END_COUNTER_FIELDS = ("a4_bw_end", "a4_color_end", "a3_bw_end", "a3_color_end")
+METRIC_FIELDS = (
+    END_COUNTER_FIELDS + tuple(f"{name}_manual" for name in END_COUNTER_FIELDS) + ("device_ip", "equipment_model")
+)
+
+# Значения этих полей запоминаются при загрузке — сигналы после save сравнивают «до» и «после»
+TRACKED_FIELDS = DUP_KEY_FIELDS + METRIC_FIELDS
+
+
 class MonthlyReport(models.Model):
     month = models.DateField(_("Месяц"), help_text="Первый день месяца (для группировки)")
     order_number = models.PositiveIntegerField(_("№ п/п"), default=1)
@@ -87,18 +112,32 @@ class MonthlyReport(models.Model):
             models.Index(fields=["month", "order_number"], name="mr_month_ord"),
         ]
 
-    def save(self, *args, **kwargs):
-        # Не считаем total_prints здесь — его разложит сервис по группам.
-        A = float(self.normative_availability or 0.0)
-        D = max(0.0, float(self.actual_downtime or 0.0))
-        W = int(self.total_requests or 0)
-        L = int(self.non_overdue_requests or 0)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = {
+            name: value for name, value in zip(field_names, values) if name in TRACKED_FIELDS and value is not DEFERRED
+        }
+        return instance
+
+    def current_state(self, names) -> tuple:
+        return tuple(getattr(self, name) for name in names)
+
+    def loaded_state(self, names):
+        """Значения полей на момент загрузки из БД (или последнего save); None — неизвестны."""
+        loaded = getattr(self, "_loaded_state", None)
+        if loaded is None or any(name not in loaded for name in names):
+            return None
+        return tuple(loaded[name] for name in names)
 
-        self.k1 = ((A - D) / A * 100.0) if A > 0 else 0.0
-        self.k1 = max(0.0, min(self.k1, 100.0))
+    def remember_state(self) -> None:
+        self._loaded_state = dict(zip(TRACKED_FIELDS, self.current_state(TRACKED_FIELDS)))
 
-        self.k2 = (L / W * 100.0) if W > 0 else 0.0
-        self.k2 = max(0.0, min(self.k2, 100.0))
+    def save(self, *args, **kwargs):
+        # Не считаем total_prints здесь — его разложит сервис по группам.
+        self.k1, self.k2 = calc_k1_k2(
+            self.normative_availability, self.actual_downtime, self.total_requests, self.non_overdue_requests
+        )
 
         super().save(*args, **kwargs)
 
@@ -142,13 +181,13 @@ class MonthlyReport(models.Model):
         if not self.serial_number:
             return None
 
-        result = MonthlyReport.objects.filter(serial_number=self.serial_number, month__lt=self.month).aggregate(
-            avg_prints=Avg("total_prints"), month_count=Count("id")
-        )
+        from .services.serial_stats import historical_totals, serial_key
+
+        count, total = historical_totals([self.serial_number], self.month).get(serial_key(self.serial_number), (0, 0))
 
         # Возвращаем среднее только если есть история (минимум 1 месяц)
-        if result["month_count"] and result["month_count"] > 0:
-            return {"average": result["avg_prints"], "months_count": result["month_count"]}
+        if count > 0:
+            return {"average": total / count, "months_count": count}
         return None
 
     def check_anomaly(self, threshold=2000):
@@ -218,6 +257,13 @@ class MonthControl(models.Model):
         verbose_name = "Настройки месяца"
         verbose_name_plural = "Настройки месяцев"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # edit_until на момент загрузки: сигнал пересобирает SerialPrintStats только при его смене
+        instance._loaded_edit_until = dict(zip(field_names, values)).get("edit_until", DEFERRED)
+        return instance
+
     @property
     def is_editable(self) -> bool:
         return bool(self.edit_until and timezone.now() < self.edit_until)
@@ -226,6 +272,92 @@ class MonthControl(models.Model):
         return f"{self.month} (до {self.edit_until or 'закрыт'})"
 
 
+class SerialPrintStats(models.Model):
+    """
+    Накопительная статистика total_prints по серийнику — по всем закрытым месяцам
+    до month включительно (сумма, сумма квадратов, число записей).
+
+    Строка есть только за месяцы, где серийник встречается; история до месяца M —
+    последняя строка серийника с month < M. Ведётся services/serial_stats.py.
+    """
+
+    serial_key = models.CharField("Серийный номер (нормализованный)", max_length=100)
+    month = models.DateField("Месяц")
+    count = models.PositiveIntegerField("Записей", default=0)
+    total = models.BigIntegerField("Сумма total_prints", default=0)
+    total_sq = models.BigIntegerField("Сумма квадратов total_prints", default=0)
+
+    class Meta:
+        verbose_name = "Статистика печати по серийнику"
+        verbose_name_plural = "Статистика печати по серийникам"
+        constraints = [models.UniqueConstraint(fields=["serial_key", "month"], name="sps_serial_month_uniq")]
+        indexes = [models.Index(fields=["month"], name="sps_month")]
+
+    def __str__(self):
+        return f"{self.serial_key} до {self.month}: {self.count} записей"
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class MonthMetrics(models.Model):
+    """
+    Сырые счётчики метрик месяца: сколько строк с каждой сигнатурой (какие
+    end-поля разрешены, пусты, ручные, положительны; есть ли IP) и кто правил
+    счётчики. Проценты для конкретных прав — проекция этих счётчиков.
+    Ведётся services/month_metrics.py; counts = None — пересобрать при чтении.
+    """
+
+    month = models.DateField("Месяц", unique=True)
+    counts = models.JSONField("Счётчики", null=True, blank=True)
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
+
+    class Meta:
+        verbose_name = "Метрики месяца"
+        verbose_name_plural = "Метрики месяцев"
+
+    def __str__(self):
+        return f"Метрики {self.month:%Y-%m}"
+
+
+class MonthlyReportStaging(models.Model):
+    """
+    Промежуточные строки загрузки Excel (services/excel_import.py): пачка batch
+    заливается COPY и переносится в MonthlyReport одним INSERT ... SELECT
+    в той же транзакции. На PostgreSQL таблица UNLOGGED.
+    """
+
+    batch = models.UUIDField("Загрузка", db_index=True)
+    row_number = models.PositiveIntegerField("Строка файла")
+    order_number = models.BigIntegerField(default=0)
+    organization = models.CharField(max_length=255)
+    branch = models.CharField(max_length=255)
+    city = models.CharField(max_length=255)
+    address = models.CharField(max_length=255)
+    equipment_model = models.CharField(max_length=255)
+    serial_number = models.CharField(max_length=100)
+    inventory_number = models.CharField(max_length=100)
+    a4_bw_start = models.BigIntegerField(default=0)
+    a4_bw_end = models.BigIntegerField(default=0)
+    a4_color_start = models.BigIntegerField(default=0)
+    a4_color_end = models.BigIntegerField(default=0)
+    a3_bw_start = models.BigIntegerField(default=0)
+    a3_bw_end = models.BigIntegerField(default=0)
+    a3_color_start = models.BigIntegerField(default=0)
+    a3_color_end = models.BigIntegerField(default=0)
+    total_prints = models.BigIntegerField(default=0)
+    normative_availability = models.FloatField(default=0.0)
+    actual_downtime = models.FloatField(default=0.0)
+    non_overdue_requests = models.BigIntegerField(default=0)
+    total_requests = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Строка загрузки Excel"
+        verbose_name_plural = "Строки загрузки Excel"
+        default_permissions = ()
+
+
 class CounterChangeLog(models.Model):
     """
     Журнал изменений счетчиков с полной историей
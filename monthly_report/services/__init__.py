@@ -3,14 +3,31 @@
 from __future__ import annotations
 
 import logging
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from django.db import models, transaction
+from django.db import connection, transaction
+from django.db.models.functions import Upper
 
-from ..models import MonthlyReport
+from ..models import MonthlyReport, calc_k1_k2
 
 logger = logging.getLogger(__name__)
 
+# Пространство ключей pg_advisory_xact_lock для блокировок месяца (второй ключ — YYYYMM)
+MONTH_LOCK_NAMESPACE = 0x4D52  # "MR"
+
+COUNTER_FIELDS = (
+    "a4_bw_start",
+    "a4_bw_end",
+    "a4_color_start",
+    "a4_color_end",
+    "a3_bw_start",
+    "a3_bw_end",
+    "a3_color_start",
+    "a3_color_end",
+)
+RECOMPUTED_FIELDS = ("total_prints", "k1", "k2")
+K_INPUT_FIELDS = ("normative_availability", "actual_downtime", "total_requests", "non_overdue_requests")
+
 
 def _nz(x) -> int:
     """Безопасно привести к int, пустые/None -> 0."""
@@ -46,6 +63,21 @@ def _calculate_page_counts(obj: MonthlyReport) -> Tuple[int, int, int]:
     return a4_total, a3_total, combined_total
 
 
+def _month_lock(month, shared: bool = False) -> None:
+    """
+    Транзакционная advisory-блокировка месяца (PostgreSQL; на других СУБД — no-op).
+
+    recompute_group берёт её разделяемой, recompute_month — исключительной:
+    пересчёты отдельных групп идут параллельно, а полный пересчёт месяца ждёт их
+    и не даёт им писать поверх себя.
+    """
+    if connection.vendor != "postgresql":
+        return
+    func = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {func}(%s, %s)", [MONTH_LOCK_NAMESPACE, month.year * 100 + month.month])
+
+
 @transaction.atomic
 def recompute_group(month, serial: Optional[str], inventory: Optional[str]) -> None:
     """
@@ -67,6 +99,8 @@ def recompute_group(month, serial: Optional[str], inventory: Optional[str]) -> N
         logger.warning(f"recompute_group: пустые ключи для месяца {month}")
         return
 
+    _month_lock(month, shared=True)
+
     # Формируем запрос
     qs = MonthlyReport.objects.select_for_update().filter(month=month)
     if sn:
@@ -102,9 +136,48 @@ def recompute_group(month, serial: Optional[str], inventory: Optional[str]) -> N
     # Сохраняем изменения
     MonthlyReport.objects.bulk_update([calc[0] for calc in calculations], ["total_prints"])
 
+    from .excel_export import touch
+
+    touch(month)
+
     logger.info(f"recompute_group: обновлено {len(rows)} записей для {sn or inv} в {month}")
 
 
+@transaction.atomic
+def recompute_serials(month, serials: Iterable[str]) -> List[MonthlyReport]:
+    """
+    recompute_group для набора серийников одним запросом и одним bulk_update.
+
+    Returns:
+        Все строки затронутых групп с актуальным total_prints.
+    """
+    keys = {(sn or "").strip().upper() for sn in serials} - {""}
+    if not keys:
+        return []
+
+    _month_lock(month, shared=True)
+    rows = list(
+        MonthlyReport.objects.select_for_update()
+        .filter(month=month)
+        .annotate(serial_upper=Upper("serial_number"))
+        .filter(serial_upper__in=keys)
+        .order_by("order_number", "id")
+    )
+    before = {row.id: row.total_prints for row in rows}
+    _apply_month_groups(rows)
+
+    changed = [row for row in rows if row.total_prints != before[row.id]]
+    if changed:
+        MonthlyReport.objects.bulk_update(changed, ["total_prints"], batch_size=1000)
+
+        from .excel_export import touch
+
+        touch(month)
+
+    logger.info(f"recompute_serials: {len(keys)} групп, обновлено {len(changed)} из {len(rows)} записей в {month}")
+    return rows
+
+
 def _distribute_prints_for_duplicates(calculations: List[Tuple[MonthlyReport, int, int, int]]) -> None:
     """
     НОВАЯ ФУНКЦИЯ: Распределяет счетчики в группе дублей согласно строгой логике:
@@ -130,49 +203,113 @@ def _distribute_prints_for_duplicates(calculations: List[Tuple[MonthlyReport, in
         logger.debug(f"Дубль - строка #{i + 1} {row.id}: total_prints = {row_a3} (только A3)")
 
 
-def recompute_month(month) -> None:
+def recompute_month(month) -> int:
     """
-    Массовый пересчёт месяца с улучшенной производительностью и логированием.
-    Теперь учитывает новую логику дублей.
+    Массовый пересчёт месяца одним проходом.
+
+    Все строки месяца читаются одним запросом и группируются в памяти по тем же
+    правилам, что и recompute_group (серийник, затем инвентарный у строк без SN —
+    он перекрывает результат по серийнику), total_prints раскладывается по логике
+    дублей, K1/K2 — как в MonthlyReport.save(). Изменившиеся строки пишутся
+    одним bulk_update пачками под исключительной блокировкой месяца.
+
+    Returns:
+        Количество обновлённых строк.
     """
     logger.info(f"Начало пересчета месяца {month}")
 
     try:
         with transaction.atomic():
-            # Все непустые серийники
-            serials = (
+            _month_lock(month)
+            # Порядок строк дубля — как в recompute_group: при равных order_number решает id
+            rows = list(
                 MonthlyReport.objects.filter(month=month)
-                .exclude(serial_number__isnull=True)
-                .exclude(serial_number__exact="")
-                .values_list("serial_number", flat=True)
-                .distinct()
+                .order_by("order_number", "id")
+                .only(
+                    "id",
+                    "serial_number",
+                    "inventory_number",
+                    "order_number",
+                    *RECOMPUTED_FIELDS,
+                    *COUNTER_FIELDS,
+                    *K_INPUT_FIELDS,
+                )
             )
 
-            logger.info(f"Найдено {len(serials)} уникальных серийников")
+            before = {row.id: [getattr(row, name) for name in RECOMPUTED_FIELDS] for row in rows}
+            _apply_month_groups(rows)
+            for row in rows:
+                row.k1, row.k2 = calc_k1_k2(
+                    row.normative_availability, row.actual_downtime, row.total_requests, row.non_overdue_requests
+                )
 
-            for sn in serials:
-                recompute_group(month, sn, None)
+            # CASE WHEN в bulk_update строится на каждое поле — пишем только реально изменившиеся
+            changed, fields = [], set()
+            for row in rows:
+                diff = {name for name, old in zip(RECOMPUTED_FIELDS, before[row.id]) if getattr(row, name) != old}
+                if diff:
+                    changed.append(row)
+                    fields |= diff
+            if changed:
+                MonthlyReport.objects.bulk_update(changed, sorted(fields), batch_size=1000)
 
-            # Инвентарные только у тех строк, где нет SN
-            inventories = (
-                MonthlyReport.objects.filter(month=month)
-                .filter(models.Q(serial_number__isnull=True) | models.Q(serial_number__exact=""))
-                .exclude(inventory_number__isnull=True)
-                .exclude(inventory_number__exact="")
-                .values_list("inventory_number", flat=True)
-                .distinct()
-            )
+    except Exception as e:
+        logger.error(f"Ошибка при пересчете месяца {month}: {e}")
+        raise
+
+    logger.info(f"Пересчет месяца {month} завершен: {len(rows)} записей, обновлено {len(changed)}")
 
-            logger.info(f"Найдено {len(inventories)} уникальных инвентарных номеров")
+    # Строки месяца могли прийти пачкой мимо сигналов (загрузка Excel) — индекс дублей соберётся заново
+    from . import duplicate_index, excel_export
 
-            for inv in inventories:
-                recompute_group(month, None, inv)
+    transaction.on_commit(lambda: duplicate_index.invalidate(month))
+    excel_export.touch(month)
 
+    try:
+        from .serial_stats import on_month_changed
+
+        on_month_changed(month)
     except Exception as e:
-        logger.error(f"Ошибка при пересчете месяца {month}: {e}")
-        raise
+        logger.error(f"Ошибка обновления статистики серийников после пересчета {month}: {e}")
+
+    return len(changed)
+
 
-    logger.info(f"Пересчет месяца {month} завершен успешно")
+def _apply_month_groups(rows: List[MonthlyReport]) -> None:
+    """
+    Раскладывает total_prints по группам месяца, повторяя выборки recompute_group.
+
+    Ключ группы — обрезанный серийник без учёта регистра; в группу входят строки,
+    чей серийник совпадает с ключом (iexact, без обрезки). Группы по инвентарному
+    строятся по строкам с пустым SN, но включают все строки с таким инвентарным
+    и обрабатываются последними — как во втором проходе прежнего recompute_month.
+    """
+    by_serial: Dict[str, List[MonthlyReport]] = {}
+    by_inventory: Dict[str, List[MonthlyReport]] = {}
+    serial_keys = set()
+    inventory_keys = set()
+
+    for row in rows:
+        sn = row.serial_number or ""
+        inv = row.inventory_number or ""
+        by_serial.setdefault(sn.upper(), []).append(row)
+        by_inventory.setdefault(inv.upper(), []).append(row)
+        if sn:
+            serial_keys.add(sn.strip().upper())
+        else:
+            inventory_keys.add(inv.strip().upper())
+
+    for groups, keys in ((by_serial, serial_keys), (by_inventory, inventory_keys)):
+        for key in keys:
+            members = groups.get(key) if key else None
+            if not members:
+                continue
+            calculations = [(row, *_calculate_page_counts(row)) for row in members]
+            if len(calculations) == 1:
+                row, _, _, combined = calculations[0]
+                row.total_prints = combined
+            else:
+                _distribute_prints_for_duplicates(calculations)
 
 
 def get_duplicate_summary(month) -> dict:
@@ -0,0 +1,218 @@
+# monthly_report/services/duplicate_index.py
+"""
+Индекс групп дублей месяца: (serial, inventory) -> упорядоченные id строк
+и id строки -> (группа, позиция, размер группы).
+
+Раньше группы дублей пересобирались по всему месяцу на каждое редактирование
+ячейки (api_update_counters), расчёт метрик, выдачу месяца и синхронизацию
+с inventory — и потом ещё искались перебором всех групп для каждой строки.
+
+Индекс хранится в кэше одним объектом на месяц — только группы из 2+ строк,
+то есть обычно несколько процентов месяца. Ключ объекта включает версию
+месяца (счётчик изменений mr:dupidx:<месяц>:ver):
+
+    - изменение ключа группы у одной строки (serial, inventory, order, month —
+      сигналы post_save/post_delete) перечитывает из БД только старую и новую
+      группу, патчит индекс предыдущей версии и кладёт его под новой;
+    - массовые изменения (загрузка Excel через recompute_month, удаление
+      месяца) только поднимают версию — индекс соберётся при следующем чтении.
+
+Группировка как раньше: по обрезанным serial_number и inventory_number
+с учётом регистра, строки без обоих ключей в группы не входят, порядок —
+(order_number, id).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Trim
+
+from ..models import MonthlyReport
+
+logger = logging.getLogger(__name__)
+
+INDEX_TTL = 24 * 60 * 60
+# Больше изменённых групп за транзакцию — не патчим, а сбрасываем индекс месяца
+PATCH_LIMIT = 50
+
+GroupKey = Tuple[str, str]
+
+UNKNOWN = object()
+
+
+class DuplicatePosition(NamedTuple):
+    key: GroupKey
+    position: int
+    size: int
+
+
+def group_key(serial: Optional[str], inventory: Optional[str]) -> Optional[GroupKey]:
+    sn = (serial or "").strip()
+    inv = (inventory or "").strip()
+    if not sn and not inv:
+        return None
+    return sn, inv
+
+
+class DuplicateIndex:
+    """Группы дублей одного месяца."""
+
+    def __init__(self, groups: Dict[GroupKey, List[int]]):
+        self.groups = groups
+        self._rows = {
+            report_id: DuplicatePosition(key, position, len(ids))
+            for key, ids in groups.items()
+            for position, report_id in enumerate(ids)
+        }
+
+    def lookup(self, report_id: int) -> Optional[DuplicatePosition]:
+        """Позиция строки в группе дублей; None — строка не дубль."""
+        return self._rows.get(report_id)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Версия месяца
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _version_key(month) -> str:
+    return f"mr:dupidx:{month:%Y-%m}:ver"
+
+
+def _index_key(month, version: int) -> str:
+    return f"mr:dupidx:{month:%Y-%m}:v{version}"
+
+
+def _version(month) -> int:
+    version = cache.get(_version_key(month))
+    if version is None:
+        # Начальная версия от времени: после вытеснения счётчика старые индексы не подхватятся
+        cache.add(_version_key(month), time.time_ns(), None)
+        version = cache.get(_version_key(month)) or 0
+    return version
+
+
+def _bump(month) -> Optional[int]:
+    """Новая версия месяца; None — счётчика не было (патчить нечего)."""
+    try:
+        return cache.incr(_version_key(month))
+    except ValueError:
+        cache.add(_version_key(month), time.time_ns(), None)
+        return None
+
+
+def invalidate(month) -> None:
+    """Месяц изменился целиком — индекс соберётся заново при следующем чтении."""
+    try:
+        _bump(month)
+    except Exception as e:
+        logger.warning(f"duplicate_index: не удалось сбросить индекс {month}: {e}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Чтение и сборка
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def get_duplicate_index(month) -> DuplicateIndex:
+    try:
+        version = _version(month)
+        groups = cache.get(_index_key(month, version))
+    except Exception as e:
+        logger.warning(f"duplicate_index: кэш недоступен, собираем индекс {month} из БД: {e}")
+        return DuplicateIndex(_build(month))
+
+    if groups is None:
+        groups = _build(month)
+        cache.add(_index_key(month, version), groups, INDEX_TTL)
+    return DuplicateIndex(groups)
+
+
+def _build(month) -> Dict[GroupKey, List[int]]:
+    members: Dict[GroupKey, List[int]] = {}
+    for report_id, sn, inv in (
+        MonthlyReport.objects.filter(month=month)
+        .order_by("order_number", "id")
+        .values_list("id", "serial_number", "inventory_number")
+    ):
+        key = group_key(sn, inv)
+        if key:
+            members.setdefault(key, []).append(report_id)
+    return {key: ids for key, ids in members.items() if len(ids) >= 2}
+
+
+def _group_ids(month, key: GroupKey) -> List[int]:
+    return list(
+        MonthlyReport.objects.filter(month=month)
+        .annotate(sn_key=Trim("serial_number"), inv_key=Trim("inventory_number"))
+        .filter(sn_key=key[0], inv_key=key[1])
+        .order_by("order_number", "id")
+        .values_list("id", flat=True)
+    )
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Инкрементальное обновление
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def refresh_groups(month, keys) -> None:
+    """Перечитывает из БД группы keys месяца и патчит индекс под новой версией."""
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+    try:
+        version = _bump(month)
+        if version is None:
+            return
+        groups = cache.get(_index_key(month, version - 1))
+        if groups is None:
+            # Прежнего индекса нет (или его уже обогнал другой патч) — соберётся при чтении
+            return
+        for key in keys:
+            ids = _group_ids(month, key)
+            if len(ids) >= 2:
+                groups[key] = ids
+            else:
+                groups.pop(key, None)
+        cache.set(_index_key(month, version), groups, INDEX_TTL)
+    except Exception as e:
+        logger.warning(f"duplicate_index: не удалось обновить индекс {month}: {e}")
+        invalidate(month)
+
+
+_local = threading.local()
+
+
+def on_report_changed(old, new: Optional[tuple]) -> None:
+    """
+    Строка сменила ключ группы: old/new — (month, serial, inventory, order_number)
+    до и после изменения (None — строки не было / больше нет, UNKNOWN — прежний
+    ключ неизвестен). Индекс обновляется после коммита, одним проходом на транзакцию.
+    """
+    pending = getattr(_local, "pending", None)
+    if pending is None:
+        pending = _local.pending = {}
+    for state in (old, new):
+        if state is UNKNOWN:
+            pending.setdefault(new[0], set()).add(UNKNOWN)
+        elif state and state[0]:
+            pending.setdefault(state[0], set()).add(group_key(state[1], state[2]))
+    # Колбэк на каждое изменение, но работу делает первый: остальные найдут pending пустым.
+    # После отката транзакции накопленное применится со следующим коммитом — лишний патч безвреден
+    transaction.on_commit(_flush)
+
+
+def _flush() -> None:
+    pending, _local.pending = getattr(_local, "pending", None) or {}, None
+    for month, keys in pending.items():
+        if UNKNOWN in keys or len(keys) > PATCH_LIMIT:
+            invalidate(month)
+        else:
+            refresh_groups(month, keys)
@@ -1,161 +1,199 @@
+# monthly_report/services/excel_export.py
+"""
+Экспорт месяца в Excel (в том же формате, что и загрузка).
+
+Книга пишется потоково (printer_inventory.xlsx) прямо из iterator() по строкам
+месяца и кладётся в кэш файлов под версией данных месяца: повторное скачивание
+неизменившегося месяца отдаётся с диска. Сборка идёт Celery-задачей
+build_month_export_task в очереди exports; параллельные запросы одной версии
+ждут одну задачу.
+
+Версия данных — счётчик mr:export:<месяц>:ver в кэше, поднимается после
+коммита любого изменения строк месяца (touch): сигналы post_save/post_delete
+MonthlyReport и массовые bulk_update (пересчёт total_prints, опросы inventory,
+смена IP).
+"""
+
 from __future__ import annotations
 
-import io
+import logging
+import threading
+import time
+import uuid
 from datetime import date
+from pathlib import Path
+from typing import Optional
 
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from openpyxl.utils import get_column_letter
+from django.core.cache import cache
+from django.db import transaction
 
-from django.http import HttpResponse
+from printer_inventory.xlsx import CENTER, NUMBER, TEXT, StreamingWorkbook, cached_artifact, store_artifact
 
 from ..models import MonthlyReport
 
-
-def export_month_to_excel(month_dt: date) -> HttpResponse:
-    """
-    Экспортирует данные месяца в Excel в том же формате, что и загрузка.
-    """
-    # Получаем данные за месяц
-    reports = MonthlyReport.objects.filter(month__year=month_dt.year, month__month=month_dt.month).order_by(
-        "order_number", "organization", "city", "equipment_model", "serial_number"
+logger = logging.getLogger(__name__)
+
+EXPORT_KIND = "monthly_report"
+# Сколько держим отметку о запущенной сборке версии (дольше time_limit задачи)
+TASK_LOCK_TTL = 15 * 60
+TASK_STATE_TTL = 15 * 60
+
+COLUMNS = (
+    # (заголовок, поле, ширина)
+    ("№ п/п", "order_number", 8),
+    ("Организация", "organization", 25),
+    ("Филиал", "branch", 20),
+    ("Город", "city", 15),
+    ("Адрес", "address", 30),
+    ("Модель и наименование оборудования", "equipment_model", 35),
+    ("Серийный номер оборудования", "serial_number", 20),
+    ("Инв номер", "inventory_number", 15),
+    ("A4 ч/б начало", "a4_bw_start", 12),
+    ("A4 ч/б конец", "a4_bw_end", 12),
+    ("A4 цвет начало", "a4_color_start", 12),
+    ("A4 цвет конец", "a4_color_end", 12),
+    ("A3 ч/б начало", "a3_bw_start", 12),
+    ("A3 ч/б конец", "a3_bw_end", 12),
+    ("A3 цвет начало", "a3_color_start", 12),
+    ("A3 цвет конец", "a3_color_end", 12),
+    ("Итого отпечатков шт.", "total_prints", 15),
+    ("Нормативное время доступности (A)", "normative_availability", 12),
+    ("Фактическое время недоступности (D)", "actual_downtime", 12),
+    ("K1 = ((A - D)/A)*100%", "k1", 12),
+    ("Количество не просроченных запросов (L)", "non_overdue_requests", 12),
+    ("Общее количество запросов (W)", "total_requests", 12),
+    ("K2 = (L/W)*100%", "k2", 12),
+)
+
+# № п/п по центру, текст влево, счётчики и показатели вправо
+STYLES = [CENTER] + [TEXT] * 7 + [NUMBER] * (len(COLUMNS) - 8)
+
+
+def export_filename(month_dt: date) -> str:
+    return f"monthly_report_{month_dt:%Y-%m}.xlsx"
+
+
+def write_month_workbook(month_dt: date, target) -> int:
+    """Пишет книгу месяца в target (путь или файловый объект). Returns: число строк."""
+    fields = [field for _, field, _ in COLUMNS]
+    k1, k2 = fields.index("k1"), fields.index("k2")
+    rows = (
+        MonthlyReport.objects.filter(month=month_dt)
+        .order_by("order_number", "organization", "city", "equipment_model", "serial_number")
+        .values_list(*fields)
+        .iterator(chunk_size=2000)
     )
 
-    # Создаем книгу Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = f"{month_dt.strftime('%Y-%m')}"
-
-    # Определяем заголовки (точно как в загрузке)
-    headers = [
-        "№ п/п",
-        "Организация",
-        "Филиал",
-        "Город",
-        "Адрес",
-        "Модель и наименование оборудования",
-        "Серийный номер оборудования",
-        "Инв номер",
-        "A4 ч/б начало",
-        "A4 ч/б конец",
-        "A4 цвет начало",
-        "A4 цвет конец",
-        "A3 ч/б начало",
-        "A3 ч/б конец",
-        "A3 цвет начало",
-        "A3 цвет конец",
-        "Итого отпечатков шт.",
-        "Нормативное время доступности (A)",
-        "Фактическое время недоступности (D)",
-        "K1 = ((A - D)/A)*100%",
-        "Количество не просроченных запросов (L)",
-        "Общее количество запросов (W)",
-        "K2 = (L/W)*100%",
-    ]
-
-    # Стили для заголовков
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-
-    thin_border = Border(
-        left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin")
+    wb = StreamingWorkbook(header_color="4472C4", bordered=True)
+    sheet = wb.sheet(
+        f"{month_dt:%Y-%m}",
+        [header for header, _, _ in COLUMNS],
+        widths=[width for _, _, width in COLUMNS],
+        styles=STYLES,
+        header_height=40,
     )
+    for row in rows:
+        row = list(row)
+        row[k1] = round(row[k1], 2) if row[k1] else 0
+        row[k2] = round(row[k2], 2) if row[k2] else 0
+        sheet.append(row)
+    wb.save(target)
+    return sheet.rows
 
-    # Записываем заголовки
-    for col_idx, header in enumerate(headers, start=1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    # Устанавливаем ширину колонок
-    column_widths = {
-        1: 8,  # № п/п
-        2: 25,  # Организация
-        3: 20,  # Филиал
-        4: 15,  # Город
-        5: 30,  # Адрес
-        6: 35,  # Модель
-        7: 20,  # Серийный номер
-        8: 15,  # Инв номер
-        9: 12,  # A4 ч/б начало
-        10: 12,  # A4 ч/б конец
-        11: 12,  # A4 цвет начало
-        12: 12,  # A4 цвет конец
-        13: 12,  # A3 ч/б начало
-        14: 12,  # A3 ч/б конец
-        15: 12,  # A3 цвет начало
-        16: 12,  # A3 цвет конец
-        17: 15,  # Итого отпечатков
-        18: 12,  # A
-        19: 12,  # D
-        20: 12,  # K1
-        21: 12,  # L
-        22: 12,  # W
-        23: 12,  # K2
-    }
-
-    for col_idx, width in column_widths.items():
-        ws.column_dimensions[get_column_letter(col_idx)].width = width
-
-    # Высота строки заголовка
-    ws.row_dimensions[1].height = 40
-
-    # Записываем данные
-    for row_idx, report in enumerate(reports, start=2):
-        row_data = [
-            report.order_number,
-            report.organization,
-            report.branch,
-            report.city,
-            report.address,
-            report.equipment_model,
-            report.serial_number,
-            report.inventory_number,
-            report.a4_bw_start,
-            report.a4_bw_end,
-            report.a4_color_start,
-            report.a4_color_end,
-            report.a3_bw_start,
-            report.a3_bw_end,
-            report.a3_color_start,
-            report.a3_color_end,
-            report.total_prints,
-            report.normative_availability,
-            report.actual_downtime,
-            round(report.k1, 2) if report.k1 else 0,
-            report.non_overdue_requests,
-            report.total_requests,
-            round(report.k2, 2) if report.k2 else 0,
-        ]
-
-        for col_idx, value in enumerate(row_data, start=1):
-            cell = ws.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = thin_border
-
-            # Выравнивание
-            if col_idx == 1:  # № п/п
-                cell.alignment = Alignment(horizontal="center")
-            elif col_idx >= 9:  # Числовые поля
-                cell.alignment = Alignment(horizontal="right")
-            else:
-                cell.alignment = Alignment(horizontal="left")
-
-    # Закрепляем первую строку
-    ws.freeze_panes = "A2"
-
-    # Сохраняем в байты
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    # Создаем HTTP ответ
-    filename = f"monthly_report_{month_dt.strftime('%Y-%m')}.xlsx"
-    response = HttpResponse(
-        output.getvalue(), content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
 
-    return response
+# ──────────────────────────────────────────────────────────────────────────────
+# Версия данных месяца
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _version_key(month) -> str:
+    return f"mr:export:{month:%Y-%m}:ver"
+
+
+def data_version(month) -> int:
+    version = cache.get(_version_key(month))
+    if version is None:
+        # Начальная версия от времени: после вытеснения счётчика старые файлы не подхватятся
+        cache.add(_version_key(month), time.time_ns(), None)
+        version = cache.get(_version_key(month)) or 0
+    return version
+
+
+def _bump(month) -> None:
+    try:
+        cache.incr(_version_key(month))
+    except ValueError:
+        cache.add(_version_key(month), time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"excel_export: не удалось поднять версию выгрузки {month}: {e}")
+
+
+_local = threading.local()
+
+
+def touch(month) -> None:
+    """Строки месяца изменились: версия поднимется после коммита (один раз на месяц за транзакцию)."""
+    if not month:
+        return
+    pending = getattr(_local, "pending", None)
+    if pending is None:
+        pending = _local.pending = set()
+    pending.add(month)
+    transaction.on_commit(_flush)
+
+
+def _flush() -> None:
+    pending, _local.pending = getattr(_local, "pending", None) or set(), None
+    for month in pending:
+        _bump(month)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Сборка и кэш файлов
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def cached_month_export(month_dt: date) -> Optional[Path]:
+    return cached_artifact(EXPORT_KIND, f"{month_dt:%Y-%m}", data_version(month_dt))
+
+
+def build_month_export(month_dt: date) -> Path:
+    """Файл выгрузки текущей версии месяца: из кэша или собранный заново."""
+    # Версию читаем до данных: изменение после чтения поднимет её, и этот файл больше не отдастся
+    version = data_version(month_dt)
+    key = f"{month_dt:%Y-%m}"
+    path = cached_artifact(EXPORT_KIND, key, version)
+    if path is None:
+        started = time.monotonic()
+        path = store_artifact(EXPORT_KIND, key, version, lambda target: write_month_workbook(month_dt, target))
+        logger.info(f"excel_export: выгрузка {key} собрана за {time.monotonic() - started:.1f} c")
+    return path
+
+
+def task_lock_key(month_dt: date, version) -> str:
+    return f"mr:export:{month_dt:%Y-%m}:v{version}:task"
+
+
+def task_state_key(task_id: str) -> str:
+    return f"mr:export:task:{task_id}"
+
+
+def start_month_export(month_dt: date) -> str:
+    """Ставит сборку выгрузки в очередь exports; повторный запрос той же версии получает уже запущенную задачу."""
+    from ..tasks import build_month_export_task
+
+    version = data_version(month_dt)
+    lock_key = task_lock_key(month_dt, version)
+    task_id = str(uuid.uuid4())
+    if not cache.add(lock_key, task_id, TASK_LOCK_TTL):
+        running = cache.get(lock_key)
+        if running:
+            return running
+        cache.set(lock_key, task_id, TASK_LOCK_TTL)
+    cache.set(task_state_key(task_id), {"done": False}, TASK_STATE_TTL)
+    try:
+        build_month_export_task.apply_async(args=[month_dt.isoformat(), version], task_id=task_id)
+    except Exception:
+        cache.delete(lock_key)
+        raise
+    return task_id
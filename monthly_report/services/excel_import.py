@@ -0,0 +1,534 @@
+# monthly_report/services/excel_import.py
+"""
+Загрузка месяца из Excel.
+
+Раньше ExcelUploadForm.process_data обходил лист df.iterrows(): на каждую строку
+— поиск колонок по заголовкам, разбор каждого числа регуляркой, запрос
+спецификации модели и отдельный объект MonthlyReport, всё в потоке запроса.
+
+Теперь загрузка колоночная:
+
+    1. read_sheet   — лист строками (dtype=str), без служебной строки с номерами колонок;
+    2. map_columns  — колонки файла -> поля модели один раз; числа разбираются
+                      целыми колонками (str.extract + to_numeric), ограничения
+                      спецификаций — один раз на уникальную модель, маской;
+    3. validate     — организации по справочнику, диапазоны чисел и длины строк
+                      по колонкам сразу, с номерами строк файла;
+    4. stage        — строки в MonthlyReportStaging: COPY на PostgreSQL,
+                      bulk_create на остальных БД;
+    5. merge        — INSERT ... SELECT из staging в MonthlyReport одним запросом,
+                      затем recompute_month.
+
+Очистка месяца (replace_month), шаги 4-5 и пересчёт идут в одной транзакции:
+ошибка загрузки больше не оставляет месяц пустым.
+
+В фоне загрузку выполняет import_month_excel_task (очередь exports), прогресс
+уходит в WebSocket-группу месяца (событие import_progress) и в кэш для опроса.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import re
+import unicodedata
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from inventory.models import Organization
+
+from ..models import MonthControl, MonthlyReport, MonthlyReportStaging
+from ..specs import allowed_counter_fields, ensure_model_specs, get_spec_for_model_name
+
+logger = logging.getLogger(__name__)
+
+Progress = Callable[[int, str], None]
+
+TEXT_FIELDS = (
+    "organization",
+    "branch",
+    "city",
+    "address",
+    "equipment_model",
+    "serial_number",
+    "inventory_number",
+)
+COUNTER_FIELDS = (
+    "a4_bw_start",
+    "a4_bw_end",
+    "a4_color_start",
+    "a4_color_end",
+    "a3_bw_start",
+    "a3_bw_end",
+    "a3_color_start",
+    "a3_color_end",
+)
+INT_FIELDS = COUNTER_FIELDS + ("non_overdue_requests", "total_requests")
+FLOAT_FIELDS = ("normative_availability", "actual_downtime")
+
+# Верхняя граница PositiveIntegerField
+MAX_INT = 2147483647
+# Сколько ошибок проверки показываем пользователю
+MAX_REPORTED_ERRORS = 50
+# Строк на одну пачку COPY / bulk_create
+STAGE_CHUNK = 5000
+
+
+class UnknownOrganizationsError(Exception):
+    """Raised when uploaded file contains organizations not present in the directory."""
+
+    def __init__(self, unknown: list[str]):
+        self.unknown = unknown
+        super().__init__(f"Unknown organizations: {unknown}")
+
+
+class ImportValidationError(Exception):
+    """Значения файла не помещаются в поля отчёта; errors — сообщения с номерами строк."""
+
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__(f"Invalid rows: {errors[:5]}")
+
+
+def _normalize_org_name(name: str) -> str:
+    """Normalize organization name for matching: NFKC, casefold, collapse whitespace."""
+    if not name:
+        return ""
+    s = unicodedata.normalize("NFKC", str(name))
+    s = s.replace("\xa0", " ").replace("ё", "е").replace("Ё", "Е")
+    s = re.sub(r"\s+", " ", s).strip().casefold()
+    return s
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Заголовки
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def norm_header(s: str) -> str:
+    if s is None:
+        return ""
+    s = unicodedata.normalize("NFKC", str(s)).strip().lower()
+    s = (
+        s.replace("\xa0", " ")
+        .replace("ё", "е")
+        .replace("ч/б", "чб")
+        .replace("№", "no")
+        .replace("а4", "a4")
+        .replace("а3", "a3")
+    )
+    s = re.sub(r"[^a-z0-9а-я]+", "", s)
+    return s
+
+
+# нормализованные заголовки -> поля модели
+ALIASES = {
+    # идентификация
+    "nopp": "order_number",
+    "noпп": "order_number",
+    "организация": "organization",
+    "филиал": "branch",
+    "город": "city",
+    "адрес": "address",
+    "модель": "equipment_model",
+    "модельинаименованиеоборудования": "equipment_model",
+    "серийныйномероборудования": "serial_number",
+    "серийныйномер": "serial_number",
+    "серийныйno": "serial_number",
+    "серийный": "serial_number",
+    "инвномер": "inventory_number",
+    "инвno": "inventory_number",
+    "инв": "inventory_number",
+    # A4 короткие
+    "a4чбначало": "a4_bw_start",
+    "a4чбконец": "a4_bw_end",
+    "a4цветначало": "a4_color_start",
+    "a4цветконец": "a4_color_end",
+    # A4 длинные
+    "показаниесчетчикаa4чбнаначалопериода": "a4_bw_start",
+    "показаниесчетчикаa4чбнаконецпериода": "a4_bw_end",
+    "показаниесчетчикаa4цветныенаначалопериода": "a4_color_start",
+    "показаниесчетчикаa4цветныенаконецпериода": "a4_color_end",
+    # A3 короткие
+    "a3чбначало": "a3_bw_start",
+    "a3чбконец": "a3_bw_end",
+    "a3цветначало": "a3_color_start",
+    "a3цветконец": "a3_color_end",
+    # A3 длинные
+    "показаниесчетчикаa3чбнаначалопериода": "a3_bw_start",
+    "показаниесчетчикаa3чбнаконецпериода": "a3_bw_end",
+    "показаниесчетчикаa3цветныенаначалопериода": "a3_color_start",
+    "показаниесчетчикаa3цветныенаконецпериода": "a3_color_end",
+    # SLA
+    "анорматив": "normative_availability",
+    "dнедоступность": "actual_downtime",
+    "lнепросроченные": "non_overdue_requests",
+    "wобщее": "total_requests",
+    "нормативноевременидоступностиa": "normative_availability",
+    "фактическиевремененедоступностиd": "actual_downtime",
+    "количествонепросроченныхзапросовl": "non_overdue_requests",
+    "общеколичествозапросовw": "total_requests",
+    "итогоотпечатков": None,  # игнорировать колонку из файла
+}
+
+TOKENS = {
+    "a4_bw_start": [["a4"], ["чб", "bw", "моно"], ["начало", "start"]],
+    "a4_bw_end": [["a4"], ["чб", "bw", "моно"], ["конец", "end", "оконч"]],
+    "a4_color_start": [["a4"], ["цвет", "color"], ["начало", "start"]],
+    "a4_color_end": [["a4"], ["цвет", "color"], ["конец", "end", "оконч"]],
+    "a3_bw_start": [["a3"], ["чб", "bw", "моно"], ["начало", "start"]],
+    "a3_bw_end": [["a3"], ["чб", "bw", "моно"], ["конец", "end", "оконч"]],
+    "a3_color_start": [["a3"], ["цвет", "color"], ["начало", "start"]],
+    "a3_color_end": [["a3"], ["цвет", "color"], ["конец", "end", "оконч"]],
+}
+
+# Человекочитаемые названия полей для сообщений об ошибках
+FIELD_LABELS = {field.name: str(field.verbose_name) for field in MonthlyReport._meta.concrete_fields}
+
+
+def find_column(norm_to_real: dict[str, str], field: str) -> str | None:
+    # точные алиасы
+    for norm_name, model_field in ALIASES.items():
+        if model_field == field and norm_name in norm_to_real:
+            return norm_to_real[norm_name]
+    # эвристика токенов
+    tokens = TOKENS.get(field)
+    if not tokens:
+        return None
+    for norm_name, real in norm_to_real.items():
+        if all(any(tok in norm_name for tok in group) for group in tokens):
+            return real
+    return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Чтение и разбор
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def read_sheet(source) -> pd.DataFrame:
+    """
+    Первый лист строками. Колонка _excel_row — номер строки в файле (для ошибок).
+
+    Возможная первая "служебная" строка с порядковыми номерами колонок ("1 2 3 ... N")
+    отбрасывается. Проверка строгая: ключевые текстовые поля (организация, модель,
+    серийник) одновременно состоят из короткого числа или пусты — у реального принтера
+    хотя бы одно из них почти всегда содержит буквы, поэтому ложного срабатывания не будет.
+    """
+    df = pd.read_excel(source, sheet_name=0, dtype=str, keep_default_na=False)
+    excel_rows = np.arange(len(df)) + 2  # строка 1 — заголовки
+    if len(df) > 0:
+        norm_to_real = {norm_header(c): c for c in df.columns}
+        first = df.iloc[0].astype(str).str.strip()
+        short_num = first.str.fullmatch(r"\d{1,3}")
+        key_cols = [find_column(norm_to_real, f) for f in ("organization", "equipment_model", "serial_number")]
+        key_cols = [c for c in key_cols if c is not None]
+        keys_look_numeric = bool(key_cols) and all(first.get(c, "") == "" or short_num.get(c, False) for c in key_cols)
+        only_numbers = short_num.sum() >= max(4, min(8, len(df.columns) // 2))
+        if keys_look_numeric and only_numbers:
+            df = df.iloc[1:].reset_index(drop=True)
+            excel_rows = excel_rows[1:]
+    df["_excel_row"] = excel_rows
+    return df
+
+
+_NUMBER_RE = r"(-?\d+(?:\.\d+)?)"
+
+
+def _numbers(column: pd.Series) -> pd.Series:
+    """Первое число в каждой ячейке: пробелы убираются, запятая — десятичный разделитель; нет числа — 0."""
+    cleaned = column.astype(str).str.replace(" ", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(cleaned.str.extract(_NUMBER_RE, expand=False), errors="coerce").fillna(0.0)
+
+
+def map_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Колонки файла -> поля MonthlyReport. Целые остаются float64 (с отброшенной дробной
+    частью) до validate — так переполнение видно до приведения типа.
+    """
+    norm_to_real = {norm_header(c): c for c in df.columns if c != "_excel_row"}
+    out = pd.DataFrame(index=df.index)
+    out["_excel_row"] = df["_excel_row"]
+
+    def source(field):
+        column = find_column(norm_to_real, field)
+        return df[column] if column is not None else None
+
+    for field in TEXT_FIELDS:
+        column = source(field)
+        out[field] = column.astype(str).str.strip() if column is not None else ""
+    for field in ("order_number",) + INT_FIELDS:
+        column = source(field)
+        out[field] = np.trunc(_numbers(column)) if column is not None else 0.0
+    for field in FLOAT_FIELDS:
+        column = source(field)
+        out[field] = _numbers(column) if column is not None else 0.0
+
+    # № п/п: пусто или 0 — позиция строки
+    out["order_number"] = out["order_number"].mask(out["order_number"] == 0, np.arange(len(out)) + 1.0)
+
+    # ---- применяем ограничения «справочника моделей» (одна проверка на модель) ----
+    for model_name in out["equipment_model"].unique():
+        allowed = allowed_counter_fields(get_spec_for_model_name(model_name))  # полный набор, если правил нет
+        denied = [field for field in COUNTER_FIELDS if field not in allowed]
+        if denied:
+            out.loc[out["equipment_model"] == model_name, denied] = 0.0
+
+    # базовый total = A4 + A3 (точные «раскладки» сделает recompute_month)
+    out["total_prints"] = sum(
+        (out[f"{fmt}_end"] - out[f"{fmt}_start"]).clip(lower=0) for fmt in ("a4_bw", "a4_color", "a3_bw", "a3_color")
+    )
+
+    # пропустить полностью пустые строки
+    filled = out[["organization", "equipment_model", "serial_number", "inventory_number"]].ne("").any(axis=1)
+    filled |= out[list(INT_FIELDS + FLOAT_FIELDS)].ne(0).any(axis=1)
+    return out[filled].reset_index(drop=True)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Проверка
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def check_organizations(rows: pd.DataFrame) -> None:
+    """Организации файла должны быть в справочнике inventory.Organization."""
+    names = rows["organization"][rows["organization"] != ""].drop_duplicates()
+    if names.empty:
+        return
+    normalized = names.map(_normalize_org_name)
+    known = {_normalize_org_name(n) for n in Organization.objects.values_list("name", flat=True)}
+    unknown = sorted(set(names[~normalized.isin(known) & (normalized != "")]))
+    if unknown:
+        raise UnknownOrganizationsError(unknown)
+
+
+def validate(rows: pd.DataFrame) -> None:
+    """Значения, которые не поместятся в поля MonthlyReport, — по колонкам целиком."""
+    errors: List[tuple] = []
+
+    def report(mask: pd.Series, message: str) -> None:
+        for excel_row in rows.loc[mask, "_excel_row"].head(MAX_REPORTED_ERRORS):
+            errors.append((int(excel_row), message))
+
+    for field in ("order_number",) + INT_FIELDS:
+        label = FIELD_LABELS[field]
+        report(rows[field] < 0, f"отрицательное значение в «{label}»")
+        report(rows[field] > MAX_INT, f"слишком большое значение в «{label}»")
+    for field in TEXT_FIELDS:
+        max_length = MonthlyReport._meta.get_field(field).max_length
+        report(rows[field].str.len() > max_length, f"«{FIELD_LABELS[field]}» длиннее {max_length} символов")
+
+    if errors:
+        errors.sort()
+        raise ImportValidationError([f"Строка {row}: {message}" for row, message in errors[:MAX_REPORTED_ERRORS]])
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Staging и перенос в MonthlyReport
+# ──────────────────────────────────────────────────────────────────────────────
+
+STAGED_FIELDS = ("order_number",) + TEXT_FIELDS + INT_FIELDS + ("total_prints",) + FLOAT_FIELDS
+
+
+def _staging_frame(rows: pd.DataFrame, batch: uuid.UUID) -> pd.DataFrame:
+    frame = rows[list(STAGED_FIELDS)].copy()
+    for field in ("order_number", "total_prints") + INT_FIELDS:
+        frame[field] = frame[field].astype("int64")
+    frame.insert(0, "row_number", np.arange(len(frame)) + 1)
+    frame.insert(0, "batch", str(batch))
+    return frame
+
+
+def stage(rows: pd.DataFrame, batch: uuid.UUID, progress: Progress) -> None:
+    frame = _staging_frame(rows, batch)
+    total = len(frame)
+    for start in range(0, total, STAGE_CHUNK):
+        chunk = frame.iloc[start : start + STAGE_CHUNK]
+        if connection.vendor == "postgresql":
+            _copy_chunk(chunk)
+        else:
+            MonthlyReportStaging.objects.bulk_create(
+                [MonthlyReportStaging(**record) for record in chunk.to_dict("records")], batch_size=1000
+            )
+        done = min(start + STAGE_CHUNK, total)
+        progress(40 + int(30 * done / total), f"Загружено строк: {done} из {total}")
+
+
+def _copy_chunk(chunk: pd.DataFrame) -> None:
+    """COPY в staging из CSV: строки в кавычках (пустая строка — не NULL), числа как есть."""
+    buf = io.StringIO()
+    chunk.to_csv(buf, index=False, header=False, quoting=csv.QUOTE_NONNUMERIC)
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(MonthlyReportStaging._meta.get_field(name).column) for name in chunk.columns)
+    with connection.cursor() as cursor:
+        with cursor.copy(
+            f"COPY {qn(MonthlyReportStaging._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+        ) as copy:
+            copy.write(buf.getvalue())
+
+
+def merge(batch: uuid.UUID, month: date) -> int:
+    """
+    INSERT ... SELECT пачки из staging в MonthlyReport в порядке файла. Поля, которых нет
+    в staging, получают значения по умолчанию модели. Returns: число вставленных строк.
+    """
+    qn = connection.ops.quote_name
+    columns, select, params = [], [], []
+    for field in MonthlyReport._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        columns.append(qn(field.column))
+        if field.name == "month":
+            select.append("%s")
+            params.append(field.get_db_prep_value(month, connection))
+        elif field.name in STAGED_FIELDS:
+            select.append(qn(MonthlyReportStaging._meta.get_field(field.name).column))
+        else:
+            select.append("%s")
+            params.append(field.get_db_prep_save(field.get_default(), connection))
+    params.append(MonthlyReportStaging._meta.get_field("batch").get_db_prep_value(batch, connection))
+
+    sql = (
+        f"INSERT INTO {qn(MonthlyReport._meta.db_table)} ({', '.join(columns)}) "
+        f"SELECT {', '.join(select)} FROM {qn(MonthlyReportStaging._meta.db_table)} "
+        f"WHERE {qn('batch')} = %s ORDER BY {qn('row_number')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        inserted = cursor.rowcount
+    MonthlyReportStaging.objects.filter(batch=batch).delete()
+    return inserted
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Загрузка целиком
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _noop_progress(percent, message):
+    pass
+
+
+def import_month(source, month: date, replace_month: bool = False, progress: Optional[Progress] = None) -> int:
+    """
+    Загружает лист Excel в месяц month. Returns: число загруженных строк.
+
+    Raises:
+        UnknownOrganizationsError, ImportValidationError — файл не загружен, месяц не тронут.
+    """
+    progress = progress or _noop_progress
+    month = month.replace(day=1)
+
+    progress(5, "Чтение файла…")
+    df = read_sheet(source)
+    progress(20, f"Разбор строк: {len(df)}")
+    rows = map_columns(df)
+    # Проверка организаций — после среза служебной строки, чтобы её фиктивные значения
+    # (например, порядковые номера колонок) не попали в список "неизвестных"
+    check_organizations(rows)
+    validate(rows)
+    progress(35, f"Проверено строк: {len(rows)}")
+
+    from . import month_metrics, recompute_month
+
+    batch = uuid.uuid4()
+    with transaction.atomic():
+        if replace_month:
+            progress(38, "Очистка месяца…")
+            MonthlyReport.objects.filter(month=month).delete()
+        if rows.empty:
+            return 0
+
+        # 1) Для всех новых моделей создадим «свободные» правила (разрешено всё)
+        ensure_model_specs(set(rows["equipment_model"]), enforce=False)
+
+        # 2) Сохраняем строки отчёта через staging
+        stage(rows, batch, progress)
+        progress(72, "Перенос строк в отчёт…")
+        inserted = merge(batch, month)
+
+        # 3) Пересчитываем раскладку total_prints; строки пришли мимо сигналов — метрики месяца пересоберутся
+        progress(80, "Пересчёт итогов месяца…")
+        recompute_month(month)
+        month_metrics.invalidate(month)
+
+    logger.info(f"excel_import: {month:%Y-%m} загружено {inserted} строк")
+    return inserted
+
+
+def apply_month_control(month: date, edit_until, is_published: bool) -> None:
+    """Режим редактирования и публикация месяца; edit_until = None — месяц закрыт."""
+    mc, _ = MonthControl.objects.get_or_create(month=month.replace(day=1))
+    mc.edit_until = edit_until
+    mc.is_published = is_published
+    mc.save(update_fields=["edit_until", "is_published"])
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Фоновая загрузка
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Сколько держим состояние задачи для опроса фронтом
+TASK_STATE_TTL = 60 * 60
+
+
+def import_state_key(task_id: str) -> str:
+    return f"mr:import:task:{task_id}"
+
+
+def month_group(month: date) -> str:
+    """WebSocket-группа месяца (MonthlyReportConsumer)."""
+    return f"monthly_report_{month.year}_{month.month:02d}"
+
+
+def report_progress(task_id: str, month: date, percent: int, message: str, done: bool = False, **extra) -> None:
+    """
+    Состояние загрузки: в кэш (для опроса upload/status/<task_id>/) и событием
+    import_progress в WebSocket-группу месяца. Недоступный канальный слой загрузку не прерывает.
+    """
+    state = {"percent": max(0, min(100, int(percent))), "message": message, "done": done, **extra}
+    cache.set(import_state_key(task_id), state, TASK_STATE_TTL)
+    try:
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(
+                month_group(month), {"type": "import_progress", "task_id": task_id, **state}
+            )
+    except Exception as e:
+        logger.warning(f"excel_import: не удалось отправить прогресс загрузки {task_id}: {e}")
+
+
+def save_upload(uploaded) -> Path:
+    """Сохраняет загруженный файл в IMPORT_UPLOAD_DIR — его прочтёт воркер Celery."""
+    upload_dir = Path(settings.IMPORT_UPLOAD_DIR)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    path = upload_dir / f"{uuid.uuid4()}.xlsx"
+    with open(path, "wb") as fh:
+        for chunk in uploaded.chunks():
+            fh.write(chunk)
+    return path
+
+
+def start_month_import(path: Path, month: date, options: Dict, bulk_log_id: int) -> str:
+    """
+    Ставит загрузку в очередь exports. options — replace_month, allow_edit,
+    edit_until (ISO или None), is_published. Returns: task_id.
+    """
+    from ..tasks import import_month_excel_task
+
+    task_id = str(uuid.uuid4())
+    cache.set(import_state_key(task_id), {"percent": 0, "message": "В очереди…", "done": False}, TASK_STATE_TTL)
+    import_month_excel_task.apply_async(args=[str(path), month.isoformat(), options, bulk_log_id], task_id=task_id)
+    return task_id
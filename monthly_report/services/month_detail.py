@@ -0,0 +1,131 @@
+# monthly_report/services/month_detail.py
+"""
+Поиск и пагинация для api_month_detail.
+
+Раньше выдача месяца загружала и сериализовала все строки месяца (с аномалиями,
+дублями, спецификациями) на каждый запрос — в том числе на каждое нажатие
+клавиши в поиске — и только потом резала страницу Paginator'ом.
+
+Теперь, если не включён фильтр show_unfilled (он считается в Python), страница
+режется в SQL и сериализуется только она:
+
+    - page=N      — COUNT + LIMIT/OFFSET, как раньше для клиента;
+    - cursor=...  — keyset: WHERE (поле, id) > (последняя строка), без OFFSET;
+                    next_cursor в ответе ведёт на следующую страницу.
+
+Порядок всегда дополняется id, чтобы страницы не перекрывались при равных
+значениях сортировки. Сортировка по умолчанию (№ п/п) идёт по индексу
+mr_month_ord.
+
+Общий поиск q — icontains по семи текстовым полям. На PostgreSQL это
+UPPER(поле) LIKE UPPER('%q%'), и под каждое поле есть GIN-индекс pg_trgm по
+UPPER(поле) (миграция 0015) — планировщик объединяет его с индексом месяца.
+На SQLite (тесты) тот же запрос выполняется обычным сканированием.
+
+Количество для больших выборок можно получить оценкой планировщика
+(count=approx, по умолчанию для cursor): точный COUNT(*) считается, только
+если оценка меньше APPROX_COUNT_THRESHOLD.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+from typing import List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = (
+    "organization",
+    "branch",
+    "city",
+    "address",
+    "equipment_model",
+    "serial_number",
+    "inventory_number",
+)
+
+# Меньше этой оценки планировщика считаем точно
+APPROX_COUNT_THRESHOLD = 10000
+
+
+def search_q(q: str) -> Q:
+    """Общий поиск по текстовым полям строки (под каждое поле — trigram-индекс на PostgreSQL)."""
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f"{field}__icontains": q})
+    return condition
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Keyset-пагинация
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def encode_cursor(value, report_id: int) -> str:
+    raw = json.dumps([value, report_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[object, int]]:
+    """None — курсор повреждён (начинаем с первой страницы)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, report_id = json.loads(raw)
+        return value, int(report_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def ordered(qs, sort_field: str, descending: bool):
+    """Сортировка выдачи с id для однозначного порядка."""
+    return qs.order_by(f"-{sort_field}" if descending else sort_field, "id")
+
+
+def keyset_page(
+    qs, sort_field: str, descending: bool, cursor: Optional[str], per_page: int
+) -> Tuple[List, Optional[str]]:
+    """
+    Страница после курсора в порядке ordered().
+
+    Returns:
+        (строки страницы, курсор следующей страницы или None)
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        value, last_id = position
+        after = Q(**{f"{sort_field}__lt" if descending else f"{sort_field}__gt": value})
+        qs = qs.filter(after | Q(**{sort_field: value, "id__gt": last_id}))
+
+    rows = list(ordered(qs, sort_field, descending)[: per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_field), last.id)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Количество
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def approximate_count(qs) -> Tuple[int, bool]:
+    """
+    Returns:
+        (количество, это оценка) — на PostgreSQL оценка планировщика для больших выборок,
+        иначе точный COUNT(*).
+    """
+    if connection.vendor == "postgresql":
+        try:
+            plan = json.loads(qs.order_by().values("id").explain(format="json"))
+            estimate = int(plan[0]["Plan"]["Plan Rows"])
+            if estimate >= APPROX_COUNT_THRESHOLD:
+                return estimate, True
+        except Exception as e:
+            logger.warning(f"month_detail: не удалось оценить количество строк: {e}")
+    return qs.count(), False
@@ -0,0 +1,218 @@
+# monthly_report/services/month_metrics.py
+"""
+Метрики месяца (процент заполненности, автозаполнения, число пользователей)
+на сырых счётчиках MonthMetrics.
+
+Раньше _calculate_month_metrics на каждый промах кэша обходил все строки
+месяца, а результат кэшировался на час отдельно для каждой комбинации прав;
+invalidate_month_metrics_cache сбрасывал только четыре известные комбинации.
+
+Теперь для месяца хранится гистограмма строк по сигнатуре — от прав она не
+зависит:
+
+    "<разрешено>:<пусто>:<вручную>:<положительно>:<есть IP>"
+
+где первые четыре — битовые маски end-полей (END_COUNTER_FIELDS): разрешённые
+группой дублей и спецификацией модели, равные 0, с флагом _manual, больше 0.
+Метрики для прав пользователя — проекция гистограммы (project), несколько
+десятков сигнатур вместо тысяч строк.
+
+Счётчики обновляются дельтами: сигнал post_save MonthlyReport (правка ячейки,
+синхронизация с inventory) и apply_pending опросов переносят строку из старой
+сигнатуры в новую, новая запись CounterChangeLog добавляет пользователя.
+Смена группы дублей, создание и удаление строк, загрузка Excel и изменение
+спецификаций сбрасывают счётчики месяца — они пересоберутся при чтении.
+check_month_metrics сверяет счётчики с полным пересчётом.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from types import SimpleNamespace
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+
+from ..models import END_COUNTER_FIELDS, METRIC_FIELDS, CounterChangeLog, MonthlyReport, MonthMetrics
+from ..specs import allowed_counter_fields, get_spec_for_model_name
+from .duplicate_index import get_duplicate_index
+
+logger = logging.getLogger(__name__)
+
+_DUP_A4 = {"a4_bw_end", "a4_color_end"}
+_DUP_A3 = {"a3_bw_end", "a3_color_end"}
+
+
+def _mask(fields: Iterable[str]) -> int:
+    fields = set(fields)
+    return sum(1 << bit for bit, name in enumerate(END_COUNTER_FIELDS) if name in fields)
+
+
+def signature(report, dup_position: Optional[int]) -> str:
+    """Сигнатура строки; dup_position — позиция в группе дублей (None — не дубль)."""
+    allowed = set(END_COUNTER_FIELDS)
+    if dup_position is not None:
+        allowed &= _DUP_A4 if dup_position == 0 else _DUP_A3
+    allowed_by_spec = allowed_counter_fields(get_spec_for_model_name(report.equipment_model))
+    if allowed_by_spec:
+        allowed &= allowed_by_spec
+
+    values = {name: getattr(report, name, 0) or 0 for name in END_COUNTER_FIELDS}
+    return ":".join(
+        str(part)
+        for part in (
+            _mask(allowed),
+            _mask(name for name, value in values.items() if value == 0),
+            _mask(name for name in END_COUNTER_FIELDS if getattr(report, f"{name}_manual", False)),
+            _mask(name for name, value in values.items() if value > 0),
+            int(bool(report.device_ip)),
+        )
+    )
+
+
+def project(counts: Dict, allowed_by_perm) -> Dict:
+    """Метрики для набора полей, разрешённых правами пользователя."""
+    perm = _mask(allowed_by_perm)
+    total = filled = with_ip = auto_filled = 0
+    for sig, n in counts["rows"].items():
+        allowed, zero, manual, positive, has_ip = map(int, sig.split(":"))
+        allowed &= perm
+        total += n
+        if not zero & allowed:
+            filled += n
+        if has_ip:
+            with_ip += n
+            # Заполнено автоматически: ни одно разрешённое поле не правили вручную и хоть одно > 0
+            if allowed and not manual & allowed and positive & allowed:
+                auto_filled += n
+
+    def percent(part):
+        return round(part / total * 100, 1) if total else None
+
+    return {
+        "completion_percentage": percent(filled),
+        "unique_users_count": len(counts["users"]),
+        "auto_fill_potential_percentage": percent(with_ip),
+        "auto_fill_actual_percentage": percent(auto_filled),
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Сборка и чтение
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def compute(month) -> Dict:
+    """Полный пересчёт счётчиков месяца по строкам."""
+    index = get_duplicate_index(month)
+    rows = Counter()
+    for report in MonthlyReport.objects.filter(month=month).only("id", *METRIC_FIELDS):
+        dup = index.lookup(report.id)
+        rows[signature(report, dup.position if dup else None)] += 1
+    users = list(
+        CounterChangeLog.objects.filter(monthly_report__month=month)
+        .order_by()
+        .values_list("user", flat=True)
+        .distinct()
+    )
+    return {"rows": dict(rows), "users": users}
+
+
+@transaction.atomic
+def rebuild(month) -> Dict:
+    # Блокировка строки до чтения отчётов: дельты параллельных транзакций ждут пересборку
+    metrics, _ = MonthMetrics.objects.select_for_update().get_or_create(month=month)
+    metrics.counts = compute(month)
+    metrics.save(update_fields=["counts", "updated_at"])
+    return metrics.counts
+
+
+def get_counts(month) -> Dict:
+    counts = MonthMetrics.objects.filter(month=month).values_list("counts", flat=True).first()
+    if counts is None:
+        logger.debug(f"month_metrics: пересборка счётчиков {month}")
+        counts = rebuild(month)
+    return counts
+
+
+def get_month_metrics(month, allowed_by_perm) -> Dict:
+    return project(get_counts(month), allowed_by_perm)
+
+
+def verify(month) -> Optional[Dict]:
+    """Сверка хранимых счётчиков с полным пересчётом. Returns: None — совпадают, иначе {"stored", "actual"}."""
+    stored = MonthMetrics.objects.filter(month=month).values_list("counts", flat=True).first()
+    if stored is None:
+        return None
+    actual = compute(month)
+    if stored["rows"] == actual["rows"] and set(stored["users"]) == set(actual["users"]):
+        return None
+    return {"stored": stored, "actual": actual}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Обновление
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def invalidate(month) -> None:
+    """Счётчики месяца пересоберутся при следующем чтении."""
+    MonthMetrics.objects.filter(month=month, counts__isnull=False).update(counts=None)
+
+
+def invalidate_all() -> None:
+    """Изменились спецификации моделей — разрешённые поля могли поменяться во всех месяцах."""
+    MonthMetrics.objects.filter(counts__isnull=False).update(counts=None)
+
+
+def apply_delta(month, removed: Counter, added: Counter, users: Iterable = ()) -> None:
+    """Переносит строки между сигнатурами и добавляет пользователей журнала."""
+    users = list(users)
+    if removed == added and not users:
+        return
+    with transaction.atomic():
+        metrics = MonthMetrics.objects.select_for_update().filter(month=month).first()
+        if metrics is None or metrics.counts is None:
+            return
+
+        rows = Counter(metrics.counts["rows"])
+        rows.subtract(removed)
+        rows.update(added)
+        if any(n < 0 for n in rows.values()):
+            logger.warning(f"month_metrics: расхождение счётчиков {month}, пересобираем при чтении")
+            metrics.counts = None
+        else:
+            known = metrics.counts["users"]
+            new_users = [user for user in dict.fromkeys(users) if user not in known]
+            if removed == added and not new_users:
+                return
+            metrics.counts = {"rows": {sig: n for sig, n in rows.items() if n}, "users": known + new_users}
+        metrics.save(update_fields=["counts", "updated_at"])
+
+
+def add_user(month, user_id) -> None:
+    apply_delta(month, Counter(), Counter(), users=[user_id])
+
+
+def invalidate_for_report(report_id) -> None:
+    MonthMetrics.objects.filter(
+        month__in=MonthlyReport.objects.filter(pk=report_id).values("month"), counts__isnull=False
+    ).update(counts=None)
+
+
+def on_report_changed(report) -> None:
+    """Строка сохранена без смены группы дублей: перенос между сигнатурами."""
+    old = report.loaded_state(METRIC_FIELDS)
+    if old is None:
+        invalidate(report.month)
+        return
+    if old == report.current_state(METRIC_FIELDS):
+        return
+
+    dup = get_duplicate_index(report.month).lookup(report.id)
+    position = dup.position if dup else None
+    before = signature(SimpleNamespace(**dict(zip(METRIC_FIELDS, old))), position)
+    after = signature(report, position)
+    if before != after:
+        apply_delta(report.month, Counter([before]), Counter([after]))
@@ -0,0 +1,175 @@
+# monthly_report/services/serial_stats.py
+"""
+Накопительная статистика печати по серийникам (SerialPrintStats) для аномалий.
+
+_annotate_anomalies_api и MonthlyReport.get_historical_average считали среднее
+total_prints серийника по всем предыдущим месяцам — скан, растущий с историей.
+Теперь история до месяца M — последняя строка SerialPrintStats серийника с
+month < M (одна строка на серийник по индексу serial_key, month) плюс живой
+агрегат по месяцам после последнего свёрнутого (обычно только открытые).
+
+Сворачиваются только закрытые месяцы, и только префиксом: все месяцы раньше
+первого открытого (MonthControl.edit_until > now). Открытый месяц меняется
+при редактировании и опросах, поэтому в статистику попадает при закрытии:
+ежедневной задачей refresh_serial_stats_task или сразу при сохранении
+MonthControl. recompute_month и удаление месяца пересобирают статистику
+с этого месяца.
+
+Ключ серийника — UPPER(TRIM(serial_number)), как при группировке дублей.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.db import models, transaction
+from django.db.models import Count, ExpressionWrapper, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Trim, Upper
+from django.utils import timezone
+
+from ..models import MonthControl, MonthlyReport, SerialPrintStats
+
+logger = logging.getLogger(__name__)
+
+
+def serial_key(serial: Optional[str]) -> str:
+    return (serial or "").strip().upper()
+
+
+def _with_serial_key(qs):
+    return qs.annotate(serial_key=Upper(Trim("serial_number"))).exclude(serial_key="")
+
+
+def _first_open_month():
+    return (
+        MonthControl.objects.filter(edit_until__gt=timezone.now()).order_by("month").values_list("month", flat=True)
+    ).first()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Чтение
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def historical_totals(serials: Iterable[str], month) -> Dict[str, Tuple[int, int]]:
+    """
+    История печати серийников за все месяцы раньше month.
+
+    Returns:
+        {serial_key: (количество записей, сумма total_prints)} — только для серийников с историей.
+    """
+    keys = {serial_key(sn) for sn in serials} - {""}
+    if not keys:
+        return {}
+
+    rolled_up_to = SerialPrintStats.objects.filter(month__lt=month).aggregate(last=Max("month"))["last"]
+
+    result = {}
+    if rolled_up_to:
+        latest = (
+            SerialPrintStats.objects.filter(serial_key=OuterRef("serial_key"), month__lt=month)
+            .order_by("-month")
+            .values("month")[:1]
+        )
+        for key, count, total in SerialPrintStats.objects.filter(
+            serial_key__in=keys, month=Subquery(latest)
+        ).values_list("serial_key", "count", "total"):
+            result[key] = (count, total)
+
+    # Месяцы после последнего свёрнутого (открытые или ещё не свёрнутые)
+    tail = MonthlyReport.objects.filter(month__lt=month)
+    if rolled_up_to:
+        tail = tail.filter(month__gt=rolled_up_to)
+    for row in (
+        _with_serial_key(tail)
+        .filter(serial_key__in=keys)
+        .values("serial_key")
+        .annotate(count=Count("id"), total=Sum("total_prints"))
+    ):
+        count, total = result.get(row["serial_key"], (0, 0))
+        result[row["serial_key"]] = (count + row["count"], total + row["total"])
+
+    return result
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Сворачивание
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def refresh_serial_stats(from_month=None) -> int:
+    """
+    Пересобирает статистику начиная с from_month (None — только ещё не свёрнутые месяцы).
+
+    Свёрнутыми остаются только закрытые месяцы раньше первого открытого;
+    строки за открытые и более поздние месяцы удаляются.
+
+    Returns:
+        Количество свёрнутых месяцев.
+    """
+    first_open = _first_open_month()
+
+    with transaction.atomic():
+        if from_month is None:
+            last = SerialPrintStats.objects.aggregate(last=Max("month"))["last"]
+            months = MonthlyReport.objects.filter(month__gt=last) if last else MonthlyReport.objects.all()
+        else:
+            SerialPrintStats.objects.filter(month__gte=from_month).delete()
+            months = MonthlyReport.objects.filter(month__gte=from_month)
+        if first_open:
+            # Открытый месяц (в том числе переоткрытый) и всё после него не сворачиваем
+            SerialPrintStats.objects.filter(month__gte=first_open).delete()
+            months = months.filter(month__lt=first_open)
+
+        months = list(months.values_list("month", flat=True).distinct().order_by("month"))
+        if not months:
+            return 0
+
+        running = _running_totals_before(months[0])
+        square = ExpressionWrapper(F("total_prints") * F("total_prints"), output_field=models.BigIntegerField())
+        for month in months:
+            rows = []
+            for row in (
+                _with_serial_key(MonthlyReport.objects.filter(month=month))
+                .values("serial_key")
+                .annotate(count=Count("id"), total=Sum("total_prints"), total_sq=Sum(square))
+            ):
+                count, total, total_sq = running.get(row["serial_key"], (0, 0, 0))
+                running[row["serial_key"]] = stats = (
+                    count + row["count"],
+                    total + row["total"],
+                    total_sq + row["total_sq"],
+                )
+                rows.append(
+                    SerialPrintStats(
+                        serial_key=row["serial_key"], month=month, count=stats[0], total=stats[1], total_sq=stats[2]
+                    )
+                )
+            SerialPrintStats.objects.bulk_create(rows, batch_size=1000)
+
+    logger.info(f"refresh_serial_stats: свёрнуто месяцев {len(months)} ({months[0]} — {months[-1]})")
+    return len(months)
+
+
+def _running_totals_before(month) -> Dict[str, Tuple[int, int, int]]:
+    """Последняя накопленная строка каждого серийника до month."""
+    latest = (
+        SerialPrintStats.objects.filter(serial_key=OuterRef("serial_key"), month__lt=month)
+        .order_by("-month")
+        .values("month")[:1]
+    )
+    return {
+        key: (count, total, total_sq)
+        for key, count, total, total_sq in SerialPrintStats.objects.filter(
+            month__lt=month, month=Subquery(latest)
+        ).values_list("serial_key", "count", "total", "total_sq")
+    }
+
+
+def on_month_changed(month) -> None:
+    """Данные месяца изменились (пересчёт, загрузка, удаление): пересобрать статистику с него."""
+    if SerialPrintStats.objects.filter(month__gte=month).exists():
+        refresh_serial_stats(from_month=month)
+    else:
+        refresh_serial_stats()
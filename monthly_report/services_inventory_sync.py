@@ -1,11 +1,10 @@
 from __future__ import annotations
 
 import logging
-from collections import defaultdict
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from datetime import timezone as dt_timezone
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, Optional, Set, Tuple
 
 from django.core.cache import cache
 from django.db import transaction
@@ -13,6 +12,7 @@ from django.utils import timezone
 
 from .models import MonthlyReport
 from .services import recompute_group
+from .services.duplicate_index import get_duplicate_index
 
 logger = logging.getLogger(__name__)
 
@@ -44,28 +44,6 @@ class SyncStats:
     manually_edited_skipped: int = 0
 
 
-def _get_duplicate_groups(reports: List[MonthlyReport]) -> Dict[Tuple[str, str], List[MonthlyReport]]:
-    """
-    Группирует записи по (serial_number, inventory_number) и находит дубли.
-    Возвращает только группы с 2+ записями.
-    """
-    groups = defaultdict(list)
-
-    for r in reports:
-        sn = (r.serial_number or "").strip()
-        inv = (r.inventory_number or "").strip()
-        if not sn and not inv:
-            continue
-        groups[(sn, inv)].append(r)
-
-    # Сортируем записи внутри каждой группы по order_number и id
-    for key in groups:
-        groups[key].sort(key=lambda x: (x.order_number, x.id))
-
-    # Оставляем только группы с дублями
-    return {k: v for k, v in groups.items() if len(v) >= 2}
-
-
 def _assign_autofields(
     report: MonthlyReport,
     start: Optional[Dict],
@@ -225,13 +203,13 @@ def _sync_month_internal(month_dt: date, *, only_empty: bool) -> Dict:
         }
 
     # ====== ОПРЕДЕЛЯЕМ ДУБЛИ ======
-    duplicate_groups = _get_duplicate_groups(reports_list)
+    duplicate_groups = get_duplicate_index(reports_list[0].month).groups
 
     # Создаем маппинг report.id -> (is_duplicate, position)
     report_dup_info = {}
-    for (sn, inv), group_reports in duplicate_groups.items():
-        for position, report in enumerate(group_reports):
-            report_dup_info[report.id] = {"is_duplicate": True, "position": position, "group_size": len(group_reports)}
+    for group_ids in duplicate_groups.values():
+        for position, report_id in enumerate(group_ids):
+            report_dup_info[report_id] = {"is_duplicate": True, "position": position, "group_size": len(group_ids)}
 
     logger.info(
         f"Найдено {len(duplicate_groups)} групп дублей "
@@ -1,9 +1,16 @@
+import logging
+
 from django.apps import apps
+from django.db import transaction
+from django.db.models import DEFERRED
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from .integrations.inventory_hooks import on_inventory_snapshot_saved
-from .models import CounterChangeLog, MonthlyReport
+from .models import DUP_KEY_FIELDS, TRACKED_FIELDS, CounterChangeLog, MonthControl, MonthlyReport
+from .models_modelspec import PrinterModelSpec
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=None)
@@ -36,27 +43,89 @@ def connect_signals():
         pass
 
 
-# Инвалидация кэша метрик месяца при изменении данных
+# Метрики месяца: журнал изменений добавляет пользователя
+@receiver(post_save, sender=CounterChangeLog)
+def update_metrics_on_changelog(sender, instance, created, **kwargs):
+    from .services import month_metrics
+
+    if created:
+        month_metrics.add_user(instance.monthly_report.month, instance.user_id)
+
+
+@receiver(post_delete, sender=CounterChangeLog)
+def invalidate_metrics_on_changelog_delete(sender, instance, **kwargs):
+    from .services import month_metrics
+
+    month_metrics.invalidate_for_report(instance.monthly_report_id)
+
+
+def enqueue_serial_stats_refresh():
+    """Ставит пересборку SerialPrintStats в очередь после коммита; недоступный брокер не ломает запрос."""
+    from .tasks import refresh_serial_stats_task
+
+    def _enqueue():
+        try:
+            refresh_serial_stats_task.delay()
+        except Exception as e:
+            # Ежедневный refresh_serial_stats_task всё равно догонит свёртку
+            logger.warning(f"refresh_serial_stats_task not queued: {e}")
+
+    transaction.on_commit(_enqueue)
+
+
+# Открытие/закрытие месяца меняет набор свёрнутых в SerialPrintStats месяцев;
+# смена is_published/auto_sync_enabled на свёртку не влияет
+@receiver(post_save, sender=MonthControl)
+def refresh_serial_stats_on_month_control(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and "edit_until" not in update_fields):
+        return
+    loaded = getattr(instance, "_loaded_edit_until", DEFERRED)
+    instance._loaded_edit_until = instance.edit_until
+    if not created and loaded is not DEFERRED and loaded == instance.edit_until:
+        return
+    enqueue_serial_stats_refresh()
+
+
+@receiver(post_delete, sender=MonthControl)
+def refresh_serial_stats_on_month_control_delete(sender, instance, **kwargs):
+    enqueue_serial_stats_refresh()
+
+
+# Индекс групп дублей и метрики месяца: сравниваем ключевые поля строки до и после save
 @receiver(post_save, sender=MonthlyReport)
+def track_report_changes(sender, instance, created, update_fields=None, **kwargs):
+    from .services import duplicate_index, excel_export, month_metrics
+
+    excel_export.touch(instance.month)
+    if update_fields and not set(update_fields) & set(TRACKED_FIELDS):
+        return
+
+    new_key = instance.current_state(DUP_KEY_FIELDS)
+    old_key = None if created else instance.loaded_state(DUP_KEY_FIELDS) or duplicate_index.UNKNOWN
+    if old_key != new_key:
+        duplicate_index.on_report_changed(old_key, new_key)
+        # Позиции соседей по группе сдвинулись — метрики месяца проще пересобрать
+        month_metrics.invalidate(instance.month)
+        if old_key and old_key is not duplicate_index.UNKNOWN and old_key[0] != instance.month:
+            month_metrics.invalidate(old_key[0])
+    else:
+        month_metrics.on_report_changed(instance)
+    instance.remember_state()
+
+
 @receiver(post_delete, sender=MonthlyReport)
-def invalidate_metrics_on_report_change(sender, instance, **kwargs):
-    """
-    Инвалидирует кэш метрик месяца при изменении/удалении записи отчета
-    """
-    from .views import invalidate_month_metrics_cache
+def track_report_delete(sender, instance, **kwargs):
+    from .services import duplicate_index, excel_export, month_metrics
 
-    if instance.month:
-        invalidate_month_metrics_cache(instance.month)
+    excel_export.touch(instance.month)
+    duplicate_index.on_report_changed(instance.current_state(DUP_KEY_FIELDS), None)
+    month_metrics.invalidate(instance.month)
 
 
-@receiver(post_save, sender=CounterChangeLog)
-@receiver(post_delete, sender=CounterChangeLog)
-def invalidate_metrics_on_changelog(sender, instance, **kwargs):
-    """
-    Инвалидирует кэш метрик месяца при изменении истории изменений
-    (влияет на количество уникальных пользователей)
-    """
-    from .views import invalidate_month_metrics_cache
+# Спецификации моделей определяют разрешённые поля во всех месяцах
+@receiver(post_save, sender=PrinterModelSpec)
+@receiver(post_delete, sender=PrinterModelSpec)
+def invalidate_metrics_on_spec_change(sender, instance, **kwargs):
+    from .services import month_metrics
 
-    if instance.monthly_report and instance.monthly_report.month:
-        invalidate_month_metrics_cache(instance.monthly_report.month)
+    month_metrics.invalidate_all()
@@ -3,41 +3,48 @@ from datetime import timedelta
 from typing import Iterable, Optional, Set
 
 from django.conf import settings
+from django.db.models.functions import Lower
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
+from printer_inventory.coherent_cache import CoherentCache
+
 from .models import MonthlyReport
 from .models_modelspec import PaperFormat, PrinterModelSpec, SerialEditOverride
 
 logger = logging.getLogger(__name__)
 
-SPEC_CACHE: dict[str, PrinterModelSpec] = {}
-SERIAL_OVERRIDE_CACHE: dict[str, Optional[SerialEditOverride]] = {}
+# Кэши справочников: локальный LRU процесса + поколение в общем кэше (printer_inventory/coherent_cache.py).
+# Ключ — нормализованное имя модели / серийник в нижнем регистре.
+SPEC_CACHE = CoherentCache("monthly_report.spec")
+SERIAL_OVERRIDE_CACHE = CoherentCache("monthly_report.serial_override")
 
 
 def clear_spec_cache():
     """
-    Очистить кэш спецификаций моделей принтеров.
+    Очистить кэш спецификаций моделей принтеров во всех процессах.
     Используется при изменении PrinterModelSpec в админке.
     """
-    global SPEC_CACHE
-    cache_size = len(SPEC_CACHE)
-    SPEC_CACHE = {}
+    cache_size = SPEC_CACHE.invalidate()
     if cache_size > 0:
         logger.info(f"Очищен кэш PrinterModelSpec ({cache_size} записей)")
 
 
+def warm_spec_cache() -> int:
+    """Загружает весь справочник моделей одним запросом. Returns: число спецификаций."""
+    specs = list(PrinterModelSpec.objects.all())
+    SPEC_CACHE.fill(((_norm_model_name(spec.model_name).lower(), spec) for spec in specs), complete=True)
+    return len(specs)
+
+
 def get_spec_for_model_name(model_name: Optional[str]) -> Optional[PrinterModelSpec]:
     name = _norm_model_name(model_name)
     if not name:
         return None
-    hit = SPEC_CACHE.get(name.lower())
-    if hit is not None:
-        return hit
-    spec = PrinterModelSpec.objects.filter(model_name__iexact=name).first()
-    SPEC_CACHE[name.lower()] = spec
-    return spec
+    if not SPEC_CACHE.is_warm:
+        warm_spec_cache()
+    return SPEC_CACHE.get(name.lower(), lambda: PrinterModelSpec.objects.filter(model_name__iexact=name).first())
 
 
 # Автоматическая очистка кэша при изменении/удалении спецификаций
@@ -61,22 +68,28 @@ def invalidate_cache_on_delete(sender, instance, **kwargs):
 
 
 def clear_serial_override_cache():
-    global SERIAL_OVERRIDE_CACHE
-    cache_size = len(SERIAL_OVERRIDE_CACHE)
-    SERIAL_OVERRIDE_CACHE = {}
+    """Очистить кэш исключений по серийникам во всех процессах."""
+    cache_size = SERIAL_OVERRIDE_CACHE.invalidate()
     if cache_size > 0:
         logger.info(f"Очищен кэш SerialEditOverride ({cache_size} записей)")
 
 
+def warm_serial_override_cache() -> int:
+    """Загружает все исключения по серийникам одним запросом. Returns: число исключений."""
+    overrides = list(SerialEditOverride.objects.all())
+    SERIAL_OVERRIDE_CACHE.fill(((o.serial_number.strip().lower(), o) for o in overrides), complete=True)
+    return len(overrides)
+
+
 def get_serial_override(serial_number: str) -> Optional[SerialEditOverride]:
     key = serial_number.strip().lower()
     if not key:
         return None
-    if key in SERIAL_OVERRIDE_CACHE:
-        return SERIAL_OVERRIDE_CACHE[key]
-    override = SerialEditOverride.objects.filter(serial_number__iexact=serial_number.strip()).first()
-    SERIAL_OVERRIDE_CACHE[key] = override
-    return override
+    if not SERIAL_OVERRIDE_CACHE.is_warm:
+        warm_serial_override_cache()
+    return SERIAL_OVERRIDE_CACHE.get(
+        key, lambda: SerialEditOverride.objects.filter(serial_number__iexact=serial_number.strip()).first()
+    )
 
 
 def is_auto_locked(report: MonthlyReport, user) -> bool:
@@ -192,24 +205,41 @@ def ensure_model_specs(
     Возвращает количество созданных записей.
     По умолчанию создаются «свободные» правила: enforce=False (разрешено всё).
     """
-    created = 0
+    # Нормализованные имена без повторов (без учёта регистра), первое написание
+    wanted: dict[str, str] = {}
     for raw in model_names:
         name = _norm_model_name(raw)
-        if not name:
-            continue
-        # case-insensitive поиск: если есть — пропускаем
-        exist = PrinterModelSpec.objects.filter(model_name__iexact=name).first()
-        if exist:
-            continue
-        obj = PrinterModelSpec(
+        if name:
+            wanted.setdefault(name.lower(), name)
+    if not wanted:
+        return 0
+
+    # case-insensitive поиск одним запросом: какие уже есть — пропускаем
+    existing = set(
+        PrinterModelSpec.objects.annotate(name_lower=Lower("model_name"))
+        .filter(name_lower__in=list(wanted))
+        .values_list("name_lower", flat=True)
+    )
+    missing = [
+        PrinterModelSpec(
             model_name=name,
             is_color=default_color,
             paper_format=default_format,
             enforce=enforce,  # False => allowed_counter_fields вернёт все поля
         )
-        obj.save()
-        created += 1
-    return created
+        for key, name in wanted.items()
+        if key not in existing
+    ]
+    if not missing:
+        return 0
+    # bulk_create мимо post_save — кэш спецификаций (и метрики месяцев, если правила строгие) сбрасываем сами
+    created = PrinterModelSpec.objects.bulk_create(missing, ignore_conflicts=True)
+    clear_spec_cache()
+    if enforce:
+        from .services import month_metrics
+
+        month_metrics.invalidate_all()
+    return len(created)
 
 
 # Автоматическая очистка кэша при изменении/удалении SerialEditOverride
@@ -0,0 +1,127 @@
+"""
+Фоновые задачи ежемесячных отчётов.
+"""
+
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(queue="low_priority", ignore_result=True)
+def refresh_serial_stats_task() -> int:
+    """Сворачивает в SerialPrintStats месяцы, закрытые с прошлого запуска (истёк edit_until)."""
+    from .services.serial_stats import refresh_serial_stats
+
+    return refresh_serial_stats()
+
+
+@shared_task(bind=True, queue="exports", time_limit=600, soft_time_limit=540)
+def build_month_export_task(self, month_iso: str, version: int) -> dict:
+    """
+    Собирает Excel-выгрузку месяца в кэш файлов. Состояние для опроса фронтом —
+    в кэше по task_state_key; сам файл отдаёт export_month_excel.
+    """
+    from datetime import date
+
+    from django.core.cache import cache
+
+    from .services.excel_export import TASK_STATE_TTL, build_month_export, task_lock_key, task_state_key
+
+    month = date.fromisoformat(month_iso)
+    state_key = task_state_key(self.request.id)
+    try:
+        path = build_month_export(month)
+    except Exception as e:
+        logger.exception(f"build_month_export_task: ошибка выгрузки {month_iso}: {e}")
+        cache.delete(task_lock_key(month, version))
+        cache.set(state_key, {"done": True, "error": str(e)}, TASK_STATE_TTL)
+        raise
+    cache.set(state_key, {"done": True}, TASK_STATE_TTL)
+    return {"path": str(path), "size": path.stat().st_size}
+
+
+@shared_task(bind=True, queue="exports", time_limit=1800, soft_time_limit=1740)
+def import_month_excel_task(self, path: str, month_iso: str, options: dict, bulk_log_id: int) -> dict:
+    """
+    Загружает сохранённый Excel в месяц (services/excel_import.py), фиксирует режим
+    редактирования, закрывает запись аудита bulk_log_id. Прогресс — report_progress;
+    загруженный файл удаляется в любом случае.
+    """
+    from datetime import date, datetime
+    from pathlib import Path
+
+    from .models import BulkChangeLog
+    from .services.audit_service import AuditService
+    from .services.excel_import import (
+        ImportValidationError,
+        UnknownOrganizationsError,
+        apply_month_control,
+        import_month,
+        report_progress,
+    )
+
+    task_id = self.request.id
+    month = date.fromisoformat(month_iso)
+    bulk_log = BulkChangeLog.objects.filter(pk=bulk_log_id).first()
+
+    def finish(count, success, error=""):
+        if bulk_log is not None:
+            AuditService.finish_bulk_operation(
+                bulk_log=bulk_log,
+                records_affected=count,
+                fields_changed=["multiple_counters"] if success else [],
+                success=success,
+                error_message=error,
+            )
+
+    try:
+        count = import_month(
+            path,
+            month,
+            replace_month=options.get("replace_month", False),
+            progress=lambda percent, message: report_progress(task_id, month, percent, message),
+        )
+        edit_until = options.get("edit_until")
+        apply_month_control(
+            month,
+            datetime.fromisoformat(edit_until) if edit_until else None,
+            options.get("is_published", False),
+        )
+    except UnknownOrganizationsError as e:
+        finish(0, False, f"unknown_organizations: {e.unknown}")
+        report_progress(
+            task_id,
+            month,
+            100,
+            "В файле найдены организации, отсутствующие в справочнике. "
+            "Приведите названия в соответствие со справочником и загрузите снова.",
+            done=True,
+            error="unknown_organizations",
+            unknown_organizations=e.unknown,
+        )
+        return {"count": 0}
+    except ImportValidationError as e:
+        finish(0, False, "; ".join(e.errors))
+        report_progress(
+            task_id,
+            month,
+            100,
+            "Файл не загружен: исправьте значения в строках",
+            done=True,
+            error="invalid_rows",
+            errors=e.errors,
+        )
+        return {"count": 0}
+    except Exception as e:
+        logger.exception(f"import_month_excel_task: ошибка загрузки {month_iso}: {e}")
+        finish(0, False, str(e))
+        report_progress(task_id, month, 100, str(e), done=True, error="failed")
+        raise
+    finally:
+        Path(path).unlink(missing_ok=True)
+
+    finish(count, True)
+    report_progress(task_id, month, 100, f"Успешно загружено {count} записей", done=True, count=count)
+    return {"count": count}
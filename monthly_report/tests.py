@@ -1,12 +1,57 @@
-from datetime import date
+import io
+import multiprocessing
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
 from types import SimpleNamespace
+from unittest import mock
 
-from django.test import SimpleTestCase
+from openpyxl import Workbook, load_workbook
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Avg, Count
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
-from monthly_report.models_modelspec import PaperFormat
+from inventory.models import InventoryTask, Organization, PageCounter, Printer
+from monthly_report.integrations.inventory_batch import get_counters_for_month_batch, iter_first_last_counters
+from monthly_report.management.commands.bench_recompute_month import recompute_month_by_groups
+from monthly_report.models import (
+    BulkChangeLog,
+    CounterChangeLog,
+    MonthControl,
+    MonthlyReport,
+    MonthlyReportStaging,
+    MonthMetrics,
+    SerialPrintStats,
+    User,
+)
+from monthly_report.models_modelspec import PaperFormat, PrinterModelSpec, SerialEditOverride
+from monthly_report.services import (
+    duplicate_index,
+    excel_export,
+    excel_import,
+    month_metrics,
+    recompute_month,
+)
+from monthly_report.services.serial_stats import refresh_serial_stats
 from monthly_report.services_inventory_sync import _month_bounds_utc
-from monthly_report.specs import _norm_model_name, allowed_counter_fields
+from monthly_report.specs import (
+    SPEC_CACHE,
+    _norm_model_name,
+    allowed_counter_fields,
+    clear_serial_override_cache,
+    clear_spec_cache,
+    ensure_model_specs,
+    get_serial_override,
+    get_spec_for_model_name,
+)
+from monthly_report.views import COUNTER_FIELDS, _annotate_anomalies_api
+from printer_inventory.coherent_cache import CoherentCache, handle_message
 
 
 class NormModelNameTests(SimpleTestCase):
@@ -64,3 +109,824 @@ class MonthBoundsUtcTests(SimpleTestCase):
         start, end = _month_bounds_utc(date(2025, 12, 1))
         le = timezone.localtime(end)
         self.assertEqual((le.year, le.month, le.day), (2025, 12, 31))
+
+
+class RecomputeMonthTests(TestCase):
+    MONTH = date(2025, 5, 1)
+
+    def _row(self, order, sn="", inv="", a4=(0, 0), a3=(0, 0), **extra):
+        return MonthlyReport(
+            month=self.MONTH,
+            order_number=order,
+            organization="Org",
+            branch="Branch",
+            city="City",
+            address="Addr",
+            equipment_model="Model",
+            serial_number=sn,
+            inventory_number=inv,
+            a4_bw_start=a4[0],
+            a4_bw_end=a4[1],
+            a3_bw_start=a3[0],
+            a3_bw_end=a3[1],
+            **extra,
+        )
+
+    def setUp(self):
+        MonthlyReport.objects.bulk_create(
+            [
+                self._row(1, sn="SN-1", a4=(100, 150), a3=(10, 20)),
+                # Дубли серийника в разном регистре: первая строка — A4, остальные — A3
+                self._row(2, sn="DUP", a4=(0, 40), a3=(0, 7)),
+                self._row(3, sn="dup", a4=(0, 50), a3=(0, 9)),
+                self._row(4, sn="Dup", inv="INV-9", a4=(5, 5), a3=(100, 112)),
+                # Сброс счётчика — отрицательное значение сохраняется
+                self._row(5, sn="RESET", a4=(500, 20)),
+                # Без SN — группа по инвентарному, включая строку с SN и тем же инвентарным
+                self._row(6, inv="INV-1", a4=(0, 30), a3=(0, 3)),
+                self._row(7, inv="inv-1", a4=(0, 60), a3=(0, 6)),
+                self._row(8, sn="SN-X", inv="INV-1", a4=(0, 11), a3=(0, 22)),
+                # Серийник с пробелами и пустые ключи в группы не попадают
+                self._row(9, sn=" PAD ", a4=(0, 99)),
+                self._row(10, a4=(0, 77)),
+                self._row(11, sn="SN-K", a4=(0, 1), normative_availability=100, actual_downtime=25, total_requests=4),
+            ]
+        )
+
+    def _state(self):
+        return list(MonthlyReport.objects.order_by("id").values_list("id", "total_prints"))
+
+    def test_matches_per_group_recompute(self):
+        recompute_month_by_groups(self.MONTH)
+        expected = self._state()
+
+        MonthlyReport.objects.update(total_prints=0)
+        recompute_month(self.MONTH)
+
+        self.assertEqual(self._state(), expected)
+
+    def test_tied_order_numbers_pick_same_first_row(self):
+        # Строки дубля с одинаковым order_number: первой считается строка с меньшим id
+        MonthlyReport.objects.bulk_create(
+            [self._row(20, sn="TIE", a4=(0, 70), a3=(0, 4)), self._row(20, sn="TIE", a4=(0, 80), a3=(0, 6))]
+        )
+        recompute_month_by_groups(self.MONTH)
+        expected = self._state()
+
+        MonthlyReport.objects.update(total_prints=0)
+        recompute_month(self.MONTH)
+
+        self.assertEqual(self._state(), expected)
+        first, second = MonthlyReport.objects.filter(serial_number="TIE").order_by("id")
+        self.assertEqual((first.total_prints, second.total_prints), (70, 6))
+
+    def test_fills_k1_k2_for_bulk_created_rows(self):
+        recompute_month(self.MONTH)
+
+        row = MonthlyReport.objects.get(serial_number="SN-K")
+        self.assertEqual((row.k1, row.k2), (75.0, 0.0))
+
+    def test_writes_only_changed_rows(self):
+        self.assertEqual(recompute_month(self.MONTH), 9)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(recompute_month(self.MONTH), 0)
+        self.assertFalse([q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")])
+
+
+class SerialPrintStatsTests(TestCase):
+    MONTHS = [date(2025, m, 1) for m in range(1, 6)]
+    # total_prints по месяцам: спайк, сброс счётчика, серийник без истории
+    TOTALS = {
+        "SPS-A": [1000, 1200, 900, 1100, 5000],
+        "SPS-B": [300, None, 400, -50, 350],
+        "SPS-C": [None, None, None, 7000, 100],
+        "SPS-D": [2000, 2100, None, None, 2050],
+    }
+
+    def setUp(self):
+        now = timezone.now()
+        MonthControl.objects.create(month=self.MONTHS[0], edit_until=None)
+        MonthControl.objects.create(month=self.MONTHS[1], edit_until=now - timedelta(days=30))
+        MonthControl.objects.create(month=self.MONTHS[3], edit_until=now + timedelta(days=1))
+        rows = []
+        for sn, totals in self.TOTALS.items():
+            for order, (month, total) in enumerate(zip(self.MONTHS, totals)):
+                if total is not None:
+                    rows.append(self._row(month, order, sn, total))
+        MonthlyReport.objects.bulk_create(rows)
+
+    def _row(self, month, order, sn, total):
+        return MonthlyReport(
+            month=month,
+            order_number=order,
+            organization="Org",
+            branch="Branch",
+            city="City",
+            address="Addr",
+            equipment_model="Model",
+            serial_number=sn,
+            inventory_number=f"INV-{sn}",
+            a4_bw_start=max(0, -total),
+            a4_bw_end=max(0, total),
+            total_prints=total,
+        )
+
+    def _reference(self, reports, month, threshold=2000):
+        """Прежний расчёт: среднее по всем предыдущим месяцам прямым агрегатом."""
+        averages = {
+            item["serial_number"]: (item["avg"], item["count"])
+            for item in MonthlyReport.objects.filter(
+                serial_number__in=[r.serial_number for r in reports], month__lt=month
+            )
+            .values("serial_number")
+            .annotate(avg=Avg("total_prints"), count=Count("id"))
+        }
+        flags = {}
+        for r in reports:
+            if r.serial_number in averages:
+                avg, count = averages[r.serial_number]
+                flags[r.id] = (r.total_prints - avg > threshold or r.total_prints < 0, round(avg, 0), count)
+            else:
+                flags[r.id] = (r.total_prints < 0, None, 0)
+        return flags
+
+    def _assert_same_flags(self):
+        for month in self.MONTHS:
+            reports = list(MonthlyReport.objects.filter(month=month))
+            actual = {
+                rid: (info["is_anomaly"], info.get("average"), info.get("months_count", 0))
+                for rid, info in _annotate_anomalies_api(reports, month).items()
+            }
+            self.assertEqual(actual, self._reference(reports, month), month)
+
+    def test_rollup_gives_identical_anomaly_flags(self):
+        self._assert_same_flags()
+
+        # Свёрнуты только закрытые месяцы до первого открытого (апрель)
+        self.assertEqual(refresh_serial_stats(), 3)
+        self.assertEqual(sorted(set(SerialPrintStats.objects.values_list("month", flat=True))), self.MONTHS[:3])
+        a = SerialPrintStats.objects.get(serial_key="SPS-A", month=self.MONTHS[2])
+        self.assertEqual((a.count, a.total, a.total_sq), (3, 3100, 1000**2 + 1200**2 + 900**2))
+        self._assert_same_flags()
+
+        # Пересчёт закрытого месяца пересобирает статистику с него
+        MonthlyReport.objects.filter(serial_number="SPS-A", month=self.MONTHS[1]).update(a4_bw_end=4000)
+        recompute_month(self.MONTHS[1])
+        self.assertEqual(SerialPrintStats.objects.get(serial_key="SPS-A", month=self.MONTHS[2]).total, 5900)
+        self._assert_same_flags()
+
+        # Переоткрытый месяц выпадает из свёртки вместе со всем, что после него
+        MonthControl.objects.filter(month=self.MONTHS[1]).update(edit_until=timezone.now() + timedelta(days=1))
+        refresh_serial_stats()
+        self.assertEqual(set(SerialPrintStats.objects.values_list("month", flat=True)), {self.MONTHS[0]})
+        self._assert_same_flags()
+
+    def test_annotation_query_count_does_not_grow_with_history(self):
+        refresh_serial_stats()
+        reports = list(MonthlyReport.objects.filter(month=self.MONTHS[4]))
+
+        with self.assertNumQueries(3):
+            flags = _annotate_anomalies_api(reports, self.MONTHS[4])
+
+        spike = next(r for r in reports if r.serial_number == "SPS-A")
+        self.assertEqual((flags[spike.id]["is_anomaly"], flags[spike.id]["months_count"]), (True, 4))
+
+
+class MonthControlSignalTests(TestCase):
+    MONTH = date(2025, 6, 1)
+
+    def _saved(self, mc, **kwargs):
+        with mock.patch("monthly_report.tasks.refresh_serial_stats_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                mc.save(**kwargs)
+        return delay.call_count
+
+    def test_refresh_queued_only_when_edit_until_changes(self):
+        mc = MonthControl(month=self.MONTH)
+        self.assertEqual(self._saved(mc), 1)
+
+        mc = MonthControl.objects.get(month=self.MONTH)
+        mc.is_published = True
+        self.assertEqual(self._saved(mc), 0)
+        mc.edit_until = timezone.now() + timedelta(days=1)
+        self.assertEqual(self._saved(mc, update_fields=["is_published"]), 0)
+        self.assertEqual(self._saved(mc), 1)
+        # Повторный save того же экземпляра сравнивается с последним сохранённым значением
+        self.assertEqual(self._saved(mc), 0)
+
+    def test_delete_queues_refresh(self):
+        mc = MonthControl.objects.create(month=self.MONTH)
+        with mock.patch("monthly_report.tasks.refresh_serial_stats_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                mc.delete()
+        delay.assert_called_once_with()
+
+    def test_broker_failure_does_not_break_save(self):
+        with mock.patch("monthly_report.tasks.refresh_serial_stats_task.delay", side_effect=ConnectionError):
+            with self.captureOnCommitCallbacks(execute=True):
+                MonthControl.objects.create(month=self.MONTH)
+        self.assertTrue(MonthControl.objects.filter(month=self.MONTH).exists())
+
+
+class DuplicateIndexTests(TestCase):
+    MONTH = date(2025, 5, 1)
+
+    def setUp(self):
+        cache.clear()
+        duplicate_index._local.pending = None
+        MonthlyReport.objects.bulk_create(
+            [
+                MonthlyReport(
+                    month=self.MONTH,
+                    order_number=order,
+                    organization="Org",
+                    branch="Branch",
+                    city="City",
+                    address="Addr",
+                    equipment_model="Model",
+                    serial_number=sn,
+                    inventory_number=inv,
+                )
+                for order, sn, inv in [
+                    (1, "DI-A", "INV-A"),
+                    (3, "DI-A", "INV-A"),
+                    (2, " DI-A ", "INV-A"),
+                    (4, "DI-B", "INV-B"),
+                    (5, "DI-C", ""),
+                    (6, "", ""),
+                    (7, "", ""),
+                ]
+            ]
+        )
+        self.rows = {r.order_number: r for r in MonthlyReport.objects.filter(month=self.MONTH)}
+
+    def _assert_fresh(self):
+        self.assertEqual(duplicate_index.get_duplicate_index(self.MONTH).groups, duplicate_index._build(self.MONTH))
+
+    def test_lookup_positions_and_cache(self):
+        index = duplicate_index.get_duplicate_index(self.MONTH)
+        self.assertEqual(index.groups, {("DI-A", "INV-A"): [self.rows[1].id, self.rows[2].id, self.rows[3].id]})
+        self.assertEqual(index.lookup(self.rows[2].id), (("DI-A", "INV-A"), 1, 3))
+        self.assertIsNone(index.lookup(self.rows[4].id))
+        self.assertIsNone(index.lookup(self.rows[6].id))
+
+        with self.assertNumQueries(0):
+            duplicate_index.get_duplicate_index(self.MONTH).lookup(self.rows[1].id)
+
+    def test_key_change_patches_index(self):
+        duplicate_index.get_duplicate_index(self.MONTH)
+        version = duplicate_index._version(self.MONTH)
+
+        # Строка уходит из группы DI-A и образует новую группу с DI-B
+        row = MonthlyReport.objects.get(pk=self.rows[1].id)
+        row.serial_number, row.inventory_number = "DI-B", "INV-B"
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+
+        self.assertEqual(duplicate_index._version(self.MONTH), version + 1)
+        with self.assertNumQueries(0):
+            index = duplicate_index.get_duplicate_index(self.MONTH)
+        self.assertEqual(index.lookup(self.rows[4].id).position, 1)
+        self.assertEqual(index.lookup(self.rows[2].id), (("DI-A", "INV-A"), 0, 2))
+        self._assert_fresh()
+
+        # Порядок внутри группы
+        row = MonthlyReport.objects.get(pk=self.rows[3].id)
+        row.order_number = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        self.assertEqual(duplicate_index.get_duplicate_index(self.MONTH).lookup(self.rows[3].id).position, 0)
+        self._assert_fresh()
+
+    def test_delete_and_unrelated_save(self):
+        duplicate_index.get_duplicate_index(self.MONTH)
+        version = duplicate_index._version(self.MONTH)
+
+        row = MonthlyReport.objects.get(pk=self.rows[4].id)
+        row.a4_bw_end = 100
+        with self.captureOnCommitCallbacks(execute=True):
+            row.save()
+        self.assertEqual(duplicate_index._version(self.MONTH), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MonthlyReport.objects.filter(pk__in=[self.rows[1].id, self.rows[3].id]).delete()
+        self.assertIsNone(duplicate_index.get_duplicate_index(self.MONTH).lookup(self.rows[2].id))
+        self._assert_fresh()
+
+
+class MonthMetricsTests(TestCase):
+    MONTH = date(2025, 5, 1)
+    PERMS = [
+        set(),
+        {"a4_bw_start", "a4_color_start", "a3_bw_start", "a3_color_start"},
+        {"a4_bw_end", "a4_color_end", "a3_bw_end", "a3_color_end"},
+        set(COUNTER_FIELDS),
+    ]
+
+    def setUp(self):
+        cache.clear()
+        PrinterModelSpec.objects.create(model_name="Mono A4", is_color=False, paper_format=PaperFormat.A4_ONLY)
+        MonthlyReport.objects.bulk_create(
+            [
+                MonthlyReport(
+                    month=self.MONTH,
+                    order_number=order,
+                    organization="Org",
+                    branch="Branch",
+                    city="City",
+                    address="Addr",
+                    equipment_model=model,
+                    serial_number=sn,
+                    inventory_number="INV",
+                    device_ip=ip,
+                    a4_bw_end=a4,
+                    a3_bw_end=a3,
+                    a4_bw_end_manual=manual,
+                )
+                for order, sn, model, ip, a4, a3, manual in [
+                    (1, "MM-1", "Mono A4", "10.0.0.1", 100, 0, False),
+                    (2, "MM-2", "Mono A4", None, 0, 0, False),
+                    (3, "MM-3", "Other", "10.0.0.3", 50, 5, True),
+                    (4, "MM-DUP", "Other", "10.0.0.4", 70, 0, False),
+                    (5, "MM-DUP", "Other", "10.0.0.4", 0, 0, False),
+                ]
+            ]
+        )
+
+    def _reference(self, allowed_by_perm):
+        """Прежний расчёт: обход всех строк месяца."""
+        index = duplicate_index.get_duplicate_index(self.MONTH)
+        total = filled = with_ip = auto = 0
+        for report in MonthlyReport.objects.filter(month=self.MONTH):
+            dup = index.lookup(report.id)
+            allowed = set(allowed_by_perm)
+            if dup:
+                allowed &= {"a4_bw_end", "a4_color_end"} if dup.position == 0 else {"a3_bw_end", "a3_color_end"}
+            allowed &= allowed_counter_fields(get_spec_for_model_name(report.equipment_model))
+            allowed = {f for f in allowed if f.endswith("_end")}
+            total += 1
+            filled += all(getattr(report, f) != 0 for f in allowed)
+            if report.device_ip:
+                with_ip += 1
+                auto += bool(
+                    allowed
+                    and not any(getattr(report, f"{f}_manual") for f in allowed)
+                    and any(getattr(report, f) > 0 for f in allowed)
+                )
+        return (round(filled / total * 100, 1), round(with_ip / total * 100, 1), round(auto / total * 100, 1))
+
+    def _assert_matches_reference(self):
+        for perms in self.PERMS:
+            metrics = month_metrics.get_month_metrics(self.MONTH, perms)
+            actual = (
+                metrics["completion_percentage"],
+                metrics["auto_fill_potential_percentage"],
+                metrics["auto_fill_actual_percentage"],
+            )
+            self.assertEqual(actual, self._reference(perms), perms)
+
+    def test_projection_matches_full_scan(self):
+        self._assert_matches_reference()
+        self.assertEqual(month_metrics.get_month_metrics(self.MONTH, set())["unique_users_count"], 0)
+
+    def test_counter_edits_update_counts_by_delta(self):
+        month_metrics.get_counts(self.MONTH)
+
+        report = MonthlyReport.objects.get(serial_number="MM-2")
+        report.a4_bw_end = 40
+        report.device_ip = "10.0.0.2"
+        report.save()
+        report = MonthlyReport.objects.get(serial_number="MM-3")
+        report.a4_bw_end_manual = False
+        report.save(update_fields=["a4_bw_end_manual"])
+        user = User.objects.create(username="mm-user")
+        CounterChangeLog.objects.create(
+            monthly_report=report, user=user, field_name="a4_bw_end", old_value=0, new_value=50
+        )
+
+        # Счётчики не сброшены, а сдвинуты дельтами — и совпадают с полным пересчётом
+        self.assertIsNotNone(MonthMetrics.objects.get(month=self.MONTH).counts)
+        self.assertIsNone(month_metrics.verify(self.MONTH))
+        self._assert_matches_reference()
+        self.assertEqual(month_metrics.get_month_metrics(self.MONTH, set())["unique_users_count"], 1)
+
+        with self.assertNumQueries(1):
+            month_metrics.get_month_metrics(self.MONTH, self.PERMS[2])
+
+    def test_structural_changes_reset_counts(self):
+        month_metrics.get_counts(self.MONTH)
+
+        report = MonthlyReport.objects.get(order_number=5)
+        report.serial_number = "MM-5"
+        report.save()
+        self.assertIsNone(MonthMetrics.objects.get(month=self.MONTH).counts)
+        self._assert_matches_reference()
+
+        PrinterModelSpec.objects.filter(model_name="Mono A4").delete()
+        self.assertIsNone(MonthMetrics.objects.get(month=self.MONTH).counts)
+        self._assert_matches_reference()
+
+
+class MonthDetailPaginationTests(TestCase):
+    MONTH = date(2025, 5, 1)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser("md-admin", "md@example.com", "x"))
+        session = self.client.session
+        session["oidc_id_token_expiration"] = 9999999999
+        session.save()
+        MonthlyReport.objects.bulk_create(
+            [
+                MonthlyReport(
+                    month=self.MONTH,
+                    order_number=order,
+                    organization="Org" if order % 3 else "Findme Org",
+                    branch="Branch",
+                    city="City",
+                    address="Addr",
+                    equipment_model="Model",
+                    serial_number=f"MD-{order}",
+                    inventory_number=f"INV-{order}",
+                    total_prints=order % 4,
+                )
+                for order in range(1, 12)
+            ]
+        )
+
+    def _get(self, **params):
+        response = self.client.get(f"/monthly-report/api/month/{self.MONTH.year}/{self.MONTH.month}/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _walk(self, **params):
+        ids, cursor = [], ""
+        while cursor is not None:
+            data = self._get(cursor=cursor, per_page=3, **params)
+            ids += [r["id"] for r in data["reports"]]
+            cursor = data["pagination"]["next_cursor"]
+        return ids, data["pagination"]
+
+    def test_page_mode_serializes_only_page(self):
+        data = self._get(page=2, per_page=4)
+        self.assertEqual([r["order_number"] for r in data["reports"]], [5, 6, 7, 8])
+        self.assertEqual((data["pagination"]["total"], data["pagination"]["total_pages"]), (11, 3))
+
+    def test_cursor_walk_matches_ordering(self):
+        for sort in ("num", "-total", "org"):
+            ids, pagination = self._walk(sort=sort)
+            page_ids = [r["id"] for r in self._get(sort=sort, per_page="all")["reports"]]
+            self.assertEqual(ids, page_ids, sort)
+            self.assertEqual((pagination["total"], pagination["total_is_estimate"]), (11, False))
+
+    def test_search_with_cursor(self):
+        ids, pagination = self._walk(q="findme")
+        expected = list(
+            MonthlyReport.objects.filter(organization="Findme Org")
+            .order_by("order_number")
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(pagination["total"], 3)
+
+
+class MonthExcelExportTests(TestCase):
+    MONTH = date(2025, 6, 1)
+
+    def setUp(self):
+        cache.clear()
+        excel_export._local.pending = None
+        self.client.force_login(User.objects.create_superuser("xl-admin", "xl@example.com", "x"))
+        session = self.client.session
+        session["oidc_id_token_expiration"] = 9999999999
+        session.save()
+        self.report = MonthlyReport.objects.create(
+            month=self.MONTH,
+            order_number=1,
+            organization="Org",
+            equipment_model="Model",
+            serial_number="XL-1",
+            a4_bw_start=10,
+            a4_bw_end=25,
+            normative_availability=100,
+            actual_downtime=1,
+        )
+        self.url = f"/monthly-report/{self.MONTH.year}/{self.MONTH.month}/export-excel/"
+
+    def _rows(self, response):
+        ws = load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        return [list(row) for row in ws.iter_rows(values_only=True)]
+
+    def test_workbook_content(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("monthly_report_2025-06.xlsx", response["Content-Disposition"])
+        header, row = self._rows(response)
+        self.assertEqual(header[0], "№ п/п")
+        self.assertEqual(len(header), len(excel_export.COLUMNS))
+        self.assertEqual(row[:3], [1, "Org", None])
+        self.assertEqual(row[8:10], [10, 25])
+        self.assertEqual(row[19], 99.0)
+
+    def test_unchanged_month_served_from_disk(self):
+        with mock.patch.object(excel_export, "write_month_workbook", wraps=excel_export.write_month_workbook) as write:
+            self._rows(self.client.get(self.url))
+            self._rows(self.client.get(self.url))
+            self.assertEqual(write.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.report.a4_bw_end = 40
+                self.report.save()
+            rows = self._rows(self.client.get(self.url))
+            self.assertEqual(write.call_count, 2)
+        self.assertEqual(rows[1][9], 40)
+
+    def test_bulk_recompute_bumps_version(self):
+        version = excel_export.data_version(self.MONTH)
+        with self.captureOnCommitCallbacks(execute=True):
+            recompute_month(self.MONTH)
+        self.assertNotEqual(excel_export.data_version(self.MONTH), version)
+
+    def test_async_export(self):
+        response = self.client.get(self.url, {"async": "1"})
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertFalse(data["ready"])
+        # Celery в тестах синхронный — задача уже выполнена
+        status = self.client.get(data["status_url"]).json()
+        self.assertEqual(status, {"ok": True, "done": True})
+
+        response = self.client.get(self.url, {"async": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["download_url"], self.url)
+        self.assertEqual(len(self._rows(self.client.get(self.url))), 2)
+
+
+class ExcelImportTests(TestCase):
+    MONTH = date(2025, 7, 1)
+    HEADERS = [
+        "№ п/п",
+        "Организация",
+        "Модель и наименование оборудования",
+        "Серийный номер оборудования",
+        "A4 ч/б начало",
+        "A4 ч/б конец",
+        "A4 цвет начало",
+        "A4 цвет конец",
+        "А норматив",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        excel_export._local.pending = None
+        duplicate_index._local.pending = None
+        Organization.objects.create(name="ООО Ромашка")
+
+    def _workbook(self, rows, service_row=False):
+        wb = Workbook()
+        ws = wb.active
+        ws.append(self.HEADERS)
+        if service_row:
+            ws.append([str(i) for i in range(1, len(self.HEADERS) + 1)])
+        for row in rows:
+            ws.append(row)
+        buf = io.BytesIO()
+        wb.save(buf)
+        buf.seek(0)
+        return buf
+
+    def test_columnar_parsing(self):
+        PrinterModelSpec.objects.create(
+            model_name="Mono A4", is_color=False, paper_format=PaperFormat.A4_ONLY, enforce=True
+        )
+        source = self._workbook(
+            [
+                ["", "ООО Ромашка", "Mono A4", "SN-1", "1 200", "1 500,7", "10", "20", "720,5"],
+                ["", "", "", "", "", "", "", "", ""],
+                ["7", " ооо  ромашка ", "Color", "SN-2", "0", "100", "5", "15", "abc"],
+            ],
+            service_row=True,
+        )
+        rows = excel_import.map_columns(excel_import.read_sheet(source))
+        self.assertEqual(list(rows["serial_number"]), ["SN-1", "SN-2"])
+        self.assertEqual(list(rows["_excel_row"]), [3, 5])
+        self.assertEqual(list(rows["order_number"]), [1, 7])
+        self.assertEqual(list(rows["a4_bw_end"]), [1500, 100])
+        # цветные счётчики монохромной модели обнуляются по спецификации
+        self.assertEqual(list(rows["a4_color_end"]), [0, 15])
+        self.assertEqual(list(rows["total_prints"]), [300, 110])
+        self.assertEqual(list(rows["normative_availability"]), [720.5, 0.0])
+
+    def test_import_month(self):
+        MonthlyReport.objects.create(month=self.MONTH, order_number=1, serial_number="OLD")
+        source = self._workbook(
+            [["", "ООО Ромашка", "HP", f"SN-{i}", "0", str(i * 10), "", "", "720"] for i in range(1, 4)]
+        )
+        progress = []
+        count = excel_import.import_month(
+            source, self.MONTH, replace_month=True, progress=lambda percent, message: progress.append(percent)
+        )
+        self.assertEqual(count, 3)
+        reports = list(MonthlyReport.objects.filter(month=self.MONTH).order_by("order_number"))
+        self.assertEqual([r.serial_number for r in reports], ["SN-1", "SN-2", "SN-3"])
+        self.assertEqual([r.total_prints for r in reports], [10, 20, 30])
+        self.assertEqual(reports[0].normative_availability, 720)
+        self.assertFalse(MonthlyReportStaging.objects.exists())
+        self.assertTrue(PrinterModelSpec.objects.filter(model_name="HP").exists())
+        self.assertEqual(progress, sorted(progress))
+
+    def test_invalid_rows_leave_month_untouched(self):
+        MonthlyReport.objects.create(month=self.MONTH, order_number=1, serial_number="OLD")
+        source = self._workbook(
+            [
+                ["", "ООО Ромашка", "HP", "SN-1", "0", "-5", "", "", ""],
+                ["", "ООО Ромашка", "HP", "SN-2", "0", "99999999999", "", "", ""],
+            ]
+        )
+        with self.assertRaises(excel_import.ImportValidationError) as ctx:
+            excel_import.import_month(source, self.MONTH, replace_month=True)
+        self.assertEqual(len(ctx.exception.errors), 2)
+        self.assertTrue(ctx.exception.errors[0].startswith("Строка 2:"))
+        self.assertTrue(ctx.exception.errors[1].startswith("Строка 3:"))
+        self.assertEqual(list(MonthlyReport.objects.values_list("serial_number", flat=True)), ["OLD"])
+
+    def test_unknown_organizations(self):
+        source = self._workbook([["", "ООО Лютик", "HP", "SN-1", "0", "5", "", "", ""]])
+        with self.assertRaises(excel_import.UnknownOrganizationsError) as ctx:
+            excel_import.import_month(source, self.MONTH)
+        self.assertEqual(ctx.exception.unknown, ["ООО Лютик"])
+
+    def test_upload_view_runs_in_background(self):
+        self.client.force_login(User.objects.create_superuser("up-admin", "up@example.com", "x"))
+        session = self.client.session
+        session["oidc_id_token_expiration"] = 9999999999
+        session.save()
+        upload = SimpleUploadedFile(
+            "report.xlsx", self._workbook([["", "ООО Ромашка", "HP", "SN-1", "0", "5", "", "", ""]]).read()
+        )
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch.object(excel_import, "get_channel_layer", return_value=layer):
+            response = self.client.post(
+                "/monthly-report/upload/", {"excel_file": upload, "month": "2025-07-01", "allow_edit": "on"}
+            )
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data["month_url"], "/monthly-report/2025-07/")
+        # Celery в тестах синхронный — загрузка уже завершена
+        status = self.client.get(data["status_url"]).json()
+        self.assertTrue(status["success"])
+        self.assertTrue(status["done"])
+        self.assertEqual(status["count"], 1)
+        groups = {call.args[0] for call in layer.group_send.call_args_list}
+        self.assertEqual(groups, {"monthly_report_2025_07"})
+        self.assertTrue(MonthControl.objects.get(month=self.MONTH).edit_until)
+        bulk_log = BulkChangeLog.objects.get(pk=data["bulk_log_id"])
+        self.assertTrue(bulk_log.success)
+        self.assertEqual(bulk_log.records_affected, 1)
+        self.assertFalse(any(Path(settings.IMPORT_UPLOAD_DIR).iterdir()))
+
+
+class InventoryBatchCountersTests(TestCase):
+    START = timezone.make_aware(datetime(2025, 5, 1))
+    END = timezone.make_aware(datetime(2025, 5, 31, 23, 59, 59))
+
+    def setUp(self):
+        self.printer = Printer.objects.create(ip_address="10.19.0.1", serial_number="FL-1")
+        self.idle = Printer.objects.create(ip_address="10.19.0.2", serial_number="FL-2")
+
+    def _poll(self, printer, day, bw_a4, status="SUCCESS"):
+        task = InventoryTask.objects.create(printer=printer, status=status)
+        InventoryTask.objects.filter(pk=task.pk).update(task_timestamp=self.START + timedelta(days=day))
+        PageCounter.objects.create(task=task, bw_a4=bw_a4, color_a4=0)
+
+    def test_first_and_last_in_window(self):
+        self._poll(self.printer, -1, 5)  # до окна
+        self._poll(self.printer, 2, 100)
+        self._poll(self.printer, 10, 150, status="FAILED")
+        self._poll(self.printer, 12, 180)
+        self._poll(self.printer, 20, 210)
+        self._poll(self.printer, 40, 999)  # после окна
+        self._poll(self.idle, 40, 1)
+
+        result = get_counters_for_month_batch(["FL-1", "FL-2", "UNKNOWN"], self.START, self.END)
+        self.assertEqual(list(result), ["FL-1"])
+        self.assertEqual(result["FL-1"]["start"], {"bw_a4": 100, "color_a4": 0, "bw_a3": None, "color_a3": None})
+        self.assertEqual(result["FL-1"]["end"]["bw_a4"], 210)
+        self.assertEqual(result["FL-1"]["last_ok"], self.START + timedelta(days=20))
+        self.assertEqual(result["FL-1"]["ip"], "10.19.0.1")
+
+    def test_chunks_do_not_load_history(self):
+        for day in range(25):
+            self._poll(self.printer, day, 100 + day)
+            self._poll(self.idle, day, 200 + day)
+        with CaptureQueriesContext(connection) as ctx:
+            edges = list(iter_first_last_counters([self.printer.pk, self.idle.pk], self.START, self.END, chunk_size=1))
+        self.assertEqual(len(ctx.captured_queries), 4)
+        self.assertEqual(
+            [(pid, first["bw_a4"], last["bw_a4"]) for pid, first, last in edges],
+            [(self.printer.pk, 100, 124), (self.idle.pk, 200, 224)],
+        )
+
+
+def _coherent_worker(conn, name, source):
+    """Отдельный процесс: читает значение через свой CoherentCache, считая загрузки из «БД» (файла)."""
+    local = CoherentCache(name)
+    loads = 0
+
+    def load():
+        nonlocal loads
+        loads += 1
+        return Path(source).read_text()
+
+    while conn.recv():
+        conn.send((local.get("model", load), loads))
+
+
+class CoherentSpecCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_spec_cache()
+        clear_serial_override_cache()
+
+    def test_specs_loaded_in_one_query(self):
+        for name in ("HP M402", "Kyocera M2040", "Canon MF443"):
+            PrinterModelSpec.objects.create(model_name=name, paper_format=PaperFormat.A4_ONLY)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_spec_for_model_name("hp  m402").model_name, "HP M402")
+            self.assertEqual(get_spec_for_model_name("Canon MF443").model_name, "Canon MF443")
+            self.assertIsNone(get_spec_for_model_name("Unknown"))
+
+    def test_ensure_model_specs_is_set_based(self):
+        PrinterModelSpec.objects.create(model_name="HP M402")
+        with self.assertNumQueries(2):
+            created = ensure_model_specs(["hp m402", "Xerox B215", "xerox  b215", "", "Canon MF443"])
+        self.assertEqual(created, 2)
+        self.assertEqual(PrinterModelSpec.objects.count(), 3)
+        self.assertIsNotNone(get_spec_for_model_name("Xerox B215"))
+
+    def test_change_visible_after_commit(self):
+        spec = PrinterModelSpec.objects.create(model_name="HP M402", enforce=False)
+        self.assertFalse(get_spec_for_model_name("HP M402").enforce)
+        generation = SPEC_CACHE.remote_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            spec.enforce = True
+            spec.save()
+        self.assertNotEqual(SPEC_CACHE.remote_generation(), generation)
+        self.assertTrue(get_spec_for_model_name("HP M402").enforce)
+
+    def test_serial_override(self):
+        SerialEditOverride.objects.create(serial_number="SN-OVR", allow_manual_edit=True)
+        self.assertTrue(get_serial_override(" sn-ovr ").allow_manual_edit)
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_serial_override("SN-NONE"))
+
+    def test_lru_is_bounded(self):
+        lru = CoherentCache("test.lru", maxsize=2)
+        for key in "abc":
+            lru.get(key, lambda key=key: key.upper())
+        self.assertEqual([key for key, _ in lru.items()], ["b", "c"])
+
+    def test_pubsub_message_clears_local_level(self):
+        pushed = CoherentCache("test.pubsub")
+        pushed.get("k", lambda: 1)
+        handle_message({"type": "message", "data": b"test.pubsub"})
+        self.assertEqual(len(pushed), 0)
+
+    def test_coherent_across_processes(self):
+        tmp = Path(tempfile.mkdtemp(prefix="coherent-cache-"))
+        source = tmp / "spec.txt"
+        source.write_text("v1")
+        shared = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "coherent": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": str(tmp / "c")},
+        }
+        with override_settings(CACHES=shared, COHERENT_CACHE_ALIAS="coherent"):
+            ctx = multiprocessing.get_context("fork")
+            workers = []
+            for _ in range(2):
+                parent, child = ctx.Pipe()
+                process = ctx.Process(target=_coherent_worker, args=(child, "test.multiprocess", str(source)))
+                process.start()
+                workers.append((process, parent))
+
+            def read_all():
+                results = []
+                for _, conn in workers:
+                    conn.send(True)
+                    results.append(conn.recv())
+                return results
+
+            try:
+                self.assertEqual(read_all(), [("v1", 1), ("v1", 1)])
+                # Без инвалидации процессы отдают свою копию, в «БД» не ходят
+                source.write_text("v2")
+                self.assertEqual(read_all(), [("v1", 1), ("v1", 1)])
+                # Изменение в этом процессе — после коммита его видят все остальные
+                with self.captureOnCommitCallbacks(execute=True):
+                    CoherentCache("test.multiprocess").invalidate()
+                self.assertEqual(read_all(), [("v2", 2), ("v2", 2)])
+            finally:
+                for process, conn in workers:
+                    conn.send(False)
+                    process.join(timeout=10)
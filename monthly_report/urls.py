@@ -5,6 +5,7 @@ from . import views, api_views_drf
 urlpatterns = [
     path("", views.MonthListView.as_view(), name="month_list"),
     path("upload/", views.upload_excel, name="upload_excel"),
+    path("upload/status/<str:task_id>/", views.upload_excel_status, name="upload_excel_status"),
     path("api/months/", views.api_months_list, name="api_months_list"),
     path("api/month/<int:year>/<int:month>/", views.api_month_detail, name="api_month_detail"),
     path("api/update-counters/<int:pk>/", views.api_update_counters, name="api_update_counters"),
@@ -31,6 +32,7 @@ urlpatterns = [
     path("api/glpi-export/start/", views.api_start_glpi_export, name="api_start_glpi_export"),
     path("api/glpi-export/status/<str:task_id>/", views.api_glpi_export_status, name="api_glpi_export_status"),
     path("<int:year>/<int:month>/export-excel/", views.export_month_excel, name="export_month_excel"),
+    path("export-excel/status/<str:task_id>/", views.export_month_excel_status, name="export_month_excel_status"),
     re_path(r"^(?P<month>\d{4}-\d{2})/$", views.MonthDetailView.as_view(), name="month_detail"),
     # ═══════════════════════════════════════════════════════════════
     # DRF API ENDPOINTS (для OpenAPI документации)
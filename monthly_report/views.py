@@ -10,7 +10,6 @@ from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.core.cache import cache
 from django.db.models import Count, OuterRef, Q, Subquery
 from django.db.models.functions import TruncMonth
 from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
@@ -20,11 +19,16 @@ from django.utils.translation import gettext as _
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.generic import ListView
 
-from .forms import ExcelUploadForm, UnknownOrganizationsError
+from .forms import ExcelUploadForm
 from .models import CounterChangeLog, MonthControl, MonthlyReport
 from .models_modelspec import SerialEditOverride
 from .services import recompute_group
 from .services.audit_service import AuditService
+from .services.duplicate_index import get_duplicate_index
+from .services.excel_import import save_upload, start_month_import
+from .services.month_detail import approximate_count, keyset_page, ordered, search_q
+from .services.month_metrics import get_month_metrics
+from .services.serial_stats import historical_totals, on_month_changed, serial_key
 from .specs import (
     allowed_counter_fields,
     clear_serial_override_cache,
@@ -126,38 +130,6 @@ def _to_int(x):
         return 0
 
 
-def _get_duplicate_groups(month_dt):
-    """
-    Возвращает группы дублирующихся серийников с позициями строк.
-    Результат: {(serial, inventory): [(report_id, position), ...]}
-    """
-    from collections import defaultdict
-
-    reports = (
-        MonthlyReport.objects.filter(month=month_dt)
-        .values("id", "serial_number", "inventory_number", "order_number")
-        .order_by("order_number", "id")
-    )
-
-    groups = defaultdict(list)
-    for r in reports:
-        sn = (r["serial_number"] or "").strip()
-        inv = (r["inventory_number"] or "").strip()
-        if not sn and not inv:
-            continue
-        groups[(sn, inv)].append(r)
-
-    # Оставляем только группы с дублями и определяем позиции
-    result = {}
-    for key, reports_list in groups.items():
-        if len(reports_list) >= 2:
-            # Сортируем по order_number и id для стабильного порядка
-            sorted_reports = sorted(reports_list, key=lambda x: (x["order_number"], x["id"]))
-            result[key] = [(r["id"], pos) for pos, r in enumerate(sorted_reports)]
-
-    return result
-
-
 class MonthListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     """
     Список месяцев с отчетами (Vue.js компонент).
@@ -463,53 +435,29 @@ def upload_excel(request):
                 month=form.cleaned_data["month"],
             )
 
+            # Разбор и запись — в фоне (import_month_excel_task); прогресс — WebSocket месяца и upload/status/
             try:
-                count = form.process_data()
-
-                # Завершаем логирование успешно
-                AuditService.finish_bulk_operation(
-                    bulk_log=bulk_log, records_affected=count, fields_changed=["multiple_counters"], success=True
-                )
-
-                # Получаем месяц для формирования URL
-                month_str = form.cleaned_data["month"].strftime("%Y-%m")
-                month_url = f"/monthly-report/{month_str}/"
-
-                # Возвращаем JSON для Vue.js компонента
-                return JsonResponse(
-                    {
-                        "success": True,
-                        "count": count,
-                        "bulk_log_id": bulk_log.id,
-                        "month_url": month_url,
-                        "message": f"Успешно загружено {count} записей",
-                    }
-                )
-            except UnknownOrganizationsError as e:
-                AuditService.finish_bulk_operation(
-                    bulk_log=bulk_log,
-                    records_affected=0,
-                    fields_changed=[],
-                    success=False,
-                    error_message=f"unknown_organizations: {e.unknown}",
-                )
-                return JsonResponse(
-                    {
-                        "success": False,
-                        "error": (
-                            "В файле найдены организации, отсутствующие в справочнике. "
-                            "Приведите названия в соответствие со справочником и загрузите снова."
-                        ),
-                        "unknown_organizations": e.unknown,
-                    },
-                    status=400,
-                )
+                path = save_upload(request.FILES["excel_file"])
+                task_id = start_month_import(path, form.cleaned_data["month"], form.import_options(), bulk_log.id)
             except Exception as e:
-                # Завершаем логирование с ошибкой
+                logger.exception(f"Ошибка постановки загрузки Excel: {e}")
                 AuditService.finish_bulk_operation(
                     bulk_log=bulk_log, records_affected=0, fields_changed=[], success=False, error_message=str(e)
                 )
-                return JsonResponse({"success": False, "error": str(e)}, status=400)
+                return JsonResponse({"success": False, "error": str(e)}, status=500)
+
+            month_str = form.cleaned_data["month"].strftime("%Y-%m")
+            return JsonResponse(
+                {
+                    "success": True,
+                    "task_id": task_id,
+                    "status_url": f"/monthly-report/upload/status/{task_id}/",
+                    "bulk_log_id": bulk_log.id,
+                    "month_url": f"/monthly-report/{month_str}/",
+                    "message": "Файл принят, идёт загрузка",
+                },
+                status=202,
+            )
         else:
             # Форма невалидна
             errors = []
@@ -553,17 +501,8 @@ def api_update_counters(request, pk: int):
         return HttpResponseForbidden(_("Нет прав для изменения счётчиков"))
 
     # НОВАЯ ЛОГИКА: ограничения по дублям
-    duplicate_groups = _get_duplicate_groups(obj.month)
-
-    # Находим информацию о дубле для данной записи
-    dup_info = None
-    for (sn, inv), report_positions in duplicate_groups.items():
-        for report_id, position in report_positions:
-            if report_id == obj.id:
-                dup_info = {"position": position, "group_size": len(report_positions)}
-                break
-        if dup_info:
-            break
+    dup = get_duplicate_index(obj.month).lookup(obj.id)
+    dup_info = {"position": dup.position, "group_size": dup.size} if dup else None
 
     # Определяем ограничения по дублям
     if dup_info:
@@ -981,25 +920,71 @@ def api_reset_manual_flag(request, pk: int):
 @permission_required("monthly_report.access_monthly_report", raise_exception=True)
 def export_month_excel(request, year: int, month: int):
     """
-    Экспорт месяца в Excel
+    Экспорт месяца в Excel.
+
+    Файл текущей версии данных месяца отдаётся из кэша на диске, иначе собирается.
+    ?async=1 — не собирать в запросе: {"ready": true, "download_url"} для готового
+    файла или 202 с task_id/status_url задачи сборки в очереди exports.
     """
-    from datetime import date
+    from printer_inventory.xlsx import artifact_response
 
-    from .services.excel_export import export_month_to_excel
+    from .services.excel_export import build_month_export, cached_month_export, export_filename, start_month_export
 
     month_date = date(int(year), int(month), 1)
+    download_url = request.path
 
     try:
-        return export_month_to_excel(month_date)
+        if request.GET.get("async"):
+            if cached_month_export(month_date):
+                return JsonResponse({"ok": True, "ready": True, "download_url": download_url})
+            task_id = start_month_export(month_date)
+            return JsonResponse(
+                {
+                    "ok": True,
+                    "ready": False,
+                    "task_id": task_id,
+                    "status_url": f"/monthly-report/export-excel/status/{task_id}/",
+                    "download_url": download_url,
+                },
+                status=202,
+            )
+        return artifact_response(build_month_export(month_date), export_filename(month_date))
     except Exception as e:
         logger.exception(f"Ошибка экспорта Excel: {e}")
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 
+@permission_required("monthly_report.upload_monthly_report", raise_exception=True)
+def upload_excel_status(request, task_id: str):
+    """Состояние загрузки Excel: {"percent", "message", "done", "count"? | "error", ...}."""
+    from django.core.cache import cache
+
+    from .services.excel_import import import_state_key
+
+    state = cache.get(import_state_key(task_id))
+    if state is None:
+        return JsonResponse({"success": False, "done": True, "error": "Задача не найдена или устарела"}, status=404)
+    return JsonResponse({"success": not state.get("error"), **state})
+
+
+@login_required
+@permission_required("monthly_report.access_monthly_report", raise_exception=True)
+def export_month_excel_status(request, task_id: str):
+    """Состояние задачи сборки выгрузки месяца: {"done": bool, "error"?: str}."""
+    from django.core.cache import cache
+
+    from .services.excel_export import task_state_key
+
+    state = cache.get(task_state_key(task_id))
+    if state is None:
+        return JsonResponse({"ok": False, "done": True, "error": "Задача не найдена или устарела"}, status=404)
+    return JsonResponse({"ok": True, **state})
+
+
 def _calculate_month_metrics(month_dt, allowed_by_perm):
     """
     Вычисляет метрики месяца (процент заполненности и количество пользователей).
-    Результат кэшируется в Redis.
+    Проекция сырых счётчиков месяца (services/month_metrics.py) на права пользователя.
 
     Args:
         month_dt: Дата месяца (date object)
@@ -1013,176 +998,7 @@ def _calculate_month_metrics(month_dt, allowed_by_perm):
             'auto_fill_actual_percentage': float,     # Процент записей которые были заполнены автоматически и не изменены
         }
     """
-    # Генерируем уникальный ключ кэша на основе месяца и прав пользователя
-    # Права нужны потому что процент заполненности зависит от того какие поля может редактировать пользователь
-    perm_key = "_".join(sorted(allowed_by_perm))
-    cache_key = f"month_metrics:{month_dt.year}-{month_dt.month:02d}:{perm_key}"
-
-    # Пытаемся получить из кэша
-    cached = cache.get(cache_key)
-    if cached is not None:
-        logger.debug(f"Cache HIT for month metrics: {month_dt}")
-        return cached
-
-    logger.debug(f"Cache MISS for month metrics: {month_dt}, calculating...")
-
-    # Расчет процента заполненности
-    completion_percentage = None
-    auto_fill_potential_percentage = None
-    auto_fill_actual_percentage = None
-
-    month_reports = MonthlyReport.objects.filter(month=month_dt)
-    records_count = month_reports.count()
-
-    if records_count > 0:
-        duplicate_groups = _get_duplicate_groups(month_dt)
-
-        total_records = 0
-        filled_records = 0
-
-        # Метрики автозаполнения
-        records_with_ip = 0  # Записи у которых есть device_ip (могут быть заполнены автоматически)
-        records_auto_filled = 0  # Записи которые были заполнены автоматически и не изменены вручную
-
-        for report in month_reports:
-            # Определяем позицию в группе дублей
-            is_dup = False
-            dup_position = 0
-            for (serial, inv), positions in duplicate_groups.items():
-                for report_id, position in positions:
-                    if report_id == report.id:
-                        is_dup = True
-                        dup_position = position
-                        break
-                if is_dup:
-                    break
-
-            # Вычисляем разрешенные поля для этого отчета
-            # 1. Ограничения по дублям
-            # Логика: первая позиция = A4 формат, вторая позиция = A3 формат
-            if is_dup:
-                if dup_position == 0:
-                    # Первая позиция в группе дублей = A4 формат
-                    allowed_by_dup = {"a4_bw_start", "a4_bw_end", "a4_color_start", "a4_color_end"}
-                else:
-                    # Вторая позиция в группе дублей = A3 формат
-                    allowed_by_dup = {"a3_bw_start", "a3_bw_end", "a3_color_start", "a3_color_end"}
-            else:
-                # Не дубль - разрешены все поля
-                allowed_by_dup = COUNTER_FIELDS
-
-            # 2. Ограничения по модели устройства
-            spec = get_spec_for_model_name(report.equipment_model)
-            allowed_by_spec = allowed_counter_fields(spec)
-
-            # 3. Итоговые разрешения = пересечение всех ограничений
-            allowed_final = allowed_by_perm & allowed_by_dup
-            # Применяем ограничения по спецификации только если они установлены
-            if allowed_by_spec:
-                allowed_final &= allowed_by_spec
-
-            # Получаем разрешенные end поля
-            allowed_end_fields = {f for f in allowed_final if f.endswith("_end")}
-
-            # Проверяем есть ли незаполненные среди разрешенных
-            has_unfilled = False
-            for field in allowed_end_fields:
-                if getattr(report, field, 0) == 0:
-                    has_unfilled = True
-                    break
-
-            total_records += 1
-            if not has_unfilled:
-                filled_records += 1
-
-            # Метрики автозаполнения
-            # 1. Потенциальное автозаполнение - есть ли device_ip
-            has_device_ip = bool(report.device_ip)
-            if has_device_ip:
-                records_with_ip += 1
-
-            # 2. Фактическое автозаполнение - заполнено автоматически и не изменено вручную
-            # ВАЖНО: проверяем только среди записей с device_ip (потенциал)
-            if has_device_ip and allowed_end_fields:
-                all_auto = True
-                for field in allowed_end_fields:
-                    manual_field = f"{field}_manual"
-                    if getattr(report, manual_field, False):
-                        all_auto = False
-                        break
-
-                # Также проверяем что поля заполнены (не нулевые)
-                if all_auto:
-                    has_values = False
-                    for field in allowed_end_fields:
-                        if getattr(report, field, 0) > 0:
-                            has_values = True
-                            break
-
-                    if has_values:
-                        records_auto_filled += 1
-
-        # Рассчитываем процент заполненности
-        if total_records > 0:
-            completion_percentage = round((filled_records / total_records) * 100, 1)
-            auto_fill_potential_percentage = round((records_with_ip / total_records) * 100, 1)
-            auto_fill_actual_percentage = round((records_auto_filled / total_records) * 100, 1)
-
-    # Расчет количества уникальных пользователей
-    unique_users_count = (
-        CounterChangeLog.objects.filter(monthly_report__month=month_dt).values("user").distinct().count()
-    )
-
-    result = {
-        "completion_percentage": completion_percentage,
-        "unique_users_count": unique_users_count,
-        "auto_fill_potential_percentage": auto_fill_potential_percentage,
-        "auto_fill_actual_percentage": auto_fill_actual_percentage,
-    }
-
-    # Кэшируем результат на 1 час (3600 секунд)
-    cache.set(cache_key, result, 3600)
-
-    return result
-
-
-def invalidate_month_metrics_cache(month_dt):
-    """
-    Инвалидирует кэш метрик для указанного месяца.
-    Вызывается при изменении данных MonthlyReport.
-
-    Args:
-        month_dt: Дата месяца (date object)
-    """
-    # Очищаем кэш для всех возможных комбинаций прав
-    # Так как мы не знаем какие комбинации прав были закэшированы, удаляем по паттерну
-    # Redis не поддерживает удаление по паттерну напрямую через django cache
-    # Но мы можем использовать version для инвалидации
-    # Для простоты просто установим короткий TTL=1 для ключей которые мы знаем
-
-    # Возможные комбинации прав (самые распространенные)
-    common_perms = [
-        set(),  # Нет прав
-        {"a4_bw_start", "a4_color_start", "a3_bw_start", "a3_color_start"},  # Только start
-        {"a4_bw_end", "a4_color_end", "a3_bw_end", "a3_color_end"},  # Только end
-        {
-            "a4_bw_start",
-            "a4_bw_end",
-            "a4_color_start",
-            "a4_color_end",
-            "a3_bw_start",
-            "a3_bw_end",
-            "a3_color_start",
-            "a3_color_end",
-        },  # Все права
-    ]
-
-    for perms in common_perms:
-        perm_key = "_".join(sorted(perms))
-        cache_key = f"month_metrics:{month_dt.year}-{month_dt.month:02d}:{perm_key}"
-        cache.delete(cache_key)
-
-    logger.debug(f"Invalidated month metrics cache for {month_dt}")
+    return get_month_metrics(month_dt, allowed_by_perm)
 
 
 @login_required
@@ -1564,8 +1380,6 @@ def _annotate_anomalies_api(reports, current_month, threshold=2000):
     Returns:
         dict: Словарь вида {report_id: anomaly_info_dict}
     """
-    from django.db.models import Avg, Count
-
     if not reports:
         return {}
 
@@ -1574,18 +1388,12 @@ def _annotate_anomalies_api(reports, current_month, threshold=2000):
     if not serial_numbers:
         return {r.id: {"is_anomaly": False, "has_history": False} for r in reports}
 
-    # Получаем средние значения для всех серийных номеров одним запросом
-    averages = (
-        MonthlyReport.objects.filter(serial_number__in=serial_numbers, month__lt=current_month)
-        .values("serial_number")
-        .annotate(avg_prints=Avg("total_prints"), month_count=Count("id"))
-    )
-
-    # Создаем словарь для быстрого поиска
-    avg_dict = {}
-    for item in averages:
-        if item["month_count"] > 0:
-            avg_dict[item["serial_number"]] = {"avg": item["avg_prints"], "count": item["month_count"]}
+    # История всех серийников — из накопительной статистики SerialPrintStats одним запросом
+    avg_dict = {
+        key: {"avg": total / count, "count": count}
+        for key, (count, total) in historical_totals(serial_numbers, current_month).items()
+        if count > 0
+    }
 
     # Вычисляем аномалию для каждого отчета
     result = {}
@@ -1593,8 +1401,9 @@ def _annotate_anomalies_api(reports, current_month, threshold=2000):
         # Проверка на отрицательное значение (сброс счётчика)
         is_negative = r.total_prints < 0
 
-        if r.serial_number in avg_dict:
-            avg_data = avg_dict[r.serial_number]
+        key = serial_key(r.serial_number)
+        if key in avg_dict:
+            avg_data = avg_dict[key]
             avg = avg_data["avg"]
             difference = r.total_prints - avg
 
@@ -1663,21 +1472,13 @@ def api_month_detail(request, year, month):
                 {"ok": False, "error": "Этот месяц еще не опубликован. Обратитесь к администратору."}, status=403
             )
 
-    # Базовый queryset
-    qs = MonthlyReport.objects.filter(month__year=year, month__month=month)
+    # Базовый queryset (равенство по month — по индексам (month, ...), а не EXTRACT года/месяца)
+    qs = MonthlyReport.objects.filter(month=month_date)
 
     # Общий поиск
     q = request.GET.get("q", "").strip()
     if q:
-        qs = qs.filter(
-            Q(organization__icontains=q)
-            | Q(branch__icontains=q)
-            | Q(city__icontains=q)
-            | Q(address__icontains=q)
-            | Q(equipment_model__icontains=q)
-            | Q(serial_number__icontains=q)
-            | Q(inventory_number__icontains=q)
-        )
+        qs = qs.filter(search_q(q))
 
     # Фильтры по столбцам (текстовые поля)
     filter_fields = {
@@ -1810,10 +1611,10 @@ def api_month_detail(request, year, month):
         descending = False
 
     if sort_field in sort_map:
-        order_by = f"-{sort_map[sort_field]}" if descending else sort_map[sort_field]
-        qs = qs.order_by(order_by)
+        sort_column = sort_map[sort_field]
     else:
-        qs = qs.order_by("order_number")
+        sort_column, descending = "order_number", False
+    qs = ordered(qs, sort_column, descending)
 
     # Фильтр по аномалиям (если запрошен)
     show_anomalies = request.GET.get("show_anomalies") == "true"
@@ -1833,14 +1634,41 @@ def api_month_detail(request, year, month):
     show_unfilled = request.GET.get("show_unfilled") == "true"
 
     # Получаем дубли до пагинации
-    duplicate_groups = _get_duplicate_groups(month_date)
+    duplicate_index = get_duplicate_index(month_date)
 
-    # ВАЖНО: Всегда получаем ВСЕ записи без пагинации
-    # Пагинация будет применена один раз в конце после сериализации и фильтрации
-    # Это необходимо потому что:
-    # 1. Фильтр show_unfilled работает на уровне Python (не SQL)
-    # 2. Нужно правильно посчитать total для пагинации
-    all_reports_list = list(qs)
+    # Обработка пагинации
+    per_page = request.GET.get("per_page", "100")
+    page_num = request.GET.get("page", "1")
+    cursor = request.GET.get("cursor")
+
+    try:
+        per_page = int(per_page) if per_page != "all" else 10000
+    except ValueError:
+        per_page = 100
+
+    try:
+        page_num = int(page_num)
+    except ValueError:
+        page_num = 1
+
+    count_mode = request.GET.get("count", "approx" if cursor is not None else "exact")
+
+    # Фильтр show_unfilled работает на уровне Python (не SQL) — тогда сериализуем ВСЕ записи
+    # и режем страницу в конце. Иначе страница режется в SQL и сериализуется только она
+    next_cursor = None
+    total_is_estimate = False
+    if show_unfilled:
+        all_reports_list = list(qs)
+    elif cursor is not None:
+        all_reports_list, next_cursor = keyset_page(qs, sort_column, descending, cursor, per_page)
+        if count_mode == "approx":
+            total, total_is_estimate = approximate_count(qs)
+        else:
+            total = qs.count()
+    else:
+        paginator = Paginator(qs, per_page)
+        page_obj = paginator.get_page(page_num)
+        all_reports_list = list(page_obj)
 
     # Вычисляем аномалии для отчетов
     anomaly_flags = _annotate_anomalies_api(all_reports_list, month_date, threshold=2000)
@@ -1874,23 +1702,17 @@ def api_month_detail(request, year, month):
     reports = []
     for report in all_reports_list:
         # Определяем позицию в группе дублей
+        dup = duplicate_index.lookup(report.id)
+        is_dup = dup is not None
+        dup_position = dup.position if dup else 0
         dup_info = None
-        is_dup = False
-        dup_position = 0
-        for (serial, inv), positions in duplicate_groups.items():
-            for report_id, position in positions:
-                if report_id == report.id:
-                    is_dup = True
-                    dup_position = position
-                    dup_info = {
-                        "group_key": f"{serial}_{inv}",
-                        "position": position,
-                        "total_in_group": len(positions),
-                        "is_first": position == 0,
-                    }
-                    break
-            if dup_info:
-                break
+        if dup:
+            dup_info = {
+                "group_key": f"{dup.key[0]}_{dup.key[1]}",
+                "position": dup.position,
+                "total_in_group": dup.size,
+                "is_first": dup.position == 0,
+            }
 
         # Вычисляем разрешенные поля для этого отчета
         # 1. Ограничения по дублям
@@ -1999,20 +1821,6 @@ def api_month_detail(request, year, month):
             }
         )
 
-    # Обработка пагинации и choices
-    per_page = request.GET.get("per_page", "100")
-    page_num = request.GET.get("page", "1")
-
-    try:
-        per_page = int(per_page) if per_page != "all" else 10000
-    except ValueError:
-        per_page = 100
-
-    try:
-        page_num = int(page_num)
-    except ValueError:
-        page_num = 1
-
     # Choices для фильтров (на основе отфильтрованных данных для кросс-фильтрации)
     if show_unfilled:
         # Собираем ID всех записей которые попали в reports (прошли show_unfilled фильтр)
@@ -2026,13 +1834,26 @@ def api_month_detail(request, year, month):
         page_obj = paginator.get_page(page_num)
         reports = list(page_obj)
     else:
-        # Обычный режим без show_unfilled - choices из base_qs_for_choices
+        # Обычный режим без show_unfilled - choices из base_qs_for_choices, страница уже вырезана в SQL
         qs_for_choices = base_qs_for_choices
 
-        # Применяем пагинацию к списку сериализованных записей
-        paginator = Paginator(reports, per_page)
-        page_obj = paginator.get_page(page_num)
-        reports = list(page_obj)
+    if cursor is not None and not show_unfilled:
+        pagination = {
+            "total": total,
+            "total_is_estimate": total_is_estimate,
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+            "has_next": next_cursor is not None,
+        }
+    else:
+        pagination = {
+            "total": paginator.count,
+            "per_page": per_page,
+            "current_page": page_obj.number,
+            "total_pages": paginator.num_pages,
+            "has_next": page_obj.has_next(),
+            "has_previous": page_obj.has_previous(),
+        }
 
     choices = {
         "org": sorted(set(qs_for_choices.values_list("organization", flat=True).distinct())),
@@ -2054,14 +1875,7 @@ def api_month_detail(request, year, month):
         {
             "ok": True,
             "reports": reports,
-            "pagination": {
-                "total": paginator.count,
-                "per_page": per_page,
-                "current_page": page_obj.number,
-                "total_pages": paginator.num_pages,
-                "has_next": page_obj.has_next(),
-                "has_previous": page_obj.has_previous(),
-            },
+            "pagination": pagination,
             "choices": choices,
             "is_editable": is_editable,
             "edit_until": timezone.localtime(mc.edit_until).strftime("%d.%m %H:%M") if (mc and mc.edit_until) else None,
@@ -2339,6 +2153,7 @@ def api_delete_month(request):
         # Django автоматически удалит связанные записи через CASCADE
         MonthlyReport.objects.filter(month=month_date).delete()
         MonthControl.objects.filter(month=month_date).delete()
+        on_month_changed(month_date)
 
         # Завершаем логирование
         AuditService.finish_bulk_operation(
@@ -2,6 +2,7 @@ import logging
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 from django.conf import settings
 
 # Устанавливаем переменную окружения для Django
@@ -96,6 +97,14 @@ def debug_tasks(sender, **kwargs):
             logger.info("All required inventory tasks registered")
 
 
+@worker_process_shutdown.connect
+def close_browser_pool(**kwargs):
+    """Закрываем тёплые браузеры пула WEB-опроса при остановке процесса воркера"""
+    from inventory.browser_pool import shutdown_browser_pool
+
+    shutdown_browser_pool()
+
+
 # Явный импорт задач для гарантированной регистрации
 try:
     from integrations.tasks import (  # noqa: F401
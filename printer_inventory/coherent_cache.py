@@ -0,0 +1,271 @@
+# printer_inventory/coherent_cache.py
+"""
+Локальный кэш процесса, согласованный между процессами.
+
+Справочники, которые читаются на каждой строке (спецификации моделей,
+исключения по серийникам), держать в Redis невыгодно — запрос в сеть на
+каждое обращение, — а в обычном словаре модуля они расходятся между
+процессами: сигнал post_save очищает словарь только в процессе, который
+сохранил запись, остальные gunicorn- и Celery-воркеры отдают старые правила
+до перезапуска.
+
+CoherentCache — два уровня:
+
+    1. локальный LRU процесса (OrderedDict, не больше maxsize записей);
+    2. счётчик поколения в общем кэше Django (coherent:<name>:gen).
+
+Любое изменение данных (invalidate) поднимает поколение после коммита.
+Процесс сверяет своё поколение с общим не чаще раза в check_interval секунд
+и при расхождении сбрасывает локальные записи — так устаревание ограничено
+check_interval без запроса в Redis на каждое чтение.
+
+Дополнительно (COHERENT_CACHE_PUBSUB = True и кэш — Redis) invalidate
+публикует имя кэша в канал coherent_cache:invalidate; фоновый поток каждого
+процесса подписан на канал и сбрасывает локальный уровень сразу.
+
+fill(..., complete=True) загружает справочник целиком: пока поколение
+не сменилось, промах означает «записи нет» и в БД не ходит.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_CHANNEL = "coherent_cache:invalidate"
+
+_MISSING = object()
+_registry: Dict[str, "CoherentCache"] = {}
+
+
+class CoherentCache:
+    def __init__(self, name: str, maxsize: Optional[int] = None, check_interval: Optional[float] = None):
+        self.name = name
+        self._maxsize = maxsize
+        self._check_interval = check_interval
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._generation = None
+        self._checked_at = 0.0
+        self._complete = False
+        self._warm = False
+        _registry[name] = self
+
+    # ---------- настройки ----------
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize if self._maxsize is not None else getattr(settings, "COHERENT_CACHE_MAXSIZE", 4096)
+
+    @property
+    def check_interval(self) -> float:
+        if self._check_interval is not None:
+            return self._check_interval
+        return getattr(settings, "COHERENT_CACHE_CHECK_INTERVAL", 2.0)
+
+    # ---------- поколение ----------
+
+    @property
+    def _gen_key(self) -> str:
+        return f"coherent:{self.name}:gen"
+
+    def _shared(self):
+        return caches[getattr(settings, "COHERENT_CACHE_ALIAS", "default")]
+
+    def remote_generation(self):
+        shared = self._shared()
+        generation = shared.get(self._gen_key)
+        if generation is None:
+            # Начальное поколение от времени: после вытеснения ключа локальные копии не совпадут
+            shared.add(self._gen_key, time.time_ns(), None)
+            generation = shared.get(self._gen_key)
+        return generation
+
+    def _validate(self) -> None:
+        now = time.monotonic()
+        if self._generation is not None and now - self._checked_at < self.check_interval:
+            return
+        try:
+            generation = self.remote_generation()
+        except Exception as e:
+            # Общий кэш недоступен — работаем по интервалу проверки, но не сбрасываем записи
+            logger.warning(f"coherent_cache[{self.name}]: нет поколения в общем кэше: {e}")
+            self._checked_at = now
+            return
+        with self._lock:
+            if generation != self._generation:
+                if self._generation is not None:
+                    logger.debug(f"coherent_cache[{self.name}]: поколение {self._generation} -> {generation}")
+                self._data.clear()
+                self._complete = self._warm = False
+                self._generation = generation
+            self._checked_at = now
+        _ensure_listener()
+
+    # ---------- чтение ----------
+
+    def get(self, key: Hashable, loader: Optional[Callable[[], Any]] = None, default=None):
+        """
+        Значение по ключу. Промах: при полном справочнике (complete) — default,
+        иначе loader() (результат, в том числе None, кэшируется).
+        """
+        self._validate()
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is not _MISSING:
+                self._data.move_to_end(key)
+                return value
+            if self._complete or loader is None:
+                return default
+            generation = self._generation
+        value = loader()
+        self._put(key, value, generation)
+        return value
+
+    @property
+    def is_warm(self) -> bool:
+        """В этом поколении справочник уже загружался целиком (fill с complete=True)."""
+        self._validate()
+        return self._warm
+
+    def fill(self, items: Iterable[Tuple[Hashable, Any]], complete: bool = False) -> None:
+        """
+        Кладёт пачку записей. complete=True — это весь справочник; если он не
+        помещается в maxsize, кэш остаётся обычным LRU с догрузкой по ключу
+        (is_warm всё равно станет True — повторно целиком не грузим).
+        """
+        self._validate()
+        items = list(items)
+        with self._lock:
+            generation = self._generation
+            for key, value in items:
+                self._put(key, value, generation)
+            if complete and self._generation == generation:
+                self._warm = True
+                self._complete = len(items) <= self.maxsize
+
+    def _put(self, key, value, generation) -> None:
+        with self._lock:
+            # Пока грузили, пришла инвалидация — значение могло устареть
+            if generation != self._generation:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._complete = False
+
+    # ---------- инвалидация ----------
+
+    def clear_local(self) -> int:
+        with self._lock:
+            size = len(self._data)
+            self._data.clear()
+            self._complete = self._warm = False
+            # Следующее чтение сверит поколение заново
+            self._generation = None
+        return size
+
+    def invalidate(self) -> int:
+        """
+        Данные изменились: локальный уровень сбрасывается сразу, поколение поднимается
+        (и уходит сообщение pub/sub) после коммита — чтобы другие процессы не перечитали
+        ещё незакоммиченное состояние. Returns: сколько локальных записей сброшено.
+        """
+        size = self.clear_local()
+        transaction.on_commit(self._publish)
+        return size
+
+    def _publish(self) -> None:
+        self.clear_local()
+        shared = self._shared()
+        try:
+            shared.incr(self._gen_key)
+        except ValueError:
+            shared.add(self._gen_key, time.time_ns(), None)
+        except Exception as e:
+            logger.warning(f"coherent_cache[{self.name}]: не удалось поднять поколение: {e}")
+        if _pubsub_enabled():
+            try:
+                _redis().publish(PUBSUB_CHANNEL, self.name)
+            except Exception as e:
+                logger.warning(f"coherent_cache[{self.name}]: не удалось опубликовать инвалидацию: {e}")
+
+    # ---------- отладка ----------
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Pub/sub: мгновенная инвалидация в других процессах
+# ──────────────────────────────────────────────────────────────────────────────
+
+_listener_lock = threading.Lock()
+_listener_pid: Optional[int] = None
+
+
+def _pubsub_enabled() -> bool:
+    return bool(getattr(settings, "COHERENT_CACHE_PUBSUB", False))
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    return get_redis_connection(getattr(settings, "COHERENT_CACHE_ALIAS", "default"))
+
+
+def handle_message(message: dict) -> None:
+    """Сообщение канала: data — имя кэша, чей локальный уровень нужно сбросить."""
+    if message.get("type") != "message":
+        return
+    name = message.get("data")
+    if isinstance(name, bytes):
+        name = name.decode()
+    target = _registry.get(name)
+    if target is not None:
+        target.clear_local()
+
+
+def _listen(pubsub) -> None:
+    try:
+        for message in pubsub.listen():
+            handle_message(message)
+    except Exception as e:
+        global _listener_pid
+        logger.warning(f"coherent_cache: подписка на {PUBSUB_CHANNEL} прервана: {e}")
+        # Следующая проверка поколения переподпишется
+        _listener_pid = None
+
+
+def _ensure_listener() -> None:
+    """Поток-подписчик на процесс; после fork (prefork gunicorn/Celery) запускается заново."""
+    global _listener_pid
+    if not _pubsub_enabled() or _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        try:
+            pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(PUBSUB_CHANNEL)
+        except Exception as e:
+            logger.warning(f"coherent_cache: pub/sub недоступен, только проверка поколения: {e}")
+            _listener_pid = os.getpid()  # не пытаемся на каждом чтении
+            return
+        threading.Thread(target=_listen, args=(pubsub,), name="coherent-cache-pubsub", daemon=True).start()
+        _listener_pid = os.getpid()
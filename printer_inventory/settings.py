@@ -401,6 +401,11 @@ CELERY_TASK_ROUTES = {
     "inventory.tasks.run_inventory_task_priority": {"queue": "high_priority"},
     # Периодические задачи - низкий приоритет
     "inventory.tasks.run_inventory_task": {"queue": "low_priority"},
+    "inventory.tasks.run_inventory_batch_task": {"queue": "low_priority"},
+    "monthly_report.tasks.refresh_serial_stats_task": {"queue": "low_priority"},
+    # Сброс накопителей опроса - не ждут за пачками опроса в low_priority
+    "inventory.tasks.flush_monthly_sync_task": {"queue": "high_priority"},
+    "inventory.tasks.flush_ws_broadcast_task": {"queue": "high_priority"},
     # Демон
     "inventory.tasks.inventory_daemon_task": {"queue": "daemon"},
     # GLPI интеграция - высокий приоритет для быстрого тестирования после релиза
@@ -412,8 +417,20 @@ CELERY_TASK_ROUTES = {
     "supplies_report.tasks.dispatch_due_supplies_reports": {"queue": "low_priority"},
     # Интерактивный экспорт Okdesk - отдельная очередь, не конкурирует с опросом
     "integrations.tasks.build_okdesk_export_task": {"queue": "exports"},
+    # XML-выгрузка GLPI после WEB/HYBRID опроса - не в low_priority, где её топят пачки опроса
+    "inventory.tasks.save_xml_export_task": {"queue": "exports"},
     # Интерактивная выгрузка статистики дашборда - та же очередь exports
     "dashboard.tasks.build_statistics_export_task": {"queue": "exports"},
+    # Сводки опросов и прогрев кэша дашборда истекают через свой интервал (expires) -
+    # как и сброс накопителей, не ждут за пачками опроса в low_priority
+    "dashboard.tasks.refresh_poll_rollups_task": {"queue": "high_priority"},
+    "dashboard.tasks.warm_dashboard_cache_task": {"queue": "high_priority"},
+    # Снимки счётчиков закрывшихся месяцев - раз в сутки, без expires
+    "dashboard.tasks.refresh_counter_snapshots_task": {"queue": "low_priority"},
+    # Excel-выгрузка месяца ежемесячных отчётов
+    "monthly_report.tasks.build_month_export_task": {"queue": "exports"},
+    # Загрузка месяца из Excel
+    "monthly_report.tasks.import_month_excel_task": {"queue": "exports"},
     # Проверка кандидатов на автоопрос в GLPI - несколько запросов на серийник
     "contracts.tasks.probe_autopoll_candidates_task": {"queue": "exports"},
     # Пробный опрос кандидата - netdiscovery молчащего IP тянется до полутора минут
@@ -469,6 +486,16 @@ CELERY_BEAT_SCHEDULE = {
         "schedule": crontab(hour="*/4", minute=45),  # Через 15 мин после issues sync
         "options": {"queue": "low_priority", "priority": 1},
     },
+    "refresh-printer-month-counters-daily": {
+        "task": "dashboard.tasks.refresh_counter_snapshots_task",
+        "schedule": crontab(hour=3, minute=40),  # 03:40 — снимки счётчиков закрывшихся месяцев
+        "options": {"queue": "low_priority", "priority": 1},
+    },
+    "refresh-serial-print-stats-daily": {
+        "task": "monthly_report.tasks.refresh_serial_stats_task",
+        "schedule": crontab(hour=3, minute=30),  # 03:30 — сворачивает закрывшиеся месяцы
+        "options": {"queue": "low_priority", "priority": 1},
+    },
     "cleanup-old-glpi-syncs-weekly": {
         "task": "integrations.tasks.cleanup_old_glpi_syncs",
         "schedule": crontab(hour=4, minute=30, day_of_week=0),  # Воскресенье 04:30
@@ -508,6 +535,10 @@ CELERY_TASK_ANNOTATIONS = {
         "rate_limit": "100/m",  # 100 фоновых задач в минуту
         "time_limit": 600,  # 10 минут максимум
     },
+    "inventory.tasks.run_inventory_batch_task": {
+        "soft_time_limit": 60 * 40,  # пачка из 50 принтеров при 8 потоках
+        "time_limit": 60 * 45,
+    },
 }
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 100
@@ -551,6 +582,16 @@ STORAGES = {
 
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 8000
 
+# ──────────────────────────────────────────────────────────────────────────────
+# ВЫГРУЗКИ
+# ──────────────────────────────────────────────────────────────────────────────
+# Готовые XLSX-выгрузки (printer_inventory/xlsx.py). Каталог должен быть общим
+# для веб-процессов и Celery-воркеров очереди exports
+EXPORT_CACHE_DIR = Path(os.getenv("EXPORT_CACHE_DIR", BASE_DIR / "exports"))
+# Загруженные Excel-файлы ежемесячного отчёта до обработки задачей
+# import_month_excel_task — тоже общий каталог
+IMPORT_UPLOAD_DIR = Path(os.getenv("IMPORT_UPLOAD_DIR", BASE_DIR / "uploads" / "monthly_report"))
+
 # ──────────────────────────────────────────────────────────────────────────────
 # LOGGING (оптимизированное для Celery)
 # ──────────────────────────────────────────────────────────────────────────────
@@ -781,8 +822,76 @@ else:
     GLPI_USE_SUDO = False
 
 HTTP_CHECK = os.getenv("HTTP_CHECK", "True").strip().lower() == "true"
+
+# Встроенный asyncio SNMP-опрос (Printer.snmp_backend = NATIVE)
+SNMP_NATIVE_TIMEOUT = float(os.getenv("SNMP_NATIVE_TIMEOUT", "2"))  # секунды на один запрос
+SNMP_NATIVE_RETRIES = int(os.getenv("SNMP_NATIVE_RETRIES", "1"))
+SNMP_NATIVE_CONCURRENCY = int(os.getenv("SNMP_NATIVE_CONCURRENCY", "100"))  # одновременно опрашиваемых устройств
+# Частные OID счётчиков парка: {"BW_A3": ["1.3.6.1.4.1..."], ...} — проверяются раньше встроенных
+SNMP_NATIVE_PAGECOUNTER_OIDS = {}
+
+# Пул headless-браузеров для WEB/HYBRID опроса (на процесс воркера / веб-сервера)
+WEB_BROWSER_POOL_SIZE = int(os.getenv("WEB_BROWSER_POOL_SIZE", "2"))  # 0 — без пула, браузер на каждый опрос
+WEB_BROWSER_MAX_USES = int(os.getenv("WEB_BROWSER_MAX_USES", "50"))  # аренд до пересоздания браузера
+WEB_BROWSER_CHECKOUT_TIMEOUT = float(os.getenv("WEB_BROWSER_CHECKOUT_TIMEOUT", "60"))  # секунды ожидания
+
+# Правила без цепочки действий выполняются без браузера (requests + lxml)
+WEB_STATIC_FETCH = os.getenv("WEB_STATIC_FETCH", "True").strip().lower() == "true"
+WEB_STATIC_TIMEOUT = float(os.getenv("WEB_STATIC_TIMEOUT", "30"))  # секунды на HTTP-запрос
+
 POLL_INTERVAL_MINUTES = int(os.getenv("POLL_INTERVAL_MINUTES", "60"))
 
+# Адаптивное расписание опроса (inventory/scheduling.py)
+POLL_ADAPTIVE_SCHEDULE = os.getenv("POLL_ADAPTIVE_SCHEDULE", "True").strip().lower() == "true"
+POLL_MAX_BACKOFF_MINUTES = int(os.getenv("POLL_MAX_BACKOFF_MINUTES", str(24 * 60)))  # потолок для недоступных
+POLL_MAX_INTERVAL_MINUTES = int(os.getenv("POLL_MAX_INTERVAL_MINUTES", str(6 * 60)))  # потолок для «тихих»
+POLL_PAGES_PER_POLL = int(os.getenv("POLL_PAGES_PER_POLL", "20"))  # целевой прирост страниц между опросами
+POLL_VELOCITY_WINDOW_DAYS = int(os.getenv("POLL_VELOCITY_WINDOW_DAYS", "14"))
+
+# Пакетный опрос демоном: принтеров в одном сообщении брокера и потоков внутри задачи.
+# WEB/HYBRID принтеры пачки делят между собой WEB_BROWSER_POOL_SIZE браузеров процесса.
+# Не дождавшиеся браузера за WEB_BROWSER_CHECKOUT_TIMEOUT не считаются ошибкой — уходят в очередь заново.
+INVENTORY_BATCH_SIZE = int(os.getenv("INVENTORY_BATCH_SIZE", "50"))  # 1 — задача на каждый принтер
+INVENTORY_BATCH_CONCURRENCY = int(os.getenv("INVENTORY_BATCH_CONCURRENCY", "8"))
+
+# Реестр опросов «в полёте» (inventory/inflight.py): один опрос принтера за раз,
+# повторный запрос ждёт результат идущего, демон не ставит принтер в очередь дважды
+INVENTORY_INFLIGHT_CACHE_ALIAS = "inventory"
+INVENTORY_INFLIGHT_TTL = int(os.getenv("INVENTORY_INFLIGHT_TTL", "900"))  # потолок длительности опроса, сек
+INVENTORY_INFLIGHT_QUEUED_TTL = int(os.getenv("INVENTORY_INFLIGHT_QUEUED_TTL", "1800"))  # сколько помним постановку
+
+# История опросов (inventory/partitions.py): последние INVENTORY_FULL_HISTORY_DAYS дней хранятся целиком,
+# старше — последняя задача на принтер за день. На PostgreSQL InventoryTask и PageCounter секционированы
+# помесячно; cleanup_old_inventory_data создаёт секции на INVENTORY_PARTITIONS_AHEAD месяцев вперёд
+INVENTORY_FULL_HISTORY_DAYS = int(os.getenv("INVENTORY_FULL_HISTORY_DAYS", "90"))
+INVENTORY_PARTITIONS_AHEAD = int(os.getenv("INVENTORY_PARTITIONS_AHEAD", "3"))
+
+# WebSocket-события опроса копятся в общем буфере (Redis кэша WS_BROADCAST_CACHE_ALIAS)
+# и уходят пачкой раз в N мс, по принтеру — только последнее состояние
+# (inventory/ws_broadcast.py). 0 — каждое событие сразу, как раньше.
+WS_BROADCAST_INTERVAL_MS = int(os.getenv("WS_BROADCAST_INTERVAL_MS", "300"))
+WS_BROADCAST_CACHE_ALIAS = "inventory"
+# Страховка: окно, брошенное погибшим процессом, рассылается не позже чем через N секунд
+WS_BROADCAST_STALE_FLUSH_SECONDS = int(os.getenv("WS_BROADCAST_STALE_FLUSH_SECONDS", "15"))
+if WS_BROADCAST_INTERVAL_MS > 0 and WS_BROADCAST_STALE_FLUSH_SECONDS > 0:
+    CELERY_BEAT_SCHEDULE["flush-stale-ws-broadcast"] = {
+        "task": "inventory.tasks.flush_ws_broadcast_task",
+        "schedule": float(WS_BROADCAST_STALE_FLUSH_SECONDS),
+        "options": {"queue": "high_priority", "priority": 5, "expires": WS_BROADCAST_STALE_FLUSH_SECONDS},
+    }
+
+# Опросы демона попадают в месячные отчёты пачкой (inventory/monthly_sync.py):
+# накопитель в Redis кэша MONTHLY_SYNC_CACHE_ALIAS, применение — не позже чем через
+# MONTHLY_SYNC_MAX_STALENESS секунд. 0 — каждый опрос сразу, как раньше.
+MONTHLY_SYNC_MAX_STALENESS = int(os.getenv("MONTHLY_SYNC_MAX_STALENESS", "60"))
+MONTHLY_SYNC_CACHE_ALIAS = "inventory"
+if MONTHLY_SYNC_MAX_STALENESS > 0:
+    CELERY_BEAT_SCHEDULE["flush-monthly-sync"] = {
+        "task": "inventory.tasks.flush_monthly_sync_task",
+        "schedule": float(MONTHLY_SYNC_MAX_STALENESS),
+        "options": {"queue": "high_priority", "priority": 5, "expires": MONTHLY_SYNC_MAX_STALENESS},
+    }
+
 # ═══════════════════════════════════════════════════════════════
 # ЗАЩИТА ОТ АНОМАЛЬНЫХ СЧЕТЧИКОВ (Kyocera bug protection)
 # ═══════════════════════════════════════════════════════════════
@@ -801,10 +910,49 @@ ANOMALY_JUMP_THRESHOLD = int(os.getenv("ANOMALY_JUMP_THRESHOLD", "5000"))
 # Если принтер не опрашивался дольше этого времени - считаем что он мог много печатать (например, по USB)
 ANOMALY_SKIP_CHECK_DAYS = int(os.getenv("ANOMALY_SKIP_CHECK_DAYS", "30"))
 
+# Скользящее окно последних успешных счётчиков для validate_against_history
+# (inventory/counter_window.py): держим в кэше, чтобы валидация не ходила в БД
+COUNTER_WINDOW_CACHE_ALIAS = "inventory"
+COUNTER_WINDOW_SIZE = 5
+COUNTER_WINDOW_TTL = int(os.getenv("COUNTER_WINDOW_TTL", str(7 * 24 * 3600)))
+
 # Автоблокировка ручного редактирования end-полей (дни)
 # Если принтер успешно опрашивался в течение этого срока — end-поля заблокированы
 AUTO_LOCK_FRESHNESS_DAYS = int(os.getenv("AUTO_LOCK_FRESHNESS_DAYS", "7"))
 
+# Справочники правил редактирования (спецификации моделей, исключения по серийникам)
+# кэшируются в процессе и сверяются с поколением в кэше COHERENT_CACHE_ALIAS не чаще
+# раза в COHERENT_CACHE_CHECK_INTERVAL секунд (printer_inventory/coherent_cache.py).
+# COHERENT_CACHE_PUBSUB — вдобавок мгновенный сброс через Redis pub/sub.
+COHERENT_CACHE_ALIAS = "default"
+COHERENT_CACHE_CHECK_INTERVAL = float(os.getenv("COHERENT_CACHE_CHECK_INTERVAL", "2"))
+COHERENT_CACHE_MAXSIZE = int(os.getenv("COHERENT_CACHE_MAXSIZE", "4096"))
+COHERENT_CACHE_PUBSUB = os.getenv("COHERENT_CACHE_PUBSUB", "False").strip().lower() == "true"
+
+# Сводки опросов для виджетов дашборда (dashboard/services_rollups.py): дополняются
+# задачами новее отметки раз в DASHBOARD_ROLLUP_INTERVAL секунд; задачи моложе
+# DASHBOARD_ROLLUP_LAG секунд ждут следующего запуска. Часовые строки хранятся
+# DASHBOARD_ROLLUP_HOURLY_DAYS дней, суточные — бессрочно.
+DASHBOARD_ROLLUP_INTERVAL = int(os.getenv("DASHBOARD_ROLLUP_INTERVAL", "300"))
+DASHBOARD_ROLLUP_LAG = int(os.getenv("DASHBOARD_ROLLUP_LAG", "60"))
+DASHBOARD_ROLLUP_HOURLY_DAYS = int(os.getenv("DASHBOARD_ROLLUP_HOURLY_DAYS", "8"))
+if DASHBOARD_ROLLUP_INTERVAL > 0:
+    CELERY_BEAT_SCHEDULE["refresh-dashboard-poll-rollups"] = {
+        "task": "dashboard.tasks.refresh_poll_rollups_task",
+        "schedule": float(DASHBOARD_ROLLUP_INTERVAL),
+        "options": {"queue": "high_priority", "priority": 5, "expires": DASHBOARD_ROLLUP_INTERVAL},
+    }
+
+# Прогрев кэша виджетов дашборда для каждого фильтра организации — чаще, чем значения
+# устаревают (5 минут, dashboard/services.py). 0 — не прогревать.
+DASHBOARD_CACHE_WARM_INTERVAL = int(os.getenv("DASHBOARD_CACHE_WARM_INTERVAL", "240"))
+if DASHBOARD_CACHE_WARM_INTERVAL > 0:
+    CELERY_BEAT_SCHEDULE["warm-dashboard-cache"] = {
+        "task": "dashboard.tasks.warm_dashboard_cache_task",
+        "schedule": float(DASHBOARD_CACHE_WARM_INTERVAL),
+        "options": {"queue": "high_priority", "priority": 5, "expires": DASHBOARD_CACHE_WARM_INTERVAL},
+    }
+
 # ──────────────────────────────────────────────────────────────────────────────
 # USB AGENT (PrinterCollector) — мастер-ключ для self-registration агентов
 # ──────────────────────────────────────────────────────────────────────────────
@@ -7,6 +7,9 @@ PostgreSQL/Redis и реальных кредов.
     DJANGO_SETTINGS_MODULE=printer_inventory.test_settings python manage.py test
 """
 
+import tempfile
+from pathlib import Path
+
 from .settings import *  # noqa: F401,F403
 
 DATABASES = {
@@ -42,6 +45,9 @@ SESSION_ENGINE = "django.contrib.sessions.backends.db"
 
 # Channels — in-memory слой.
 CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+WS_BROADCAST_INTERVAL_MS = 0  # без фоновых таймеров рассылки
+COHERENT_CACHE_CHECK_INTERVAL = 0  # справочники сверяют поколение на каждом чтении
+COHERENT_CACHE_PUBSUB = False
 
 # Celery — синхронное выполнение задач.
 CELERY_TASK_ALWAYS_EAGER = True
@@ -50,3 +56,7 @@ CELERY_BROKER_URL = "memory://"
 CELERY_RESULT_BACKEND = "cache+memory://"
 
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+# Кэш XLSX-выгрузок — во временном каталоге, не в дереве проекта.
+EXPORT_CACHE_DIR = Path(tempfile.mkdtemp(prefix="printer-inventory-exports-"))
+IMPORT_UPLOAD_DIR = Path(tempfile.mkdtemp(prefix="printer-inventory-uploads-"))
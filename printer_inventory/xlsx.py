@@ -0,0 +1,209 @@
+# printer_inventory/xlsx.py
+"""
+Потоковая запись XLSX для выгрузок всех приложений и кэш готовых файлов на диске.
+
+Раньше каждая выгрузка собирала обычную книгу openpyxl: все ячейки листа
+живут в памяти до wb.save(), а у каждой ячейки свои объекты Font/Fill/Border/
+Alignment. На месяце в десятки тысяч строк это сотни мегабайт в процессе,
+который обслуживает запрос.
+
+StreamingWorkbook пишет в режиме write_only: строки сразу сериализуются во
+временный XML листа, в памяти остаётся только текущая строка. Оформление —
+именованные стили, регистрируются один раз на книгу; ячейка хранит только
+имя стиля. Ширины колонок, высота шапки и закрепление задаются до первой
+строки (после — write_only их уже не примет), поэтому автоподбор ширины
+по данным невозможен — ширины задаются явно.
+
+Кэш файлов (store_artifact / cached_artifact): готовая выгрузка кладётся
+в EXPORT_CACHE_DIR/<kind>/<key>.v<версия>.xlsx, где версия — счётчик
+изменений данных у вызывающего. Повторное скачивание неизменившихся данных
+отдаётся с диска без пересборки.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from django.conf import settings
+from django.http import FileResponse
+
+logger = logging.getLogger(__name__)
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Имена стилей ячеек данных
+TEXT = "xlsx_text"
+CENTER = "xlsx_center"
+NUMBER = "xlsx_number"
+DATETIME = "xlsx_datetime"
+HEADER = "xlsx_header"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Потоковая книга
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+def _styled(ws, value, style: Optional[str]):
+    if style is None:
+        return value
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
+    return cell
+
+
+class StreamingSheet:
+    """Лист write_only-книги: только дописывание строк."""
+
+    def __init__(self, ws, styles: Optional[Sequence[Optional[str]]]):
+        self._ws = ws
+        self._styles = list(styles) if styles else None
+        self.rows = 0
+
+    def append(self, values: Sequence) -> None:
+        if self._styles:
+            values = [_styled(self._ws, value, style) for value, style in zip(values, self._styles)] + list(
+                values[len(self._styles) :]
+            )
+        self._ws.append(values)
+        self.rows += 1
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        for values in rows:
+            self.append(values)
+
+
+class StreamingWorkbook:
+    """
+    write_only-книга с именованными стилями.
+
+    header_color — заливка шапки (RGB), header_font_color — цвет её текста;
+    bordered — тонкие границы у шапки и у ячеек со стилем.
+    """
+
+    def __init__(self, header_color: Optional[str] = "4472C4", header_font_color: str = "FFFFFF", bordered=False):
+        self._wb = Workbook(write_only=True)
+        border = Border(**{side: Side(style="thin") for side in ("left", "right", "top", "bottom")})
+        extra = {"border": border} if bordered else {}
+        header = {
+            "font": Font(bold=True, color=header_font_color if header_color else None),
+            "alignment": Alignment(horizontal="center", vertical="center", wrap_text=True),
+            **extra,
+        }
+        if header_color:
+            header["fill"] = PatternFill(start_color=header_color, end_color=header_color, fill_type="solid")
+        for style in (
+            NamedStyle(HEADER, **header),
+            NamedStyle(TEXT, alignment=Alignment(horizontal="left"), **extra),
+            NamedStyle(CENTER, alignment=Alignment(horizontal="center"), **extra),
+            NamedStyle(NUMBER, alignment=Alignment(horizontal="right"), **extra),
+            NamedStyle(DATETIME, number_format="dd.mm.yyyy hh:mm", **extra),
+        ):
+            self._wb.add_named_style(style)
+
+    def sheet(
+        self,
+        title: str,
+        headers: Sequence[str],
+        widths: Sequence[float] = (),
+        styles: Optional[Sequence[Optional[str]]] = None,
+        header_height: Optional[float] = None,
+        freeze: Optional[str] = "A2",
+    ) -> StreamingSheet:
+        """
+        Новый лист с шапкой. styles — имя стиля на колонку данных (None — без стиля,
+        ячейка пишется как значение: дешевле всего).
+        """
+        ws = self._wb.create_sheet(title[:31])
+        for idx, width in enumerate(widths, start=1):
+            ws.column_dimensions[get_column_letter(idx)].width = width
+        if header_height:
+            ws.row_dimensions[1].height = header_height
+        if freeze:
+            ws.freeze_panes = freeze
+        ws.append([_styled(ws, header, HEADER) for header in headers])
+        return StreamingSheet(ws, styles)
+
+    def save(self, target) -> None:
+        """target — путь или файловый объект. Книгу write_only можно сохранить только один раз."""
+        if not self._wb.worksheets:
+            self._wb.create_sheet("Лист1")
+        self._wb.save(target)
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        self.save(buf)
+        return buf.getvalue()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Кэш готовых файлов
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Прежние версии файла удаляются не сразу: их ещё могут отдавать параллельные запросы
+PRUNE_GRACE_SECONDS = 10 * 60
+
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+
+def _cache_dir(kind: str) -> Path:
+    return Path(settings.EXPORT_CACHE_DIR) / _UNSAFE.sub("_", kind)
+
+
+def artifact_path(kind: str, key: str, version) -> Path:
+    return _cache_dir(kind) / f"{_UNSAFE.sub('_', key)}.v{version}.xlsx"
+
+
+def cached_artifact(kind: str, key: str, version) -> Optional[Path]:
+    path = artifact_path(kind, key, version)
+    return path if path.exists() else None
+
+
+def store_artifact(kind: str, key: str, version, build: Callable[[str], None]) -> Path:
+    """
+    Собирает файл build(путь) во временный файл и атомарно переименовывает
+    в файл версии. Параллельные сборки одной версии безопасны: победит
+    последняя, содержимое одинаковое.
+    """
+    path = artifact_path(kind, key, version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        build(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    _prune(path, key)
+    return path
+
+
+def _prune(current: Path, key: str) -> None:
+    cutoff = time.time() - PRUNE_GRACE_SECONDS
+    for old in current.parent.glob(f"{_UNSAFE.sub('_', key)}.v*.xlsx"):
+        if old == current:
+            continue
+        try:
+            if old.stat().st_mtime < cutoff:
+                old.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"xlsx: не удалось удалить устаревшую выгрузку {old}: {e}")
+
+
+def artifact_response(path: Path, filename: str) -> FileResponse:
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
@@ -18,7 +18,7 @@ from typing import Iterable
 
 from django.utils import timezone
 
-from inventory.models import PageCounter
+from inventory.models import PageCounter, PrinterLatestState
 
 from .models import ReportGroup, ReportGroupItem
 
@@ -89,21 +89,15 @@ def printer_model_name(printer) -> str:
 def _latest_counters_map(printer_ids: list[int]) -> dict[int, PageCounter]:
     """Один запрос: последний успешный PageCounter для каждого из переданных принтеров.
 
-    Использует PostgreSQL `DISTINCT ON (task__printer_id)` поверх упорядочивания
-    по recorded_at desc. Эквивалентно «window-row-number == 1», но проще.
+    Берётся из денормализованной таблицы `PrinterLatestState` (одна строка на
+    принтер), которую inventory обновляет при каждом успешном опросе.
     """
     if not printer_ids:
         return {}
-    counters = (
-        PageCounter.objects.filter(
-            task__printer_id__in=printer_ids,
-            task__status="SUCCESS",
-        )
-        .select_related("task")
-        .order_by("task__printer_id", "-recorded_at")
-        .distinct("task__printer_id")
+    states = PrinterLatestState.objects.filter(printer_id__in=printer_ids, counter__isnull=False).select_related(
+        "counter__task"
     )
-    return {pc.task.printer_id: pc for pc in counters}
+    return {state.printer_id: state.counter for state in states}
 
 
 def _build_consumables(counter: PageCounter | None) -> list[ConsumableRow]: